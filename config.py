@@ -22,6 +22,16 @@ SERVER_HOST = os.getenv("INFOGEO_HOST", "0.0.0.0")
 # Modo debug (True = desenvolvimento, False = produção)
 DEBUG_MODE = os.getenv("INFOGEO_DEBUG", "True").lower() == "true"
 
+# Produção (gunicorn -c server/gunicorn_conf.py server.servidor:app):
+# processos worker (0 = nº de núcleos) e threads por worker
+SERVER_WORKERS = int(os.getenv("INFOGEO_WORKERS", 0))
+SERVER_THREADS = int(os.getenv("INFOGEO_THREADS", 4))
+
+# Intervalo (s) da verificação dos arquivos de dados no processo mestre;
+# se algum mudar, as camadas são recarregadas e os workers substituídos
+# sem derrubar conexões. 0 desativa.
+SERVER_DATA_WATCH_INTERVAL = int(os.getenv("INFOGEO_DATA_WATCH_S", 60))
+
 # Tamanho máximo de upload (em MB)
 MAX_UPLOAD_SIZE_MB = int(os.getenv("INFOGEO_MAX_UPLOAD_MB", 5000))
 
@@ -63,6 +73,16 @@ CENTROIDES_GEOJSON_PATH = DATA_DIR / "Centroides_BR.geojson"
 # GeoPackage de CAR (Cadastro Ambiental Rural)
 CAR_GPKG_PATH = DATA_DIR / 'CAR_BR_BB_simplificado.gpkg'
 
+# Índice auxiliar (SQLite) de busca por cod_imovel, gerado a partir do GPKG
+CAR_INDEX_PATH = Path(
+    os.getenv("INFOGEO_CAR_INDEX_PATH", DATA_DIR / "CAR_BR_BB_simplificado.index.sqlite")
+)
+
+# Análises de lote pré-calculadas por imóvel do CAR (python -m server.car_precompute)
+CAR_ANALISES_PATH = Path(
+    os.getenv("INFOGEO_CAR_ANALISES_PATH", DATA_DIR / "CAR_analises.sqlite")
+)
+
 # Excel de Micro Classes (Notas Agronômicas)
 MICRO_CLASSES_EXCEL_PATH = DATA_DIR / "CD_MICRO_CLASSES.xlsx"
 
@@ -75,7 +95,8 @@ VALORACAO_ENABLED_DEFAULT = (
     os.getenv("INFOGEO_VALORACAO_DEFAULT", "True").lower() == "true"
 )
 
-# Usar geolocalização reversa (requer internet)
+# Usar geolocalização reversa via Nominatim (requer internet); o lookup
+# local no shapefile IBGE não depende desta opção
 GEOLOCATION_ENABLED = os.getenv("INFOGEO_GEOLOCATION", "True").lower() == "true"
 
 # User agent para geopy
@@ -473,6 +494,196 @@ SOLOS_ORDEM_CORES = {
     "Outros":                    "#CCCCCC",
 }
 
+# =============================================================================
+# CACHE DE IMAGENS (recortes PNG servidos por URL)
+# =============================================================================
+
+# Memória máxima do cache LRU de imagens (em MB, por processo)
+IMAGE_CACHE_MAX_MB = int(os.getenv("INFOGEO_IMAGE_CACHE_MB", 256))
+
+# Diretório opcional para persistir as imagens em disco (compartilhado entre
+# workers: a URL da imagem pode cair num worker diferente do que a
+# renderizou). Vazio = apenas memória; com mais de um worker, o gunicorn
+# (server/gunicorn_conf.py) usa IMAGE_CACHE_DIR_PADRAO.
+IMAGE_CACHE_DIR = os.getenv("INFOGEO_IMAGE_CACHE_DIR", "")
+IMAGE_CACHE_DIR_PADRAO = DATA_DIR / "cache_recortes"
+
+# Validade (Cache-Control max-age, em segundos) das imagens servidas
+IMAGE_CACHE_MAX_AGE = int(os.getenv("INFOGEO_IMAGE_CACHE_MAX_AGE", 7 * 24 * 3600))
+
+# =============================================================================
+# TILES XYZ (/tiles/<camada>/<z>/<x>/<y>.png)
+# =============================================================================
+
+# Memória máxima do cache LRU de tiles (em MB, por processo)
+TILE_CACHE_MAX_MB = int(os.getenv("INFOGEO_TILE_CACHE_MB", 256))
+
+# Diretório opcional para persistir tiles em disco. Vazio = apenas memória.
+TILE_CACHE_DIR = os.getenv("INFOGEO_TILE_CACHE_DIR", "")
+
+# Validade (Cache-Control max-age, em segundos) dos tiles servidos
+TILE_CACHE_MAX_AGE = int(os.getenv("INFOGEO_TILE_CACHE_MAX_AGE", 24 * 3600))
+
+# Faixa de zoom atendida (abaixo do mínimo a leitura fica cara sem overviews)
+TILE_MIN_ZOOM = int(os.getenv("INFOGEO_TILE_MIN_ZOOM", 3))
+TILE_MAX_ZOOM = int(os.getenv("INFOGEO_TILE_MAX_ZOOM", 18))
+
+# =============================================================================
+# CACHE DE RESULTADOS (memoização das análises por geometria)
+# =============================================================================
+
+# Memória máxima do cache LRU de resultados (em MB, por processo)
+RESULT_CACHE_MAX_MB = int(os.getenv("INFOGEO_RESULT_CACHE_MB", 128))
+
+# Arquivo SQLite opcional compartilhado entre workers. Vazio = apenas
+# memória; com mais de um worker, o gunicorn (server/gunicorn_conf.py) usa
+# RESULT_CACHE_PATH_PADRAO.
+RESULT_CACHE_PATH = os.getenv("INFOGEO_RESULT_CACHE_PATH", "")
+RESULT_CACHE_PATH_PADRAO = DATA_DIR / "result_cache.sqlite"
+
+# Tamanho máximo do arquivo SQLite (em MB); acima disso, descarta os menos acessados
+RESULT_CACHE_DISK_MAX_MB = int(os.getenv("INFOGEO_RESULT_CACHE_DISK_MB", 2048))
+
+# =============================================================================
+# PROGRESSO DAS ANÁLISES DE LOTE (/analisar-lote-eventos, Server-Sent Events)
+# =============================================================================
+
+# Arquivo SQLite opcional compartilhado entre workers (o stream de progresso
+# pode cair num worker diferente do que executa o lote). Vazio = apenas
+# memória; com mais de um worker, o gunicorn (server/gunicorn_conf.py) usa
+# BATCH_PROGRESS_PATH_PADRAO.
+BATCH_PROGRESS_PATH = os.getenv("INFOGEO_BATCH_PROGRESS_PATH", "")
+BATCH_PROGRESS_PATH_PADRAO = DATA_DIR / "batch_progress.sqlite"
+
+# Tempo (s) que o progresso de um lote encerrado continua disponível
+BATCH_PROGRESS_TTL = int(os.getenv("INFOGEO_BATCH_PROGRESS_TTL", 3600))
+
+# Eventos mantidos por lote para retomada após reconexão (os mais recentes)
+BATCH_PROGRESS_MAX_EVENTOS = int(os.getenv("INFOGEO_BATCH_PROGRESS_MAX_EVENTOS", 2000))
+
+# =============================================================================
+# TRIAGEM EUDR EM LOTE (/triagem-eudr)
+# =============================================================================
+
+# Máximo de plots (linhas do CSV ou feições) por requisição
+EUDR_TRIAGEM_MAX_PLOTS = int(os.getenv("INFOGEO_EUDR_TRIAGEM_MAX_PLOTS", 200000))
+
+# Raio máximo (m) aceito para os pontos
+EUDR_TRIAGEM_RAIO_MAX_M = float(os.getenv("INFOGEO_EUDR_TRIAGEM_RAIO_MAX_M", 10000))
+
+# Threads que leem o PRODES nos plots não resolvidos pela pirâmide
+EUDR_TRIAGEM_THREADS = int(os.getenv("INFOGEO_EUDR_TRIAGEM_THREADS", min(4, os.cpu_count() or 1)))
+
+# =============================================================================
+# AMOSTRAGEM DOS RASTERS POR PONTO (/amostrar-pontos)
+# =============================================================================
+
+# Máximo de pontos por requisição
+AMOSTRAGEM_MAX_PONTOS = int(os.getenv("INFOGEO_AMOSTRAGEM_MAX_PONTOS", 500000))
+
+# Raio máximo (m): o núcleo cresce com o quadrado do raio (500 m ≈ 7.800
+# pixels por ponto no raster de 10 m)
+AMOSTRAGEM_RAIO_MAX_M = float(os.getenv("INFOGEO_AMOSTRAGEM_RAIO_MAX_M", 500))
+
+# Threads de leitura por camada
+AMOSTRAGEM_THREADS = int(os.getenv("INFOGEO_AMOSTRAGEM_THREADS", min(4, os.cpu_count() or 1)))
+
+# =============================================================================
+# PRÉ-CARGA NA INICIALIZAÇÃO (warm-up) E PRONTIDÃO (/readyz)
+# =============================================================================
+
+# Camadas de referência carregadas ao iniciar, em paralelo: "todas", vazio
+# (desativa) ou nomes separados por vírgula — municipios_ibge,
+# macro_rta_geocoding, macro_rta_valoracao, centroides, notas_agronomicas,
+# koppen_excel, embargo, icmbio, solos
+WARMUP_CAMADAS = os.getenv("INFOGEO_WARMUP", "todas")
+
+# Abre os rasters e lê a menor visão geral (aquece cabeçalhos e cache do SO)
+WARMUP_RASTERS = os.getenv("INFOGEO_WARMUP_RASTERS", "True").lower() == "true"
+
+# Threads usadas na pré-carga
+WARMUP_THREADS = int(os.getenv("INFOGEO_WARMUP_THREADS", 4))
+
+# =============================================================================
+# CAMADAS DE REFERÊNCIA MAPEADAS EM MEMÓRIA (compartilhadas entre workers)
+# =============================================================================
+
+# Camadas vetoriais e tabelas de referência gravadas como arrays NumPy
+# (WKB + atributos + R-tree) e abertas com mmap: todos os processos
+# compartilham as páginas do cache do SO. False = arrays só em memória
+CAMADAS_MAPEADAS = os.getenv("INFOGEO_CAMADAS_MAPEADAS", "True").lower() == "true"
+
+# Diretório dos pacotes (um subdiretório por camada, regerado quando a
+# origem muda; gerar antes: python -m server.camadas_mapeadas)
+CAMADAS_DIR = Path(os.getenv("INFOGEO_CAMADAS_DIR", str(DATA_DIR / "camadas")))
+
+# =============================================================================
+# TEMPOS POR ETAPA E MÉTRICAS (/metrics, bloco "timings")
+# =============================================================================
+
+# Histogramas por etapa das análises e por rota, expostos em /metrics
+# (formato Prometheus). O bloco "timings" da resposta (parâmetro timings=1)
+# funciona mesmo com as métricas desligadas.
+METRICS_ENABLED = os.getenv("INFOGEO_METRICS", "False").lower() == "true"
+
+# Acesso a /metrics: com token, exige o cabeçalho "Authorization: Bearer
+# <token>"; sem token, só responde a requisições da própria máquina
+METRICS_TOKEN = os.getenv("INFOGEO_METRICS_TOKEN", "")
+
+# =============================================================================
+# EXECUÇÃO DAS ANÁLISES (pool de processos, limites e tempos máximos)
+# =============================================================================
+
+# Processos dedicados às análises por polígono. 0 = executa na própria thread
+# da requisição (servidor de desenvolvimento). O modo ASGI (server/asgi.py)
+# usa os núcleos disponíveis quando não configurado.
+ANALYSIS_POOL_WORKERS = int(os.getenv("INFOGEO_ANALYSIS_WORKERS", 0))
+
+# Análises simultâneas por tipo (por processo servidor)
+ANALYSIS_CONCURRENCY = {
+    "uso_solo": 3,
+    "prodes": 2,
+    "embargo": 8,
+    "icmbio": 8,
+}
+ANALYSIS_CONCURRENCY_PADRAO = int(os.getenv("INFOGEO_ANALYSIS_CONCURRENCY", 4))
+
+# Tempo máximo de cada análise (segundos; aplicado quando o pool está ativo)
+ANALYSIS_TIMEOUTS = {
+    "uso_solo": 600,
+    "prodes": 600,
+    "embargo": 60,
+    "icmbio": 60,
+}
+ANALYSIS_TIMEOUT_PADRAO = int(os.getenv("INFOGEO_ANALYSIS_TIMEOUT", 300))
+
+# Espera máxima por uma vaga do tipo antes de responder 503 (segundos)
+ANALYSIS_QUEUE_TIMEOUT = int(os.getenv("INFOGEO_ANALYSIS_QUEUE_TIMEOUT", 30))
+
+# Análises pesadas (rasters): com o pool ativo, rodam num grupo de processos
+# próprio, separado das consultas rápidas (embargo, ICMBio, solos, Köppen)
+ANALYSIS_HEAVY_TYPES = {"uso_solo", "prodes", "declividade", "aptidao", "solo_textural"}
+
+# Fração dos processos do pool reservada às análises pesadas (cada grupo
+# tem ao menos um processo)
+ANALYSIS_HEAVY_SHARE = float(os.getenv("INFOGEO_ANALYSIS_HEAVY_SHARE", 0.5))
+
+# =============================================================================
+# EXPORTAÇÃO KML/KMZ
+# =============================================================================
+
+# Níveis de simplificação (tolerância em pixels do raster) aceitos em
+# /exportar-kml. Suavizam a "escadinha" dos pixels preservando a topologia.
+KML_SIMPLIFICACAO_NIVEIS = {
+    "nenhuma": 0.0,
+    "leve": 0.5,
+    "media": 1.0,
+    "forte": 2.0,
+}
+
+# Nível usado quando o cliente não informa nenhum
+KML_SIMPLIFICACAO_PADRAO = os.getenv("INFOGEO_KML_SIMPLIFICACAO", "nenhuma")
+
 # =============================================================================
 # CONFIGURAÇÕES DE LOGGING
 # =============================================================================
@@ -535,7 +746,7 @@ def validate_configuration():
         warnings.append(f"⚠️  Raster Köppen não encontrado: {RASTER_KOPPEN_PATH}")
         warnings.append("   → Análise climática Köppen-Geiger desabilitada")
 
-    if not KOPPEN_EXCEL_PATH.exists():
+    if not KOPPEN_EXCEL_PATH.exists() and not (CAMADAS_DIR / "koppen_clima").exists():
         warnings.append(f"⚠️  Excel Köppen não encontrado: {KOPPEN_EXCEL_PATH}")
         warnings.append("   → Dados climáticos municipais (temperatura/precipitação) indisponíveis")
 
@@ -35,6 +35,8 @@ const APP = {
         valoracaoFiles: [],
         valoracaoFeatures: [],
         analysisOrder: [],
+        // Respostas de /analisar-todos aguardando o módulo (chave "tipo|índice")
+        analisesPendentes: {},
         selectedPolygonIndex: -1  // -1 = todos; >=0 = índice específico
     },
 
@@ -608,6 +610,32 @@ const APP = {
             return;
         }
 
+        // Com mais de uma análise, o servidor processa todas de uma vez por
+        // polígono (/analisar-todos) e cada módulo recebe a sua resposta
+        const tipos = [];
+        if (chkUso.checked && !(this.state.rasterType === 'custom' && this.state.currentRasterFile)) tipos.push('uso_solo');
+        if (chkDecliv.checked && typeof DecliviDADE !== 'undefined') tipos.push('declividade');
+        if (chkAptidao.checked && typeof Aptidao !== 'undefined') tipos.push('aptidao');
+        if (chkSoloText.checked && typeof SoloTextural !== 'undefined') tipos.push('solo_textural');
+        if (chkKoppen.checked && typeof Koppen !== 'undefined') tipos.push('koppen');
+        if (chkEmbargo.checked && typeof Embargo !== 'undefined') {
+            tipos.push('embargo');
+            if (typeof ICMBIO !== 'undefined') tipos.push('icmbio');
+        }
+        if (chkProdes && chkProdes.checked && typeof Prodes !== 'undefined') tipos.push('prodes');
+        if (chkSolos && chkSolos.checked && typeof Solos !== 'undefined') tipos.push('solos');
+        if (tipos.length > 1) {
+            this.prefetchAnalises(tipos);
+        }
+
+        try {
+            await this._runSelectedModules({ chkUso, chkDecliv, chkAptidao, chkSoloText, chkKoppen, chkEmbargo, chkProdes, chkSolos });
+        } finally {
+            this.state.analisesPendentes = {};
+        }
+    },
+
+    _runSelectedModules: async function ({ chkUso, chkDecliv, chkAptidao, chkSoloText, chkKoppen, chkEmbargo, chkProdes, chkSolos }) {
         // Uso do Solo (análise principal)
         if (chkUso.checked) {
             try { await this.analyzeFile(); } catch (e) { console.error('Erro Uso do Solo:', e); }
@@ -649,6 +677,104 @@ const APP = {
         }
     },
 
+    // Polígonos que os módulos vão analisar: o desenhado/pesquisado (índice -1)
+    // ou o selecionado / todos os arquivos, com o índice original
+    _poligonosParaAnalise: function () {
+        if (this.state.drawnPolygon) {
+            const geojson = this.state.drawnPolygon.toGeoJSON();
+            const blob = new Blob([JSON.stringify(geojson)], { type: 'application/json' });
+            const file = new File([blob], 'poligono_desenhado.geojson', { type: 'application/json' });
+            return [{ file, index: -1 }];
+        }
+        const files = this.state.currentFiles || [];
+        const selected = this.state.selectedPolygonIndex;
+        if (selected >= 0 && selected < files.length) {
+            return [{ file: files[selected].originalFile || files[selected], index: selected }];
+        }
+        return files.map((f, index) => ({ file: f.originalFile || f, index }));
+    },
+
+    // Envia cada polígono a /analisar-todos (NDJSON) e deixa uma promessa por
+    // análise em state.analisesPendentes; os polígonos seguem um após o outro
+    prefetchAnalises: function (tipos) {
+        const rasterType = localStorage.getItem('rasterType') || 'com_mosaico';
+        let anterior = Promise.resolve();
+
+        this._poligonosParaAnalise().forEach(({ file, index }) => {
+            const pendentes = {};
+            tipos.forEach(tipo => {
+                const promessa = new Promise((resolve, reject) => {
+                    pendentes[tipo] = { resolve, reject };
+                });
+                promessa.catch(() => {}); // quem consome trata a falha (postAnalise)
+                this.state.analisesPendentes[`${tipo}|${index}`] = promessa;
+            });
+
+            const formData = new FormData();
+            formData.append('kml', file);
+            formData.append('analises', JSON.stringify(tipos));
+            formData.append('formato', 'ndjson');
+            formData.append('formato_imagem', 'url');
+            formData.append('raster_type', rasterType);
+            formData.append('enable_valoracao', 'false');
+
+            anterior = anterior.then(() => this._lerAnalisesTodos(formData, pendentes));
+        });
+    },
+
+    // Lê o NDJSON de /analisar-todos, entregando cada análise assim que chega
+    _lerAnalisesTodos: async function (formData, pendentes) {
+        try {
+            const response = await fetch('/analisar-todos', { method: 'POST', body: formData });
+            if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+
+            const entregar = (texto) => {
+                if (!texto.trim()) return;
+                const linha = JSON.parse(texto);
+                const pendente = pendentes[linha.analise];
+                if (!pendente) return; // linha final de resumo
+                pendente.resolve(new Response(JSON.stringify(linha.resultado), {
+                    status: linha.status_http,
+                    headers: { 'Content-Type': 'application/json' }
+                }));
+                delete pendentes[linha.analise];
+            };
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            for (;;) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const linhas = buffer.split('\n');
+                buffer = linhas.pop();
+                linhas.forEach(entregar);
+            }
+            entregar(buffer + decoder.decode());
+            if (Object.keys(pendentes).length > 0) throw new Error('Resposta incompleta');
+        } catch (err) {
+            Object.values(pendentes).forEach(p => p.reject(err));
+        }
+    },
+
+    // POST de uma análise por polígono: usa a resposta já pedida a
+    // /analisar-todos, se houver; senão (ou se ela falhou) chama a rota da análise.
+    // O PNG recortado vem por URL (/imagem-recorte), não em base64 no JSON
+    postAnalise: function (tipo, url, formData, index) {
+        formData.set('formato_imagem', 'url');
+        const enviar = () => fetch(url, { method: 'POST', body: formData });
+        const chave = `${tipo}|${index}`;
+        const pendente = this.state.analisesPendentes[chave];
+        if (!pendente) return enviar();
+
+        delete this.state.analisesPendentes[chave];
+        return pendente.catch(err => {
+            console.warn(`/analisar-todos falhou para ${tipo}; usando ${url}:`, err);
+            return enviar();
+        });
+    },
+
     // Atualizar estado visual dos botões de basemap
     updateBasemapButtons: function (activeId) {
         const buttons = ['btnShowMap', 'btnShowSatellite', 'btnShowNone'];
@@ -1410,7 +1536,7 @@ const APP = {
                     }
                     this.state.analysisResults.sort((a, b) => a.fileIndex - b.fileIndex);
 
-                    if (result.imagem_recortada && result.imagem_recortada.base64) {
+                    if (UTILS.imagemRecorteSrc(result.imagem_recortada)) {
                         let bounds = null;
 
                         // Tentar obter bounds do polígono existente no mapa
@@ -1426,7 +1552,7 @@ const APP = {
                         }
 
                         if (bounds) {
-                            MAP.addRasterForPolygon(originalIndex, result.imagem_recortada.base64, bounds);
+                            MAP.addRasterForPolygon(originalIndex, UTILS.imagemRecorteSrc(result.imagem_recortada), bounds);
                         }
                     }
                 }
@@ -1495,10 +1621,7 @@ const APP = {
         formData.append('file_index', index.toString());
 
         try {
-            const response = await fetch('/analisar', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await this.postAnalise('uso_solo', '/analisar', formData, index);
 
             const data = await response.json();
 
@@ -2089,9 +2212,8 @@ const APP = {
 
         for (let i = 0; i < this.state.analysisResults.length; i++) {
             const result = this.state.analysisResults[i];
-            if (!result || !result.imagem_recortada || !result.imagem_recortada.base64) continue;
-
-            const imageUrl = 'data:image/png;base64,' + result.imagem_recortada.base64;
+            const imageUrl = result && UTILS.imagemRecorteSrc(result.imagem_recortada);
+            if (!imageUrl) continue;
 
             // Usar result.fileIndex (índice original do polígono no mapa) em vez de i
             const polyIdx = (result.fileIndex !== undefined) ? result.fileIndex : i;
@@ -2653,6 +2775,7 @@ const APP = {
             formData.append('raster_type', rasterType);
             formData.append('enable_valoracao', 'true'); // ✅ PRO: valoração habilitada
             formData.append('file_index', selectedIndex.toString());
+            formData.append('formato_imagem', 'url');
 
             const response = await fetch('/analisar', { method: 'POST', body: formData });
             const data = await response.json();
@@ -2697,10 +2820,10 @@ const APP = {
                 this.showPolygonResult(selectedIndex, { skipZoom: false });
 
                 // Add raster if available
-                if (data.imagem_recortada && data.imagem_recortada.base64) {
+                if (UTILS.imagemRecorteSrc(data.imagem_recortada)) {
                     const bounds = MAP.getPolygonBounds(selectedIndex);
                     if (bounds) {
-                        MAP.addRasterForPolygon(selectedIndex, data.imagem_recortada.base64, bounds);
+                        MAP.addRasterForPolygon(selectedIndex, UTILS.imagemRecorteSrc(data.imagem_recortada), bounds);
                     }
                 }
 
@@ -2796,6 +2919,7 @@ const APP = {
         if (document.getElementById('chkEmbargo')?.checked) analises.push('embargo');
         if (document.getElementById('chkICMBio')?.checked) analises.push('icmbio');
         if (document.getElementById('chkSoloTextural')?.checked) analises.push('soloTextural');
+        if (document.getElementById('chkEudr')?.checked) analises.push('eudr');
 
         if (analises.length === 0) {
             this.showStatus('Selecione pelo menos uma análise.', 'error');
@@ -2820,28 +2944,17 @@ const APP = {
             const includeWkt = document.getElementById('chkIncludeWkt').checked;
             formData.append('include_wkt', includeWkt ? 'true' : 'false');
 
-            // Start polling progress
+            // Acompanhar o progresso (stream SSE; consulta periódica se indisponível)
             const taskId = Date.now().toString();
             formData.append('task_id', taskId);
-            const progressInterval = setInterval(async () => {
-                try {
-                    const resp = await fetch(`/analisar-lote-progresso/${taskId}`);
-                    if (resp.ok) {
-                        const prog = await resp.json();
-                        if (prog.total > 0) {
-                            const label = prog.label || 'Processando...';
-                            this.showProgress(label, prog.current, prog.total);
-                        }
-                    }
-                } catch (e) { /* ignore polling errors */ }
-            }, 2000);
+            const stopProgress = this._followBatchProgress(taskId);
 
             const response = await fetch('/analisar-lote-completo', {
                 method: 'POST',
                 body: formData
             });
 
-            clearInterval(progressInterval);
+            stopProgress();
 
             if (!response.ok) {
                 const errData = await response.json();
@@ -2876,6 +2989,52 @@ const APP = {
         }
     },
 
+    // Progresso do lote: eventos do servidor (um por polígono concluído, com
+    // taxa e ETA); sem EventSource, consulta /analisar-lote-progresso.
+    // Retorna a função que encerra o acompanhamento.
+    _followBatchProgress: function (taskId) {
+        const formatEta = (seg) => {
+            if (seg === null || seg === undefined) return '';
+            if (seg < 60) return `~${Math.ceil(seg)} s restantes`;
+            if (seg < 3600) return `~${Math.ceil(seg / 60)} min restantes`;
+            return `~${(seg / 3600).toFixed(1).replace('.', ',')} h restantes`;
+        };
+
+        if (typeof EventSource === 'undefined') {
+            const progressInterval = setInterval(async () => {
+                try {
+                    const resp = await fetch(`/analisar-lote-progresso/${taskId}`);
+                    if (resp.ok) {
+                        const prog = await resp.json();
+                        if (prog.total > 0) {
+                            const label = prog.label || 'Processando...';
+                            this.showProgress(label, prog.current, prog.total);
+                        }
+                    }
+                } catch (e) { /* ignore polling errors */ }
+            }, 2000);
+            return () => clearInterval(progressInterval);
+        }
+
+        const source = new EventSource(`/analisar-lote-eventos/${taskId}`);
+        source.addEventListener('inicio', (e) => {
+            const dados = JSON.parse(e.data);
+            this.showProgress(`Preparando ${dados.total} polígonos...`, 0, Math.max(dados.total, 1));
+        });
+        source.addEventListener('poligono', (e) => {
+            const dados = JSON.parse(e.data);
+            const partes = [`Analisando polígono ${dados.concluidos} de ${dados.total}`];
+            if (dados.poligonos_por_s) {
+                partes.push(`${this.formatNumberPTBR(dados.poligonos_por_s, 1)} pol/s`);
+            }
+            const eta = formatEta(dados.eta_s);
+            if (eta) partes.push(eta);
+            this.showProgress(partes.join(' · '), dados.concluidos, dados.total);
+        });
+        source.addEventListener('fim', () => source.close());
+        return () => source.close();
+    },
+
     _downloadBlob: function (blob, filename) {
         const url = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
@@ -154,10 +154,7 @@ const Aptidao = {
         formData.append('kml', fileToAnalyze);
 
         try {
-            const response = await fetch('/analisar-aptidao', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await APP.postAnalise('aptidao', '/analisar-aptidao', formData, index);
 
             const data = await response.json();
 
@@ -196,10 +193,7 @@ const Aptidao = {
             const formData = new FormData();
             formData.append('kml', file);
 
-            const response = await fetch('/analisar-aptidao', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await APP.postAnalise('aptidao', '/analisar-aptidao', formData, -1);
 
             const data = await response.json();
 
@@ -361,14 +355,14 @@ const Aptidao = {
      * Criar HTML da imagem
      */
     createImageHTML: function (result) {
-        if (!result.imagem_recortada || !result.imagem_recortada.base64) {
+        if (!UTILS.imagemRecorteSrc(result.imagem_recortada)) {
             return '';
         }
 
         return `
             <div class="image-section">
                 <h4>Mapa de Aptidão Agronômica</h4>
-                <img src="data:image/png;base64,${result.imagem_recortada.base64}" 
+                <img src="${UTILS.imagemRecorteSrc(result.imagem_recortada)}" 
                      alt="Mapa de Aptidão" 
                      class="result-image">
             </div>
@@ -485,13 +479,13 @@ const Aptidao = {
                 continue;
             }
 
-            // Extrair a string base64 da imagem
+            // Endereço da imagem (URL do cache ou base64)
             let imageUrl;
 
             if (typeof imagemRecortada === 'string') {
-                imageUrl = imagemRecortada.startsWith('data:') ? imagemRecortada : 'data:image/png;base64,' + imagemRecortada;
-            } else if (imagemRecortada && imagemRecortada.base64) {
-                imageUrl = 'data:image/png;base64,' + imagemRecortada.base64;
+                imageUrl = UTILS.imagemRecorteSrc(imagemRecortada);
+            } else if (UTILS.imagemRecorteSrc(imagemRecortada)) {
+                imageUrl = UTILS.imagemRecorteSrc(imagemRecortada);
             } else {
                 console.warn(`⚠️ Formato de imagem_recortada inválido para resultado ${i}`);
                 continue;
@@ -150,10 +150,7 @@ const DecliviDADE = {
         formData.append('kml', fileToAnalyze);
 
         try {
-            const response = await fetch('/analisar-declividade', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await APP.postAnalise('declividade', '/analisar-declividade', formData, index);
 
             const data = await response.json();
 
@@ -192,10 +189,7 @@ const DecliviDADE = {
             const formData = new FormData();
             formData.append('kml', file);
 
-            const response = await fetch('/analisar-declividade', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await APP.postAnalise('declividade', '/analisar-declividade', formData, -1);
 
             const data = await response.json();
 
@@ -358,14 +352,14 @@ const DecliviDADE = {
      * Criar HTML da imagem
      */
     createImageHTML: function (result) {
-        if (!result.imagem_recortada || !result.imagem_recortada.base64) {
+        if (!UTILS.imagemRecorteSrc(result.imagem_recortada)) {
             return '';
         }
 
         return `
             <div class="image-section">
                 <h4>Mapa de Declividade</h4>
-                <img src="data:image/png;base64,${result.imagem_recortada.base64}" 
+                <img src="${UTILS.imagemRecorteSrc(result.imagem_recortada)}" 
                      alt="Mapa de Declividade" 
                      class="result-image">
             </div>
@@ -492,13 +486,13 @@ const DecliviDADE = {
                 continue;
             }
 
-            // Extrair a string base64 da imagem
+            // Endereço da imagem (URL do cache ou base64)
             let imageUrl;
 
             if (typeof imagemRecortada === 'string') {
-                imageUrl = imagemRecortada.startsWith('data:') ? imagemRecortada : 'data:image/png;base64,' + imagemRecortada;
-            } else if (imagemRecortada && imagemRecortada.base64) {
-                imageUrl = 'data:image/png;base64,' + imagemRecortada.base64;
+                imageUrl = UTILS.imagemRecorteSrc(imagemRecortada);
+            } else if (UTILS.imagemRecorteSrc(imagemRecortada)) {
+                imageUrl = UTILS.imagemRecorteSrc(imagemRecortada);
             } else {
                 console.warn(`⚠️ Formato de imagem_recortada inválido para resultado ${i}`);
                 continue;
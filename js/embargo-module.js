@@ -111,7 +111,7 @@ const Embargo = {
             const formData = new FormData();
             formData.append('kml', file.originalFile || file);
 
-            const response = await fetch('/analisar-embargo', { method: 'POST', body: formData });
+            const response = await APP.postAnalise('embargo', '/analisar-embargo', formData, index);
             if (!response.ok) throw new Error(`HTTP ${response.status}`);
             const data = await response.json();
 
@@ -134,7 +134,7 @@ const Embargo = {
             const formData = new FormData();
             formData.append('kml', file);
 
-            const response = await fetch('/analisar-embargo', { method: 'POST', body: formData });
+            const response = await APP.postAnalise('embargo', '/analisar-embargo', formData, -1);
             if (!response.ok) throw new Error(`HTTP ${response.status}`);
             const data = await response.json();
 
@@ -85,7 +85,7 @@ const ICMBIO = {
             const formData = new FormData();
             formData.append('kml', file.originalFile || file);
 
-            const response = await fetch('/analisar-icmbio', { method: 'POST', body: formData });
+            const response = await APP.postAnalise('icmbio', '/analisar-icmbio', formData, index);
             if (!response.ok) throw new Error(`HTTP ${response.status}`);
             const data = await response.json();
 
@@ -108,7 +108,7 @@ const ICMBIO = {
             const formData = new FormData();
             formData.append('kml', file);
 
-            const response = await fetch('/analisar-icmbio', { method: 'POST', body: formData });
+            const response = await APP.postAnalise('icmbio', '/analisar-icmbio', formData, -1);
             if (!response.ok) throw new Error(`HTTP ${response.status}`);
             const data = await response.json();
 
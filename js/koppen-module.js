@@ -159,10 +159,7 @@ const Koppen = {
         formData.append('kml', fileToAnalyze);
 
         try {
-            const response = await fetch('/analisar-koppen', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await APP.postAnalise('koppen', '/analisar-koppen', formData, index);
 
             const data = await response.json();
 
@@ -201,10 +198,7 @@ const Koppen = {
             const formData = new FormData();
             formData.append('kml', file);
 
-            const response = await fetch('/analisar-koppen', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await APP.postAnalise('koppen', '/analisar-koppen', formData, -1);
 
             const data = await response.json();
 
@@ -372,14 +366,14 @@ const Koppen = {
      * Criar HTML da imagem
      */
     createImageHTML: function (result) {
-        if (!result.imagem_recortada || !result.imagem_recortada.base64) {
+        if (!UTILS.imagemRecorteSrc(result.imagem_recortada)) {
             return '';
         }
 
         return `
             <div class="image-section">
                 <h4>Mapa de Classificação Climática</h4>
-                <img src="data:image/png;base64,${result.imagem_recortada.base64}"
+                <img src="${UTILS.imagemRecorteSrc(result.imagem_recortada)}"
                      alt="Mapa Köppen-Geiger"
                      class="result-image">
             </div>
@@ -531,13 +525,13 @@ const Koppen = {
                 continue;
             }
 
-            // Extrair a string base64 da imagem
+            // Endereço da imagem (URL do cache ou base64)
             let imageUrl;
 
             if (typeof imagemRecortada === 'string') {
-                imageUrl = imagemRecortada.startsWith('data:') ? imagemRecortada : 'data:image/png;base64,' + imagemRecortada;
-            } else if (imagemRecortada && imagemRecortada.base64) {
-                imageUrl = 'data:image/png;base64,' + imagemRecortada.base64;
+                imageUrl = UTILS.imagemRecorteSrc(imagemRecortada);
+            } else if (UTILS.imagemRecorteSrc(imagemRecortada)) {
+                imageUrl = UTILS.imagemRecorteSrc(imagemRecortada);
             } else {
                 console.warn(`⚠️ Formato de imagem_recortada inválido para resultado ${i}`);
                 continue;
@@ -410,15 +410,15 @@ const MAP = {
         return polygonLayer;
     },
 
-    // Adicionar raster para um polígono específico
-    addRasterForPolygon: function (index, imageBase64, bounds, options = {}) {
+    // Adicionar raster para um polígono específico (imagem: URL, data URL ou base64)
+    addRasterForPolygon: function (index, imagem, bounds, options = {}) {
         if (!this.state.leafletMap) return null;
 
         if (this.state.rasterLayers[index]) {
             this.state.leafletMap.removeLayer(this.state.rasterLayers[index]);
         }
 
-        const imageUrl = `data:image/png;base64,${imageBase64}`;
+        const imageUrl = UTILS.imagemRecorteSrc(imagem);
         let rasterBounds = bounds;
 
         // Se não temos bounds específicos do raster, usar os bounds do polígono
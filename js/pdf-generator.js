@@ -72,14 +72,15 @@
   }
 
   /**
-   * Redimensiona imagem base64 para caber em maxMm_W × maxMm_H (em mm)
+   * Redimensiona a imagem recortada para caber em maxMm_W × maxMm_H (em mm)
    * e converte para JPEG comprimido — principal fator de redução do PDF.
-   * @param {string} base64 - dados da imagem sem prefixo "data:"
+   * @param {object|string} imagem - imagem_recortada (url ou base64) ou base64 sem prefixo "data:"
    * @param {number} maxMm_W - largura máxima no PDF (mm)
    * @param {number} maxMm_H - altura máxima no PDF (mm)
    * @param {number} quality - qualidade JPEG 0–1 (padrão 0.92)
    */
-  function optimizeImageForPdf(base64, maxMm_W, maxMm_H, quality = 0.92) {
+  function optimizeImageForPdf(imagem, maxMm_W, maxMm_H, quality = 0.92) {
+    const src = UTILS.imagemRecorteSrc(imagem);
     const PX_PER_MM = 300 / 25.4; // 300 DPI → pixels por mm
     const maxPxW = Math.round(maxMm_W * PX_PER_MM);
     const maxPxH = Math.round(maxMm_H * PX_PER_MM);
@@ -97,8 +98,8 @@
         ctx.drawImage(img, 0, 0, w, h);
         resolve(canvas.toDataURL('image/jpeg', quality));
       };
-      img.onerror = () => resolve(`data:image/png;base64,${base64}`); // fallback
-      img.src = `data:image/png;base64,${base64}`;
+      img.onerror = () => resolve(src); // fallback
+      img.src = src;
     });
   }
 
@@ -323,12 +324,12 @@
         currentY += infoCardHeight + 6;
 
         // 2. MAPA DE USO DO SOLO
-        if (safe(analysisResult, 'imagem_recortada.base64')) {
+        if (UTILS.imagemRecorteSrc(safe(analysisResult, 'imagem_recortada'))) {
           const mapHeight = 85;
           const mapCard = drawCard(doc, margin, currentY, contentWidth, mapHeight, 'Mapa Temático de Uso do Solo');
           const availW = contentWidth - 10;
           const availH = mapHeight - 14;
-          const imgData = await optimizeImageForPdf(analysisResult.imagem_recortada.base64, availW, availH);
+          const imgData = await optimizeImageForPdf(analysisResult.imagem_recortada, availW, availH);
           const { width: imgW, height: imgH } = await getImageDimensions(imgData);
 
           const ratio = Math.min(availW / imgW, availH / imgH);
@@ -408,10 +409,10 @@
         dy += 35;
 
         // 2. Mapa Declividade
-        if (safe(declivityResult, 'imagem_recortada.base64')) {
+        if (UTILS.imagemRecorteSrc(safe(declivityResult, 'imagem_recortada'))) {
           const mapH = 90;
           const mapCardD = drawCard(doc, margin, dy, contentWidth, mapH, 'Mapa Temático de Declividade (%)');
-          const imgD = await optimizeImageForPdf(declivityResult.imagem_recortada.base64, contentWidth - 10, mapH - 14);
+          const imgD = await optimizeImageForPdf(declivityResult.imagem_recortada, contentWidth - 10, mapH - 14);
           const { width: iW, height: iH } = await getImageDimensions(imgD);
           const r = Math.min((contentWidth - 10) / iW, (mapH - 14) / iH);
           doc.addImage(imgD, 'JPEG', mapCardD.contentX + (contentWidth - 10 - iW * r) / 2, mapCardD.contentY + (mapH - 14 - iH * r) / 2, iW * r, iH * r);
@@ -476,10 +477,10 @@
         ay += 35;
 
         // 2. Mapa Aptidao
-        if (safe(aptidaoResult, 'imagem_recortada.base64')) {
+        if (UTILS.imagemRecorteSrc(safe(aptidaoResult, 'imagem_recortada'))) {
           const mapH = 90;
           const mapCardA = drawCard(doc, margin, ay, contentWidth, mapH, 'Mapa Temático de Aptidão Agronômica');
-          const imgA = await optimizeImageForPdf(aptidaoResult.imagem_recortada.base64, contentWidth - 10, mapH - 14);
+          const imgA = await optimizeImageForPdf(aptidaoResult.imagem_recortada, contentWidth - 10, mapH - 14);
           const { width: iW, height: iH } = await getImageDimensions(imgA);
           const r = Math.min((contentWidth - 10) / iW, (mapH - 14) / iH);
           doc.addImage(imgA, 'JPEG', mapCardA.contentX + (contentWidth - 10 - iW * r) / 2, mapCardA.contentY + (mapH - 14 - iH * r) / 2, iW * r, iH * r);
@@ -554,10 +555,10 @@
         sy += 35;
 
         // 2. Mapa
-        if (safe(soloTexturalResult, 'imagem_recortada.base64')) {
+        if (UTILS.imagemRecorteSrc(safe(soloTexturalResult, 'imagem_recortada'))) {
           const mapH = 90;
           const mapCardS = drawCard(doc, margin, sy, contentWidth, mapH, 'Mapa Temático de Textura do Solo');
-          const imgS = await optimizeImageForPdf(soloTexturalResult.imagem_recortada.base64, contentWidth - 10, mapH - 14);
+          const imgS = await optimizeImageForPdf(soloTexturalResult.imagem_recortada, contentWidth - 10, mapH - 14);
           const { width: iW, height: iH } = await getImageDimensions(imgS);
           const r = Math.min((contentWidth - 10) / iW, (mapH - 14) / iH);
           doc.addImage(imgS, 'JPEG', mapCardS.contentX + (contentWidth - 10 - iW * r) / 2, mapCardS.contentY + (mapH - 14 - iH * r) / 2, iW * r, iH * r);
@@ -734,10 +735,10 @@
         ky += 35;
 
         // 2. Mapa
-        if (safe(koppenResult, 'imagem_recortada.base64')) {
+        if (UTILS.imagemRecorteSrc(safe(koppenResult, 'imagem_recortada'))) {
           const mapH = 90;
           const mapCardK = drawCard(doc, margin, ky, contentWidth, mapH, 'Mapa Temático de Köppen-Geiger');
-          const imgK = await optimizeImageForPdf(koppenResult.imagem_recortada.base64, contentWidth - 10, mapH - 14);
+          const imgK = await optimizeImageForPdf(koppenResult.imagem_recortada, contentWidth - 10, mapH - 14);
           const { width: iW, height: iH } = await getImageDimensions(imgK);
           const r = Math.min((contentWidth - 10) / iW, (mapH - 14) / iH);
           doc.addImage(imgK, 'JPEG', mapCardK.contentX + (contentWidth - 10 - iW * r) / 2, mapCardK.contentY + (mapH - 14 - iH * r) / 2, iW * r, iH * r);
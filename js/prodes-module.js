@@ -135,10 +135,7 @@ const Prodes = {
         formData.append('kml', fileToAnalyze);
 
         try {
-            const response = await fetch('/analisar-prodes', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await APP.postAnalise('prodes', '/analisar-prodes', formData, index);
 
             const data = await response.json();
 
@@ -167,10 +164,7 @@ const Prodes = {
             const formData = new FormData();
             formData.append('kml', file);
 
-            const response = await fetch('/analisar-prodes', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await APP.postAnalise('prodes', '/analisar-prodes', formData, -1);
 
             const data = await response.json();
 
@@ -366,14 +360,14 @@ const Prodes = {
     },
 
     createImageHTML: function (result) {
-        if (!result.imagem_recortada || !result.imagem_recortada.base64) {
+        if (!UTILS.imagemRecorteSrc(result.imagem_recortada)) {
             return '';
         }
 
         return `
             <div class="image-section">
                 <h4>Mapa PRODES</h4>
-                <img src="data:image/png;base64,${result.imagem_recortada.base64}"
+                <img src="${UTILS.imagemRecorteSrc(result.imagem_recortada)}"
                      alt="Mapa PRODES"
                      class="result-image">
             </div>
@@ -459,9 +453,9 @@ const Prodes = {
 
             let imageUrl;
             if (typeof imagemRecortada === 'string') {
-                imageUrl = imagemRecortada.startsWith('data:') ? imagemRecortada : 'data:image/png;base64,' + imagemRecortada;
-            } else if (imagemRecortada.base64) {
-                imageUrl = 'data:image/png;base64,' + imagemRecortada.base64;
+                imageUrl = UTILS.imagemRecorteSrc(imagemRecortada);
+            } else if (UTILS.imagemRecorteSrc(imagemRecortada)) {
+                imageUrl = UTILS.imagemRecorteSrc(imagemRecortada);
             } else {
                 continue;
             }
@@ -6,9 +6,14 @@ const SEARCH = {
     state: {
         lastResults: [],
         currentMarker: null,
-        carLayer: null  // Layer para exibir polígonos CAR no mapa
+        carLayer: null,  // Layer para exibir polígonos CAR no mapa
+        typeaheadTimer: null,
+        carAbort: null   // AbortController da busca CAR em andamento
     },
 
+    // Atraso (ms) entre a digitação e a busca automática de CAR
+    TYPEAHEAD_DELAY: 150,
+
     init: function () {
         const input = document.getElementById('mapSearchInput');
         const btn = document.getElementById('btnMapSearch');
@@ -26,6 +31,17 @@ const SEARCH = {
             }
         });
 
+        // Sugestões de CAR enquanto digita (coordenadas continuam no Enter)
+        input.addEventListener('input', () => {
+            clearTimeout(this.state.typeaheadTimer);
+            const query = input.value.trim();
+            if (query.length < 3 || this.parseCoordinates(query)) return;
+            this.state.typeaheadTimer = setTimeout(
+                () => this.searchCAR(query, { silent: true }),
+                this.TYPEAHEAD_DELAY
+            );
+        });
+
         // Fechar resultados ao clicar fora
         document.addEventListener('click', (e) => {
             if (!e.target.closest('.search-container')) {
@@ -39,6 +55,7 @@ const SEARCH = {
         const query = input.value.trim();
 
         if (!query) return;
+        clearTimeout(this.state.typeaheadTimer);
 
         // 1. Tentar interpretar como coordenadas
         const coords = this.parseCoordinates(query);
@@ -55,16 +72,23 @@ const SEARCH = {
     /**
      * Busca CARs pelo cod_imovel no backend.
      */
-    searchCAR: async function (query) {
+    searchCAR: async function (query, { silent = false } = {}) {
         if (query.length < 3) {
             this.showResultsMessage('Digite pelo menos 3 caracteres para buscar CAR');
             return;
         }
 
-        this.showResultsMessage('🔄 Buscando...');
+        // Cancela a busca anterior: só a última digitação interessa
+        if (this.state.carAbort) this.state.carAbort.abort();
+        const controller = new AbortController();
+        this.state.carAbort = controller;
+
+        if (!silent) this.showResultsMessage('🔄 Buscando...');
 
         try {
-            const response = await fetch(`/buscar-car?q=${encodeURIComponent(query)}`);
+            const response = await fetch(`/buscar-car?q=${encodeURIComponent(query)}`, {
+                signal: controller.signal
+            });
             const data = await response.json();
 
             if (data.status === 'erro') {
@@ -82,6 +106,7 @@ const SEARCH = {
             this.showCARResults(resultados);
 
         } catch (err) {
+            if (err.name === 'AbortError') return;
             console.error('[SEARCH] Erro ao buscar CAR:', err);
             this.showResultsMessage('❌ Erro ao buscar CAR');
         }
@@ -139,11 +164,28 @@ const SEARCH = {
     /**
      * Ao clicar num resultado CAR: carrega o polígono no mapa para análise.
      */
-    selectCARResult: function (item) {
+    selectCARResult: async function (item) {
         if (!MAP.state.leafletMap) return;
 
         const map = MAP.state.leafletMap;
 
+        // Busca por coordenada retorna só código/centroide: geometria sob demanda
+        if (!item.geojson) {
+            try {
+                const resp = await fetch(`/car-geometria?cod_imovel=${encodeURIComponent(item.cod_imovel)}`);
+                const data = await resp.json();
+                if (data.status !== 'sucesso') {
+                    APP.showStatus(data.mensagem || 'Erro ao carregar geometria do CAR', 'error');
+                    return;
+                }
+                item = data;
+            } catch (err) {
+                console.error('[SEARCH] Erro ao carregar geometria do CAR:', err);
+                APP.showStatus('Erro ao carregar geometria do CAR', 'error');
+                return;
+            }
+        }
+
         // Remover layer CAR de visualização anterior (se existir)
         if (this.state.carLayer) {
             map.removeLayer(this.state.carLayer);
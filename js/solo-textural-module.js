@@ -156,10 +156,7 @@ const SoloTextural = {
         formData.append('kml', fileToAnalyze);
 
         try {
-            const response = await fetch('/analisar-solo-textural', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await APP.postAnalise('solo_textural', '/analisar-solo-textural', formData, index);
 
             const data = await response.json();
 
@@ -197,10 +194,7 @@ const SoloTextural = {
             const formData = new FormData();
             formData.append('kml', file);
 
-            const response = await fetch('/analisar-solo-textural', {
-                method: 'POST',
-                body: formData
-            });
+            const response = await APP.postAnalise('solo_textural', '/analisar-solo-textural', formData, -1);
 
             const data = await response.json();
 
@@ -357,14 +351,14 @@ const SoloTextural = {
      * Criar HTML da imagem
      */
     createImageHTML: function (result) {
-        if (!result.imagem_recortada || !result.imagem_recortada.base64) {
+        if (!UTILS.imagemRecorteSrc(result.imagem_recortada)) {
             return '';
         }
 
         return `
             <div class="image-section">
                 <h4>Mapa de Textura do Solo</h4>
-                <img src="data:image/png;base64,${result.imagem_recortada.base64}"
+                <img src="${UTILS.imagemRecorteSrc(result.imagem_recortada)}"
                      alt="Mapa de Textura do Solo"
                      class="result-image">
             </div>
@@ -490,9 +484,9 @@ const SoloTextural = {
             let imageUrl;
 
             if (typeof imagemRecortada === 'string') {
-                imageUrl = imagemRecortada.startsWith('data:') ? imagemRecortada : 'data:image/png;base64,' + imagemRecortada;
-            } else if (imagemRecortada && imagemRecortada.base64) {
-                imageUrl = 'data:image/png;base64,' + imagemRecortada.base64;
+                imageUrl = UTILS.imagemRecorteSrc(imagemRecortada);
+            } else if (UTILS.imagemRecorteSrc(imagemRecortada)) {
+                imageUrl = UTILS.imagemRecorteSrc(imagemRecortada);
             } else {
                 console.warn(`⚠️ Formato de imagem_recortada inválido para resultado ${i}`);
                 continue;
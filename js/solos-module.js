@@ -74,7 +74,7 @@ const Solos = {
                     const file = filesToAnalyze[i];
                     const originalIndex = indexOffset + i;
                     APP.showProgress(`Solos: ${file.name}`, i + 1, filesToAnalyze.length);
-                    const result = await this.analyzeFile(file);
+                    const result = await this.analyzeFile(file, originalIndex);
                     if (result) results.push({ ...result, fileIndex: originalIndex, fileName: file.name });
                 }
             }
@@ -107,11 +107,11 @@ const Solos = {
         }
     },
 
-    analyzeFile: async function (file) {
+    analyzeFile: async function (file, index) {
         const formData = new FormData();
         formData.append('kml', file);
         try {
-            const response = await fetch('/analisar-solos', { method: 'POST', body: formData });
+            const response = await APP.postAnalise('solos', '/analisar-solos', formData, index);
             if (!response.ok) throw new Error(`HTTP ${response.status}`);
             return await response.json();
         } catch (err) {
@@ -131,7 +131,7 @@ const Solos = {
             const geojsonStr = JSON.stringify(geojson);
             const blob = new Blob([geojsonStr], { type: 'application/json' });
             const file = new File([blob], 'poligono_desenhado.geojson', { type: 'application/json' });
-            return await this.analyzeFile(file);
+            return await this.analyzeFile(file, -1);
         } catch (err) {
             console.error('Erro ao analisar poligono desenhado (solos):', err);
             return null;
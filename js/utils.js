@@ -24,6 +24,17 @@ const UTILS = {
 
     // Funções auxiliares
     clamp: (v, a, b) => Math.max(a, Math.min(b, v)),
+
+    // src do PNG recortado de uma análise: URL do cache (formato_imagem=url)
+    // ou base64 (respostas antigas / string solta)
+    imagemRecorteSrc: (imagem) => {
+        if (!imagem) return null;
+        if (typeof imagem === 'string') {
+            return /^(data:|\/|https?:)/.test(imagem) ? imagem : `data:image/png;base64,${imagem}`;
+        }
+        if (imagem.url) return imagem.url;
+        return imagem.base64 ? `data:image/png;base64,${imagem.base64}` : null;
+    },
     
     download: (filename, text, mime = 'text/plain;charset=utf-8') => {
         const blob = new Blob([text], {type: mime});
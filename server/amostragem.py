@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Amostragem de rasters por ponto
+=========================================
+Classe de cada ponto num raster, sem rasterizar polígonos:
+
+  - coordenadas → (linha, coluna) de todos os pontos de uma vez
+    (transformação inversa vetorizada);
+  - pontos agrupados pelo bloco interno do raster (tile do COG) e
+    processados em ordem de bloco: cada grupo faz uma única leitura, do
+    retângulo que cobre seus pontos (e o raio, se houver);
+  - com raio, um núcleo em disco (deslocamentos em pixels, calculados uma
+    vez por tamanho) dá a classe predominante no círculo e sua fração; os
+    pontos do grupo são contados em lotes de até `_MAX_AMOSTRAS` valores
+    (pontos × pixels do núcleo), com memória limitada para qualquer raio;
+  - os grupos são divididos entre threads, cada uma com o próprio dataset
+    (a leitura/descompressão do GDAL libera o GIL).
+"""
+
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+logger = logging.getLogger("lulc-analyzer")
+
+# Valor dos pontos fora do raster ou sobre NoData
+SEM_VALOR = -1
+
+# Metros por grau de latitude (aproximação esférica, usada só no raio)
+_METROS_POR_GRAU = 111320.0
+
+# Grupos (blocos) por tarefa das threads
+_GRUPOS_POR_TAREFA = 64
+
+# Valores amostrados (pontos × pixels do núcleo, ou × classes na contagem)
+# por lote de pontos: ~32 MB em int64 por thread
+_MAX_AMOSTRAS = 4_000_000
+
+
+@lru_cache(maxsize=64)
+def nucleo_disco(raio_x_px: float, raio_y_px: float):
+    """(dy, dx) dos pixels cujo centro cai na elipse de raios dados (em pixels).
+
+    O pixel central sempre entra (raio menor que meio pixel = só o ponto).
+    """
+    ry, rx = int(math.ceil(raio_y_px)), int(math.ceil(raio_x_px))
+    dy, dx = np.mgrid[-ry : ry + 1, -rx : rx + 1]
+    dentro = (dy / max(raio_y_px, 1e-9)) ** 2 + (dx / max(raio_x_px, 1e-9)) ** 2 <= 1.0
+    dentro[ry, rx] = True
+    return dy[dentro], dx[dentro]
+
+
+def _raio_pixels(src, raio_m: float, lat: float):
+    """Raio (x, y) em pixels do raster para `raio_m` metros na latitude `lat`."""
+    res_x, res_y = abs(src.transform.a), abs(src.transform.e)
+    if src.crs is not None and src.crs.is_geographic:
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        return (
+            raio_m / (res_x * _METROS_POR_GRAU * cos_lat),
+            raio_m / (res_y * _METROS_POR_GRAU),
+        )
+    return raio_m / res_x, raio_m / res_y
+
+
+def _predominante(valores: np.ndarray):
+    """Classe mais frequente por linha de `valores` (n×k) e sua fração.
+
+    SEM_VALOR não conta; linha só com SEM_VALOR → (SEM_VALOR, NaN).
+    """
+    n = valores.shape[0]
+    deslocados = np.where(valores < 0, 0, valores + 1)
+    largura = int(deslocados.max()) + 1
+    contagens = np.bincount(
+        (deslocados + np.arange(n)[:, None] * largura).ravel(), minlength=n * largura
+    ).reshape(n, largura)
+    contagens[:, 0] = 0
+    total = contagens.sum(axis=1)
+    classe = contagens.argmax(axis=1)
+    fracao = np.where(total > 0, contagens[np.arange(n), classe] / np.maximum(total, 1), np.nan)
+    return np.where(total > 0, classe - 1, SEM_VALOR), fracao
+
+
+def _amostrar_grupos(raster_path, grupos, linhas, colunas, lat, raios_m, valores, fracoes):
+    """Preenche `valores`/`fracoes` nos índices de cada grupo (mesmo bloco e raio)."""
+    import rasterio
+    from rasterio.windows import Window
+
+    with rasterio.open(raster_path) as src:
+        nodata = src.nodata
+        for idx in grupos:
+            raio_m = float(raios_m[idx[0]])
+            if raio_m > 0:
+                rx, ry = _raio_pixels(src, raio_m, float(np.nanmean(lat[idx])))
+                dy, dx = nucleo_disco(round(rx * 4) / 4, round(ry * 4) / 4)
+            else:
+                dy = dx = np.zeros(1, dtype=int)
+
+            lin, col = linhas[idx], colunas[idx]
+            l0, l1 = int(lin.min() + dy.min()), int(lin.max() + dy.max()) + 1
+            c0, c1 = int(col.min() + dx.min()), int(col.max() + dx.max()) + 1
+
+            # Lê só a parte dentro do raster; o resto do retângulo fica SEM_VALOR
+            janela = Window(c0, l0, c1 - c0, l1 - l0).intersection(
+                Window(0, 0, src.width, src.height)
+            )
+            dados = src.read(1, window=janela).astype(np.int64)
+            if nodata is not None:
+                dados[dados == nodata] = SEM_VALOR
+            recorte = np.full((l1 - l0, c1 - c0), SEM_VALOR, dtype=np.int64)
+            lj, cj = int(janela.row_off) - l0, int(janela.col_off) - c0
+            recorte[lj : lj + dados.shape[0], cj : cj + dados.shape[1]] = dados
+
+            if dy.size == 1:
+                amostras = recorte[lin - l0 + dy[0], col - c0 + dx[0]]
+                valores[idx] = amostras
+                fracoes[idx] = np.where(amostras >= 0, 1.0, np.nan)
+                continue
+
+            # Lotes de pontos: a matriz n×k das amostras e a de contagens
+            # (n × classes) ficam dentro de `_MAX_AMOSTRAS`
+            por_lote = max(1, _MAX_AMOSTRAS // max(dy.size, int(recorte.max()) + 2))
+            for i in range(0, idx.size, por_lote):
+                parte = slice(i, i + por_lote)
+                amostras = recorte[
+                    (lin[parte] - l0)[:, None] + dy, (col[parte] - c0)[:, None] + dx
+                ]
+                valores[idx[parte]], fracoes[idx[parte]] = _predominante(amostras)
+
+
+def amostrar(raster_path, lon, lat, raios_m=0.0, threads: int = 1):
+    """Classe de cada ponto (lon/lat em EPSG:4326) no raster `raster_path`.
+
+    `raios_m` (escalar ou um por ponto): 0 = pixel do ponto; maior que 0 =
+    classe predominante no círculo. Retorna (valores, frações): valores
+    int64 com SEM_VALOR fora do raster/NoData; frações em [0, 1] (NaN sem
+    valor).
+    """
+    import rasterio
+
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    raios_m = np.broadcast_to(np.nan_to_num(np.asarray(raios_m, dtype=float)), lon.shape)
+    valores = np.full(lon.shape, SEM_VALOR, dtype=np.int64)
+    fracoes = np.full(lon.shape, np.nan)
+
+    with rasterio.open(raster_path) as src:
+        crs = src.crs
+        transform = src.transform
+        altura, largura = src.height, src.width
+        bloco_altura, bloco_largura = src.block_shapes[0]
+
+    # SIRGAS 2000 e WGS84 coincidem na escala dos pixels
+    x, y = lon, lat
+    if crs is not None and crs.to_epsg() not in (4326, 4674):
+        from pyproj import Transformer
+
+        x, y = Transformer.from_crs("EPSG:4326", crs, always_xy=True).transform(lon, lat)
+        x, y = np.asarray(x), np.asarray(y)
+
+    colunas_f, linhas_f = ~transform * (x, y)
+    validos = np.isfinite(linhas_f) & np.isfinite(colunas_f)
+    linhas = np.where(validos, np.floor(np.nan_to_num(linhas_f)), -1).astype(np.int64)
+    colunas = np.where(validos, np.floor(np.nan_to_num(colunas_f)), -1).astype(np.int64)
+    validos &= (linhas >= 0) & (linhas < altura) & (colunas >= 0) & (colunas < largura)
+
+    indices = np.flatnonzero(validos)
+    if indices.size == 0:
+        return valores, fracoes
+
+    # Chave do grupo: (raio, bloco); blocos em ordem de tile (linha a linha do raster)
+    blocos_por_linha = -(-largura // bloco_largura)
+    bloco = (linhas[indices] // bloco_altura) * blocos_por_linha + colunas[indices] // bloco_largura
+    _, raio_idx = np.unique(raios_m[indices], return_inverse=True)
+    chave = raio_idx.astype(np.int64) * (bloco.max() + 1) + bloco
+    ordem = np.argsort(chave, kind="stable")
+    chave, indices = chave[ordem], indices[ordem]
+    cortes = np.flatnonzero(np.diff(chave)) + 1
+    grupos = np.split(indices, cortes)
+
+    tarefas = [
+        grupos[i : i + _GRUPOS_POR_TAREFA] for i in range(0, len(grupos), _GRUPOS_POR_TAREFA)
+    ]
+    args = (linhas, colunas, lat, raios_m, valores, fracoes)
+    if threads <= 1 or len(tarefas) == 1:
+        for tarefa in tarefas:
+            _amostrar_grupos(raster_path, tarefa, *args)
+    else:
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="amostragem") as executor:
+            for _ in executor.map(lambda t: _amostrar_grupos(raster_path, t, *args), tarefas):
+                pass
+
+    logger.info(
+        f"[Amostragem] {indices.size} pontos em {len(grupos)} blocos de {raster_path}"
+    )
+    return valores, fracoes
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Execução das análises com limites por tipo
+=====================================================
+As rotas /analisar* chamam `executar(tipo, funcao, arquivo, ...)` em vez de
+rodar o `_process_*_sync` diretamente:
+
+  - limite de análises simultâneas por tipo (ex.: poucas PRODES grandes não
+    ocupam todas as vagas das consultas rápidas de embargo); sem vaga dentro
+    de `ANALYSIS_QUEUE_TIMEOUT` → erro "ocupado" (HTTP 503);
+  - com o pool ativo (`configurar(n)`, usado pelo modo ASGI), o cálculo roda
+    num processo separado, sem disputar o GIL com as demais requisições, e
+    respeita o tempo máximo do tipo → erro "tempo_esgotado" (HTTP 504);
+  - as análises pesadas (`ANALYSIS_HEAVY_TYPES`) e as leves têm grupos de
+    processos separados (`ANALYSIS_HEAVY_SHARE` dos processos para as
+    pesadas): PRODES longas não ocupam os processos das consultas rápidas.
+
+Tempo esgotado: o próprio processo interrompe a análise (alarme de
+`SIGALRM` com o mesmo limite) e fica livre; se ela não parar em
+`_FOLGA_ENCERRAMENTO` s (ex.: presa numa leitura GDAL), os processos do
+grupo são encerrados e o grupo é recriado. A vaga do tipo só é devolvida
+quando o processo de fato termina a análise.
+
+Sem pool (padrão do servidor de desenvolvimento e do gunicorn) a função
+roda na própria thread da requisição, como antes; apenas o limite por tipo
+se aplica — uma thread não pode ser interrompida de fora, então o tempo
+máximo exige o pool.
+"""
+
+import io
+import logging
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from . import tracing
+
+logger = logging.getLogger("lulc-analyzer")
+
+_BASE_DIR = Path(__file__).parent.parent
+
+_lock = threading.Lock()
+_pools = {}  # grupo ("pesadas"/"leves") → ProcessPoolExecutor
+_workers = 0
+_semaforos = {}
+
+# Prazo extra (s) para o processo interromper sozinho uma análise vencida
+_FOLGA_ENCERRAMENTO = 30
+
+
+def configurar(workers: int):
+    """Define o nº de processos do pool (0 desativa e executa em linha)."""
+    global _workers
+    workers = max(0, int(workers))
+    if workers and multiprocessing.current_process().daemon:
+        # Ex.: workers do hypercorn (-w N ≥ 1) são processos daemon e não
+        # podem ter filhos; cada worker já é um processo, executa em linha.
+        logger.warning("[Análises] Processo daemon: pool desativado, execução em linha")
+        workers = 0
+    with _lock:
+        _workers = workers
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+    logger.info(
+        f"[Análises] Pool de processos: {_workers or 'desativado (execução em linha)'}"
+    )
+
+
+def ativo() -> bool:
+    return _workers > 0
+
+
+def _init_worker():
+    """Processo do pool: importa o servidor uma vez (rasters/tabelas em cache)."""
+    sys.path.insert(0, str(_BASE_DIR))
+    from server import servidor  # noqa: F401
+
+
+def _grupo(tipo: str) -> str:
+    from config import ANALYSIS_HEAVY_TYPES
+
+    return "pesadas" if tipo in ANALYSIS_HEAVY_TYPES else "leves"
+
+
+def _processos(grupo: str) -> int:
+    """Nº de processos do grupo: a fração configurada, ao menos um em cada."""
+    from config import ANALYSIS_HEAVY_SHARE
+
+    if _workers < 2:
+        return 1
+    pesadas = min(_workers - 1, max(1, round(_workers * ANALYSIS_HEAVY_SHARE)))
+    return pesadas if grupo == "pesadas" else _workers - pesadas
+
+
+def _obter_pool(grupo: str) -> ProcessPoolExecutor:
+    with _lock:
+        pool = _pools.get(grupo)
+        if pool is None:
+            # spawn: o processo servidor tem threads; fork herdaria locks/GDAL
+            pool = _pools[grupo] = ProcessPoolExecutor(
+                max_workers=_processos(grupo),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return pool
+
+
+def _reiniciar_pool(grupo: str, pool: ProcessPoolExecutor, encerrar=False):
+    """Descarta `pool` (se ainda for o do grupo); `encerrar` mata seus processos."""
+    with _lock:
+        if _pools.get(grupo) is pool:
+            del _pools[grupo]
+    if encerrar:
+        # O executor não expõe qual processo roda cada tarefa: encerra todos
+        # (as demais análises do grupo em andamento terminam com erro)
+        for processo in list((getattr(pool, "_processes", None) or {}).values()):
+            processo.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _encerrar_se_preso(tipo, grupo, pool, futuro):
+    if futuro.done():
+        return
+    logger.error(
+        f"[Análises] {tipo} não parou após o tempo máximo; reiniciando processos ({grupo})"
+    )
+    _reiniciar_pool(grupo, pool, encerrar=True)
+
+
+def _semaforo(tipo: str) -> threading.BoundedSemaphore:
+    from config import ANALYSIS_CONCURRENCY, ANALYSIS_CONCURRENCY_PADRAO
+
+    with _lock:
+        sem = _semaforos.get(tipo)
+        if sem is None:
+            limite = ANALYSIS_CONCURRENCY.get(tipo, ANALYSIS_CONCURRENCY_PADRAO)
+            sem = _semaforos[tipo] = threading.BoundedSemaphore(max(1, int(limite)))
+        return sem
+
+
+def _timeout(tipo: str) -> float:
+    from config import ANALYSIS_TIMEOUTS, ANALYSIS_TIMEOUT_PADRAO
+
+    return float(ANALYSIS_TIMEOUTS.get(tipo, ANALYSIS_TIMEOUT_PADRAO))
+
+
+def _tempo_esgotado(signum, frame):
+    raise TimeoutError("tempo máximo da análise excedido")
+
+
+def _executar_no_worker(nome_funcao, upload, args, prazo=None):
+    """Reconstrói o arquivo enviado e chama `servidor.<nome_funcao>`.
+
+    `upload` é o GeoDataFrame já lido (usado como está) ou um dicionário
+    com os bytes do arquivo. Com `prazo` (instante `time.time()`), um alarme
+    interrompe a análise vencida e libera o processo. Devolve (resultado, tempos por etapa); o
+    processo do servidor incorpora os tempos ao rastreio da requisição e
+    às métricas.
+    """
+    from werkzeug.datastructures import FileStorage
+
+    from server import servidor
+
+    if isinstance(upload, dict):
+        arquivo = FileStorage(
+            stream=io.BytesIO(upload["dados"]),
+            filename=upload["filename"],
+            content_type=upload["content_type"],
+        )
+    else:
+        arquivo = upload
+    alarme = prazo is not None and hasattr(signal, "setitimer")
+    if alarme:
+        signal.signal(signal.SIGALRM, _tempo_esgotado)
+        signal.setitimer(signal.ITIMER_REAL, max(0.01, prazo - time.time()))
+    tracing.iniciar()
+    try:
+        resultado = getattr(servidor, nome_funcao)(arquivo, *args)
+    finally:
+        if alarme:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        observacoes = tracing.finalizar()
+    return resultado, observacoes
+
+
+def executar(tipo: str, funcao, input_file, *args):
+    """Executa `funcao(input_file, *args)` respeitando vaga e tempo do tipo."""
+    from config import ANALYSIS_QUEUE_TIMEOUT
+
+    sem = _semaforo(tipo)
+    with tracing.span("fila"):
+        obteve_vaga = sem.acquire(timeout=ANALYSIS_QUEUE_TIMEOUT)
+    if not obteve_vaga:
+        logger.warning(f"[Análises] Sem vaga para {tipo} após {ANALYSIS_QUEUE_TIMEOUT}s")
+        return {
+            "status": "erro",
+            "codigo": "ocupado",
+            "mensagem": f"Servidor ocupado com análises de {tipo}. Tente novamente em instantes.",
+        }
+    liberar = True
+    try:
+        if not ativo():
+            return funcao(input_file, *args)
+
+        if hasattr(input_file, "geometry"):
+            upload = input_file
+        else:
+            input_file.seek(0)
+            upload = {
+                "dados": input_file.read(),
+                "filename": getattr(input_file, "filename", "") or "",
+                "content_type": getattr(input_file, "content_type", "") or "",
+            }
+        limite = _timeout(tipo)
+        grupo = _grupo(tipo)
+        pool = _obter_pool(grupo)
+        prazo = time.time() + limite
+        futuro = pool.submit(_executar_no_worker, funcao.__name__, upload, args, prazo)
+        try:
+            resultado, observacoes = futuro.result(timeout=limite)
+            tracing.incorporar(observacoes)
+            return resultado
+        except FuturesTimeoutError:
+            if not futuro.cancel():
+                # Em execução: a vaga segue ocupada até o processo parar
+                # (alarme no worker ou, vencida a folga, encerramento)
+                liberar = False
+                futuro.add_done_callback(lambda _f: sem.release())
+                temporizador = threading.Timer(
+                    _FOLGA_ENCERRAMENTO, _encerrar_se_preso, (tipo, grupo, pool, futuro)
+                )
+                temporizador.daemon = True
+                temporizador.start()
+            logger.warning(f"[Análises] {tipo} excedeu {limite:.0f}s")
+            return {
+                "status": "erro",
+                "codigo": "tempo_esgotado",
+                "mensagem": f"A análise de {tipo} excedeu o tempo máximo de {limite:.0f}s.",
+            }
+        except BrokenProcessPool:
+            logger.error(f"[Análises] Processo do pool encerrado durante {tipo}; reiniciando pool")
+            _reiniciar_pool(grupo, pool)
+            return {
+                "status": "erro",
+                "mensagem": "Falha interna ao executar a análise. Tente novamente.",
+            }
+    finally:
+        if liberar:
+            sem.release()
+
+
+def status_http(result) -> int:
+    """Código HTTP da resposta de uma análise."""
+    if not isinstance(result, dict):
+        return 500
+    if result.get("status") == "sucesso":
+        return 200
+    return {"ocupado": 503, "tempo_esgotado": 504}.get(result.get("codigo"), 400)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Modo ASGI (hypercorn)
+===============================
+Ponto de entrada para servir a aplicação com hypercorn:
+
+    hypercorn server.asgi:app -w 0 --bind 0.0.0.0:5000
+
+(`-w 0` mantém o servidor no processo principal; os workers do hypercorn
+são processos daemon, que não podem criar o pool de análises.)
+
+O hypercorn atende as conexões num loop asyncio e executa as views Flask
+em threads; as análises por polígono (`_process_*_sync`) são enviadas ao
+pool de processos de `analysis_pool`, com vagas e tempo máximo por tipo,
+de modo que uma PRODES grande não bloqueia as consultas rápidas.
+
+O nº de processos vem de `ANALYSIS_POOL_WORKERS` (padrão: núcleos − 1).
+As camadas de referência são pré-carregadas em segundo plano; /readyz
+responde 503 até o fim da pré-carga.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import ANALYSIS_POOL_WORKERS  # noqa: E402
+from server import analysis_pool  # noqa: E402
+
+analysis_pool.configurar(ANALYSIS_POOL_WORKERS or max(1, (os.cpu_count() or 2) - 1))
+
+from server.servidor import app, iniciar_precarga  # noqa: E402,F401
+
+iniciar_precarga()
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Escrita em streaming dos resultados de lote
+======================================================
+`BatchResultWriter` recebe os registros produzidos por
+`/analisar-lote-completo` um a um e os grava em blocos num arquivo
+temporário, no formato pedido pelo cliente:
+
+  - csv      → legado (`;` + vírgula decimal, utf-8-sig), compatível com Excel
+  - parquet  → colunar tipado (GeoParquet quando há geometria WKB)
+  - arrow    → Arrow IPC (arquivo .arrow / Feather v2)
+  - gpkg     → GeoPackage com geometria nativa
+
+Nos formatos tipados os valores ausentes permanecem nulos (sem `fillna(0)`),
+DN é inteiro, áreas são float64 e a flag EUDR é booleana.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import shutil
+from pathlib import Path
+from tempfile import SpooledTemporaryFile, TemporaryDirectory
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger("lulc-analyzer")
+
+# formato -> (extensão, mimetype)
+BATCH_OUTPUT_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+    "gpkg": (".gpkg", "application/geopackage+sqlite3"),
+}
+
+# Arquivos acima deste tamanho saem da memória para o disco
+_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+
+# Registros acumulados antes de cada gravação em disco
+_DEFAULT_CHUNK_SIZE = 5000
+
+# Colunas fixas do lote e seus tipos lógicos ("float", "int", "bool", "str")
+_COMMON_COLUMNS = [
+    ("Tipo Análise", "str"),
+    ("DN", "int"),
+    ("Descrição", "str"),
+    ("área_classe_ha", "float"),
+]
+
+_ANALYSIS_COLUMNS = {
+    "embargo": [("num_tad", "str"), ("dat_embarg", "str"), ("des_infrac", "str")],
+    "icmbio": [
+        ("numero_emb", "str"),
+        ("data_embargo", "str"),
+        ("desc_infra", "str"),
+        ("tipo_infra", "str"),
+    ],
+    "prodes": [("EUDR_Conforme", "bool"), ("EUDR_Risco", "str")],
+    "eudr": [("EUDR_Conforme", "bool"), ("EUDR_Risco", "str")],
+    "solos": [
+        ("Solo_Simbolo", "str"),
+        ("Solo_Ordem", "str"),
+        ("Solo_Subordem", "str"),
+        ("Solo_Grande_Grupo", "str"),
+        ("Solo_Percentual", "float"),
+    ],
+}
+
+_TIPO_SOLOS = "Solos Embrapa"
+
+
+def _import_pyarrow():
+    """Importa pyarrow sob demanda (dependência opcional dos formatos colunares)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ValueError(
+            "Formatos parquet/arrow requerem o pacote 'pyarrow' instalado no servidor"
+        )
+    return pa
+
+
+def _infer_attr_kind(series: pd.Series) -> str:
+    """Classifica uma coluna de atributos do arquivo de entrada."""
+    import pandas as pd
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    return "str"
+
+
+class BatchResultWriter:
+    """Grava registros de lote em blocos, com esquema fixo conhecido de antemão.
+
+    O esquema é derivado dos atributos do arquivo enviado e das análises
+    solicitadas, de modo que todos os blocos compartilham as mesmas colunas
+    e tipos (requisito de Parquet/Arrow/GPKG).
+    """
+
+    def __init__(
+        self,
+        output_format: str,
+        attrs_df: pd.DataFrame,
+        analises,
+        include_centroid: bool = False,
+        include_wkt: bool = False,
+        chunk_size: int = _DEFAULT_CHUNK_SIZE,
+    ):
+        output_format = (output_format or "csv").lower()
+        if output_format not in BATCH_OUTPUT_FORMATS:
+            disponiveis = ", ".join(sorted(BATCH_OUTPUT_FORMATS))
+            raise ValueError(
+                f"Formato de saída '{output_format}' inválido. Disponíveis: {disponiveis}"
+            )
+
+        self.output_format = output_format
+        self.chunk_size = max(1, int(chunk_size))
+        self.rows_written = 0
+        self._buffer = []
+        self._geoms = []
+        self._closed = False
+
+        # CSV mantém a WKT textual; formatos tipados usam geometria binária
+        self.typed = output_format != "csv"
+        self.with_geometry = output_format == "gpkg" or (self.typed and include_wkt)
+
+        self.columns = self._build_columns(
+            attrs_df, analises, include_centroid, include_wkt and not self.typed
+        )
+
+        self._out = SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES, mode="w+b")
+        self._tmpdir = None
+        self._pa_writer = None
+        self._pa_schema = None
+
+        if output_format in ("parquet", "arrow"):
+            self._pa_schema = self._build_arrow_schema()
+        elif output_format == "gpkg":
+            self._tmpdir = TemporaryDirectory()
+            self._gpkg_path = Path(self._tmpdir.name) / "analise_lote.gpkg"
+
+    # --------------------------------------------------------------------------
+    # Esquema
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _build_columns(attrs_df, analises, include_centroid, include_wkt_text):
+        columns = []
+        seen = set()
+
+        def _add(name, kind):
+            if name not in seen:
+                seen.add(name)
+                columns.append((name, kind))
+
+        if attrs_df is not None:
+            for col in attrs_df.columns:
+                if col == "geometry" or str(col).startswith("_"):
+                    continue
+                _add(str(col), _infer_attr_kind(attrs_df[col]))
+
+        _add("área_imovel_ha", "float")
+        if include_centroid:
+            _add("Centroide_Lat", "float")
+            _add("Centroide_Lon", "float")
+        if include_wkt_text:
+            _add("Geometria_WKT", "str")
+
+        for name, kind in _COMMON_COLUMNS:
+            _add(name, kind)
+        for analise in analises or []:
+            for name, kind in _ANALYSIS_COLUMNS.get(analise, []):
+                _add(name, kind)
+        return columns
+
+    def _build_arrow_schema(self):
+        pa = _import_pyarrow()
+        arrow_types = {
+            "float": pa.float64(),
+            "int": pa.int64(),
+            "bool": pa.bool_(),
+            "str": pa.string(),
+        }
+        fields = [pa.field(name, arrow_types[kind]) for name, kind in self.columns]
+        # DN cabe em int32 (códigos de classe / sequencial de embargo)
+        fields = [
+            pa.field("DN", pa.int32()) if f.name == "DN" else f for f in fields
+        ]
+        metadata = None
+        if self.with_geometry:
+            fields.append(pa.field("geometry", pa.binary()))
+            geo = {
+                "version": "1.0.0",
+                "primary_column": "geometry",
+                "columns": {"geometry": {"encoding": "WKB", "geometry_types": []}},
+            }
+            metadata = {b"geo": json.dumps(geo).encode("utf-8")}
+        return pa.schema(fields, metadata=metadata)
+
+    # --------------------------------------------------------------------------
+    # Escrita
+    # --------------------------------------------------------------------------
+    @property
+    def total_rows(self) -> int:
+        """Registros recebidos até agora (gravados + pendentes no bloco atual)."""
+        return self.rows_written + len(self._buffer)
+
+    def write(self, record: dict, geometry=None):
+        """Enfileira um registro; grava o bloco quando `chunk_size` é atingido."""
+        self._buffer.append(record)
+        if self.with_geometry:
+            self._geoms.append(geometry)
+        if len(self._buffer) >= self.chunk_size:
+            self._flush()
+
+    def _normalize_typed(self, record: dict) -> dict:
+        """Converte placeholders textuais ("" / "—") em nulos e ajusta o DN de solos."""
+        out = dict(record)
+        if out.get("Tipo Análise") == _TIPO_SOLOS:
+            out["Solo_Simbolo"] = str(out.get("DN", "") or "") or None
+            out["DN"] = None
+        for name, kind in self.columns:
+            val = out.get(name)
+            if val is None:
+                continue
+            if kind != "str" and isinstance(val, str):
+                out[name] = None if val.strip() == "" else val
+        return out
+
+    def _chunk_dataframe(self) -> pd.DataFrame:
+        import pandas as pd
+        names = [name for name, _ in self.columns]
+        records = (
+            [self._normalize_typed(r) for r in self._buffer]
+            if self.typed
+            else self._buffer
+        )
+        df = pd.DataFrame.from_records(records, columns=names)
+        if not self.typed:
+            return df.fillna(0)
+
+        for name, kind in self.columns:
+            ser = df[name]
+            if kind == "float":
+                df[name] = pd.to_numeric(ser, errors="coerce").astype("float64")
+            elif kind == "int":
+                df[name] = pd.to_numeric(ser, errors="coerce").round().astype("Int64")
+            elif kind == "bool":
+                df[name] = ser.astype("boolean")
+            else:
+                df[name] = ser.map(
+                    lambda v: None if v is None or (not isinstance(v, str) and pd.isna(v)) else str(v)
+                ).astype("string")
+        return df
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        df = self._chunk_dataframe()
+        n = len(df)
+
+        if self.output_format == "csv":
+            df.to_csv(
+                self._out,
+                index=False,
+                sep=";",
+                decimal=",",
+                header=self.rows_written == 0,
+                encoding="utf-8-sig" if self.rows_written == 0 else "utf-8",
+            )
+        elif self.output_format in ("parquet", "arrow"):
+            self._write_arrow_chunk(df)
+        elif self.output_format == "gpkg":
+            self._write_gpkg_chunk(df)
+
+        self.rows_written += n
+        self._buffer = []
+        self._geoms = []
+
+    def _write_arrow_chunk(self, df: pd.DataFrame):
+        pa = _import_pyarrow()
+        if self.with_geometry:
+            df = df.copy()
+            df["geometry"] = [
+                g.wkb if g is not None and not g.is_empty else None
+                for g in self._geoms
+            ]
+        table = pa.Table.from_pandas(
+            df, schema=self._pa_schema, preserve_index=False, safe=False
+        )
+        if self._pa_writer is None:
+            if self.output_format == "parquet":
+                self._pa_writer = pa.parquet.ParquetWriter(
+                    self._out, self._pa_schema, compression="zstd"
+                )
+            else:
+                self._pa_writer = pa.ipc.new_file(self._out, self._pa_schema)
+        self._pa_writer.write_table(table)
+
+    def _write_gpkg_chunk(self, df: pd.DataFrame):
+        import geopandas as gpd
+
+        gdf = gpd.GeoDataFrame(df, geometry=list(self._geoms), crs="EPSG:4326")
+        gdf.to_file(
+            str(self._gpkg_path),
+            driver="GPKG",
+            layer="analise_lote",
+            mode="a" if self.rows_written > 0 else "w",
+        )
+
+    # --------------------------------------------------------------------------
+    # Finalização
+    # --------------------------------------------------------------------------
+    def close(self):
+        """Grava o bloco pendente e devolve (arquivo, mimetype, download_name).
+
+        O arquivo retornado é posicionado no início e fica sob responsabilidade
+        de quem o recebe (ex.: `send_file`, que o fecha ao final da resposta).
+        """
+        if self._closed:
+            raise ValueError("BatchResultWriter já finalizado")
+        self._flush()
+        self._closed = True
+
+        if self._pa_writer is not None:
+            self._pa_writer.close()
+        elif self.output_format in ("parquet", "arrow") and self.rows_written == 0:
+            self._write_arrow_chunk(self._chunk_dataframe())
+            self._pa_writer.close()
+
+        if self.output_format == "gpkg":
+            try:
+                if self._gpkg_path.exists():
+                    with open(self._gpkg_path, "rb") as fh:
+                        shutil.copyfileobj(fh, self._out)
+            finally:
+                self._tmpdir.cleanup()
+
+        self._out.seek(0)
+        ext, mimetype = BATCH_OUTPUT_FORMATS[self.output_format]
+        logger.info(
+            f"[Lote] {self.rows_written} registros gravados em {self.output_format}"
+        )
+        return self._out, mimetype, f"analise_lote_completa{ext}"
+
+    def abort(self):
+        """Descarta arquivos temporários após erro."""
+        self._closed = True
+        try:
+            if self._pa_writer is not None:
+                self._pa_writer.close()
+        except Exception:
+            pass
+        self._out.close()
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Progresso das análises de lote
+========================================
+Eventos numerados por tarefa (`task_id`) das rotas de lote, transmitidos
+por /analisar-lote-eventos/<task_id> (Server-Sent Events) e resumidos no
+/analisar-lote-progresso/<task_id> (consulta pontual, legado):
+
+  - "inicio":   total de polígonos;
+  - "poligono": polígono concluído, com os registros parciais, polígonos/s,
+                tempo decorrido e estimativa do restante (ETA);
+  - "fim":      status final, polígonos e linhas gravadas.
+
+Armazenamento:
+  - Memória: tarefas do próprio processo; quem espera é acordado assim que
+    o evento é publicado.
+  - SQLite (opcional, `BATCH_PROGRESS_PATH`): compartilhado entre workers —
+    o stream pode ser atendido por um worker diferente do que executa o
+    lote (o arquivo é consultado a cada `_INTERVALO_SQLITE` s).
+
+Cada tarefa guarda só os últimos `max_eventos` eventos (o cliente que
+reconecta retoma a partir do `Last-Event-ID`, se ainda disponível);
+tarefas encerradas são descartadas após `ttl` segundos.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+logger = logging.getLogger("lulc-analyzer")
+
+# Intervalo (s) entre consultas ao SQLite de quem espera eventos de outro worker
+_INTERVALO_SQLITE = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    task_id TEXT PRIMARY KEY,
+    atualizado REAL NOT NULL,
+    encerrado REAL,
+    estado TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS eventos (
+    task_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    tipo TEXT NOT NULL,
+    dados TEXT NOT NULL,
+    PRIMARY KEY (task_id, seq)
+) WITHOUT ROWID;
+"""
+
+ESTADO_AGUARDANDO = {"current": 0, "total": 0, "label": "Aguardando..."}
+
+
+def _json_padrao(valor):
+    """Escalares numpy (registros do lote) viram tipos nativos no SQLite."""
+    return valor.item() if hasattr(valor, "item") else str(valor)
+
+
+class ProgressoLote:
+    """Eventos de progresso por tarefa, em memória com espelho SQLite opcional."""
+
+    def __init__(self, db_path=None, ttl: int = 3600, max_eventos: int = 2000):
+        self.ttl = int(ttl)
+        self.max_eventos = max(1, int(max_eventos))
+        self._cond = threading.Condition()
+        self._tarefas = {}  # task_id → {"eventos": deque, "estado": dict, "encerrado": ts}
+        self._db_path = Path(db_path) if db_path else None
+        self._local = threading.local()
+        if self._db_path is not None:
+            try:
+                self._db_path.parent.mkdir(parents=True, exist_ok=True)
+                self._conn().executescript(_SCHEMA)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Progresso de lote em disco desativado ({self._db_path}): {e}")
+                self._db_path = None
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(str(self._db_path), timeout=5, check_same_thread=False)
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("PRAGMA synchronous = NORMAL")
+            self._local.con = con
+        return con
+
+    # --------------------------------------------------------------------------
+    # Publicação
+    # --------------------------------------------------------------------------
+    def acompanhar(self, task_id, total: int) -> "Acompanhamento":
+        """Começa (ou reinicia) a tarefa e devolve quem publica seus eventos."""
+        return Acompanhamento(self if task_id else None, task_id, total)
+
+    def _reiniciar(self, task_id):
+        agora = time.time()
+        with self._cond:
+            self._tarefas[task_id] = {
+                "eventos": deque(maxlen=self.max_eventos),
+                "estado": dict(ESTADO_AGUARDANDO),
+                "encerrado": None,
+            }
+            for tid in [
+                t for t, tarefa in self._tarefas.items()
+                if tarefa["encerrado"] is not None and agora - tarefa["encerrado"] > self.ttl
+            ]:
+                del self._tarefas[tid]
+
+        if self._db_path is not None:
+            try:
+                con = self._conn()
+                with con:
+                    con.execute("DELETE FROM eventos WHERE task_id = ?", (task_id,))
+                    con.execute(
+                        "DELETE FROM eventos WHERE task_id IN ("
+                        " SELECT task_id FROM tarefas WHERE encerrado < ?)",
+                        (agora - self.ttl,),
+                    )
+                    con.execute("DELETE FROM tarefas WHERE encerrado < ?", (agora - self.ttl,))
+            except Exception as e:
+                logger.warning(f"Falha ao preparar progresso do lote {task_id}: {e}")
+
+    def _publicar(self, task_id, seq: int, tipo: str, dados: dict, estado: dict):
+        agora = time.time()
+        encerrado = agora if tipo == "fim" else None
+        with self._cond:
+            tarefa = self._tarefas.get(task_id)
+            if tarefa is not None:
+                tarefa["eventos"].append((seq, tipo, dados))
+                tarefa["estado"] = estado
+                tarefa["encerrado"] = encerrado
+            self._cond.notify_all()
+
+        if self._db_path is not None:
+            try:
+                con = self._conn()
+                with con:
+                    con.execute(
+                        "INSERT OR REPLACE INTO eventos VALUES (?, ?, ?, ?)",
+                        (task_id, seq, tipo, json.dumps(dados, ensure_ascii=False, default=_json_padrao)),
+                    )
+                    con.execute(
+                        "INSERT OR REPLACE INTO tarefas VALUES (?, ?, ?, ?)",
+                        (task_id, agora, encerrado, json.dumps(estado, ensure_ascii=False)),
+                    )
+                    if seq > self.max_eventos:
+                        con.execute(
+                            "DELETE FROM eventos WHERE task_id = ? AND seq <= ?",
+                            (task_id, seq - self.max_eventos),
+                        )
+            except Exception as e:
+                logger.warning(f"Falha ao gravar progresso do lote {task_id}: {e}")
+
+    # --------------------------------------------------------------------------
+    # Consulta
+    # --------------------------------------------------------------------------
+    def estado(self, task_id) -> dict:
+        """Último resumo da tarefa ({current, total, label, ...})."""
+        with self._cond:
+            tarefa = self._tarefas.get(task_id)
+            if tarefa is not None:
+                return dict(tarefa["estado"])
+        if self._db_path is not None:
+            try:
+                row = self._conn().execute(
+                    "SELECT estado FROM tarefas WHERE task_id = ?", (task_id,)
+                ).fetchone()
+                if row is not None:
+                    return json.loads(row[0])
+            except Exception as e:
+                logger.warning(f"Falha ao ler progresso do lote {task_id}: {e}")
+        return dict(ESTADO_AGUARDANDO)
+
+    def existe(self, task_id) -> bool:
+        """Se a tarefa é conhecida (neste processo ou no SQLite) e não expirou."""
+        limite = time.time() - self.ttl
+        with self._cond:
+            tarefa = self._tarefas.get(task_id)
+            if tarefa is not None:
+                return tarefa["encerrado"] is None or tarefa["encerrado"] >= limite
+        if self._db_path is None:
+            return False
+        try:
+            row = self._conn().execute(
+                "SELECT encerrado FROM tarefas WHERE task_id = ?", (task_id,)
+            ).fetchone()
+        except Exception as e:
+            logger.warning(f"Falha ao ler progresso do lote {task_id}: {e}")
+            return True
+        return row is not None and (row[0] is None or row[0] >= limite)
+
+    def eventos(self, task_id, desde: int = 0, timeout: float = 15.0) -> list:
+        """[(seq, tipo, dados)] com seq > `desde`, esperando até `timeout` s por novos."""
+        limite = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                tarefa = self._tarefas.get(task_id)
+                if tarefa is not None:
+                    novos = [e for e in tarefa["eventos"] if e[0] > desde]
+                    restante = limite - time.monotonic()
+                    if novos or restante <= 0:
+                        return novos
+                    # Tarefa deste processo: acorda na próxima publicação
+                    self._cond.wait(restante)
+                    continue
+
+            novos = self._eventos_sqlite(task_id, desde)
+            restante = limite - time.monotonic()
+            if novos or restante <= 0:
+                return novos
+            if self._db_path is None:
+                # Tarefa ainda não começou neste processo: espera a criação
+                with self._cond:
+                    self._cond.wait(restante)
+            else:
+                time.sleep(min(_INTERVALO_SQLITE, restante))
+
+    def _eventos_sqlite(self, task_id, desde: int) -> list:
+        if self._db_path is None:
+            return []
+        try:
+            rows = self._conn().execute(
+                "SELECT seq, tipo, dados FROM eventos WHERE task_id = ? AND seq > ? ORDER BY seq",
+                (task_id, desde),
+            ).fetchall()
+        except Exception as e:
+            logger.warning(f"Falha ao ler eventos do lote {task_id}: {e}")
+            return []
+        return [(seq, tipo, json.loads(dados)) for seq, tipo, dados in rows]
+
+
+class Acompanhamento:
+    """Publica os eventos de uma tarefa de lote (taxa e ETA calculados aqui).
+
+    Sem `task_id`, os métodos não fazem nada.
+    """
+
+    def __init__(self, progresso, task_id, total: int):
+        self._progresso = progresso
+        self.task_id = task_id
+        self.total = int(total)
+        self.concluidos = 0
+        self.linhas = 0
+        self._seq = 0
+        self._inicio = time.monotonic()
+        if progresso is not None:
+            progresso._reiniciar(task_id)
+            self._publicar(
+                "inicio",
+                {"total": self.total},
+                f"Preparando {self.total} polígonos...",
+            )
+
+    def _decorrido(self) -> float:
+        return time.monotonic() - self._inicio
+
+    def _publicar(self, tipo: str, dados: dict, label: str):
+        self._seq += 1
+        estado = {
+            "current": self.concluidos,
+            "total": self.total,
+            "label": label,
+            "linhas": self.linhas,
+            **{k: dados[k] for k in ("poligonos_por_s", "eta_s", "status") if k in dados},
+        }
+        self._progresso._publicar(self.task_id, self._seq, tipo, dados, estado)
+
+    def poligono(self, indice: int, rotulo, resultado: dict, linhas: int = 0, area_ha=None):
+        """Polígono `indice` (1…total) concluído; `resultado` = {análise: registros}."""
+        if self._progresso is None:
+            return
+        self.concluidos += 1
+        self.linhas += linhas
+        decorrido = self._decorrido()
+        taxa = self.concluidos / decorrido if decorrido > 0 else None
+        eta = (self.total - self.concluidos) / taxa if taxa else None
+        self._publicar(
+            "poligono",
+            {
+                "indice": indice,
+                "rotulo": rotulo,
+                "concluidos": self.concluidos,
+                "total": self.total,
+                "linhas": self.linhas,
+                "area_ha": area_ha,
+                "decorrido_s": round(decorrido, 1),
+                "poligonos_por_s": round(taxa, 3) if taxa else None,
+                "eta_s": round(eta, 1) if eta is not None else None,
+                "resultado": resultado,
+            },
+            f"{self.concluidos} de {self.total} polígonos analisados",
+        )
+
+    def concluir(self, status: str = "sucesso", mensagem=None):
+        """Evento final ("sucesso" ou "erro"); encerra o stream dos clientes."""
+        if self._progresso is None:
+            return
+        dados = {
+            "status": status,
+            "concluidos": self.concluidos,
+            "total": self.total,
+            "linhas": self.linhas,
+            "decorrido_s": round(self._decorrido(), 1),
+        }
+        if mensagem:
+            dados["mensagem"] = mensagem
+        self._publicar(
+            "fim",
+            dados,
+            "Concluído" if status == "sucesso" else (mensagem or "Falha no lote"),
+        )
@@ -0,0 +1,646 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Benchmarks com dados sintéticos
+=========================================
+Mede, sem internet e sem os dados reais, os pontos de entrada das análises
+(`_process_*_sync`), o `_fractional_stats`, os parsers de upload, o
+`gerar_kml` e a rota de lote completo, e compara com uma linha de base:
+
+    python -m server.benchmark --salvar          # mede e grava a linha de base
+    python -m server.benchmark                   # mede e compara (código 1 se piorou)
+    python -m server.benchmark --completo        # inclui 500 mil ha e 10 mil feições
+    python -m server.benchmark -k parse. -k fractional_stats -v
+
+Os dados são gerados de forma determinística (semente fixa) e reaproveitados
+entre execuções (`--dados`):
+
+  - um COG classificado por camada (uso do solo, declividade, aptidão, solo
+    textural, Köppen, PRODES) na grade dos rasters reais: EPSG:4674,
+    0.0001° (~10 m), blocos de 512 px e visões gerais;
+  - polígonos de 1, 100 e 10 000 ha (500 000 ha com `--completo`), simples
+    e multipartes;
+  - coleções de 10 e 1 000 feições (10 000 com `--completo`) em GeoJSON,
+    KML, KMZ, shapefile (.zip) e GeoPackage;
+  - camadas vetoriais de embargos IBAMA, ICMBio e solos, colocadas no
+    cache do servidor no lugar dos arquivos reais.
+
+Cada caso roda uma vez para aquecer (abre arquivos, cache do SO) e depois até
+`--repeticoes` vezes ou `--tempo-max` s; vale o menor tempo. Um caso é
+"LENTO" quando passa da linha de base em mais de `--tolerancia` e em mais de
+`--piso-ms`. A linha de base só é comparável na mesma máquina, por isso não
+há uma versionada: o CI (.github/workflows/benchmark.yml) mede um
+subconjunto rápido dos casos no commit de base do PR (`--salvar`) e depois
+no do PR, no mesmo runner.
+
+O benchmark roda com Nominatim, cache de imagens, cache de resultados e
+métricas desligados, de modo que cada repetição refaz todo o trabalho.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+
+_BASE_DIR = Path(__file__).parent.parent
+
+BASELINE_PADRAO = _BASE_DIR / "benchmark_baseline.json"
+DADOS_PADRAO = Path(tempfile.gettempdir()) / "infogeo_benchmark"
+
+# Muda quando a geração dos dados muda (força regerar o diretório de dados)
+VERSAO_DADOS = 1
+
+# Grade dos rasters reais
+RES_GRAUS = 0.0001
+ORIGEM_LON = -47.5
+ORIGEM_LAT = -14.5
+BLOCO_CLASSES_PX = 16
+METROS_POR_GRAU = 111_320.0
+
+TAMANHOS_HA = (1, 100, 10_000)
+TAMANHOS_HA_COMPLETO = TAMANHOS_HA + (500_000,)
+FEICOES = (10, 1_000)
+FEICOES_COMPLETO = FEICOES + (10_000,)
+FEICOES_LOTE = (10,)
+FEICOES_LOTE_COMPLETO = (10, 1_000)
+
+# A vetorização do KML é em resolução total: acima disso o caso não é útil
+KML_MAX_HA = 10_000
+
+FORMATOS_UPLOAD = {
+    "geojson": "application/geo+json",
+    "kml": "application/vnd.google-earth.kml+xml",
+    "kmz": "application/vnd.google-earth.kmz",
+    "zip": "application/zip",
+    "gpkg": "application/geopackage+sqlite3",
+}
+
+# Análise → (função em servidor, camada raster ou None para as vetoriais)
+ENTRADAS = {
+    "uso_solo": ("_process_analysis_sync", "uso_solo"),
+    "declividade": ("_process_declividade_sync", "declividade"),
+    "aptidao": ("_process_aptidao_sync", "aptidao"),
+    "soloTextural": ("_process_solo_textural_sync", "soloTextural"),
+    "koppen": ("_process_koppen_sync", "koppen"),
+    "prodes": ("_process_prodes_sync", "prodes"),
+    "embargo": ("_process_embargo_sync", None),
+    "icmbio": ("_process_icmbio_sync", None),
+    "solos": ("_process_solos_sync", None),
+}
+
+ANALISES_LOTE = list(ENTRADAS)
+
+# Configuração do servidor durante o benchmark (definida antes de importar config)
+_AMBIENTE = {
+    "INFOGEO_GEOLOCATION": "false",
+    "INFOGEO_METRICS": "false",
+    "INFOGEO_IMAGE_CACHE_MB": "0",
+    "INFOGEO_IMAGE_CACHE_DIR": "",
+    "INFOGEO_RESULT_CACHE_MB": "0",
+    "INFOGEO_RESULT_CACHE_PATH": "",
+    "INFOGEO_CAMADAS_MAPEADAS": "false",
+}
+
+
+# ------------------------------------------------------------------------------
+# Geração dos dados sintéticos
+# ------------------------------------------------------------------------------
+def _classes_camadas() -> dict:
+    """Valores de classe de cada raster, tirados das legendas de config.py."""
+    from config import (
+        APTIDAO_CLASSES_NOMES,
+        CLASSES_NOMES,
+        DECLIVIDADE_CLASSES_NOMES,
+        KOPPEN_CLASSES_NOMES,
+        PRODES_CLASSES_NOMES,
+        SOLO_TEXTURAL_CLASSES_NOMES,
+    )
+
+    legendas = {
+        "uso_solo": CLASSES_NOMES,
+        "declividade": DECLIVIDADE_CLASSES_NOMES,
+        "aptidao": APTIDAO_CLASSES_NOMES,
+        "soloTextural": SOLO_TEXTURAL_CLASSES_NOMES,
+        "koppen": KOPPEN_CLASSES_NOMES,
+        "prodes": PRODES_CLASSES_NOMES,
+    }
+    return {
+        camada: sorted(int(c) for c in nomes if 0 < int(c) < 256)
+        for camada, nomes in legendas.items()
+    }
+
+
+def _grade(maior_ha: float):
+    """(largura, altura) em pixels de uma grade que comporta o maior polígono."""
+    lado_m = math.sqrt(maior_ha * 1e4) * 1.5 + 2_000
+    altura = math.ceil(lado_m / METROS_POR_GRAU / RES_GRAUS)
+    centro_lat = ORIGEM_LAT - altura * RES_GRAUS / 2
+    largura = math.ceil(
+        lado_m / (METROS_POR_GRAU * math.cos(math.radians(centro_lat))) / RES_GRAUS
+    )
+    return largura, altura
+
+
+def _gerar_raster(caminho: Path, classes, largura: int, altura: int, semente: int):
+    """COG uint8 com manchas de classes (blocos de BLOCO_CLASSES_PX px)."""
+    import rasterio
+    from rasterio.shutil import copy as copiar_raster
+    from rasterio.transform import from_origin
+
+    rng = np.random.default_rng(semente)
+    blocos = rng.choice(
+        np.asarray(classes, dtype="uint8"),
+        size=(-(-altura // BLOCO_CLASSES_PX), -(-largura // BLOCO_CLASSES_PX)),
+    )
+    dados = np.repeat(np.repeat(blocos, BLOCO_CLASSES_PX, axis=0), BLOCO_CLASSES_PX, axis=1)
+    dados = np.ascontiguousarray(dados[:altura, :largura])
+
+    tmp = caminho.with_suffix(".tmp.tif")
+    with rasterio.open(
+        tmp,
+        "w",
+        driver="GTiff",
+        width=largura,
+        height=altura,
+        count=1,
+        dtype="uint8",
+        crs="EPSG:4674",
+        transform=from_origin(ORIGEM_LON, ORIGEM_LAT, RES_GRAUS, RES_GRAUS),
+        tiled=True,
+        blockxsize=512,
+        blockysize=512,
+        compress="deflate",
+    ) as dst:
+        dst.write(dados, 1)
+    try:
+        copiar_raster(
+            str(tmp),
+            str(caminho),
+            driver="COG",
+            compress="DEFLATE",
+            blocksize=512,
+            overview_resampling="NEAREST",
+        )
+    finally:
+        tmp.unlink()
+
+
+def _poligono(cx: float, cy: float, area_ha: float, rng, vertices: int = 40):
+    """Polígono irregular (estrelado, simples) com ~area_ha centrado em (cx, cy)."""
+    from shapely.geometry import Polygon
+
+    angulos = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    angulos += rng.uniform(0, np.pi / vertices, vertices)
+    raios = 1 + 0.3 * rng.uniform(-1, 1, vertices)
+    x, y = raios * np.cos(angulos), raios * np.sin(angulos)
+
+    escala = math.sqrt(area_ha * 1e4 / Polygon(zip(x, y)).area)
+    m_lon = METROS_POR_GRAU * math.cos(math.radians(cy))
+    return Polygon(zip(cx + x * escala / m_lon, cy + y * escala / METROS_POR_GRAU))
+
+
+def _multipoligono(cx: float, cy: float, area_ha: float, rng, partes: int = 5):
+    """`partes` polígonos disjuntos em anel, somando ~area_ha."""
+    from shapely.geometry import MultiPolygon
+
+    raio_parte_m = math.sqrt(area_ha * 1e4 / partes / math.pi)
+    raio_anel_m = raio_parte_m * 1.4 / math.sin(math.pi / partes)
+    m_lon = METROS_POR_GRAU * math.cos(math.radians(cy))
+    return MultiPolygon([
+        _poligono(
+            cx + raio_anel_m * math.cos(2 * math.pi * i / partes) / m_lon,
+            cy + raio_anel_m * math.sin(2 * math.pi * i / partes) / METROS_POR_GRAU,
+            area_ha / partes,
+            rng,
+        )
+        for i in range(partes)
+    ])
+
+
+def _kml(geoms) -> str:
+    from xml.sax.saxutils import escape
+
+    from .kml_export import _kml_polygon
+
+    placemarks = []
+    for i, geom in enumerate(geoms, 1):
+        partes = list(geom.geoms) if geom.geom_type == "MultiPolygon" else [geom]
+        corpo = "".join(_kml_polygon(p) for p in partes)
+        if len(partes) > 1:
+            corpo = f"<MultiGeometry>{corpo}</MultiGeometry>"
+        placemarks.append(f"<Placemark><name>{escape(f'P{i}')}</name>{corpo}</Placemark>")
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n'
+        + "\n".join(placemarks)
+        + "\n</Document></kml>\n"
+    )
+
+
+def _gravar_colecao(base: Path, geoms, formatos=tuple(FORMATOS_UPLOAD)):
+    """Grava as geometrias como `base.<formato>` nos formatos de upload aceitos."""
+    import geopandas as gpd
+
+    gdf = gpd.GeoDataFrame(
+        {"id": range(1, len(geoms) + 1), "nome": [f"P{i}" for i in range(1, len(geoms) + 1)]},
+        geometry=list(geoms),
+        crs="EPSG:4674",
+    )
+    if "geojson" in formatos:
+        base.with_suffix(".geojson").write_text(gdf.to_json(), encoding="utf-8")
+    if "kml" in formatos or "kmz" in formatos:
+        kml = _kml(geoms)
+        base.with_suffix(".kml").write_text(kml, encoding="utf-8")
+        with zipfile.ZipFile(base.with_suffix(".kmz"), "w", zipfile.ZIP_DEFLATED) as kmz:
+            kmz.writestr("doc.kml", kml)
+    if "gpkg" in formatos:
+        gdf.to_file(base.with_suffix(".gpkg"), driver="GPKG")
+    if "zip" in formatos:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shp = Path(tmpdir) / f"{base.name}.shp"
+            gdf.to_file(shp, driver="ESRI Shapefile")
+            with zipfile.ZipFile(base.with_suffix(".zip"), "w", zipfile.ZIP_DEFLATED) as z:
+                for parte in sorted(Path(tmpdir).iterdir()):
+                    z.write(parte, parte.name)
+
+
+def _gerar_camadas_vetoriais(dados: Path, limites, rng):
+    """Embargos IBAMA/ICMBio (polígonos esparsos) e solos (malha regular)."""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    from config import SOLOS_ORDEM_CORES
+
+    oeste, sul, leste, norte = limites
+
+    def espalhados(n):
+        return [
+            _poligono(rng.uniform(oeste, leste), rng.uniform(sul, norte), rng.uniform(1, 200), rng, 12)
+            for _ in range(n)
+        ]
+
+    geoms = espalhados(400)
+    gpd.GeoDataFrame({
+        "num_tad": [f"TAD-{i:05d}" for i in range(len(geoms))],
+        "dat_embarg": [f"20{10 + i % 14}-0{1 + i % 9}-15" for i in range(len(geoms))],
+        "des_infrac": ["Desmatamento sem autorização"] * len(geoms),
+        "des_tad": ["Área embargada"] * len(geoms),
+        "qtd_area_e": [round(g.area * 1e6, 2) for g in geoms],
+        "municipio": ["Município Sintético"] * len(geoms),
+        "uf": ["GO"] * len(geoms),
+    }, geometry=geoms, crs="EPSG:4674").to_file(dados / "embargo.gpkg", driver="GPKG")
+
+    geoms = espalhados(200)
+    gpd.GeoDataFrame({
+        "numero_emb": [f"ICM-{i:05d}" for i in range(len(geoms))],
+        "data": [f"20{12 + i % 12}-0{1 + i % 9}-10" for i in range(len(geoms))],
+        "desc_infra": ["Dano em unidade de conservação"] * len(geoms),
+        "tipo_infra": ["Flora"] * len(geoms),
+        "municipio": ["Município Sintético"] * len(geoms),
+    }, geometry=geoms, crs="EPSG:4674").to_file(dados / "icmbio.gpkg", driver="GPKG")
+
+    ordens = list(SOLOS_ORDEM_CORES)
+    n = 12
+    passo_x, passo_y = (leste - oeste) / n, (norte - sul) / n
+    celulas, registros = [], []
+    for i in range(n):
+        for j in range(n):
+            ordem = ordens[int(rng.integers(len(ordens)))]
+            celulas.append(box(oeste + i * passo_x, sul + j * passo_y,
+                               oeste + (i + 1) * passo_x, sul + (j + 1) * passo_y))
+            registros.append({
+                "LEG_DESC": f"{ordem} {i % 3 + 1}",
+                "ORDEM1": ordem.upper(),
+                "SUBORDEM1": f"{ordem} Vermelhos",
+                "GDEGRUPO1": "Distróficos",
+                "CLASSE_DOM": ordem,
+                "Simbolos": ordem[:2].upper(),
+            })
+    gpd.GeoDataFrame(registros, geometry=celulas, crs="EPSG:4674").to_crs(
+        "EPSG:4326"
+    ).to_file(dados / "solos.gpkg", driver="GPKG")
+
+
+def gerar_dados(dados: Path, tamanhos, feicoes):
+    """Gera (ou reaproveita) todos os arquivos sintéticos em `dados`."""
+    manifesto = {
+        "versao": VERSAO_DADOS,
+        "tamanhos_ha": list(tamanhos),
+        "feicoes": list(feicoes),
+    }
+    caminho_manifesto = dados / "manifesto.json"
+    if caminho_manifesto.exists():
+        try:
+            if json.loads(caminho_manifesto.read_text(encoding="utf-8")) == manifesto:
+                return
+        except ValueError:
+            pass
+
+    dados.mkdir(parents=True, exist_ok=True)
+    inicio = time.perf_counter()
+    largura, altura = _grade(max(tamanhos))
+    print(f"Gerando dados sintéticos em {dados} (grade {largura}×{altura} px)...")
+
+    for semente, (camada, classes) in enumerate(sorted(_classes_camadas().items())):
+        _gerar_raster(dados / f"{camada}.tif", classes, largura, altura, semente)
+
+    rng = np.random.default_rng(42)
+    limites = (
+        ORIGEM_LON,
+        ORIGEM_LAT - altura * RES_GRAUS,
+        ORIGEM_LON + largura * RES_GRAUS,
+        ORIGEM_LAT,
+    )
+    cx, cy = (limites[0] + limites[2]) / 2, (limites[1] + limites[3]) / 2
+    for ha in tamanhos:
+        _gravar_colecao(dados / f"poligono_{ha}ha", [_poligono(cx, cy, ha, rng)], ("geojson",))
+        _gravar_colecao(dados / f"multi_{ha}ha", [_multipoligono(cx, cy, ha, rng)], ("geojson",))
+
+    # Feições pequenas (1–50 ha) longe das bordas da grade
+    margem_x = (limites[2] - limites[0]) * 0.05
+    margem_y = (limites[3] - limites[1]) * 0.05
+    for n in feicoes:
+        geoms = [
+            _poligono(
+                rng.uniform(limites[0] + margem_x, limites[2] - margem_x),
+                rng.uniform(limites[1] + margem_y, limites[3] - margem_y),
+                rng.uniform(1, 50),
+                rng,
+                24,
+            )
+            for _ in range(n)
+        ]
+        _gravar_colecao(dados / f"feicoes_{n}", geoms)
+
+    _gerar_camadas_vetoriais(dados, limites, rng)
+    caminho_manifesto.write_text(json.dumps(manifesto), encoding="utf-8")
+    print(f"Dados gerados em {time.perf_counter() - inicio:.1f} s")
+
+
+# ------------------------------------------------------------------------------
+# Casos
+# ------------------------------------------------------------------------------
+def _preparar_servidor(dados: Path):
+    """Aponta o servidor para os dados sintéticos."""
+    import geopandas as gpd
+
+    from server import camadas_mapeadas, servidor
+
+    # Camadas mapeadas em memória (INFOGEO_CAMADAS_MAPEADAS=false)
+    for nome in ("embargo", "icmbio", "solos"):
+        caminho = dados / f"{nome}.gpkg"
+        camadas_mapeadas.limpar_cache(nome)
+        camadas_mapeadas.carregar(nome, caminho, lambda caminho=caminho: gpd.read_file(caminho))
+    servidor.SOLOS_VECTOR_PATH = str(dados / "solos.gpkg")
+
+    caminhos = {camada: str(dados / f"{camada}.tif") for camada in _classes_camadas()}
+    caminhos.update({
+        "embargo": str(dados / "embargo.gpkg"),
+        "icmbio": str(dados / "icmbio.gpkg"),
+        "solos": str(dados / "solos.gpkg"),
+    })
+
+    def caminhos_fontes_lote(raster_type="com_mosaico"):
+        return dict(caminhos)
+
+    servidor._caminhos_fontes_lote = caminhos_fontes_lote
+    return servidor, caminhos
+
+
+def _upload(caminho: Path):
+    """Função que devolve um FileStorage novo (como o Flask entrega) a cada chamada."""
+    from werkzeug.datastructures import FileStorage
+
+    conteudo = caminho.read_bytes()
+    tipo = FORMATOS_UPLOAD.get(caminho.suffix.lstrip("."), "application/octet-stream")
+    return lambda: FileStorage(stream=BytesIO(conteudo), filename=caminho.name, content_type=tipo)
+
+
+def _verificar(resultado):
+    if isinstance(resultado, tuple):
+        resultado = resultado[0]
+    if isinstance(resultado, dict) and resultado.get("status") == "erro":
+        raise RuntimeError(resultado.get("mensagem"))
+    return resultado
+
+
+def casos(dados: Path, tamanhos, feicoes, feicoes_lote) -> list:
+    """[(nome, função sem argumentos)] na ordem de execução."""
+    import geopandas as gpd
+    import rasterio
+
+    from config import CLASSES_CORES, CLASSES_NOMES
+
+    from .file_parsers import parse_upload_file
+    from .geo_utils import _convert_gdf_to_raster_crs, _fractional_stats, _optimize_cog_reading
+    from .kml_export import gerar_kml
+
+    servidor, caminhos = _preparar_servidor(dados)
+    lista = []
+
+    for ha in tamanhos:
+        for forma in ("poligono", "multi"):
+            arquivo = dados / f"{forma}_{ha}ha.geojson"
+            rotulo = f"{ha}ha" if forma == "poligono" else f"multi_{ha}ha"
+            gdf = gpd.read_file(arquivo)
+
+            def fractional(gdf=gdf):
+                with rasterio.open(caminhos["uso_solo"]) as src:
+                    gdf_tiff, _ = _convert_gdf_to_raster_crs(gdf, src.crs)
+                    cog = _optimize_cog_reading(src, gdf_tiff.total_bounds)
+                    return _fractional_stats(src, gdf_tiff, cog)
+
+            lista.append((f"fractional_stats/{rotulo}", fractional))
+
+            upload = _upload(arquivo)
+            for analise, (nome_funcao, camada) in ENTRADAS.items():
+                funcao = getattr(servidor, nome_funcao)
+                args = (caminhos[camada],) if camada else ()
+
+                def entrada(funcao=funcao, args=args, upload=upload):
+                    return _verificar(funcao(upload(), *args))
+
+                lista.append((f"analise.{analise}/{rotulo}", entrada))
+
+            if ha <= KML_MAX_HA:
+                geojson = json.loads(arquivo.read_text(encoding="utf-8"))
+
+                def kml(geojson=geojson):
+                    return gerar_kml(caminhos["uso_solo"], geojson, CLASSES_NOMES, CLASSES_CORES)
+
+                lista.append((f"kml/{rotulo}", kml))
+
+    for n in feicoes:
+        for formato in FORMATOS_UPLOAD:
+            upload = _upload(dados / f"feicoes_{n}.{formato}")
+
+            def parse(upload=upload):
+                return _verificar(parse_upload_file(upload()))
+
+            lista.append((f"parse.{formato}/{n}", parse))
+
+    cliente = servidor.app.test_client()
+    for n in feicoes_lote:
+        conteudo = (dados / f"feicoes_{n}.geojson").read_bytes()
+
+        def lote(conteudo=conteudo):
+            resposta = cliente.post(
+                "/analisar-lote-completo",
+                data={
+                    "file": (BytesIO(conteudo), "lote.geojson"),
+                    "analises": json.dumps(ANALISES_LOTE),
+                    "output_format": "csv",
+                },
+            )
+            corpo = resposta.get_data()
+            if resposta.status_code != 200:
+                raise RuntimeError(f"HTTP {resposta.status_code}: {corpo[:300]!r}")
+            return corpo
+
+        lista.append((f"lote/{n}", lote))
+
+    return lista
+
+
+# ------------------------------------------------------------------------------
+# Medição e linha de base
+# ------------------------------------------------------------------------------
+def medir(funcao, repeticoes: int, tempo_max: float) -> dict:
+    """Aquece, mede e devolve {min_ms, mediana_ms, n, etapas_ms}."""
+    from . import tracing
+
+    # Aquecimento com rastreio: mostra onde o tempo vai (parse, leitura, PNG…)
+    tracing.iniciar()
+    try:
+        funcao()
+    finally:
+        etapas = tracing.resumo_ms(tracing.finalizar())
+
+    tempos = []
+    inicio = time.perf_counter()
+    while len(tempos) < max(1, repeticoes):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - t0)
+        if time.perf_counter() - inicio >= tempo_max:
+            break
+    return {
+        "min_ms": round(min(tempos) * 1000, 3),
+        "mediana_ms": round(statistics.median(tempos) * 1000, 3),
+        "n": len(tempos),
+        "etapas_ms": etapas,
+    }
+
+
+def _maquina() -> dict:
+    return {
+        "python": platform.python_version(),
+        "sistema": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _carregar_baseline(caminho: Path) -> dict:
+    if not caminho.exists():
+        return {}
+    return json.loads(caminho.read_text(encoding="utf-8"))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks do InfoGEO com dados sintéticos")
+    parser.add_argument("--completo", action="store_true",
+                        help="inclui 500 mil ha, 10 mil feições e lote de 1 000")
+    parser.add_argument("-k", dest="filtros", action="append", default=[],
+                        help="roda só os casos cujo nome contém o texto (repetível)")
+    parser.add_argument("--dados", type=Path, default=None, help="diretório dos dados sintéticos")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PADRAO)
+    parser.add_argument("--salvar", action="store_true", help="grava os tempos como linha de base")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--tempo-max", type=float, default=10.0, help="s por caso")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="fração acima da base")
+    parser.add_argument("--piso-ms", type=float, default=5.0, help="diferença mínima para acusar")
+    parser.add_argument("-v", "--verbose", action="store_true", help="mostra o tempo por etapa")
+    args = parser.parse_args(argv)
+
+    perfil = "completo" if args.completo else "rapido"
+    tamanhos = TAMANHOS_HA_COMPLETO if args.completo else TAMANHOS_HA
+    feicoes = FEICOES_COMPLETO if args.completo else FEICOES
+    feicoes_lote = FEICOES_LOTE_COMPLETO if args.completo else FEICOES_LOTE
+    dados = args.dados or (DADOS_PADRAO / perfil)
+
+    os.environ.update(_AMBIENTE)
+    os.environ["INFOGEO_CAR_ANALISES_PATH"] = str(dados / "sem_pre_calculo.sqlite")
+    gerar_dados(dados, tamanhos, feicoes)
+
+    import logging
+
+    logging.getLogger("lulc-analyzer").setLevel(logging.WARNING)
+
+    selecionados = [
+        (nome, funcao)
+        for nome, funcao in casos(dados, tamanhos, feicoes, feicoes_lote)
+        if not args.filtros or any(f in nome for f in args.filtros)
+    ]
+    if not selecionados:
+        print("Nenhum caso selecionado")
+        return 1
+
+    baseline = _carregar_baseline(args.baseline)
+    base_casos = baseline.get("casos", {})
+    maquina = _maquina()
+    if base_casos and not args.salvar and baseline.get("maquina") != maquina:
+        print(f"Aviso: linha de base gerada em outra máquina ({baseline.get('maquina')})")
+
+    resultados = {}
+    falhas = 0
+    for nome, funcao in selecionados:
+        try:
+            medicao = medir(funcao, args.repeticoes, args.tempo_max)
+        except Exception as e:
+            falhas += 1
+            print(f"ERRO  {nome}: {e}")
+            continue
+        resultados[nome] = medicao
+
+        atual = medicao["min_ms"]
+        base = base_casos.get(nome, {}).get("min_ms")
+        if args.salvar or base is None:
+            situacao, detalhe = ("     " if args.salvar else "NOVO "), ""
+        else:
+            lento = atual > base * (1 + args.tolerancia) and atual - base > args.piso_ms
+            falhas += lento
+            situacao = "LENTO" if lento else "OK   "
+            detalhe = f" (base {base:.1f} ms, {(atual / base - 1) * 100 if base else 0:+.0f}%)"
+        print(f"{situacao} {nome}: {atual:.1f} ms{detalhe} [n={medicao['n']}]")
+        if args.verbose:
+            for etapa, ms in sorted(medicao["etapas_ms"].items(), key=lambda e: -e[1]):
+                print(f"      {ms:10.1f} ms  {etapa}")
+
+    if args.salvar:
+        # Com -k, atualiza só os casos medidos
+        novos = dict(base_casos) if args.filtros else {}
+        novos.update(resultados)
+        args.baseline.write_text(json.dumps({
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            "perfil": perfil,
+            "maquina": maquina,
+            "casos": dict(sorted(novos.items())),
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Linha de base gravada em {args.baseline} ({len(resultados)} casos)")
+
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,618 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Camadas de referência mapeadas em memória
+===================================================
+Camadas vetoriais e tabelas de referência (municípios IBGE, MACRO_RTA,
+embargos IBAMA/ICMBio, solos, centroides, notas agronômicas, clima
+Köppen) gravadas num formato que o SO mapeia direto do disco, em vez de
+um GeoDataFrame por processo:
+
+  - geometrias: WKB concatenado num buffer de bytes + deslocamentos por
+    feição; só as feições consultadas são decodificadas;
+  - atributos: uma coluna por arquivo .npy — números, datas e booleanos
+    no dtype nativo; textos como UTF-8 concatenado + deslocamentos (o
+    layout de strings do Arrow);
+  - índice espacial: R-tree compacta (packed) com as feições ordenadas
+    pela curva de Hilbert — caixas dos nós por nível, percorridas em lote
+    com NumPy, sem reconstruir a árvore em cada processo;
+  - tabelas: índices ordenados por coluna (valores + posições), consulta
+    por busca binária.
+
+Os arquivos são abertos com `np.load(mmap_mode="r")`: os workers do
+gunicorn, os processos do pool de análises e o mestre leem as mesmas
+páginas do cache do SO, e cada processo guarda só os cabeçalhos dos
+arrays. Ao contrário dos objetos Python herdados por fork, essas páginas
+não são copiadas quando a contagem de referências muda.
+
+Cada pacote fica em `CAMADAS_DIR/<nome>/<versão>/`, com a versão (tamanho
++ mtime) do arquivo de origem; é gerado na primeira carga (no gunicorn,
+pelo mestre na pré-carga) e refeito quando a origem muda. Sem a origem,
+o pacote mais recente é usado como está. Com `CAMADAS_MAPEADAS=False`
+(ou diretório sem permissão de escrita) os mesmos arrays ficam só na
+memória do processo.
+
+Geração manual de todas as camadas (`--forcar` apaga os pacotes antes):
+
+    python -m server.camadas_mapeadas
+    python -m server.camadas_mapeadas --forcar
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger("lulc-analyzer")
+
+_BASE_DIR = Path(__file__).parent.parent
+
+# Versão do layout dos pacotes (pacotes de outra versão são regerados)
+_FORMATO = 1
+
+# Filhos por nó da R-tree
+_NO = 16
+
+# Bits por eixo da curva de Hilbert
+_HILBERT_BITS = 16
+
+_META = "meta.json"
+
+_locks_lock = threading.Lock()
+_locks = {}  # nome → Lock (uma geração por camada)
+_abertas = {}  # nome → TabelaMapeada | CamadaMapeada | None
+
+
+def _versao(caminho) -> str:
+    st = os.stat(caminho)
+    return f"{st.st_size}|{int(st.st_mtime)}"
+
+
+def _rotulo_versao(versao: str) -> str:
+    return hashlib.sha1(f"{_FORMATO}|{versao}".encode()).hexdigest()[:16]
+
+
+def _lock(nome) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(nome, threading.Lock())
+
+
+# ------------------------------------------------------------------------------
+# Codificação
+# ------------------------------------------------------------------------------
+def _e_data(serie) -> bool:
+    """Coluna de objetos só com datas/horas (ex.: campos Date lidos pelo fiona)."""
+    import datetime
+
+    valores = serie.dropna()
+    return not valores.empty and all(
+        isinstance(v, (datetime.date, datetime.datetime)) for v in valores
+    )
+
+
+def _codificar_coluna(serie):
+    """(tipo, {sufixo: array}, extras do meta) de uma coluna do DataFrame."""
+    import pandas as pd
+    from pandas.api import types
+
+    if types.is_bool_dtype(serie) and not serie.isna().any():
+        return "bool", {"v": serie.to_numpy(dtype=bool)}, {}
+    if types.is_numeric_dtype(serie) and not types.is_bool_dtype(serie):
+        if types.is_extension_array_dtype(serie):
+            return "numero", {"v": serie.to_numpy(dtype=float, na_value=np.nan)}, {}
+        return "numero", {"v": serie.to_numpy()}, {}
+    if types.is_datetime64_any_dtype(serie) or (serie.dtype == object and _e_data(serie)):
+        datas = pd.to_datetime(serie)
+        extras = {}
+        if getattr(datas.dt, "tz", None) is not None:
+            extras["tz"] = str(datas.dt.tz)
+            datas = datas.dt.tz_convert("UTC").dt.tz_localize(None)
+        return "data", {"v": datas.to_numpy(dtype="datetime64[ns]")}, extras
+
+    nulos = serie.isna().to_numpy()
+    textos = ["" if nulo else str(v) for v, nulo in zip(serie.tolist(), nulos)]
+    buffer, offsets = _concatenar([t.encode("utf-8") for t in textos])
+    return "texto", {"buf": buffer, "off": offsets, "nulo": nulos}, {}
+
+
+def _concatenar(partes):
+    """(buffer uint8, deslocamentos int64 n+1) de uma lista de bytes."""
+    offsets = np.zeros(len(partes) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in partes], out=offsets[1:])
+    return np.frombuffer(b"".join(partes), dtype=np.uint8).copy(), offsets
+
+
+def _valores_indice(tipo, partes):
+    """Valores ordenáveis da coluna para o índice (textos como str NumPy)."""
+    if tipo != "texto":
+        return partes["v"]
+    buf, off = partes["buf"], partes["off"]
+    return np.array(
+        [bytes(buf[off[i] : off[i + 1]]).decode("utf-8") for i in range(len(off) - 1)],
+        dtype=str,
+    )
+
+
+def _hilbert(x, y):
+    """Posição na curva de Hilbert de inteiros (x, y) em [0, 2**bits)."""
+    n = 1 << _HILBERT_BITS
+    x = x.astype(np.int64)
+    y = y.astype(np.int64)
+    d = np.zeros_like(x)
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        girar = ~ry
+        inverter = girar & rx
+        x = np.where(inverter, n - 1 - x, x)
+        y = np.where(inverter, n - 1 - y, y)
+        x, y = np.where(girar, y, x), np.where(girar, x, y)
+        s >>= 1
+    return d
+
+
+def _arvore(caixas):
+    """R-tree compacta: (caixas dos nós, nível a nível desde as folhas; início
+    de cada nível; feição de cada folha)."""
+    n = len(caixas)
+    if n == 0:
+        return np.zeros((0, 4)), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    validas = np.isfinite(caixas).all(axis=1)
+    cx = np.where(validas, (caixas[:, 0] + caixas[:, 2]) / 2, np.nan)
+    cy = np.where(validas, (caixas[:, 1] + caixas[:, 3]) / 2, np.nan)
+    escala = (1 << _HILBERT_BITS) - 1
+    if validas.any():
+        x0, x1 = np.nanmin(cx), np.nanmax(cx)
+        y0, y1 = np.nanmin(cy), np.nanmax(cy)
+        hx = np.nan_to_num((cx - x0) / max(x1 - x0, 1e-12) * escala)
+        hy = np.nan_to_num((cy - y0) / max(y1 - y0, 1e-12) * escala)
+    else:
+        hx = hy = np.zeros(n)
+    folhas = np.argsort(_hilbert(hx, hy), kind="stable").astype(np.int64)
+
+    niveis = [caixas[folhas]]
+    while len(niveis[-1]) > 1:
+        filhos = niveis[-1]
+        inicios = np.arange(0, len(filhos), _NO)
+        niveis.append(np.column_stack([
+            np.fmin.reduceat(filhos[:, 0], inicios),
+            np.fmin.reduceat(filhos[:, 1], inicios),
+            np.fmax.reduceat(filhos[:, 2], inicios),
+            np.fmax.reduceat(filhos[:, 3], inicios),
+        ]))
+    inicio_niveis = np.zeros(len(niveis) + 1, dtype=np.int64)
+    np.cumsum([len(nivel) for nivel in niveis], out=inicio_niveis[1:])
+    return np.concatenate(niveis), inicio_niveis, folhas
+
+
+def _montar(df, indices=()):
+    """(arrays, meta) do pacote a partir de um DataFrame ou GeoDataFrame."""
+    import shapely
+
+    geometria = getattr(df, "_geometry_column_name", None) if hasattr(df, "geometry") else None
+    arrays = {}
+    colunas = []
+    for i, nome in enumerate(c for c in df.columns if c != geometria):
+        tipo, partes, extras = _codificar_coluna(df[nome])
+        arrays.update({f"c{i}_{sufixo}": v for sufixo, v in partes.items()})
+        coluna = {"nome": str(nome), "tipo": tipo, **extras}
+        if nome in indices:
+            valores = _valores_indice(tipo, partes)
+            ordem = np.argsort(valores, kind="stable").astype(np.int64)
+            arrays[f"c{i}_ordem"] = ordem
+            arrays[f"c{i}_ordenados"] = valores[ordem]
+            coluna["indice"] = True
+        colunas.append(coluna)
+
+    meta = {"formato": _FORMATO, "linhas": len(df), "colunas": colunas, "geometria": None}
+    if geometria is not None:
+        geoms = np.asarray(df.geometry.values, dtype=object)
+        wkb = shapely.to_wkb(geoms)
+        arrays["wkb_buf"], arrays["wkb_off"] = _concatenar(
+            [b"" if w is None else w for w in wkb]
+        )
+        caixas = shapely.bounds(geoms).astype(np.float64)
+        arrays["caixas"] = caixas
+        arrays["arvore_caixas"], arrays["arvore_niveis"], arrays["arvore_folhas"] = _arvore(caixas)
+        meta["geometria"] = {
+            "nome": str(geometria),
+            "crs": df.crs.to_string() if df.crs is not None else None,
+            "limites": [float(v) for v in np.nan_to_num(df.total_bounds)] if len(df) else None,
+        }
+    return arrays, meta
+
+
+# ------------------------------------------------------------------------------
+# Consulta
+# ------------------------------------------------------------------------------
+class TabelaMapeada:
+    """Tabela de atributos sobre arrays (mapeados do disco ou em memória)."""
+
+    def __init__(self, arrays, meta, diretorio=None):
+        self._arrays = arrays
+        self.meta = meta
+        self.diretorio = diretorio
+        self._colunas = {c["nome"]: (i, c) for i, c in enumerate(meta["colunas"])}
+
+    def __len__(self):
+        return int(self.meta["linhas"])
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @property
+    def columns(self) -> list:
+        return [c["nome"] for c in self.meta["colunas"]]
+
+    def _indices(self, indices):
+        if indices is None:
+            return np.arange(len(self))
+        return np.asarray(indices, dtype=np.int64).reshape(-1)
+
+    def valores(self, coluna, indices=None) -> np.ndarray:
+        """Valores da `coluna` nas linhas `indices` (todas, se None).
+
+        Textos voltam como array de objetos (None nos nulos); datas como
+        datetime64 (NaT nos nulos).
+        """
+        i, info = self._colunas[coluna]
+        indices = self._indices(indices)
+        if info["tipo"] != "texto":
+            return np.asarray(self._arrays[f"c{i}_v"][indices])
+
+        buf, off, nulo = (self._arrays[f"c{i}_{s}"] for s in ("buf", "off", "nulo"))
+        saida = np.empty(len(indices), dtype=object)
+        for k, j in enumerate(indices.tolist()):
+            if not nulo[j]:
+                saida[k] = bytes(buf[off[j] : off[j + 1]]).decode("utf-8")
+        return saida
+
+    def linhas(self, indices=None):
+        """DataFrame das linhas `indices` (índice = posição original)."""
+        import pandas as pd
+
+        indices = self._indices(indices)
+        dados = {}
+        for coluna in self.meta["colunas"]:
+            valores = self.valores(coluna["nome"], indices)
+            if coluna["tipo"] == "data":
+                valores = pd.Series(valores, index=indices)
+                if coluna.get("tz"):
+                    valores = valores.dt.tz_localize("UTC").dt.tz_convert(coluna["tz"])
+            dados[coluna["nome"]] = valores
+        return pd.DataFrame(dados, index=indices)
+
+    def linhas_com(self, coluna, valor) -> np.ndarray:
+        """Posições (crescentes) das linhas com `coluna == valor` (coluna indexada)."""
+        i, info = self._colunas[coluna]
+        if not info.get("indice"):
+            raise KeyError(f"Coluna sem índice: {coluna}")
+        ordenados = self._arrays[f"c{i}_ordenados"]
+        if info["tipo"] == "texto":
+            valor = str(valor)
+        inicio = np.searchsorted(ordenados, valor, side="left")
+        fim = np.searchsorted(ordenados, valor, side="right")
+        return np.sort(self._arrays[f"c{i}_ordem"][inicio:fim])
+
+
+class CamadaMapeada(TabelaMapeada):
+    """Camada vetorial: tabela + geometrias WKB + R-tree compacta."""
+
+    def __init__(self, arrays, meta, diretorio=None):
+        super().__init__(arrays, meta, diretorio)
+        geometria = meta["geometria"]
+        self.crs = geometria["crs"]
+        self.limites = geometria["limites"]
+        self._nome_geometria = geometria["nome"]
+
+    @property
+    def columns(self) -> list:
+        return [*super().columns, self._nome_geometria]
+
+    def geometrias(self, indices=None) -> np.ndarray:
+        """Geometrias shapely das feições `indices` (decodificadas do WKB)."""
+        import shapely
+
+        indices = self._indices(indices)
+        buf, off = self._arrays["wkb_buf"], self._arrays["wkb_off"]
+        wkb = [
+            bytes(buf[off[j] : off[j + 1]]) if off[j + 1] > off[j] else None
+            for j in indices.tolist()
+        ]
+        return shapely.from_wkb(np.array(wkb, dtype=object)) if wkb else np.empty(0, dtype=object)
+
+    def consultar_caixas(self, caixas):
+        """(consulta, feição) dos pares cujas caixas se tocam, em lote.
+
+        `caixas`: n×4 (xmin, ymin, xmax, ymax). Pares ordenados por consulta
+        e, dentro dela, pela posição da feição.
+        """
+        caixas = np.asarray(caixas, dtype=np.float64).reshape(-1, 4)
+        nos = self._arrays["arvore_caixas"]
+        inicio = self._arrays["arvore_niveis"]
+        vazio = np.zeros(0, dtype=np.int64)
+        if len(nos) == 0 or len(caixas) == 0:
+            return vazio, vazio
+
+        def tocam(consulta, posicao):
+            q, b = caixas[consulta], nos[posicao]
+            return (
+                (b[:, 0] <= q[:, 2]) & (b[:, 2] >= q[:, 0])
+                & (b[:, 1] <= q[:, 3]) & (b[:, 3] >= q[:, 1])
+            )
+
+        # Raiz (único nó do último nível) e descida nível a nível
+        nivel = len(inicio) - 2
+        consulta = np.arange(len(caixas), dtype=np.int64)
+        no = np.zeros(len(caixas), dtype=np.int64)
+        manter = tocam(consulta, inicio[nivel] + no)
+        consulta, no = consulta[manter], no[manter]
+        while nivel > 0:
+            filhos_nivel = inicio[nivel] - inicio[nivel - 1]
+            primeiro = no * _NO
+            quantos = np.minimum(_NO, filhos_nivel - primeiro)
+            consulta = np.repeat(consulta, quantos)
+            base = np.repeat(np.cumsum(quantos) - quantos, quantos)
+            no = np.repeat(primeiro, quantos) + (np.arange(len(consulta)) - base)
+            nivel -= 1
+            manter = tocam(consulta, inicio[nivel] + no)
+            consulta, no = consulta[manter], no[manter]
+
+        feicao = self._arrays["arvore_folhas"][no]
+        ordem = np.lexsort((feicao, consulta))
+        return consulta[ordem], feicao[ordem]
+
+    def consultar(self, geoms, predicado: str = "intersects"):
+        """(geometria, feição) dos pares que satisfazem `predicado` (como
+        `sindex.query` em lote). `geoms` no CRS da camada."""
+        import shapely
+
+        geoms = np.asarray(geoms, dtype=object)
+        consulta, feicao = self.consultar_caixas(shapely.bounds(geoms))
+        if len(consulta) == 0:
+            return consulta, feicao
+        unicas, posicao = np.unique(feicao, return_inverse=True)
+        alvo = self.geometrias(unicas)[posicao]
+        manter = getattr(shapely, predicado)(geoms[consulta], alvo)
+        return consulta[manter], feicao[manter]
+
+    def recorte(self, xmin, ymin, xmax, ymax):
+        """GeoDataFrame das feições cuja caixa toca o retângulo (ordem original).
+
+        Substitui `gdf.cx[...]`: pode trazer feições a mais (só a caixa é
+        testada) — quem chama já filtra pela geometria exata.
+        """
+        _, feicao = self.consultar_caixas([[xmin, ymin, xmax, ymax]])
+        return self.linhas(feicao)
+
+    def contendo(self, x: float, y: float) -> np.ndarray:
+        """Posições das feições que contêm o ponto; se nenhuma, as que o tocam
+        (ponto sobre a borda)."""
+        import shapely
+
+        _, feicao = self.consultar_caixas([[x, y, x, y]])
+        if len(feicao) == 0:
+            return feicao
+        geoms = self.geometrias(feicao)
+        dentro = shapely.contains_xy(geoms, x, y)
+        if not dentro.any():
+            dentro = shapely.intersects_xy(geoms, x, y)
+        return feicao[dentro]
+
+    def mais_proxima(self, x: float, y: float):
+        """Posição da feição mais próxima do ponto (None se a camada for vazia).
+
+        Busca em caixas crescentes ao redor do ponto: a primeira feição a
+        uma distância menor que o raio da caixa é a mais próxima.
+        """
+        import shapely
+
+        if self.limites is None or self.empty:
+            return None
+        ponto = shapely.Point(x, y)
+        x0, y0, x1, y1 = self.limites
+        alcance = max(abs(x - x0), abs(x - x1), abs(y - y0), abs(y - y1), 1e-9)
+        raio = min(alcance, max(x1 - x0, y1 - y0, 1e-9) / 1024)
+        while True:
+            _, feicao = self.consultar_caixas([[x - raio, y - raio, x + raio, y + raio]])
+            if len(feicao):
+                distancias = shapely.distance(self.geometrias(feicao), ponto)
+                melhor = int(np.nanargmin(distancias)) if np.isfinite(distancias).any() else None
+                if melhor is not None and (distancias[melhor] <= raio or raio >= alcance):
+                    return int(feicao[melhor])
+            if raio >= alcance:
+                return None
+            raio = min(raio * 4, alcance)
+
+    def linhas(self, indices=None):
+        """GeoDataFrame das feições `indices` (índice = posição original)."""
+        import geopandas as gpd
+
+        indices = self._indices(indices)
+        df = super().linhas(indices)
+        df[self._nome_geometria] = self.geometrias(indices)
+        return gpd.GeoDataFrame(df, geometry=self._nome_geometria, crs=self.crs)
+
+
+# ------------------------------------------------------------------------------
+# Pacotes em disco
+# ------------------------------------------------------------------------------
+def _diretorio_base(nome) -> Path:
+    from config import CAMADAS_DIR
+
+    return Path(CAMADAS_DIR) / nome
+
+
+def _gravar(destino: Path, arrays, meta):
+    destino.mkdir(parents=True)
+    for chave, array in arrays.items():
+        np.save(destino / f"{chave}.npy", np.ascontiguousarray(array), allow_pickle=False)
+    # meta.json por último: pacote sem ele está incompleto
+    with open(destino / _META, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def _abrir(diretorio: Path):
+    """Pacote do disco (arrays mapeados) ou None se incompleto/de outro formato."""
+    try:
+        with open(diretorio / _META, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("formato") != _FORMATO:
+        return None
+    # ndarray comum sobre o mapeamento (indexar np.memmap cria um objeto por fatia)
+    arrays = {
+        arquivo.stem: np.asarray(np.load(arquivo, mmap_mode="r", allow_pickle=False))
+        for arquivo in diretorio.glob("*.npy")
+    }
+    return _objeto(arrays, meta, diretorio)
+
+
+def _objeto(arrays, meta, diretorio=None):
+    classe = CamadaMapeada if meta.get("geometria") else TabelaMapeada
+    return classe(arrays, meta, diretorio)
+
+
+def _pacote_mais_recente(base: Path):
+    if not base.is_dir():
+        return None
+    candidatos = sorted(
+        (d for d in base.iterdir() if d.is_dir() and (d / _META).exists()),
+        key=lambda d: (d / _META).stat().st_mtime,
+        reverse=True,
+    )
+    for diretorio in candidatos:
+        objeto = _abrir(diretorio)
+        if objeto is not None:
+            return objeto
+    return None
+
+
+def _remover_antigos(base: Path, atual: Path):
+    """Apaga as versões anteriores (no Linux, quem ainda as mapeia continua lendo)."""
+    for diretorio in base.iterdir():
+        if diretorio != atual and diretorio.is_dir() and not diretorio.name.startswith("."):
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def _gerar(nome, base: Path, destino: Path, ler, indices, versao):
+    """Lê a origem e grava o pacote; devolve o objeto aberto do disco (ou em
+    memória, se não puder gravar)."""
+    from config import CAMADAS_MAPEADAS
+
+    df = ler()
+    if df is None:
+        return None
+    arrays, meta = _montar(df, indices)
+    meta["origem"] = versao
+    meta["nome"] = nome
+    if not CAMADAS_MAPEADAS:
+        return _objeto(arrays, meta)
+
+    temporario = base / f".tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    try:
+        _gravar(temporario, arrays, meta)
+        try:
+            os.rename(temporario, destino)
+        except OSError:
+            # Outro processo gravou a mesma versão antes
+            shutil.rmtree(temporario, ignore_errors=True)
+        objeto = _abrir(destino)
+        if objeto is None:
+            raise OSError(f"pacote ilegível após gravação: {destino}")
+    except OSError as e:
+        shutil.rmtree(temporario, ignore_errors=True)
+        logger.warning(f"[Camadas] {nome}: pacote não gravado em {base} ({e}); mantido em memória")
+        return _objeto(arrays, meta)
+
+    _remover_antigos(base, destino)
+    tamanho = sum(arquivo.stat().st_size for arquivo in destino.iterdir())
+    logger.info(f"[Camadas] {nome}: pacote gerado em {destino} ({len(df)} linhas, {tamanho / 1e6:.1f} MB)")
+    return objeto
+
+
+def carregar(nome, fonte, ler, indices=()):
+    """Camada (GeoDataFrame de origem) ou tabela (DataFrame) `nome`, mapeada.
+
+    `fonte`: arquivo de origem (define a versão); `ler()`: lê a origem e
+    devolve o (Geo)DataFrame já no CRS e com as colunas desejadas (ou None);
+    `indices`: colunas consultadas por `linhas_com`. O objeto fica em cache
+    no processo até `limpar_cache`. Devolve None se não houver origem nem
+    pacote; erros de leitura da origem são propagados (e não ficam em cache).
+    """
+    with _lock(nome):
+        if nome in _abertas:
+            return _abertas[nome]
+
+        from config import CAMADAS_MAPEADAS
+
+        base = _diretorio_base(nome)
+        try:
+            versao = _versao(fonte)
+        except OSError:
+            versao = None
+
+        objeto = None
+        if versao is None:
+            objeto = _pacote_mais_recente(base) if CAMADAS_MAPEADAS else None
+            if objeto is None:
+                logger.warning(f"[Camadas] {nome}: arquivo de origem não encontrado ({fonte})")
+            else:
+                logger.warning(f"[Camadas] {nome}: origem ausente ({fonte}); usando {objeto.diretorio}")
+        else:
+            destino = base / _rotulo_versao(versao)
+            if CAMADAS_MAPEADAS:
+                objeto = _abrir(destino)
+            if objeto is None:
+                if CAMADAS_MAPEADAS:
+                    try:
+                        base.mkdir(parents=True, exist_ok=True)
+                    except OSError:
+                        pass  # _gerar registra e mantém em memória
+                objeto = _gerar(nome, base, destino, ler, tuple(indices), versao)
+
+        if objeto is not None:
+            logger.info(
+                f"[Camadas] {nome}: {len(objeto)} linhas "
+                f"({objeto.diretorio or 'em memória'})"
+            )
+        _abertas[nome] = objeto
+        return objeto
+
+
+def limpar_cache(*nomes):
+    """Fecha as camadas em memória (todas, ou as indicadas); a próxima
+    consulta abre o pacote da versão atual da origem."""
+    with _locks_lock:
+        for nome in nomes or list(_abertas):
+            _abertas.pop(nome, None)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(_BASE_DIR))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Pacotes mapeados das camadas de referência")
+    parser.add_argument("--forcar", action="store_true", help="apaga os pacotes e gera de novo")
+    args = parser.parse_args()
+
+    from config import CAMADAS_DIR
+    from server import servidor
+
+    if args.forcar:
+        shutil.rmtree(CAMADAS_DIR, ignore_errors=True)
+    servidor.precarregar_camadas("todas", rasters=False)
+    for nome, estado in sorted(servidor.estado_precarga()[1].items()):
+        print(f"{nome}: {estado.get('status')} ({estado.get('segundos')} s)")
@@ -0,0 +1,701 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Índice de busca do CAR
+================================
+Acesso direto (SQLite, somente leitura) ao GeoPackage do CAR e índice de
+busca por código do imóvel num SQLite auxiliar (`CAR_INDEX_PATH`):
+
+  - car_codigos      → fid + cod_imovel + código normalizado (B-tree),
+                       usado em buscas por prefixo e por código exato;
+  - car_codigos_fts  → FTS5 com tokenizador trigram sobre o código
+                       normalizado, para buscas por trecho do meio.
+
+Consultas por ponto usam diretamente a tabela R-tree do GPKG (filtro por
+envelope) seguida do teste exato `contains` só nos candidatos. Todas as
+leituras passam por um pool de conexões SQLite somente leitura, reaproveitado
+entre requisições e threads.
+
+O GeoPackage original não é alterado. O índice é reconstruído quando o
+GPKG muda (tamanho/mtime), por um processo de cada vez (trava em
+`<índice>.lock`; temporários de construções interrompidas são apagados), e
+pode ser gerado antecipadamente com:
+
+    python -m server.car_index
+"""
+
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("lulc-analyzer")
+
+_BASE_DIR = Path(__file__).parent.parent
+
+_NAO_ALFANUM = re.compile(r"[^0-9A-Z]")
+
+# Linhas inseridas por lote na construção do índice
+_BUILD_CHUNK = 50000
+
+# Conexões ociosas mantidas por arquivo no pool
+_POOL_SIZE = 8
+
+_build_lock = threading.Lock()
+_build_thread = None
+
+_pools_lock = threading.Lock()
+_pools = {}
+
+# (versão do GPKG, versão do índice) já conferidas por ensure_car_index
+_index_verificado = None
+
+
+def _config_paths():
+    from config import CAR_GPKG_PATH, CAR_INDEX_PATH
+
+    return Path(CAR_GPKG_PATH), Path(CAR_INDEX_PATH)
+
+
+def normalizar_codigo(codigo) -> str:
+    """Código em maiúsculas, só com letras e dígitos (aceita com/sem hífens)."""
+    return _NAO_ALFANUM.sub("", str(codigo or "").upper())
+
+
+def _fingerprint(path: Path) -> str:
+    st = path.stat()
+    return f"{st.st_size}|{int(st.st_mtime)}"
+
+
+def _connect_ro(path: Path) -> sqlite3.Connection:
+    """Conexão SQLite somente leitura (não cria nem trava o arquivo).
+
+    Registra `normalizar_codigo()` em SQL, para que as consultas diretas ao
+    GPKG normalizem os códigos exatamente como o índice.
+    """
+    uri = f"file:{Path(path).resolve().as_posix()}?mode=ro"
+    con = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    con.create_function("normalizar_codigo", 1, normalizar_codigo, deterministic=True)
+    return con
+
+
+class _ConnectionPool:
+    """Pool LIFO de conexões somente leitura para um arquivo SQLite/GPKG.
+
+    As conexões são criadas sob demanda; até `size` ficam ociosas para a
+    próxima requisição (a mais recente primeiro, com cache de páginas quente).
+    """
+
+    def __init__(self, path: Path, size: int = _POOL_SIZE):
+        self.path = Path(path)
+        self._idle = queue.LifoQueue(maxsize=size)
+        self.closed = False
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            con = _connect_ro(self.path)
+            con.execute("PRAGMA query_only = 1")
+            con.execute("PRAGMA cache_size = -16000")
+            return con
+
+    def release(self, con: sqlite3.Connection):
+        if self.closed:
+            con.close()
+            return
+        try:
+            self._idle.put_nowait(con)
+        except queue.Full:
+            con.close()
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+@contextmanager
+def _pooled(path: Path):
+    """Empresta uma conexão do pool do arquivo (recriado se o arquivo mudar)."""
+    path = Path(path)
+    versao = _fingerprint(path)
+    with _pools_lock:
+        pool, pool_versao = _pools.get(path, (None, None))
+        if pool is None or pool_versao != versao:
+            if pool is not None:
+                pool.close()
+            pool = _ConnectionPool(path)
+            _pools[path] = (pool, versao)
+    con = pool.acquire()
+    try:
+        yield con
+    finally:
+        pool.release(con)
+
+
+def fechar_conexoes():
+    """Descarta as conexões ociosas dos pools (ex.: herdadas num fork)."""
+    with _pools_lock:
+        for pool, _ in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+# ------------------------------------------------------------------------------
+# Metadados do GeoPackage
+# ------------------------------------------------------------------------------
+@lru_cache(maxsize=4)
+def gpkg_layer_info(gpkg_path: str, fingerprint: str = "") -> dict:
+    """Descobre tabela, coluna de geometria, SRS e chave primária da camada.
+
+    `fingerprint` entra apenas na chave do cache (invalida se o GPKG mudar).
+    """
+    con = _connect_ro(Path(gpkg_path))
+    try:
+        row = con.execute(
+            "SELECT c.table_name, g.column_name, g.srs_id "
+            "FROM gpkg_contents c JOIN gpkg_geometry_columns g "
+            "ON g.table_name = c.table_name "
+            "WHERE c.data_type = 'features' ORDER BY c.table_name LIMIT 1"
+        ).fetchone()
+        if row is None:
+            raise ValueError("Nenhuma camada de feições encontrada no GPKG")
+        table, geom_col, srs_id = row
+
+        colunas = con.execute(f'PRAGMA table_info("{table}")').fetchall()
+        fid_col = next((c[1] for c in colunas if c[5] == 1), "fid")
+        atributos = [c[1] for c in colunas if c[1] not in (fid_col, geom_col)]
+
+        srs = con.execute(
+            "SELECT organization, organization_coordsys_id, definition "
+            "FROM gpkg_spatial_ref_sys WHERE srs_id = ?",
+            (srs_id,),
+        ).fetchone()
+        if srs and str(srs[0]).upper() == "EPSG" and srs[1]:
+            crs = f"EPSG:{int(srs[1])}"
+        elif srs and srs[2] and srs[2] != "undefined":
+            crs = srs[2]
+        else:
+            crs = "EPSG:4674"
+
+        rtree = f"rtree_{table}_{geom_col}"
+        tem_rtree = (
+            con.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (rtree,),
+            ).fetchone()
+            is not None
+        )
+    finally:
+        con.close()
+
+    return {
+        "table": table,
+        "geom_col": geom_col,
+        "fid_col": fid_col,
+        "atributos": atributos,
+        "crs": crs,
+        "rtree": rtree if tem_rtree else None,
+    }
+
+
+def car_layer_info() -> dict:
+    gpkg_path, _ = _config_paths()
+    return gpkg_layer_info(str(gpkg_path), _fingerprint(gpkg_path))
+
+
+def gpkg_blob_to_wkb(blob) -> bytes:
+    """Remove o cabeçalho GeoPackageBinary e devolve o WKB puro."""
+    if blob is None:
+        return None
+    blob = bytes(blob)
+    if blob[:2] != b"GP":
+        return blob
+    flags = blob[3]
+    envelope = (flags >> 1) & 0x07
+    tamanho_env = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}.get(envelope, 0)
+    return blob[8 + tamanho_env :]
+
+
+def decode_geometries(blobs):
+    """Converte blobs GPKG em ndarray de geometrias shapely (em lote)."""
+    import shapely
+
+    wkbs = np.empty(len(blobs), dtype=object)
+    wkbs[:] = [gpkg_blob_to_wkb(b) for b in blobs]
+    return shapely.from_wkb(wkbs)
+
+
+@lru_cache(maxsize=8)
+def _transformer_to_wgs84(crs: str):
+    from pyproj import Transformer
+
+    return Transformer.from_crs(crs, "EPSG:4326", always_xy=True)
+
+
+@lru_cache(maxsize=8)
+def _transformer_from_wgs84(crs: str):
+    from pyproj import Transformer
+
+    return Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+
+
+def to_wgs84(geoms, crs: str):
+    """Reprojeta um ndarray de geometrias para EPSG:4326 (vetorizado)."""
+    import shapely
+
+    if crs in ("EPSG:4326", None):
+        return geoms
+    transformer = _transformer_to_wgs84(crs)
+
+    def _fn(coords):
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+
+    return shapely.transform(geoms, _fn)
+
+
+# ------------------------------------------------------------------------------
+# Construção do índice
+# ------------------------------------------------------------------------------
+def _index_is_current(index_path: Path, gpkg_fp: str) -> bool:
+    if not index_path.exists():
+        return False
+    try:
+        con = _connect_ro(index_path)
+        try:
+            row = con.execute(
+                "SELECT valor FROM car_meta WHERE chave = 'gpkg_fingerprint'"
+            ).fetchone()
+        finally:
+            con.close()
+        return row is not None and row[0] == gpkg_fp
+    except sqlite3.Error:
+        return False
+
+
+def _travar(arquivo, esperar: bool) -> bool:
+    if fcntl is not None:
+        try:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | (0 if esperar else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+    while True:
+        try:
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not esperar:
+                return False
+            time.sleep(0.5)
+
+
+def _destravar(arquivo):
+    if fcntl is not None:
+        fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+    else:
+        arquivo.seek(0)
+        msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _trava_construcao(index_path: Path, esperar: bool = True):
+    """Trava entre processos (arquivo `.lock` ao lado do índice).
+
+    Produz True com a trava obtida; False se outro processo (worker do
+    gunicorn, CLI) está construindo o índice e `esperar` é falso.
+    """
+    with open(index_path.with_suffix(".lock"), "a+b") as arquivo:
+        obtida = _travar(arquivo, esperar)
+        try:
+            yield obtida
+        finally:
+            if obtida:
+                _destravar(arquivo)
+
+
+def _remover_temporarios(index_path: Path):
+    """Apaga `*.tmp` de construções interrompidas (chamar com a trava obtida)."""
+    for tmp in index_path.parent.glob(f"{index_path.stem}.*.tmp"):
+        try:
+            tmp.unlink()
+            logger.info(f"[CAR] Temporário de construção interrompida removido: {tmp}")
+        except OSError as e:
+            logger.warning(f"[CAR] Não foi possível remover {tmp}: {e}")
+
+
+def build_car_index(force: bool = False, esperar: bool = True) -> bool:
+    """(Re)constrói o índice de códigos a partir do GPKG do CAR.
+
+    Grava num arquivo temporário e troca atomicamente ao final, de forma que
+    buscas concorrentes nunca veem um índice pela metade. A construção é
+    feita sob uma trava de arquivo: só um processo constrói; os demais
+    esperam (e reaproveitam o resultado) ou, com `esperar=False`, desistem.
+    """
+    gpkg_path, index_path = _config_paths()
+    if not gpkg_path.exists():
+        logger.warning(f"[CAR] GPKG não encontrado, índice não construído: {gpkg_path}")
+        return False
+
+    gpkg_fp = _fingerprint(gpkg_path)
+    if not force and _index_is_current(index_path, gpkg_fp):
+        return True
+
+    info = car_layer_info()
+    if "cod_imovel" not in info["atributos"]:
+        logger.warning("[CAR] Camada sem coluna cod_imovel; índice não construído")
+        return False
+
+    with _trava_construcao(index_path, esperar) as obtida:
+        if not obtida:
+            logger.info("[CAR] Índice em construção por outro processo")
+            return False
+        # Outro processo pode ter concluído enquanto esperávamos a trava
+        if not force and _index_is_current(index_path, gpkg_fp):
+            return True
+        _remover_temporarios(index_path)
+        return _construir(gpkg_path, index_path, gpkg_fp, info)
+
+
+def _construir(gpkg_path: Path, index_path: Path, gpkg_fp: str, info: dict) -> bool:
+    tmp_path = index_path.with_suffix(f".{os.getpid()}.tmp")
+
+    logger.info(f"[CAR] Construindo índice de códigos: {index_path}")
+    src = _connect_ro(gpkg_path)
+    dst = sqlite3.connect(str(tmp_path))
+    try:
+        dst.execute("PRAGMA journal_mode = OFF")
+        dst.execute("PRAGMA synchronous = OFF")
+        dst.execute(
+            "CREATE TABLE car_codigos ("
+            " fid INTEGER PRIMARY KEY,"
+            " cod_norm TEXT NOT NULL,"
+            " cod_imovel TEXT NOT NULL)"
+        )
+        dst.execute("CREATE TABLE car_meta (chave TEXT PRIMARY KEY, valor TEXT)")
+
+        cur = src.execute(
+            f'SELECT "{info["fid_col"]}", cod_imovel FROM "{info["table"]}" '
+            "WHERE cod_imovel IS NOT NULL"
+        )
+        total = 0
+        while True:
+            rows = cur.fetchmany(_BUILD_CHUNK)
+            if not rows:
+                break
+            dst.executemany(
+                "INSERT INTO car_codigos VALUES (?, ?, ?)",
+                [(fid, normalizar_codigo(cod), str(cod)) for fid, cod in rows],
+            )
+            total += len(rows)
+
+        dst.execute("CREATE INDEX ix_car_cod_norm ON car_codigos (cod_norm)")
+
+        fts = True
+        try:
+            dst.execute(
+                "CREATE VIRTUAL TABLE car_codigos_fts USING fts5("
+                " cod_norm, content='car_codigos', content_rowid='fid',"
+                " tokenize='trigram')"
+            )
+            dst.execute(
+                "INSERT INTO car_codigos_fts (car_codigos_fts) VALUES ('rebuild')"
+            )
+        except sqlite3.OperationalError as e:
+            # SQLite < 3.34 não tem o tokenizador trigram
+            fts = False
+            logger.warning(f"[CAR] FTS5/trigram indisponível ({e}); buscas parciais via LIKE")
+
+        dst.executemany(
+            "INSERT INTO car_meta VALUES (?, ?)",
+            [
+                ("gpkg_fingerprint", gpkg_fp),
+                ("fts_trigram", "1" if fts else "0"),
+                ("total", str(total)),
+            ],
+        )
+        dst.commit()
+    except Exception:
+        dst.close()
+        src.close()
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    dst.close()
+    src.close()
+
+    os.replace(tmp_path, index_path)
+    _index_flags.cache_clear()
+    logger.info(f"[CAR] Índice construído: {total} imóveis")
+    return True
+
+
+def ensure_car_index(background: bool = True) -> bool:
+    """Garante o índice; se precisar construir, faz isso em segundo plano.
+
+    Retorna True se o índice já está pronto para uso.
+    """
+    global _build_thread, _index_verificado
+    gpkg_path, index_path = _config_paths()
+    if not gpkg_path.exists():
+        return False
+    gpkg_fp = _fingerprint(gpkg_path)
+    versoes = (gpkg_fp, _fingerprint(index_path)) if index_path.exists() else None
+    if versoes is not None and versoes == _index_verificado:
+        return True
+    if _index_is_current(index_path, gpkg_fp):
+        if _index_verificado is None:
+            # Primeira conferência no processo: sobras de construções interrompidas
+            try:
+                with _trava_construcao(index_path, esperar=False) as obtida:
+                    if obtida:
+                        _remover_temporarios(index_path)
+            except OSError:
+                pass  # diretório somente leitura: nada a limpar
+        _index_verificado = versoes
+        return True
+    if not background:
+        return build_car_index()
+
+    with _build_lock:
+        if _build_thread is None or not _build_thread.is_alive():
+
+            def _run():
+                try:
+                    # Outro processo construindo: este só volta a conferir depois
+                    build_car_index(esperar=False)
+                except Exception as e:
+                    logger.error(f"[CAR] Falha ao construir índice: {e}")
+
+            _build_thread = threading.Thread(
+                target=_run, name="car-index-build", daemon=True
+            )
+            _build_thread.start()
+    return False
+
+
+@lru_cache(maxsize=1)
+def _index_flags() -> dict:
+    _, index_path = _config_paths()
+    con = _connect_ro(index_path)
+    try:
+        return dict(con.execute("SELECT chave, valor FROM car_meta").fetchall())
+    finally:
+        con.close()
+
+
+# ------------------------------------------------------------------------------
+# Consultas
+# ------------------------------------------------------------------------------
+def _proximo_prefixo(prefixo: str) -> str:
+    """Menor string maior que todas as que começam com `prefixo`."""
+    return prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+
+
+def buscar_codigos(query: str, limit: int = 10):
+    """Busca imóveis por código: prefixo (B-tree) e, se faltar, trecho (FTS5).
+
+    Retorna lista de (fid, cod_imovel). Usa o índice auxiliar quando pronto;
+    caso contrário, varre o GPKG (comportamento antigo) enquanto o índice é
+    construído em segundo plano.
+    """
+    q = normalizar_codigo(query)
+    if not q:
+        return []
+
+    if not ensure_car_index():
+        return _buscar_codigos_gpkg(q, limit)
+
+    _, index_path = _config_paths()
+    with _pooled(index_path) as con:
+        encontrados = con.execute(
+            "SELECT fid, cod_imovel FROM car_codigos "
+            "WHERE cod_norm >= ? AND cod_norm < ? ORDER BY cod_norm LIMIT ?",
+            (q, _proximo_prefixo(q), limit),
+        ).fetchall()
+
+        faltam = limit - len(encontrados)
+        if faltam > 0:
+            vistos = {fid for fid, _ in encontrados}
+            if _index_flags().get("fts_trigram") == "1" and len(q) >= 3:
+                rows = con.execute(
+                    "SELECT c.fid, c.cod_imovel FROM car_codigos_fts f "
+                    "JOIN car_codigos c ON c.fid = f.rowid "
+                    "WHERE car_codigos_fts MATCH ? LIMIT ?",
+                    (f'"{q}"', limit + len(vistos)),
+                ).fetchall()
+            else:
+                rows = con.execute(
+                    "SELECT fid, cod_imovel FROM car_codigos "
+                    "WHERE instr(cod_norm, ?) > 0 LIMIT ?",
+                    (q, limit + len(vistos)),
+                ).fetchall()
+            encontrados.extend(r for r in rows if r[0] not in vistos)
+    return encontrados[:limit]
+
+
+def _buscar_codigos_gpkg(q: str, limit: int):
+    """Varredura direta no GPKG (usada só enquanto o índice não existe)."""
+    gpkg_path, _ = _config_paths()
+    info = car_layer_info()
+    with _pooled(gpkg_path) as con:
+        return con.execute(
+            f'SELECT "{info["fid_col"]}", cod_imovel FROM "{info["table"]}" '
+            "WHERE instr(normalizar_codigo(cod_imovel), ?) > 0 LIMIT ?",
+            (q, limit),
+        ).fetchall()
+
+
+def carregar_feicoes(fids, com_geometria: bool = True):
+    """Lê atributos (e geometrias WGS84) das feições pelos fids.
+
+    Retorna (lista de dicts de atributos, ndarray de geometrias ou None),
+    na mesma ordem de `fids` (fids inexistentes são omitidos).
+    """
+    fids = [int(f) for f in fids]
+    if not fids:
+        return [], (np.empty(0, dtype=object) if com_geometria else None)
+
+    gpkg_path, _ = _config_paths()
+    info = car_layer_info()
+    colunas = [info["fid_col"]] + info["atributos"]
+    if com_geometria:
+        colunas.append(info["geom_col"])
+    sel = ", ".join(f'"{c}"' for c in colunas)
+
+    with _pooled(gpkg_path) as con:
+        por_fid = {}
+        # Lotes abaixo do limite de parâmetros do SQLite
+        for i in range(0, len(fids), 900):
+            lote = fids[i : i + 900]
+            marcadores = ",".join("?" * len(lote))
+            for row in con.execute(
+                f'SELECT {sel} FROM "{info["table"]}" '
+                f'WHERE "{info["fid_col"]}" IN ({marcadores})',
+                lote,
+            ):
+                por_fid[row[0]] = row
+
+    rows = [por_fid[f] for f in fids if f in por_fid]
+    n_attr = len(info["atributos"])
+    atributos = [dict(zip(info["atributos"], r[1 : 1 + n_attr])) for r in rows]
+
+    geoms = None
+    if com_geometria:
+        geoms = to_wgs84(decode_geometries([r[-1] for r in rows]), info["crs"])
+    return atributos, geoms
+
+
+def fids_por_codigos(codigos):
+    """Resolve códigos CAR exatos em fids, em lotes (B-tree do índice).
+
+    Retorna {código normalizado: (fid, cod_imovel)}; códigos não encontrados
+    ficam de fora. Sem índice pronto, consulta o GPKG diretamente.
+    """
+    normalizados = list(dict.fromkeys(c for c in map(normalizar_codigo, codigos) if c))
+    if not normalizados:
+        return {}
+
+    gpkg_path, index_path = _config_paths()
+    if ensure_car_index():
+        path = index_path
+        sql = "SELECT cod_norm, fid, cod_imovel FROM car_codigos WHERE cod_norm IN ({})"
+    else:
+        info = car_layer_info()
+        path = gpkg_path
+        sql = (
+            "SELECT normalizar_codigo(cod_imovel) AS n, "
+            f'"{info["fid_col"]}", cod_imovel FROM "{info["table"]}" '
+            "WHERE n IN ({})"
+        )
+
+    encontrados = {}
+    with _pooled(path) as con:
+        for i in range(0, len(normalizados), 900):
+            lote = normalizados[i : i + 900]
+            for cod_norm, fid, cod in con.execute(
+                sql.format(",".join("?" * len(lote))), lote
+            ):
+                encontrados.setdefault(cod_norm, (fid, cod))
+    return encontrados
+
+
+def buscar_por_ponto(lon: float, lat: float):
+    """Imóveis que contêm o ponto (WGS84), em resposta leve.
+
+    Filtra candidatos pela R-tree do GPKG (envelope) e confirma com o teste
+    exato ponto-no-polígono. Retorna dicts com fid, cod_imovel, centróide
+    [lat, lon] e bbox [oeste, sul, leste, norte] em WGS84 — a geometria
+    completa é obtida depois, sob demanda, via `carregar_feicoes`.
+    """
+    import shapely
+
+    gpkg_path, _ = _config_paths()
+    info = car_layer_info()
+    if info["rtree"] is None:
+        raise ValueError("GPKG do CAR sem índice espacial (R-tree)")
+
+    x, y = lon, lat
+    if info["crs"] != "EPSG:4326":
+        x, y = _transformer_from_wgs84(info["crs"]).transform(lon, lat)
+
+    with _pooled(gpkg_path) as con:
+        rows = con.execute(
+            f'SELECT t."{info["fid_col"]}", t.cod_imovel, t."{info["geom_col"]}" '
+            f'FROM "{info["rtree"]}" r JOIN "{info["table"]}" t '
+            f'ON t."{info["fid_col"]}" = r.id '
+            "WHERE r.minx <= ? AND r.maxx >= ? AND r.miny <= ? AND r.maxy >= ?",
+            (x, x, y, y),
+        ).fetchall()
+    if not rows:
+        return []
+
+    geoms = decode_geometries([r[2] for r in rows])
+    dentro = shapely.contains_xy(geoms, x, y)
+    if not dentro.any():
+        return []
+
+    geoms = to_wgs84(geoms[dentro], info["crs"])
+    centroides = shapely.centroid(geoms)
+    bounds = shapely.bounds(geoms)
+    selecionados = [r for r, ok in zip(rows, dentro) if ok]
+    return [
+        {
+            "fid": int(r[0]),
+            "cod_imovel": str(r[1] or ""),
+            "centroid": [float(shapely.get_y(c)), float(shapely.get_x(c))],
+            "bbox": [round(float(v), 7) for v in b],
+        }
+        for r, c, b in zip(selecionados, centroides, bounds)
+    ]
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.path.insert(0, str(_BASE_DIR))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    t0 = time.time()
+    ok = build_car_index(force="--force" in sys.argv)
+    print(f"Índice {'pronto' if ok else 'NÃO construído'} em {time.time() - t0:.1f}s")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,487 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Pré-cálculo das análises por imóvel do CAR
+=====================================================
+Tabela SQLite (`CAR_ANALISES_PATH`) com os registros de lote já calculados
+para cada imóvel do GPKG do CAR, indexada por código do imóvel:
+
+  - car_imoveis  → cod_norm → hash da geometria + área do imóvel (ha)
+  - car_analises → (cod_norm, análise, versão dos dados) → registros
+  - car_respostas → chave da memoização → resposta completa de polígono
+    único (opcional, `--respostas`)
+
+A versão de cada análise é derivada do arquivo de dados usado (caminho +
+tamanho + mtime), então uma atualização de raster/shapefile invalida apenas
+as linhas daquela análise. O hash da geometria garante que só polígonos
+idênticos ao do CAR sejam atendidos pela tabela; geometrias editadas ou
+próprias seguem para o cálculo ao vivo.
+
+Os registros de lote (as linhas da planilha) atendem as rotas de lote —
+/analisar-lote-completo (polígonos com `cod_imovel`) e /analisar-lote-car.
+As rotas de polígono único (/analisar*, /analisar-todos) devolvem imagens,
+GeoJSON e relatórios: com `--respostas`, o job grava também essas
+respostas (com os PNGs), sob a mesma chave da memoização por geometria
+(server/result_cache.py: hash da geometria, parâmetros e versões dos
+dados), e `_analise_memorizada` a consulta quando não há resposta
+memorizada. Os parâmetros são os da interface web (mosaico escolhido,
+valoração desligada); outros seguem para o cálculo ao vivo.
+
+O preenchimento é um processo offline, retomável:
+
+    python -m server.car_precompute --analises uso_solo,declividade --workers 4
+    python -m server.car_precompute --respostas --uf MT
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from pathlib import Path
+
+logger = logging.getLogger("lulc-analyzer")
+
+_BASE_DIR = Path(__file__).parent.parent
+
+# Análises de lote suportadas pela tabela (mesmos nomes de /analisar-lote-completo)
+ANALISES_PRECOMPUTAVEIS = (
+    "uso_solo",
+    "declividade",
+    "aptidao",
+    "soloTextural",
+    "koppen",
+    "embargo",
+    "icmbio",
+    "prodes",
+    "eudr",
+    "solos",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS car_imoveis (
+    cod_norm TEXT PRIMARY KEY,
+    geom_hash TEXT NOT NULL,
+    area_ha REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS car_analises (
+    cod_norm TEXT NOT NULL,
+    analise TEXT NOT NULL,
+    versao TEXT NOT NULL,
+    geom_hash TEXT NOT NULL,
+    tem_resultado INTEGER NOT NULL,
+    registros BLOB NOT NULL,
+    PRIMARY KEY (cod_norm, analise, versao)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS car_respostas (
+    chave TEXT PRIMARY KEY,
+    cod_norm TEXT NOT NULL,
+    resposta BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _store_path() -> Path:
+    from config import CAR_ANALISES_PATH
+
+    return Path(CAR_ANALISES_PATH)
+
+
+def versao_dados(caminho) -> str:
+    """Versão curta de um arquivo de dados (caminho + tamanho + mtime)."""
+    from .image_cache import raster_fingerprint
+
+    return hashlib.sha1(raster_fingerprint(caminho).encode("utf-8")).hexdigest()[:16]
+
+
+def versoes_analises(caminhos: dict, analises) -> dict:
+    """{análise: versão} para as análises pedidas que têm arquivo de dados."""
+    return {
+        a: versao_dados(caminhos[a])
+        for a in analises
+        if a in caminhos and os.path.exists(caminhos[a])
+    }
+
+
+def hash_imovel(geom, crs) -> str:
+    """Hash canônico da geometria no CRS de referência do CAR (EPSG:4674)."""
+    from .geo_utils import _geometry_hash
+
+    if crs is not None and str(crs).upper() not in ("EPSG:4674",):
+        import geopandas as gpd
+
+        geom = gpd.GeoSeries([geom], crs=crs).to_crs("EPSG:4674").iloc[0]
+    return _geometry_hash(geom)
+
+
+def _empacotar(registros) -> bytes:
+    return zlib.compress(json.dumps(registros, ensure_ascii=False).encode("utf-8"))
+
+
+def _desempacotar(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class CarAnalysisStore:
+    """Leitura (pool somente leitura) e gravação da tabela de pré-cálculo."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def consultar(self, cod_imovel, geom_hash: str, versoes: dict):
+        """Registros pré-calculados de um imóvel para as versões informadas.
+
+        Retorna (área_ha ou None, {análise: [registros]}, {análises com
+        resultado}); análises ausentes, de outra versão ou de geometria
+        diferente simplesmente não aparecem no dicionário.
+        """
+        from .car_index import _pooled, normalizar_codigo
+
+        cod_norm = normalizar_codigo(cod_imovel)
+        if not cod_norm or not versoes:
+            return None, {}, set()
+
+        with _pooled(self.path) as con:
+            imovel = con.execute(
+                "SELECT geom_hash, area_ha FROM car_imoveis WHERE cod_norm = ?",
+                (cod_norm,),
+            ).fetchone()
+            if imovel is None or imovel[0] != geom_hash:
+                return None, {}, set()
+            linhas = con.execute(
+                "SELECT analise, versao, geom_hash, tem_resultado, registros "
+                "FROM car_analises WHERE cod_norm = ?",
+                (cod_norm,),
+            ).fetchall()
+
+        resultado, tem_resultado = {}, set()
+        for analise, versao, g_hash, tem, blob in linhas:
+            if versoes.get(analise) != versao or g_hash != geom_hash:
+                continue
+            resultado[analise] = _desempacotar(blob)
+            if tem:
+                tem_resultado.add(analise)
+        return imovel[1], resultado, tem_resultado
+
+    def consultar_resposta(self, chave: str):
+        """Resposta de polígono único gravada para a chave da memoização, ou None."""
+        from .car_index import _pooled
+
+        try:
+            with _pooled(self.path) as con:
+                linha = con.execute(
+                    "SELECT resposta FROM car_respostas WHERE chave = ?", (chave,)
+                ).fetchone()
+        except sqlite3.OperationalError:
+            # Tabela gerada antes de car_respostas existir
+            return None
+        return _desempacotar(linha[0]) if linha else None
+
+    def conectar_escrita(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(str(self.path), timeout=60)
+        con.execute("PRAGMA journal_mode = WAL")
+        con.execute("PRAGMA synchronous = NORMAL")
+        con.executescript(_SCHEMA)
+        return con
+
+
+_store_cache = {}
+
+
+def obter_store():
+    """Tabela de pré-cálculo configurada, ou None se ainda não foi gerada."""
+    path = _store_path()
+    if not path.exists():
+        return None
+    store = _store_cache.get(path)
+    if store is None:
+        store = _store_cache[path] = CarAnalysisStore(path)
+    return store
+
+
+# ------------------------------------------------------------------------------
+# Job offline
+# ------------------------------------------------------------------------------
+_worker = {}
+
+
+def planos_respostas(servidor, analises, raster_type) -> dict:
+    """{tipo: plano} das rotas de polígono único para as análises de lote pedidas.
+
+    Usa os parâmetros da interface web (mosaico `raster_type`, valoração
+    desligada); análises sem rota própria (eudr) ou sem dados ficam de fora.
+    """
+    tipos, _ = servidor._analises_solicitadas(",".join(analises))
+    form = {"raster_type": raster_type, "enable_valoracao": "false"}
+    planos = {}
+    for tipo in tipos:
+        plano = servidor._plano_analise(tipo, form)
+        if "erro" not in plano:
+            planos[tipo] = plano
+    return planos
+
+
+def _init_worker(analises, raster_type, respostas=False):
+    """Inicializa um processo de cálculo: importa o servidor e abre as fontes."""
+    sys.path.insert(0, str(_BASE_DIR))
+    logging.getLogger("lulc-analyzer").setLevel(logging.WARNING)
+    from server import servidor
+
+    _worker["servidor"] = servidor
+    _worker["analises"] = list(analises)
+    _worker["fontes"] = servidor._abrir_fontes_lote(analises, raster_type)
+    _worker["versoes"] = versoes_analises(
+        servidor._caminhos_fontes_lote(raster_type), analises
+    )
+    _worker["planos"] = (
+        planos_respostas(servidor, analises, raster_type) if respostas else {}
+    )
+
+
+def _respostas_imovel(servidor, planos, gdf_imovel, cod_norm, g_hash):
+    """Linhas de car_respostas de um imóvel (só respostas com sucesso)."""
+    from .result_cache import chave_resultado
+
+    linhas = []
+    for tipo, plano in planos.items():
+        try:
+            result = plano["funcao"](gdf_imovel, *plano["args"])
+        except Exception as e:
+            logger.warning(f"[CAR pré-cálculo] {tipo} de {cod_norm}: {e}")
+            continue
+        if not isinstance(result, dict) or result.get("status") != "sucesso":
+            continue
+        chave = chave_resultado(tipo, g_hash, plano["params"], plano["arquivos"])
+        guardado = servidor._para_memorizar(result, manter_imagens=True)
+        linhas.append((chave, cod_norm, _empacotar(guardado)))
+    return linhas
+
+
+def _processar_lote(fids):
+    """Calcula as análises de um bloco de imóveis; devolve linhas para gravar."""
+    import geopandas as gpd
+    from rasterio.crs import CRS
+
+    from .car_index import carregar_feicoes, normalizar_codigo
+
+    servidor = _worker["servidor"]
+    fontes = _worker["fontes"]
+    versoes = _worker["versoes"]
+    analises = [a for a in _worker["analises"] if a in versoes]
+
+    atributos, geoms = carregar_feicoes(fids)
+    if not atributos:
+        return [], [], []
+    gdf = gpd.GeoDataFrame(atributos, geometry=geoms, crs="EPSG:4326")
+
+    src_uso = fontes.get("uso_solo")
+    ref_crs = src_uso.crs if src_uso and src_uso.crs else CRS.from_epsg(4674)
+    gdf_proj, _ = servidor._convert_gdf_to_raster_crs(gdf, ref_crs)
+
+    imoveis, linhas, respostas = [], [], []
+    for i, row in gdf_proj.iterrows():
+        geom = row.geometry
+        cod = row.get("cod_imovel")
+        if geom is None or geom.is_empty or not cod:
+            continue
+        cod_norm = normalizar_codigo(cod)
+        single_gdf = gpd.GeoDataFrame([row], crs=gdf_proj.crs)
+        area_ha = servidor._polygon_area_ha(single_gdf, ref_crs)
+        g_hash = hash_imovel(geom, gdf_proj.crs)
+
+        resultado, tem_resultado = servidor._analisar_poligono_lote(
+            single_gdf, area_ha, analises, fontes, rotulo=cod
+        )
+        imoveis.append((cod_norm, g_hash, float(area_ha)))
+        for analise, registros in resultado.items():
+            linhas.append(
+                (
+                    cod_norm,
+                    analise,
+                    versoes[analise],
+                    g_hash,
+                    int(analise in tem_resultado),
+                    _empacotar(registros),
+                )
+            )
+        if _worker["planos"]:
+            # Como num upload: o polígono no CRS do GPKG
+            respostas.extend(
+                _respostas_imovel(servidor, _worker["planos"], gdf.loc[[i]], cod_norm, g_hash)
+            )
+    return imoveis, linhas, respostas
+
+
+def _fids_pendentes(analises, versoes, forcar=False, uf=None, limite=None, planos=None):
+    """fids do GPKG cujo pré-cálculo ainda falta para alguma análise.
+
+    Com `planos` (`--respostas`), também os imóveis sem a resposta de
+    polígono único de algum tipo (chave conferida pelo hash da geometria).
+    """
+    from .car_index import _pooled, car_layer_info, normalizar_codigo
+    from config import CAR_GPKG_PATH
+
+    info = car_layer_info()
+    sql = f'SELECT "{info["fid_col"]}", cod_imovel FROM "{info["table"]}"'
+    params = []
+    if uf:
+        sql += " WHERE cod_imovel LIKE ?"
+        params.append(f"{uf.upper()}-%")
+    sql += f' ORDER BY "{info["fid_col"]}"'
+
+    with _pooled(Path(CAR_GPKG_PATH)) as con:
+        todos = con.execute(sql, params).fetchall()
+
+    feitos = {}
+    store_path = _store_path()
+    if not forcar and store_path.exists():
+        con = sqlite3.connect(str(store_path))
+        try:
+            for cod_norm, analise, versao in con.execute(
+                "SELECT cod_norm, analise, versao FROM car_analises"
+            ):
+                if versoes.get(analise) == versao:
+                    feitos[cod_norm] = feitos.get(cod_norm, 0) + 1
+            if planos:
+                _descontar_sem_resposta(con, feitos, planos)
+        finally:
+            con.close()
+
+    pendentes = [
+        fid
+        for fid, cod in todos
+        if cod and feitos.get(normalizar_codigo(cod), 0) < len(versoes)
+    ]
+    return pendentes[:limite] if limite else pendentes
+
+
+def _descontar_sem_resposta(con, feitos, planos):
+    """Zera em `feitos` os imóveis sem alguma resposta de polígono único."""
+    from .result_cache import chave_resultado
+
+    chaves = {chave for (chave,) in con.execute("SELECT chave FROM car_respostas")}
+    for cod_norm, g_hash in con.execute("SELECT cod_norm, geom_hash FROM car_imoveis"):
+        if cod_norm in feitos and any(
+            chave_resultado(tipo, g_hash, plano["params"], plano["arquivos"]) not in chaves
+            for tipo, plano in planos.items()
+        ):
+            feitos[cod_norm] = 0
+
+
+def precomputar(
+    analises=ANALISES_PRECOMPUTAVEIS,
+    raster_type="com_mosaico",
+    workers=1,
+    tamanho_lote=200,
+    forcar=False,
+    uf=None,
+    limite=None,
+    respostas=False,
+):
+    """Preenche a tabela para todos os imóveis do CAR (retomável).
+
+    `respostas`: grava também as respostas de polígono único (car_respostas).
+    """
+    from multiprocessing import Pool
+
+    sys.path.insert(0, str(_BASE_DIR))
+    from server import servidor
+
+    versoes = versoes_analises(servidor._caminhos_fontes_lote(raster_type), analises)
+    if not versoes:
+        logger.warning("[CAR pré-cálculo] Nenhum arquivo de dados disponível")
+        return 0
+
+    planos = planos_respostas(servidor, versoes, raster_type) if respostas else {}
+    store = CarAnalysisStore(_store_path())
+    con = store.conectar_escrita()  # cria as tabelas que faltarem
+    fids = _fids_pendentes(
+        versoes.keys(), versoes, forcar=forcar, uf=uf, limite=limite, planos=planos
+    )
+    total = len(fids)
+    logger.info(
+        f"[CAR pré-cálculo] {total} imóveis pendentes; análises: {', '.join(versoes)}"
+        + (f"; respostas: {', '.join(planos)}" if planos else "")
+    )
+    if not total:
+        con.close()
+        return 0
+
+    blocos = [fids[i : i + tamanho_lote] for i in range(0, total, tamanho_lote)]
+    feitos = 0
+    t0 = time.time()
+    try:
+        with Pool(
+            processes=max(1, int(workers)),
+            initializer=_init_worker,
+            initargs=(list(versoes), raster_type, bool(planos)),
+        ) as pool:
+            for imoveis, linhas, resps in pool.imap_unordered(_processar_lote, blocos):
+                with con:
+                    con.executemany(
+                        "INSERT OR REPLACE INTO car_imoveis VALUES (?, ?, ?)", imoveis
+                    )
+                    con.executemany(
+                        "INSERT OR REPLACE INTO car_analises VALUES (?, ?, ?, ?, ?, ?)",
+                        linhas,
+                    )
+                    con.executemany(
+                        "INSERT OR REPLACE INTO car_respostas VALUES (?, ?, ?)", resps
+                    )
+                feitos += len(imoveis)
+                taxa = feitos / max(time.time() - t0, 1e-6)
+                logger.info(
+                    f"[CAR pré-cálculo] {feitos}/{total} imóveis ({taxa:.1f}/s)"
+                )
+        # Arquivo final sem WAL: leitores somente leitura não precisam do -shm
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        con.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        con.close()
+    return feitos
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(_BASE_DIR))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Pré-cálculo das análises por imóvel do CAR")
+    parser.add_argument(
+        "--analises",
+        default=",".join(ANALISES_PRECOMPUTAVEIS),
+        help="lista separada por vírgulas (padrão: todas)",
+    )
+    parser.add_argument("--raster-type", default="com_mosaico")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--lote", type=int, default=200, help="imóveis por bloco")
+    parser.add_argument("--uf", default=None, help="restringe a uma UF (prefixo do código)")
+    parser.add_argument("--limite", type=int, default=None)
+    parser.add_argument("--forcar", action="store_true", help="recalcula mesmo o que já existe")
+    parser.add_argument(
+        "--respostas",
+        action="store_true",
+        help="grava também as respostas das rotas de polígono único (/analisar*)",
+    )
+    args = parser.parse_args()
+
+    analises = [a.strip() for a in args.analises.split(",") if a.strip()]
+    invalidas = sorted(set(analises) - set(ANALISES_PRECOMPUTAVEIS))
+    if invalidas:
+        parser.error(f"análises inválidas: {', '.join(invalidas)}")
+
+    t0 = time.time()
+    n = precomputar(
+        analises,
+        raster_type=args.raster_type,
+        workers=args.workers,
+        tamanho_lote=args.lote,
+        forcar=args.forcar,
+        uf=args.uf,
+        limite=args.limite,
+        respostas=args.respostas,
+    )
+    print(f"{n} imóveis pré-calculados em {time.time() - t0:.1f}s")
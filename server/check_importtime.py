@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Verificação do tempo de importação
+============================================
+Mede `python -X importtime` dos módulos do servidor e falha (código 1) se:
+
+  - o tempo acumulado passar do orçamento (`--orcamento-ms`);
+  - alguma biblioteca pesada (pandas, geopandas, rasterio, fiona, pyproj,
+    PIL) for carregada só pelo import — elas devem ser importadas dentro
+    das funções que as usam.
+
+Uso:
+
+    python -m server.check_importtime
+    python -m server.check_importtime --orcamento-ms 150 --repeticoes 5 server.servidor
+
+Cada medição roda num processo novo; vale o menor tempo das repetições
+(o primeiro import costuma pagar o cache de disco frio). Roda no CI a cada
+push/pull request que altere o servidor (.github/workflows/importtime.yml).
+"""
+
+import argparse
+import subprocess
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+_BASE_DIR = Path(__file__).parent.parent
+
+MODULOS_PADRAO = ("server.servidor", "server.car_index", "server.car_precompute", "config")
+
+BIBLIOTECAS_PESADAS = ("pandas", "geopandas", "rasterio", "fiona", "pyproj", "PIL")
+
+ORCAMENTO_PADRAO_MS = 200
+
+
+def _importtime(codigo: str):
+    """Linhas (acumulado_us, profundidade, nome) de `python -X importtime -c codigo`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=str(_BASE_DIR),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"falha ao executar {codigo!r}:\n{proc.stderr[-2000:]}")
+
+    linhas = []
+    for linha in proc.stderr.splitlines():
+        if not linha.startswith("import time:"):
+            continue
+        partes = linha[len("import time:"):].split("|")
+        if len(partes) != 3 or not partes[1].strip().isdigit():
+            continue
+        nome_bruto = partes[2].rstrip()
+        nome = nome_bruto.strip()
+        profundidade = (len(nome_bruto) - len(nome_bruto.lstrip())) // 2
+        linhas.append((int(partes[1]), profundidade, nome))
+    return linhas
+
+
+@lru_cache(maxsize=1)
+def _modulos_inicializacao() -> frozenset:
+    """Módulos que o interpretador já carrega antes do import medido (site, .pth…)."""
+    return frozenset(nome for _, _, nome in _importtime("pass"))
+
+
+def medir(modulo: str):
+    """(tempo acumulado em ms, [(acumulado_us, nome)] dos imports diretos, pacotes carregados)."""
+    inicializacao = _modulos_inicializacao()
+    total_us = 0
+    diretos = []
+    carregados = set()
+    for acumulado, profundidade, nome in _importtime(f"import {modulo}"):
+        if nome in inicializacao:
+            continue
+        carregados.add(nome.split(".")[0])
+        if nome == modulo:
+            total_us = acumulado
+        elif profundidade <= 1:
+            diretos.append((acumulado, nome))
+    return total_us / 1000, sorted(diretos, reverse=True), carregados
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Orçamento de tempo de importação do servidor")
+    parser.add_argument("modulos", nargs="*", default=list(MODULOS_PADRAO))
+    parser.add_argument("--orcamento-ms", type=float, default=ORCAMENTO_PADRAO_MS)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="imports mais caros exibidos")
+    args = parser.parse_args(argv)
+
+    falhas = 0
+    for modulo in args.modulos:
+        medicoes = [medir(modulo) for _ in range(max(1, args.repeticoes))]
+        total_ms, diretos, carregados = min(medicoes, key=lambda m: m[0])
+        pesadas = sorted(set(BIBLIOTECAS_PESADAS) & carregados)
+
+        ok = total_ms <= args.orcamento_ms and not pesadas
+        falhas += not ok
+        print(f"{'OK   ' if ok else 'FALHA'} {modulo}: {total_ms:.1f} ms (orçamento {args.orcamento_ms:.0f} ms)")
+        if pesadas:
+            print(f"      bibliotecas pesadas carregadas no import: {', '.join(pesadas)}")
+        for acumulado, nome in diretos[: args.top]:
+            print(f"      {acumulado / 1000:8.1f} ms  {nome}")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,18 +6,24 @@ Leitura unificada de KML, KMZ, Shapefile e GeoJSON.
 Fornece `parse_upload_file()` como ponto de entrada genérico.
 """
 
+from __future__ import annotations
+
 import os
 import json
 import logging
 import zipfile
+from io import StringIO
 from pathlib import Path
 from tempfile import NamedTemporaryFile, TemporaryDirectory
+from typing import TYPE_CHECKING
 
-import pandas as pd
-import geopandas as gpd
-import fiona
 from shapely.validation import make_valid
 
+from .tracing import medido
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
 logger = logging.getLogger("lulc-analyzer")
 
 
@@ -37,6 +43,9 @@ def _allowed_file(filename: str | None) -> bool:
 # KML (manual + fallbacks)
 # ------------------------------------------------------------------------------
 def _parse_kml_manually(kml_path: str) -> gpd.GeoDataFrame:
+    import pandas as pd
+    import geopandas as gpd
+    import fiona
     try:
         import xml.etree.ElementTree as ET
         from shapely.geometry import Polygon
@@ -192,6 +201,7 @@ def _process_shapefile(input_file) -> gpd.GeoDataFrame:
     Aceita tanto arquivo .shp individual (requer arquivos auxiliares)
     quanto arquivo .zip contendo todos os arquivos do shapefile.
     """
+    import geopandas as gpd
     try:
         os.environ["SHAPE_RESTORE_SHX"] = "YES"
         filename = getattr(input_file, "filename", "") or ""
@@ -273,6 +283,7 @@ def _process_shapefile(input_file) -> gpd.GeoDataFrame:
 # ------------------------------------------------------------------------------
 def _process_geojson(input_file) -> gpd.GeoDataFrame:
     """Processa arquivo GeoJSON e retorna GeoDataFrame ou tupla de erro."""
+    import geopandas as gpd
     try:
         input_file.seek(0)
     except Exception:
@@ -317,6 +328,8 @@ def _process_geojson(input_file) -> gpd.GeoDataFrame:
 # ------------------------------------------------------------------------------
 def _process_gpkg(input_file) -> gpd.GeoDataFrame:
     """Processa arquivo GeoPackage e retorna GeoDataFrame."""
+    import geopandas as gpd
+    import fiona
     filename = getattr(input_file, "filename", "temp.gpkg") or "temp.gpkg"
     try:
         with TemporaryDirectory() as tmpdir:
@@ -366,9 +379,80 @@ def _process_gpkg(input_file) -> gpd.GeoDataFrame:
         raise ValueError(f"Não foi possível processar o Geopackage: {str(e)}")
 
 
+# ------------------------------------------------------------------------------
+# CSV de pontos (latitude/longitude)
+# ------------------------------------------------------------------------------
+_COLUNAS_LAT = ("lat", "latitude", "y")
+_COLUNAS_LON = ("lon", "lng", "long", "longitude", "x")
+_COLUNAS_RAIO = ("raio_m", "raio", "radius_m", "radius")
+
+
+def _coluna_csv(colunas: dict, nomes):
+    for nome in nomes:
+        if nome in colunas:
+            return colunas[nome]
+    return None
+
+
+def parse_pontos_csv(input_file, raio_m: float = 0.0) -> gpd.GeoDataFrame:
+    """Lê um CSV de pontos (colunas lat/lon) e retorna GeoDataFrame EPSG:4326.
+
+    Aceita `,` ou `;` como separador e vírgula decimal. A coluna `raio_m`
+    (opcional) dá o raio de cada ponto, em metros; sem ela vale `raio_m`.
+    Linhas com coordenadas inválidas são mantidas com geometria nula,
+    para que a resposta tenha uma linha por linha do arquivo.
+    """
+    import geopandas as gpd
+    import numpy as np
+    import pandas as pd
+
+    try:
+        input_file.seek(0)
+    except Exception:
+        pass
+    conteudo = input_file.read()
+    if isinstance(conteudo, bytes):
+        conteudo = conteudo.decode("utf-8-sig", errors="replace")
+
+    df = pd.read_csv(StringIO(conteudo), sep=None, engine="python", dtype=str)
+    colunas = {str(c).strip().lower(): c for c in df.columns}
+    col_lat = _coluna_csv(colunas, _COLUNAS_LAT)
+    col_lon = _coluna_csv(colunas, _COLUNAS_LON)
+    if col_lat is None or col_lon is None:
+        raise ValueError(
+            "CSV sem colunas de coordenadas: use 'lat' e 'lon' (ou 'latitude' e 'longitude')"
+        )
+
+    def _numero(serie):
+        return pd.to_numeric(
+            serie.astype(str).str.strip().str.replace(",", ".", regex=False),
+            errors="coerce",
+        ).to_numpy()
+
+    lat = _numero(df[col_lat])
+    lon = _numero(df[col_lon])
+    validos = (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+
+    col_raio = _coluna_csv(colunas, _COLUNAS_RAIO)
+    raios = _numero(df[col_raio]) if col_raio is not None else np.full(len(df), np.nan)
+    df["raio_m"] = np.where(np.isnan(raios), float(raio_m), raios)
+
+    geometria = gpd.points_from_xy(lon, lat)
+    geometria[~validos] = None
+    gdf = gpd.GeoDataFrame(df, geometry=geometria, crs="EPSG:4326")
+
+    invalidos = int((~validos).sum())
+    logger.info(
+        f"CSV de pontos carregado: {len(gdf)} linha(s)"
+        + (f", {invalidos} com coordenadas inválidas" if invalidos else "")
+    )
+    return gdf
+
+
 # ------------------------------------------------------------------------------
 # Dispatcher genérico
 # ------------------------------------------------------------------------------
+@medido("parse")
 def parse_upload_file(input_file):
     """Detecta formato do arquivo enviado e retorna um GeoDataFrame.
 
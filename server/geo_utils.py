@@ -6,30 +6,28 @@ Funções para CRS, áreas, leitura COG otimizada, estatísticas fracionais
 e geração de imagem visual de classes.
 """
 
+from __future__ import annotations
+
 import logging
 import base64
 from io import BytesIO
+from typing import TYPE_CHECKING
 
 import numpy as np
-import pandas as pd
-import geopandas as gpd
-
-import rasterio
-from rasterio.windows import from_bounds
-from rasterio.features import rasterize
-from rasterio.transform import xy
-from rasterio.crs import CRS
-from rasterio.enums import Resampling
 
 from shapely.geometry import box, Polygon
 from shapely.geometry.base import BaseGeometry
 from shapely.ops import unary_union, transform as shapely_transform
 from shapely.validation import make_valid
 
-from pyproj import Transformer
-
-from PIL import Image
+# pandas, geopandas, rasterio, pyproj e PIL são importados dentro das funções:
+# importar o módulo (servidor, CLIs) não paga o custo dessas bibliotecas.
+if TYPE_CHECKING:
+    import geopandas as gpd
+    import rasterio
+    from rasterio.crs import CRS
 
+from .tracing import medido, span
 from .utils import _format_area_ha
 
 logger = logging.getLogger("lulc-analyzer")
@@ -47,6 +45,8 @@ def _calc_utm_epsg(lon: float, lat: float) -> int:
 # Área do pixel
 # ------------------------------------------------------------------------------
 def _pixel_area_ha(src: rasterio.io.DatasetReader) -> float:
+    from rasterio.transform import xy
+    from pyproj import Transformer
     try:
         if src.crs and src.crs.is_geographic:
             bounds = src.bounds
@@ -76,6 +76,7 @@ def _pixel_area_ha(src: rasterio.io.DatasetReader) -> float:
 # ------------------------------------------------------------------------------
 # Conversão de CRS do GeoDataFrame para o CRS do raster
 # ------------------------------------------------------------------------------
+@medido("crs")
 def _convert_gdf_to_raster_crs(gdf: gpd.GeoDataFrame, tiff_crs: CRS):
     crs_info = {
         "kml_crs_original": str(gdf.crs) if gdf.crs else "Não definido",
@@ -123,6 +124,7 @@ def _convert_gdf_to_raster_crs(gdf: gpd.GeoDataFrame, tiff_crs: CRS):
 # ------------------------------------------------------------------------------
 # Cálculo de área do polígono
 # ------------------------------------------------------------------------------
+@medido("area")
 def _polygon_area_ha(gdf: gpd.GeoDataFrame, crs: CRS) -> float:
     if gdf is None or gdf.empty:
         return 0.0
@@ -137,9 +139,53 @@ def _polygon_area_ha(gdf: gpd.GeoDataFrame, crs: CRS) -> float:
     return float(area_m2 / 10000.0)
 
 
+def _por_zona_utm(geoms: gpd.GeoSeries):
+    """Agrupa geometrias geográficas pelo fuso UTM do centro do envelope.
+
+    Gera (epsg, máscara) por fuso, para reprojetar cada grupo de uma vez;
+    geometrias nulas ou vazias ficam fora de todos os grupos.
+    """
+    limites = geoms.bounds
+    lon = ((limites["minx"] + limites["maxx"]) / 2).to_numpy()
+    lat = ((limites["miny"] + limites["maxy"]) / 2).to_numpy()
+    valido = np.isfinite(lon) & np.isfinite(lat)
+    zona = np.clip(np.floor((np.where(valido, lon, 0) + 180) / 6).astype(int) + 1, 1, 60)
+    epsg = np.where(lat >= 0, 32600, 32700) + zona
+    for codigo in np.unique(epsg[valido]):
+        yield int(codigo), valido & (epsg == codigo)
+
+
+def _areas_utm_ha(geoms: gpd.GeoSeries) -> np.ndarray:
+    """Área (ha) de cada geometria geográfica, no fuso UTM dela (vetorizado por fuso)."""
+    areas = np.zeros(len(geoms))
+    for epsg, mascara in _por_zona_utm(geoms):
+        areas[mascara] = geoms[mascara].to_crs(f"EPSG:{epsg}").area.to_numpy() / 10000.0
+    return areas
+
+
+def _buffer_metros(geoms: gpd.GeoSeries, raios_m) -> gpd.GeoSeries:
+    """Buffer de `raios_m` metros (escalar ou um por geometria) em geometrias geográficas.
+
+    Geometrias com raio 0 (ou sem raio) ficam como estão.
+    """
+    raios = np.broadcast_to(np.nan_to_num(np.asarray(raios_m, dtype=float)), (len(geoms),))
+    saida = geoms.copy()
+    for epsg, mascara in _por_zona_utm(geoms):
+        mascara &= raios > 0
+        if not mascara.any():
+            continue
+        utm = geoms[mascara].to_crs(f"EPSG:{epsg}")
+        saida.iloc[np.flatnonzero(mascara)] = (
+            utm.buffer(raios[mascara]).to_crs(geoms.crs).to_numpy()
+        )
+    return saida
+
+
+@medido("area")
 def _intersect_area_ha(
     geom: BaseGeometry, crs_src: CRS, src: rasterio.io.DatasetReader
 ) -> float:
+    from pyproj import Transformer
     bounds = src.bounds
     raster_poly = box(bounds.left, bounds.bottom, bounds.right, bounds.top)
     inter = geom.intersection(raster_poly)
@@ -166,6 +212,32 @@ def _intersect_area_ha(
     return float(area_m2 / 10000.0)
 
 
+# ------------------------------------------------------------------------------
+# Hash canônico de geometria
+# ------------------------------------------------------------------------------
+# Grade de arredondamento padrão (graus ≈ 1 cm), muito abaixo do pixel de 10 m
+_GEOMETRY_HASH_GRID = 1e-7
+
+
+def _geometry_hash(geom: BaseGeometry, grid_size: float = _GEOMETRY_HASH_GRID) -> str:
+    """Hash estável da geometria, independente da ordem de vértices e partes.
+
+    A geometria é arredondada à grade `grid_size`, normalizada e serializada
+    em WKB 2D: o mesmo polígono vindo de KML, GeoJSON ou do GPKG do CAR gera
+    a mesma chave.
+    """
+    import hashlib
+
+    import shapely
+
+    try:
+        g = shapely.set_precision(geom, grid_size)
+    except Exception:
+        g = shapely.set_precision(make_valid(geom), grid_size)
+    wkb = shapely.to_wkb(shapely.normalize(g), output_dimension=2, byte_order=1)
+    return hashlib.sha256(wkb).hexdigest()[:32]
+
+
 # ------------------------------------------------------------------------------
 # Sanitização de GeoDataFrame para JSON
 # ------------------------------------------------------------------------------
@@ -175,6 +247,7 @@ def _sanitize_gdf_for_json(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     - Mantém a coluna 'geometry' intacta.
     - Converte timestamps e objetos pandas para strings legíveis.
     """
+    import pandas as pd
     if gdf is None or gdf.empty:
         return gdf
 
@@ -202,6 +275,7 @@ def _optimize_cog_reading(src: rasterio.io.DatasetReader, geometry_bounds):
     """
     Otimiza a leitura para arquivos COG detectando e usando overviews.
     """
+    from rasterio.windows import from_bounds
     optimizations = {
         "use_overviews": False,
         "overview_level": 0,
@@ -247,6 +321,8 @@ def _read_optimized_data(src, window, overview_level=0):
     """
     Leitura otimizada de dados raster com suporte a COG overviews.
     """
+    import rasterio
+    from rasterio.enums import Resampling
     try:
         window = window.round_offsets("ceil")
         window = window.round_lengths("floor")
@@ -335,6 +411,9 @@ def _fractional_stats(
 
     Returns: (area_total_classes_ha, areas_por_classe_ha, img_visual, meta_dict)
     """
+    import rasterio
+    from rasterio.windows import from_bounds
+    from rasterio.features import rasterize
     if cog_optimizations is None:
         cog_optimizations = {
             "use_overviews": False,
@@ -384,27 +463,19 @@ def _fractional_stats(
         if cog_optimizations.get("use_overviews", False)
         else 0
     )
-    data = (
-        _read_optimized_data(src, src_window, overview_level)
-        if overview_level > 0
-        else None
-    )
-    if data is None:
-        try:
-            data = src.read(1, window=src_window, masked=True)
-            logger.info(f"Leitura padrão, shape: {data.shape}")
-        except Exception as e:
-            logger.error(f"Falha ao ler dados do raster: {e}")
-            return (
-                0.0,
-                {},
-                None,
-                {
-                    "dimensoes_recorte": "0 x 0",
-                    "area_por_pixel_ha": 0.0,
-                    "area_por_pixel_ha_formatado": _format_area_ha(0.0, 6),
-                },
-            )
+    with span("leitura_raster"):
+        data = (
+            _read_optimized_data(src, src_window, overview_level)
+            if overview_level > 0
+            else None
+        )
+        if data is None:
+            try:
+                data = src.read(1, window=src_window, masked=True)
+                logger.info(f"Leitura padrão, shape: {data.shape}")
+            except Exception as e:
+                logger.error(f"Falha ao ler dados do raster: {e}")
+                data = None
 
     if data is None or getattr(data, "size", 0) == 0:
         return (
@@ -437,20 +508,21 @@ def _fractional_stats(
         window_affine = src.transform
 
     try:
-        interior = rasterize(
-            [(geom_union, 1)],
-            out_shape=data_arr.shape,
-            transform=window_affine,
-            fill=0,
-            all_touched=False,
-        ).astype(bool)
-        touched = rasterize(
-            [(geom_union, 1)],
-            out_shape=data_arr.shape,
-            transform=window_affine,
-            fill=0,
-            all_touched=True,
-        ).astype(bool)
+        with span("rasterize"):
+            interior = rasterize(
+                [(geom_union, 1)],
+                out_shape=data_arr.shape,
+                transform=window_affine,
+                fill=0,
+                all_touched=False,
+            ).astype(bool)
+            touched = rasterize(
+                [(geom_union, 1)],
+                out_shape=data_arr.shape,
+                transform=window_affine,
+                fill=0,
+                all_touched=True,
+            ).astype(bool)
     except Exception as e:
         logger.warning(f"Falha ao rasterizar polígono: {e}")
         interior = np.zeros_like(data_arr, dtype=bool)
@@ -463,16 +535,17 @@ def _fractional_stats(
     area_pixel_ha = _pixel_area_ha(src)
     areas_por_classe_ha = {}
 
-    unique_classes = np.unique(data_arr)
-    if include_zero_class:
-        unique_classes = unique_classes[unique_classes >= 0]
-    else:
-        unique_classes = unique_classes[unique_classes > 0]
-    for cls in unique_classes:
-        cls_mask = (data_arr == cls) & (frac > 0)
-        area_cls_ha = float((frac[cls_mask].sum()) * area_pixel_ha)
-        if area_cls_ha > 0:
-            areas_por_classe_ha[int(cls)] = area_cls_ha
+    with span("histograma"):
+        unique_classes = np.unique(data_arr)
+        if include_zero_class:
+            unique_classes = unique_classes[unique_classes >= 0]
+        else:
+            unique_classes = unique_classes[unique_classes > 0]
+        for cls in unique_classes:
+            cls_mask = (data_arr == cls) & (frac > 0)
+            area_cls_ha = float((frac[cls_mask].sum()) * area_pixel_ha)
+            if area_cls_ha > 0:
+                areas_por_classe_ha[int(cls)] = area_cls_ha
 
     # Para a imagem visual, usar apenas pixels completamente dentro (interior) para 
     # garantir bordas nítidas sem anti-aliasing. Se estiver vazio, usar touched como fallback.
@@ -505,130 +578,140 @@ def _fractional_stats(
 # ------------------------------------------------------------------------------
 # Imagem visual de classes
 # ------------------------------------------------------------------------------
-def _create_visual_image(img_data, classes_nomes, classes_cores, include_zero_class=False):
-    try:
-        if img_data is None or getattr(img_data, "size", 0) == 0:
-            logger.warning("Dados da imagem vazios ou inválidos")
-            return (
-                None,
-                [],
-                {
-                    "width": 0,
-                    "height": 0,
-                    "non_transparent_pixels": 0,
-                    "total_pixels": 0,
-                    "png_bytes_len": 0,
-                    "unique_values": [],
-                },
-            )
+_EMPTY_IMAGE_DIAG = {
+    "width": 0,
+    "height": 0,
+    "non_transparent_pixels": 0,
+    "total_pixels": 0,
+    "png_bytes_len": 0,
+    "unique_values": [],
+}
 
-        height, width = img_data.shape
-        img_rgba = np.zeros((height, width, 4), dtype=np.uint8)
+# Maior valor de classe indexado diretamente pela LUT (acima disso usa np.unique)
+_MAX_LUT_SIZE = 65536
 
-        unique_classes = np.unique(img_data)
-        logger.info(f"Classes encontradas: {unique_classes}")
 
-        img_rgba[:, :, 3] = 0
+def _hex_to_rgb(color_hex):
+    return tuple(int(color_hex[i : i + 2], 16) for i in (1, 3, 5))
 
-        for cls in unique_classes:
-            cls_int = int(cls)
-            if cls_int < 0 or (cls_int == 0 and not include_zero_class):
-                continue
-            color_hex = classes_cores.get(cls_int, "#CCCCCC")
-            color_rgb = tuple(int(color_hex[i : i + 2], 16) for i in (1, 3, 5))
-            mask = img_data == cls_int
-            if mask.any():
-                img_rgba[mask, 0] = color_rgb[0]
-                img_rgba[mask, 1] = color_rgb[1]
-                img_rgba[mask, 2] = color_rgb[2]
-                img_rgba[mask, 3] = 255
-                logger.info(f"Classe {cls_int}: {mask.sum()} pixels")
-
-        non_transparent_pixels = int(np.sum(img_rgba[:, :, 3] > 0))
-        if non_transparent_pixels == 0:
-            logger.warning("Nenhum pixel opaco encontrado, verificando dados...")
-            valid_mask = img_data > 0
-            if valid_mask.any():
-                for cls in unique_classes:
-                    cls_int = int(cls)
-                    if cls_int > 0:
-                        color_hex = classes_cores.get(cls_int, "#CCCCCC")
-                        color_rgb = tuple(
-                            int(color_hex[i : i + 2], 16) for i in (1, 3, 5)
-                        )
-                        mask = img_data == cls_int
-                        if mask.any():
-                            img_rgba[mask, 0] = color_rgb[0]
-                            img_rgba[mask, 1] = color_rgb[1]
-                            img_rgba[mask, 2] = color_rgb[2]
-                            img_rgba[mask, 3] = 255
-
-        non_transparent_pixels = int(np.sum(img_rgba[:, :, 3] > 0))
-        total_pixels = int(img_rgba.shape[0] * img_rgba.shape[1])
+
+@medido("png")
+def _render_palette_png(img_data, classes_cores, include_zero_class=False):
+    """Renderiza a matriz de classes como PNG paletado (modo "P").
+
+    Cada valor de classe recebe um índice de paleta e a imagem inteira é
+    convertida com uma única consulta à LUT (valor → índice), em vez de uma
+    máscara booleana por classe sobre um array RGBA. O índice 0 é reservado
+    para pixels transparentes (fora do polígono, nodata, classe 0 quando
+    `include_zero_class=False`).
+
+    Retorna (png_bytes, valores_presentes, pixels_opacos).
+    """
+    from PIL import Image
+    data = np.asarray(img_data)
+    if not np.issubdtype(data.dtype, np.integer):
+        data = np.where(np.isfinite(data), data, -1).astype(np.int64)
+
+    # Desloca em +1 para que o sentinela -1 (e qualquer nodata negativo) caia em 0
+    codes = np.maximum(data, -1).astype(np.int64) + 1
+    vmax = int(codes.max())
+    if vmax < _MAX_LUT_SIZE:
+        counts = np.bincount(codes.ravel(), minlength=1)
+        posicoes = np.flatnonzero(counts)
+        valores = posicoes - 1
+        lut = np.zeros(counts.size, dtype=np.uint8)
+    else:
+        uniq, inverse = np.unique(codes, return_inverse=True)
+        codes = inverse.reshape(data.shape)
+        posicoes = np.arange(uniq.size)
+        valores = uniq - 1
+        lut = np.zeros(uniq.size, dtype=np.uint8)
+
+    palette = [0, 0, 0]
+    n_cores = 0
+    for pos, val in zip(posicoes.tolist(), valores.tolist()):
+        if val < 0 or (val == 0 and not include_zero_class):
+            continue
+        if n_cores >= 255:
+            logger.warning("Mais de 255 classes na imagem; classes excedentes ficam transparentes")
+            break
+        n_cores += 1
+        lut[pos] = n_cores
+        palette.extend(_hex_to_rgb(classes_cores.get(int(val), "#CCCCCC")))
+
+    indexed = lut[codes]
+    non_transparent_pixels = int(np.count_nonzero(indexed))
+
+    height, width = indexed.shape
+    pil_image = Image.fromarray(indexed, mode="P")
+    pil_image.putpalette(palette)
+
+    # Se a imagem for pequena, fazer upsampling (vizinho mais próximo) para
+    # preservar a nitidez dos pixels
+    if height < 100 or width < 100:
+        scale_factor = max(2, 100 // max(1, min(height, width)))
         logger.info(
-            f"Pixels não-transparentes após processamento: {non_transparent_pixels} / {total_pixels}"
+            f"Upsampling de imagem: {height}x{width} → "
+            f"{height * scale_factor}x{width * scale_factor} (fator {scale_factor}x)"
+        )
+        pil_image = pil_image.resize(
+            (width * scale_factor, height * scale_factor), Image.NEAREST
         )
 
-        # Usar PIL para criar PNG sem interpolação ou anti-aliasing
-        # Se a imagem for pequena, fazer upsampling para preservar qualidade dos pixels
-        if height < 100 or width < 100:
-            # Upsampling por fator de 2x para imagens muito pequenas
-            scale_factor = max(2, 100 // min(height, width))
-            new_height = height * scale_factor
-            new_width = width * scale_factor
-            logger.info(f"Upsampling de imagem: {height}x{width} → {new_height}x{new_width} (fator {scale_factor}x)")
-            # Criar array de pixels upsampled
-            img_rgba_upsampled = np.repeat(np.repeat(img_rgba, scale_factor, axis=0), scale_factor, axis=1)
-            pil_image = Image.fromarray(img_rgba_upsampled, mode='RGBA')
-        else:
-            pil_image = Image.fromarray(img_rgba, mode='RGBA')
-        
-        buf = BytesIO()
-        pil_image.save(buf, format='PNG', optimize=False)
-        buf.seek(0)
-        img_bytes = buf.getvalue()
+    buf = BytesIO()
+    pil_image.save(buf, format="PNG", transparency=0, optimize=False)
+    return buf.getvalue(), [int(v) for v in valores.tolist()], non_transparent_pixels
 
-        logger.info(f"PNG gerado com PIL, tamanho (bytes): {len(img_bytes)}")
 
-        img_base64 = base64.b64encode(img_bytes).decode("utf-8")
+def _create_visual_png(img_data, classes_nomes, classes_cores, include_zero_class=False):
+    """Gera o PNG paletado do recorte e sua legenda.
+
+    Retorna (png_bytes, legenda, diagnostics); png_bytes é None se a imagem
+    estiver vazia ou a renderização falhar.
+    """
+    try:
+        if img_data is None or getattr(img_data, "size", 0) == 0:
+            logger.warning("Dados da imagem vazios ou inválidos")
+            return None, [], dict(_EMPTY_IMAGE_DIAG)
+
+        height, width = img_data.shape
+        img_bytes, unique_list, non_transparent_pixels = _render_palette_png(
+            img_data, classes_cores, include_zero_class
+        )
+        total_pixels = int(height * width)
+        logger.info(
+            f"PNG paletado gerado: {len(img_bytes)} bytes, "
+            f"{non_transparent_pixels} / {total_pixels} pixels opacos"
+        )
 
         legend_info = []
-        for cls in sorted(unique_classes):
-            cls_int = int(cls)
-            if cls_int <= 0 or cls_int == -9999:
+        for cls_int in unique_list:
+            if cls_int <= 0:
                 continue
             color = classes_cores.get(cls_int, "#CCCCCC")
             desc = classes_nomes.get(cls_int, f"Classe {cls_int}")
             legend_info.append({"classe": cls_int, "cor": color, "descricao": desc})
 
-        unique_vals = np.unique(img_data)
-        try:
-            unique_list = [int(x) for x in unique_vals.tolist()]
-        except Exception:
-            unique_list = [int(x) for x in list(unique_vals)]
-
         diagnostics = {
             "width": int(width),
             "height": int(height),
             "non_transparent_pixels": int(non_transparent_pixels),
-            "total_pixels": int(total_pixels),
+            "total_pixels": total_pixels,
             "png_bytes_len": int(len(img_bytes)),
             "unique_values": unique_list,
         }
-
-        return img_base64, legend_info, diagnostics
+        return img_bytes, legend_info, diagnostics
 
     except Exception as e:
         logger.warning(f"Falha ao criar imagem: {e}")
-        return (
-            None,
-            [],
-            {
-                "width": 0,
-                "height": 0,
-                "non_transparent_pixels": 0,
-                "total_pixels": 0,
-                "png_bytes_len": 0,
-                "unique_values": [],
-            },
-        )
+        return None, [], dict(_EMPTY_IMAGE_DIAG)
+
+
+def _create_visual_image(img_data, classes_nomes, classes_cores, include_zero_class=False):
+    """Como `_create_visual_png`, mas devolve o PNG codificado em base64."""
+    img_bytes, legend_info, diagnostics = _create_visual_png(
+        img_data, classes_nomes, classes_cores, include_zero_class
+    )
+    if img_bytes is None:
+        return None, legend_info, diagnostics
+    return base64.b64encode(img_bytes).decode("utf-8"), legend_info, diagnostics
@@ -2,18 +2,23 @@
 """
 InfoGEO – Geocodificação reversa
 =================================
-Obtém município e UF a partir de coordenadas.
+Obtém município, UF e código IBGE a partir de coordenadas.
 
 Estratégia:
-  1. Lookup local via shapefile IBGE BR_Municipios_2024 (point-in-polygon)
+  1. Lookup local via shapefile IBGE BR_Municipios_2024 (point-in-polygon
+     na camada mapeada, ver server/camadas_mapeadas.py)
      → Rápido, offline, preciso.
   2. Fallback: Nominatim (geopy) via internet caso o ponto não caia em
-     nenhum polígono municipal (bordas, áreas offshore, etc.).
+     nenhum polígono municipal (bordas, áreas offshore, etc.). Desligado
+     com INFOGEO_GEOLOCATION=false (ambientes sem internet, benchmarks).
 """
 
 import logging
 from pathlib import Path
 
+from . import camadas_mapeadas
+from .tracing import medido
+
 logger = logging.getLogger("lulc-analyzer")
 
 # ---------------------------------------------------------------------------
@@ -25,145 +30,135 @@ _SHP_PATH = _BASE_DIR / "data" / "BR_Municipios_IBGE" / "BR_Municipios_2024.shp"
 # Caminho do shapefile MACRO_RTA
 _RTA_SHP_PATH = _BASE_DIR / "data" / "MACRO_RTA" / "MACRO_RTA.shp"
 
-# Cache do GeoDataFrame municipal (carregado uma única vez)
-_municipios_gdf = None
-_shp_loaded: bool = False  # True após tentativa de carga (mesmo se falhar)
-
 # Cache de resultados por coordenada arredondada
 _location_cache: dict = {}
+_codigo_cache: dict = {}  # código IBGE do município (None fora da base local)
 
 
-def _load_municipios():
-    """Carrega o shapefile IBGE em memória (apenas na primeira chamada)."""
-    global _municipios_gdf, _shp_loaded
-    if _shp_loaded:
-        return _municipios_gdf
+def _ler_municipios():
+    """Lê o shapefile IBGE (EPSG:4326, só as colunas usadas)."""
+    import geopandas as gpd
 
-    _shp_loaded = True
-    try:
-        import geopandas as gpd
+    logger.info(f"Carregando shapefile municipal IBGE: {_SHP_PATH}")
+    gdf = gpd.read_file(str(_SHP_PATH))
 
-        if not _SHP_PATH.exists():
-            logger.warning(f"Shapefile municipal não encontrado: {_SHP_PATH}")
-            return None
+    # Garantir CRS WGS-84 para comparação com centroide (ponto em EPSG:4326)
+    if gdf.crs is None:
+        gdf = gdf.set_crs("EPSG:4674")
+    gdf = gdf.to_crs("EPSG:4326")
 
-        logger.info(f"Carregando shapefile municipal IBGE: {_SHP_PATH}")
-        gdf = gpd.read_file(str(_SHP_PATH))
+    # Manter apenas as colunas necessárias para reduzir o pacote
+    colunas = ["CD_MUN", "NM_MUN", "SIGLA_UF", "NM_UF", "geometry"]
+    return gdf[[c for c in colunas if c in gdf.columns]]
 
-        # Garantir CRS WGS-84 para comparação com centroide (ponto em EPSG:4326)
-        if gdf.crs is None:
-            gdf = gdf.set_crs("EPSG:4674")
-        gdf = gdf.to_crs("EPSG:4326")
-
-        # Manter apenas as colunas necessárias para reduzir uso de memória
-        _municipios_gdf = gdf[["NM_MUN", "SIGLA_UF", "NM_UF", "geometry"]].copy()
-        logger.info(f"Shapefile municipal carregado: {len(_municipios_gdf)} municípios")
-        return _municipios_gdf
 
+def _load_municipios():
+    """Camada municipal IBGE mapeada (aberta uma única vez por processo) ou None."""
+    try:
+        return camadas_mapeadas.carregar("municipios_ibge", _SHP_PATH, _ler_municipios)
     except Exception as exc:
         logger.error(f"Falha ao carregar shapefile municipal: {exc}")
         return None
 
 
-def _lookup_ibge(lat: float, lon: float):
-    """Faz ponto-em-polígono no shapefile IBGE. Retorna (municipio, uf) ou (None, None)."""
-    gdf = _load_municipios()
-    if gdf is None:
-        return None, None
+def _atributo(camada, coluna, indice):
+    """Valor da `coluna` na feição `indice` (None se ausente ou nulo)."""
+    if coluna not in camada.columns:
+        return None
+    valor = camada.valores(coluna, [indice])[0]
+    return None if valor is None or valor != valor else valor
+
 
+def _codigo_mun(camada, indice):
+    """CD_MUN da feição como inteiro (None se ausente)."""
     try:
-        from shapely.geometry import Point
-        import geopandas as gpd
+        return int(_atributo(camada, "CD_MUN", indice))
+    except (TypeError, ValueError):
+        return None
 
-        pt = gpd.GeoDataFrame(geometry=[Point(lon, lat)], crs="EPSG:4326")
-        joined = gpd.sjoin(pt, gdf, how="left", predicate="within")
 
-        if not joined.empty and not joined["NM_MUN"].isna().all():
-            row = joined.iloc[0]
-            municipio = str(row["NM_MUN"]) if row["NM_MUN"] else None
-            uf = str(row["SIGLA_UF"]) if row["SIGLA_UF"] else None
-            if municipio and uf:
-                return municipio, uf
+def _lookup_ibge(lat: float, lon: float):
+    """Faz ponto-em-polígono na camada IBGE.
+
+    Retorna (municipio, uf, codigo_ibge) ou (None, None, None).
+    """
+    camada = _load_municipios()
+    if camada is None:
+        return None, None, None
 
-        # Ponto não caiu dentro de nenhum polígono (bordas, etc.) →
-        # usar nearest (distância mínima ao centroide)
-        gdf_copy = gdf.copy()
-        gdf_copy["_dist"] = gdf_copy.geometry.distance(Point(lon, lat))
-        nearest = gdf_copy.nsmallest(1, "_dist").iloc[0]
-        municipio = str(nearest["NM_MUN"]) if nearest["NM_MUN"] else None
-        uf = str(nearest["SIGLA_UF"]) if nearest["SIGLA_UF"] else None
+    try:
+        dentro = camada.contendo(lon, lat)
+        if len(dentro):
+            indice = int(dentro[0])
+        else:
+            # Ponto não caiu dentro de nenhum polígono (bordas, offshore) →
+            # município mais próximo
+            indice = camada.mais_proxima(lon, lat)
+            if indice is None:
+                return None, None, None
+
+        municipio = _atributo(camada, "NM_MUN", indice)
+        uf = _atributo(camada, "SIGLA_UF", indice)
         if municipio and uf:
-            logger.info(f"Município obtido por proximidade: {municipio}/{uf}")
-            return municipio, uf
+            if not len(dentro):
+                logger.info(f"Município obtido por proximidade: {municipio}/{uf}")
+            return str(municipio), str(uf), _codigo_mun(camada, indice)
 
     except Exception as exc:
         logger.warning(f"Erro no lookup IBGE: {exc}")
 
-    return None, None
+    return None, None, None
 
 
 # ---------------------------------------------------------------------------
-# MACRO_RTA lookup (carregado uma única vez em memória)
+# MACRO_RTA lookup (camada mapeada, compartilhada com a valoração)
 # ---------------------------------------------------------------------------
-_rta_gdf = None
-_rta_loaded: bool = False
 _rta_cache: dict = {}
 
 
-def _load_rta():
-    """Carrega o shapefile MACRO_RTA em memória (apenas na primeira chamada)."""
-    global _rta_gdf, _rta_loaded
-    if _rta_loaded:
-        return _rta_gdf
+def _ler_rta():
+    """Lê o shapefile MACRO_RTA em EPSG:4326 (todas as colunas: a mesma camada
+    serve à geocodificação e à valoração)."""
+    import geopandas as gpd
 
-    _rta_loaded = True
-    try:
-        import geopandas as gpd
+    logger.info(f"Carregando shapefile MACRO_RTA: {_RTA_SHP_PATH}")
+    gdf = gpd.read_file(str(_RTA_SHP_PATH))
+    if gdf.crs is None:
+        gdf = gdf.set_crs("EPSG:4326")
+    elif gdf.crs.to_string() != "EPSG:4326":
+        gdf = gdf.to_crs("EPSG:4326")
+    return gdf
 
-        if not _RTA_SHP_PATH.exists():
-            logger.warning(f"Shapefile MACRO_RTA não encontrado: {_RTA_SHP_PATH}")
-            return None
 
-        logger.info(f"Carregando shapefile MACRO_RTA: {_RTA_SHP_PATH}")
-        gdf = gpd.read_file(str(_RTA_SHP_PATH))
-        if gdf.crs is None:
-            gdf = gdf.set_crs("EPSG:4674")
-        gdf = gdf.to_crs("EPSG:4326")
-        _rta_gdf = gdf[["CD_RTA", "NM_RTA", "geometry"]].copy()
-        logger.info(f"Shapefile MACRO_RTA carregado: {len(_rta_gdf)} regiões")
-        return _rta_gdf
+def _load_rta():
+    """Camada MACRO_RTA mapeada (aberta uma única vez por processo) ou None."""
+    try:
+        return camadas_mapeadas.carregar("macro_rta", _RTA_SHP_PATH, _ler_rta)
     except Exception as exc:
         logger.error(f"Falha ao carregar MACRO_RTA: {exc}")
         return None
 
 
 def _lookup_rta(lat: float, lon: float):
-    """Ponto-em-polígono no shapefile MACRO_RTA. Retorna (cd_rta, nm_rta) ou (None, None)."""
-    gdf = _load_rta()
-    if gdf is None:
+    """Ponto-em-polígono na camada MACRO_RTA. Retorna (cd_rta, nm_rta) ou (None, None)."""
+    camada = _load_rta()
+    if camada is None:
         return None, None
     try:
-        from shapely.geometry import Point
-        import geopandas as gpd
-
-        pt = gpd.GeoDataFrame(geometry=[Point(lon, lat)], crs="EPSG:4326")
-        joined = gpd.sjoin(pt, gdf, how="left", predicate="within")
-        if not joined.empty and not joined["CD_RTA"].isna().all():
-            row = joined.iloc[0]
-            if row["CD_RTA"] is not None and row["NM_RTA"]:
-                return int(row["CD_RTA"]), str(row["NM_RTA"])
-
+        dentro = camada.contendo(lon, lat)
         # Nearest fallback
-        gdf_copy = gdf.copy()
-        gdf_copy["_dist"] = gdf_copy.geometry.distance(Point(lon, lat))
-        nearest = gdf_copy.nsmallest(1, "_dist").iloc[0]
-        if nearest["CD_RTA"] is not None and nearest["NM_RTA"]:
-            return int(nearest["CD_RTA"]), str(nearest["NM_RTA"])
+        indice = int(dentro[0]) if len(dentro) else camada.mais_proxima(lon, lat)
+        if indice is not None:
+            cd_rta = _atributo(camada, "CD_RTA", indice)
+            nm_rta = _atributo(camada, "NM_RTA", indice)
+            if cd_rta is not None and nm_rta:
+                return int(cd_rta), str(nm_rta)
     except Exception as exc:
         logger.warning(f"Erro no lookup MACRO_RTA: {exc}")
     return None, None
 
 
+@medido("rta")
 def _get_rta_from_coords(lat: float, lon: float):
     """Retorna (cd_rta, nm_rta) com cache em memória."""
     cache_key = f"{lat:.5f},{lon:.5f}"
@@ -208,6 +203,13 @@ _UF_MAP = {
 }
 
 
+def _nominatim_habilitado() -> bool:
+    from config import GEOLOCATION_ENABLED
+
+    return GEOLOCATION_ENABLED
+
+
+@medido("nominatim")
 def _lookup_nominatim(lat: float, lon: float):
     """Fallback: geocodificação reversa via Nominatim. Retorna (municipio, uf)."""
     try:
@@ -240,6 +242,7 @@ def _lookup_nominatim(lat: float, lon: float):
     return None, None
 
 
+@medido("geocodificacao")
 def _get_location_from_coords(lat: float, lon: float):
     """
     Retorna (municipio, uf) para as coordenadas fornecidas.
@@ -255,10 +258,11 @@ def _get_location_from_coords(lat: float, lon: float):
         return _location_cache[cache_key]
 
     # 1) Shapefile IBGE local
-    municipio, uf = _lookup_ibge(lat, lon)
+    municipio, uf, codigo = _lookup_ibge(lat, lon)
+    _codigo_cache[cache_key] = codigo
 
-    # 2) Nominatim como fallback
-    if not municipio or not uf:
+    # 2) Nominatim como fallback (requer internet; INFOGEO_GEOLOCATION=false desliga)
+    if (not municipio or not uf) and _nominatim_habilitado():
         logger.info(
             f"IBGE lookup falhou para ({lat:.5f}, {lon:.5f}), tentando Nominatim..."
         )
@@ -272,3 +276,23 @@ def _get_location_from_coords(lat: float, lon: float):
     _location_cache[cache_key] = result
     logger.info(f"Localização: {municipio} - {uf} (lat={lat:.5f}, lon={lon:.5f})")
     return result
+
+
+def _get_codigo_ibge_from_coords(lat: float, lon: float):
+    """Código IBGE do município das coordenadas (None se não veio da base local).
+
+    Compartilha o cache de `_get_location_from_coords`.
+    """
+    cache_key = f"{lat:.5f},{lon:.5f}"
+    if cache_key not in _codigo_cache:
+        _location_cache.pop(cache_key, None)
+        _get_location_from_coords(lat, lon)
+    return _codigo_cache.get(cache_key)
+
+
+def limpar_cache():
+    """Fecha as camadas e descarta as consultas em memória (recarga após troca dos dados)."""
+    camadas_mapeadas.limpar_cache("municipios_ibge", "macro_rta")
+    _location_cache.clear()
+    _codigo_cache.clear()
+    _rta_cache.clear()
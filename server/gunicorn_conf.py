@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Configuração do gunicorn (produção)
+=============================================
+Uso:
+
+    gunicorn -c server/gunicorn_conf.py server.servidor:app
+
+  - `preload_app`: o processo mestre importa o servidor e pré-carrega as
+    camadas de referência (municípios IBGE, MACRO_RTA, embargos, ICMBio,
+    solos, centroides, notas, Köppen) uma única vez; os workers são criados
+    por fork e compartilham essa memória em copy-on-write (`gc.freeze`
+    evita que o coletor de lixo suje as páginas herdadas). As camadas são
+    pacotes mapeados do disco (server/camadas_mapeadas.py, `CAMADAS_DIR`):
+    atributos, geometrias e índice espacial ficam em arrays NumPy mapeados,
+    sem objetos Python por feição — as páginas são do cache do SO e
+    continuam compartilhadas mesmo depois de um worker consultá-las. A pré-carga
+    (paralela, `WARMUP_*`) termina antes do fork, então todo worker já nasce
+    pronto em /readyz.
+  - Endereço, porta, nº de workers e threads vêm de `config.py`
+    (INFOGEO_HOST, INFOGEO_PORT, INFOGEO_WORKERS, INFOGEO_THREADS). Com
+    mais de um worker, o que precisa ser visto por todos vai para o disco
+    quando o caminho correspondente estiver vazio: o progresso dos lotes
+    para o SQLite `BATCH_PROGRESS_PATH_PADRAO` (o stream de eventos pode
+    cair num worker diferente do que executa o lote), os PNGs dos recortes
+    para `IMAGE_CACHE_DIR_PADRAO` (a URL da imagem pode cair num worker
+    diferente do que a renderizou) e as respostas memorizadas para o SQLite
+    `RESULT_CACHE_PATH_PADRAO` (o mesmo polígono não é recalculado em cada
+    worker).
+  - O índice do CAR (server/car_index.py) é conferido e, se preciso,
+    construído pelo mestre antes do fork, sob a trava de arquivo do índice:
+    os workers já o encontram pronto e não disparam construções próprias.
+  - Uma thread do mestre confere os arquivos das camadas e dos rasters a
+    cada `SERVER_DATA_WATCH_INTERVAL` s; se algum mudar, o mestre recarrega
+    as camadas, reaquece os rasters e envia SIGHUP a si mesmo: novos
+    workers nascem com os dados atualizados e os antigos terminam as
+    requisições em andamento.
+
+Os rasters são apenas aquecidos no mestre (cabeçalho e visão geral no
+cache do SO) e continuam abertos por requisição: handles GDAL não podem ser
+herdados por fork.
+"""
+
+import gc
+import os
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import config as _config  # noqa: E402
+from config import (  # noqa: E402
+    SERVER_DATA_WATCH_INTERVAL,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_THREADS,
+    SERVER_WORKERS,
+)
+
+bind = f"{SERVER_HOST}:{SERVER_PORT}"
+workers = SERVER_WORKERS or (os.cpu_count() or 1)
+threads = max(1, SERVER_THREADS)
+worker_class = "gthread"
+preload_app = True
+
+# Progresso dos lotes, imagens dos recortes e respostas memorizadas
+# compartilhados entre os workers (lidos pelo servidor ao ser carregado,
+# depois deste arquivo)
+if workers > 1:
+    if not _config.BATCH_PROGRESS_PATH:
+        _config.BATCH_PROGRESS_PATH = str(_config.BATCH_PROGRESS_PATH_PADRAO)
+    if not _config.IMAGE_CACHE_DIR:
+        _config.IMAGE_CACHE_DIR = str(_config.IMAGE_CACHE_DIR_PADRAO)
+    if not _config.RESULT_CACHE_PATH:
+        _config.RESULT_CACHE_PATH = str(_config.RESULT_CACHE_PATH_PADRAO)
+
+# gthread: o timeout vale para o laço do worker, não para a requisição
+# (as análises rodam em linha, sem o tempo máximo de ANALYSIS_TIMEOUTS, que
+# exige o pool de processos do modo ASGI — ver server/analysis_pool.py)
+timeout = 120
+graceful_timeout = 120
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = "info"
+
+
+def when_ready(server):
+    """Mestre pronto, antes do fork dos workers: pré-carga e vigia dos dados."""
+    from server import car_index, servidor
+
+    car_index.ensure_car_index(background=False)
+    servidor.precarregar_camadas()
+    gc.freeze()
+
+    if SERVER_DATA_WATCH_INTERVAL > 0:
+        threading.Thread(
+            target=_vigiar_dados, args=(server,), name="vigia-dados", daemon=True
+        ).start()
+
+
+def post_fork(server, worker):
+    """Worker recém-criado: não reaproveita conexões SQLite do mestre."""
+    from server import car_index
+
+    car_index.fechar_conexoes()
+
+
+def _vigiar_dados(server):
+    """Recarrega as camadas e substitui os workers quando um arquivo de dados
+    (camada de referência ou raster) muda."""
+    from server import servidor
+
+    carregadas = ultima = servidor.versoes_camadas()
+    while True:
+        time.sleep(SERVER_DATA_WATCH_INTERVAL)
+        atuais = servidor.versoes_camadas()
+        if atuais != ultima:
+            # Espera uma leitura estável (arquivo ainda sendo copiado)
+            ultima = atuais
+            continue
+        if atuais == carregadas:
+            continue
+
+        alteradas = sorted(n for n in atuais if atuais[n] != carregadas.get(n))
+        server.log.info(f"Dados alterados ({', '.join(alteradas)}); recarregando workers")
+        rasters = any(nome.startswith("raster_") for nome in alteradas)
+        try:
+            gc.unfreeze()
+            servidor.limpar_camadas()
+            servidor.precarregar_camadas(rasters=rasters or None)
+            gc.freeze()
+        except Exception as e:
+            server.log.error(f"Falha ao recarregar camadas: {e}")
+            continue
+        carregadas = atuais
+        os.kill(os.getpid(), signal.SIGHUP)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Cache de imagens PNG
+==============================
+Guarda os PNGs paletados dos recortes e dos tiles XYZ para que sejam
+servidos por URL própria, com cabeçalhos de cache HTTP, em vez de
+embutidos em base64 no JSON de cada análise.
+
+  - Memória: LRU limitado em bytes (por processo).
+  - Disco (opcional): diretório compartilhado entre workers; sobrevive a
+    reinícios. Ativado por `IMAGE_CACHE_DIR` / `TILE_CACHE_DIR`.
+
+As chaves incluem a versão do raster (caminho + tamanho + mtime), portanto
+uma entrada nunca muda: um mesmo polígono analisado de novo na mesma camada
+reaproveita a imagem sem renderizar nada.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+
+from cachetools import LRUCache
+
+logger = logging.getLogger("lulc-analyzer")
+
+_KEY_RE = re.compile(r"^[0-9a-f]{32}$")
+_LAYER_RE = re.compile(r"^[a-z0-9_]+$")
+
+
+def raster_fingerprint(raster_path) -> str:
+    """Identifica a versão do raster (caminho + tamanho + mtime)."""
+    try:
+        st = os.stat(raster_path)
+        return f"{raster_path}|{st.st_size}|{int(st.st_mtime)}"
+    except OSError:
+        return str(raster_path)
+
+
+def recorte_cache_key(layer: str, geom, raster_path) -> str:
+    """Hash estável de (camada, versão do raster, geometria em WKB)."""
+    h = hashlib.sha256()
+    h.update(layer.encode("utf-8"))
+    h.update(b"\0")
+    h.update(raster_fingerprint(raster_path).encode("utf-8"))
+    h.update(b"\0")
+    h.update(geom.wkb)
+    return h.hexdigest()[:32]
+
+
+def is_valid_key(layer: str, key: str) -> bool:
+    return bool(_LAYER_RE.match(layer or "")) and bool(_KEY_RE.match(key or ""))
+
+
+class PngCache:
+    """Cache LRU de (png_bytes, meta) em memória, com espelho opcional em disco."""
+
+    def __init__(self, max_bytes: int, cache_dir=None, name: str = "imagens"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._mem = LRUCache(maxsize=max(1, int(max_bytes)), getsizeof=self._sizeof)
+        self._dir = Path(cache_dir) if cache_dir else None
+        self.hits = 0
+        self.misses = 0
+        if self._dir is not None:
+            try:
+                self._dir.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Cache de {name} em disco desativado ({self._dir}): {e}")
+                self._dir = None
+
+    @staticmethod
+    def _sizeof(value) -> int:
+        png, _meta = value
+        return len(png) + 512
+
+    def _disk_path(self, layer: str, key: str) -> Path:
+        return self._dir / layer / key[:2] / f"{key}.png"
+
+    def get(self, layer: str, key: str):
+        """Retorna (png_bytes, meta) ou None."""
+        mem_key = f"{layer}/{key}"
+        with self._lock:
+            value = self._mem.get(mem_key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        if self._dir is not None:
+            path = self._disk_path(layer, key)
+            try:
+                png = path.read_bytes()
+                meta_path = path.with_suffix(".json")
+                meta = (
+                    json.loads(meta_path.read_text(encoding="utf-8"))
+                    if meta_path.exists()
+                    else {}
+                )
+                value = (png, meta)
+                with self._lock:
+                    self._mem[mem_key] = value
+                self.hits += 1
+                return value
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Falha ao ler {path} do cache de {self.name}: {e}")
+
+        self.misses += 1
+        return None
+
+    def put(self, layer: str, key: str, png: bytes, meta=None):
+        meta = meta or {}
+        value = (png, meta)
+        try:
+            with self._lock:
+                self._mem[f"{layer}/{key}"] = value
+        except ValueError:
+            # Item maior que o próprio cache: serve apenas do disco (se houver)
+            pass
+
+        if self._dir is not None:
+            path = self._disk_path(layer, key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # meta antes do PNG: quem encontra o PNG já encontra a meta
+                if meta:
+                    path.with_suffix(".json").write_text(
+                        json.dumps(meta, ensure_ascii=False), encoding="utf-8"
+                    )
+                # pid + thread: vários threads do mesmo worker podem gravar a mesma chave
+                tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp.write_bytes(png)
+                os.replace(tmp, path)
+            except Exception as e:
+                logger.warning(f"Falha ao gravar {path} no cache de {self.name}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "itens": len(self._mem),
+                "bytes": int(self._mem.currsize),
+                "max_bytes": int(self._mem.maxsize),
+                "hits": self.hits,
+                "misses": self.misses,
+                "disco": str(self._dir) if self._dir is not None else None,
+            }
@@ -1,73 +1,172 @@
 # -*- coding: utf-8 -*-
 """
-InfoGEO – Exportação KML (genérico/extensível)
-===============================================
+InfoGEO – Exportação KML/KMZ (genérico/extensível)
+===================================================
 Vetoriza pixels de um recorte raster em polígonos agrupados por classe
-e gera arquivo KML usando simplekml.
+e gera KML em streaming: os placemarks são emitidos à medida que são
+serializados, sem montar a árvore do documento em memória. O mesmo fluxo
+pode ser gravado compactado como KMZ.
 
 Design extensível: aceita qualquer combinação de raster_path + nomes/cores
 de classes, portanto funciona para análises existentes e futuras.
 """
 
 import logging
-from pathlib import Path
+import zipfile
+from tempfile import SpooledTemporaryFile
+from typing import Iterator
+from xml.sax.saxutils import escape
 
 import numpy as np
-import geopandas as gpd
-import rasterio
-from rasterio.crs import CRS
-from rasterio.windows import from_bounds
-from rasterio.features import rasterize, shapes
-from shapely.geometry import shape, mapping, Polygon, MultiPolygon
-from shapely.ops import unary_union
+import shapely
+from shapely.geometry import shape, Polygon, MultiPolygon, GeometryCollection
 from shapely.validation import make_valid
-from pyproj import Transformer
-
-import simplekml
 
 logger = logging.getLogger("lulc-analyzer")
 
+# Polígonos serializados por bloco emitido pelo gerador
+_POLIGONOS_POR_BLOCO = 500
+
+# KMZ maiores que isto saem da memória para o disco
+_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+
 
 # ------------------------------------------------------------------------------
 # Helpers
 # ------------------------------------------------------------------------------
 def _hex_to_kml_color(hex_color: str, alpha_int: int = 255) -> str:
-    """Converte cor hex #RRGGBB para formato KML usando simplekml."""
-    hex_color = hex_color.lstrip("#")
+    """Converte cor hex #RRGGBB para o formato KML aabbggrr."""
+    hex_color = (hex_color or "").lstrip("#")
     if len(hex_color) != 6:
         hex_color = "CCCCCC"
-    
-    kml_base = simplekml.Color.hex(hex_color)
-    return simplekml.Color.changealphaint(alpha_int, kml_base)
+    rr, gg, bb = hex_color[0:2], hex_color[2:4], hex_color[4:6]
+    return f"{alpha_int:02x}{bb}{gg}{rr}".lower()
 
 
-# ------------------------------------------------------------------------------
-# Função principal — genérica e extensível
-# ------------------------------------------------------------------------------
-def gerar_kml(
-    raster_path: str,
-    polygon_geojson: dict,
-    classes_nomes: dict,
-    classes_cores: dict,
-    nome_documento: str = "InfoGEO - Exportação",
-    include_zero_class: bool = False,
-) -> str:
-    """Vetoriza o raster recortado pelo polígono e gera KML.
+def _vetorizar_poligono(src, poly_geom, include_zero_class=False, simplificacao_px=0.0):
+    """Vetoriza as classes do raster dentro de `poly_geom` (no CRS do raster).
 
-    Args:
-        raster_path:      Caminho absoluto para o arquivo raster (TIFF/COG).
-        polygon_geojson:  GeoJSON do polígono de recorte (FeatureCollection).
-        classes_nomes:    Dict {int_classe: "Nome da classe"}.
-        classes_cores:    Dict {int_classe: "#RRGGBB"}.
-        nome_documento:   Nome do documento raiz no KML.
-        include_zero_class: Se True, inclui a classe 0 (NoData).
+    A máscara do polígono é aplicada no raster antes da vetorização, então só
+    os pixels tocados pelo polígono geram regiões. Regiões inteiramente
+    contidas no polígono são usadas como estão; apenas as que cruzam a borda
+    passam por interseção exata, feita em lote com as operações vetorizadas
+    do shapely 2.
+
+    Com `simplificacao_px > 0` a "escadinha" dos pixels é suavizada com
+    tolerância de N pixels, preservando a topologia entre classes vizinhas
+    (as arestas compartilhadas são simplificadas uma única vez).
 
     Returns:
-        String com o conteúdo KML completo.
+        Dict {classe: ndarray de geometrias}.
     """
-    logger.info(f"[KML Export] Iniciando exportação: {nome_documento}")
-    logger.info(f"[KML Export] Raster: {raster_path}")
+    import rasterio
+    from rasterio.windows import from_bounds
+    from rasterio.features import rasterize, shapes
+    res_x = src.transform.a
+    res_y = abs(src.transform.e)
+    bounds = poly_geom.buffer(max(res_x, res_y)).bounds
+
+    try:
+        window = from_bounds(*bounds, transform=src.transform)
+        window = window.round_offsets().round_lengths()
+        window = window.crop(height=src.height, width=src.width)
+    except Exception as e:
+        logger.warning(f"Erro ao calcular window para o polígono: {e}")
+        return {}
+
+    if window.width <= 0 or window.height <= 0:
+        return {}  # Polígono fora do raster
+
+    data = src.read(1, window=window, masked=True)
+    data_arr = np.asarray(data.astype(np.int32).filled(-1), dtype=np.int32)
+    window_transform = rasterio.windows.transform(window, src.transform)
+
+    # Recorte rasterizado: pixels tocados pelo polígono
+    touched = rasterize(
+        [(poly_geom, 1)],
+        out_shape=data_arr.shape,
+        transform=window_transform,
+        fill=0,
+        all_touched=True,
+        dtype=np.uint8,
+    ).astype(bool)
+    valid_mask = touched & ((data_arr >= 0) if include_zero_class else (data_arr > 0))
+    if not valid_mask.any():
+        return {}
+
+    # --- 3. Vetorizar regiões (uma por componente conexa de cada classe) ---
+    regioes = []
+    valores = []
+    for geom_dict, value in shapes(
+        data_arr,
+        mask=valid_mask,
+        transform=window_transform,
+        connectivity=4,
+    ):
+        regioes.append(shape(geom_dict))
+        valores.append(int(value))
+
+    geoms = np.empty(len(regioes), dtype=object)
+    geoms[:] = regioes
+    valores = np.asarray(valores, dtype=np.int32)
+
+    invalidas = ~shapely.is_valid(geoms)
+    if invalidas.any():
+        geoms[invalidas] = shapely.make_valid(geoms[invalidas])
+
+    # Interseção exata apenas nas regiões de borda
+    shapely.prepare(poly_geom)
+    borda = ~shapely.contains_properly(poly_geom, geoms)
+    if borda.any():
+        geoms[borda] = shapely.intersection(geoms[borda], poly_geom)
+        manter = ~shapely.is_empty(geoms) & (shapely.area(geoms) > 0)
+        geoms = geoms[manter]
+        valores = valores[manter]
+
+    # Interseções de borda podem gerar MultiPolygon/GeometryCollection:
+    # explodir em polígonos simples, mantendo a classe de origem
+    partes, origem = shapely.get_parts(geoms, return_index=True)
+    poligonos = shapely.get_type_id(partes) == 3
+    geoms = partes[poligonos]
+    valores = valores[origem[poligonos]]
+
+    if simplificacao_px and simplificacao_px > 0 and len(geoms):
+        geoms = _simplificar(geoms, simplificacao_px * max(res_x, res_y))
+        manter = ~shapely.is_empty(geoms) & (shapely.area(geoms) > 0)
+        geoms = geoms[manter]
+        valores = valores[manter]
+
+    return {int(cls_id): geoms[valores == cls_id] for cls_id in np.unique(valores)}
+
+
+def _simplificar(geoms, tolerancia):
+    """Simplifica as regiões como cobertura (sem frestas nem sobreposições).
+
+    Usa `shapely.coverage_simplify` (shapely >= 2.1 / GEOS >= 3.12); em
+    versões antigas, cai para `simplify(preserve_topology=True)` por polígono.
+    """
+    if hasattr(shapely, "coverage_simplify"):
+        try:
+            return shapely.coverage_simplify(geoms, tolerancia)
+        except Exception as e:
+            logger.warning(f"[KML Export] coverage_simplify falhou, usando simplify: {e}")
+    return shapely.simplify(geoms, tolerancia, preserve_topology=True)
 
+
+# ------------------------------------------------------------------------------
+# Vetorização (etapas 1–4)
+# ------------------------------------------------------------------------------
+def _coletar_vetores(
+    raster_path: str,
+    polygon_geojson: dict,
+    include_zero_class: bool = False,
+    simplificacao_px: float = 0.0,
+) -> dict:
+    """Vetoriza o raster dentro dos polígonos e devolve {classe: geometrias WGS84}."""
+    import geopandas as gpd
+    import rasterio
+    from rasterio.crs import CRS
+    from pyproj import Transformer
     # --- 1. Carregar polígono e preparar geometria ---
     gdf = gpd.GeoDataFrame.from_features(
         polygon_geojson["features"], crs="EPSG:4326"
@@ -78,8 +177,6 @@ def gerar_kml(
 
         # Converter polígono para CRS do raster
         gdf_raster_crs = gdf.to_crs(tiff_crs)
-        geom_union = unary_union(gdf_raster_crs.geometry)
-        geom_union = make_valid(geom_union)
 
         # --- 2. Recortar e ler raster por POLÍGONO individual ---
         # Garantir que não carregamos bounding boxes gigantes se houver
@@ -95,157 +192,172 @@ def gerar_kml(
                 geoms_list.append(valid_geom)
             elif isinstance(valid_geom, GeometryCollection):
                 geoms_list.extend([g for g in valid_geom.geoms if isinstance(g, (Polygon, MultiPolygon))])
-                
+
         vetores_por_classe = {}
         for poly_geom in geoms_list:
             if poly_geom.is_empty:
                 continue
+            for cls_id, geoms in _vetorizar_poligono(
+                src, poly_geom, include_zero_class, simplificacao_px
+            ).items():
+                vetores_por_classe.setdefault(cls_id, []).append(geoms)
 
-            res_x = src.transform.a
-            res_y = abs(src.transform.e)
-            buffer_dist = max(res_x, res_y)
-            
-            buffered_geom = poly_geom.buffer(buffer_dist)
-            bounds = buffered_geom.bounds
-            
-            try:
-                window = from_bounds(*bounds, transform=src.transform)
-                window = window.round_offsets().round_lengths()
-                window = window.crop(height=src.height, width=src.width)
-            except Exception as e:
-                logger.warning(f"Erro ao calcular window para o polígono: {e}")
-                continue
-
-            if window.width <= 0 or window.height <= 0:
-                continue # Polígono fora do raster
-
-            data = src.read(1, window=window, masked=True)
-            data_arr = np.asarray(data.filled(0), dtype=np.int32)
-            window_transform = rasterio.windows.transform(window, src.transform)
-
-            valid_mask = data_arr > 0
-
-            # --- 3. Vetorizar pixels e Recortar bordas ---
-            for geom_dict, value in shapes(
-                data_arr,
-                mask=valid_mask,
-                transform=window_transform,
-                connectivity=4,
-            ):
-                cls_id = int(value)
-                if cls_id == 0 and not include_zero_class:
-                    continue
-                    
-                pixel_poly = shape(geom_dict)
-                if not pixel_poly.is_valid:
-                    pixel_poly = make_valid(pixel_poly)
-                    
-                if not pixel_poly.intersects(poly_geom):
-                    continue
-                    
-                intersection_poly = pixel_poly.intersection(poly_geom)
-                if intersection_poly.is_empty:
-                    continue
-
-                valid_polys = []
-                if isinstance(intersection_poly, (Polygon, MultiPolygon)):
-                    valid_polys.append(intersection_poly)
-                elif hasattr(intersection_poly, "geoms"):
-                    for g in intersection_poly.geoms:
-                        if isinstance(g, (Polygon, MultiPolygon)):
-                            valid_polys.append(g)
-                
-                if not valid_polys:
-                    continue
-
-                if cls_id not in vetores_por_classe:
-                    vetores_por_classe[cls_id] = []
-                vetores_por_classe[cls_id].extend(valid_polys)
+        vetores_por_classe = {
+            cls_id: np.concatenate(partes)
+            for cls_id, partes in vetores_por_classe.items()
+        }
 
         logger.info(
             f"[KML Export] Vetorizado: {sum(len(v) for v in vetores_por_classe.values())} polígonos em {len(vetores_por_classe)} classes"
         )
 
-        # --- 4. Converter coordenadas para WGS84 se necessário ---
+        # --- 4. Converter coordenadas para WGS84 (vetorizado) ---
         need_transform = tiff_crs and str(tiff_crs) != "EPSG:4326"
-        transformer = None
         if need_transform:
             transformer = Transformer.from_crs(
                 tiff_crs, "EPSG:4326", always_xy=True
             )
 
-    # --- 5. Construir KML ---
-    kml = simplekml.Kml()
-    kml.document.name = nome_documento
+            def _to_wgs84(coords):
+                lon, lat = transformer.transform(coords[:, 0], coords[:, 1])
+                return np.column_stack([lon, lat])
 
-    for cls_id, polys in sorted(vetores_por_classe.items()):
-        if not polys:
-            continue
+            vetores_por_classe = {
+                cls_id: shapely.transform(geoms, _to_wgs84)
+                for cls_id, geoms in vetores_por_classe.items()
+            }
 
-        nome_classe = classes_nomes.get(cls_id, f"Classe {cls_id}")
-        cor_hex = classes_cores.get(cls_id, "#CCCCCC")
-        cor_kml = _hex_to_kml_color(cor_hex, 255) # 255 = 100% opacity
-
-        # Unificar polígonos adjacentes da mesma classe para KML mais limpo
-        merged = unary_union(polys)
-        merged = make_valid(merged)
-
-        # Normalizar para lista de polígonos
-        if isinstance(merged, Polygon):
-            poly_list = [merged]
-        elif isinstance(merged, MultiPolygon):
-            poly_list = list(merged.geoms)
-        else:
-            # GeometryCollection ou outro tipo
-            poly_list = [
-                g for g in merged.geoms
-                if isinstance(g, (Polygon, MultiPolygon))
-            ]
-
-        if not poly_list:
-            continue
-
-        # Criar MultiGeometry para agrupar polígonos da mesma classe
-        multi_geom = kml.newmultigeometry(name=nome_classe)
-
-        for poly in poly_list:
-            if isinstance(poly, MultiPolygon):
-                for sub in poly.geoms:
-                    _add_polygon_to_multi(multi_geom, sub, transformer)
-            else:
-                _add_polygon_to_multi(multi_geom, poly, transformer)
-
-        # Estilo
-        multi_geom.style.polystyle.color = cor_kml
-        multi_geom.style.polystyle.fill = 1
-        multi_geom.style.polystyle.outline = 0
+    return vetores_por_classe
+
+
+# ------------------------------------------------------------------------------
+# Serialização KML em streaming (etapa 5)
+# ------------------------------------------------------------------------------
+def _kml_coords(coords) -> str:
+    """Formata um anel (N×2) como 'lon,lat lon,lat ...' (7 casas ≈ 1 cm)."""
+    xy = np.asarray(coords)[:, :2]
+    return ("%.7f,%.7f " * len(xy) % tuple(xy.ravel())).rstrip()
+
+
+def _kml_polygon(polygon) -> str:
+    partes = [
+        "<Polygon><outerBoundaryIs><LinearRing><coordinates>",
+        _kml_coords(polygon.exterior.coords),
+        "</coordinates></LinearRing></outerBoundaryIs>",
+    ]
+    for interior in polygon.interiors:
+        partes.append("<innerBoundaryIs><LinearRing><coordinates>")
+        partes.append(_kml_coords(interior.coords))
+        partes.append("</coordinates></LinearRing></innerBoundaryIs>")
+    partes.append("</Polygon>")
+    return "".join(partes)
 
+
+def _iter_kml(
+    vetores_por_classe: dict,
+    classes_nomes: dict,
+    classes_cores: dict,
+    nome_documento: str,
+) -> Iterator[str]:
+    """Emite o documento KML em blocos: um Placemark/MultiGeometry por classe."""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+        f"<Document><name>{escape(nome_documento)}</name>\n"
+    )
+
+    classes = [
+        (cls_id, polys)
+        for cls_id, polys in sorted(vetores_por_classe.items())
+        if len(polys)
+    ]
+
+    for cls_id, _ in classes:
+        cor_kml = _hex_to_kml_color(classes_cores.get(cls_id, "#CCCCCC"), 255)
+        yield (
+            f'<Style id="classe_{cls_id}"><PolyStyle>'
+            f"<color>{cor_kml}</color><fill>1</fill><outline>0</outline>"
+            "</PolyStyle></Style>\n"
+        )
+
+    for cls_id, polys in classes:
+        nome_classe = classes_nomes.get(cls_id, f"Classe {cls_id}")
+        yield (
+            f"<Placemark><name>{escape(str(nome_classe))}</name>"
+            f"<styleUrl>#classe_{cls_id}</styleUrl><MultiGeometry>\n"
+        )
+        bloco = []
+        for poly in polys:
+            bloco.append(_kml_polygon(poly))
+            if len(bloco) >= _POLIGONOS_POR_BLOCO:
+                yield "\n".join(bloco) + "\n"
+                bloco = []
+        if bloco:
+            yield "\n".join(bloco) + "\n"
+        yield "</MultiGeometry></Placemark>\n"
+
+    yield "</Document>\n</kml>\n"
     logger.info(f"[KML Export] KML gerado com sucesso: {nome_documento}")
-    return kml.kml()
 
 
-def _add_polygon_to_multi(multi_geom, polygon, transformer=None):
-    """Adiciona um polígono Shapely ao MultiGeometry do simplekml,
-    convertendo coordenadas para WGS84 se um Transformer for fornecido."""
-    if polygon.is_empty:
-        return
+# ------------------------------------------------------------------------------
+# Funções principais — genéricas e extensíveis
+# ------------------------------------------------------------------------------
+def gerar_kml_stream(
+    raster_path: str,
+    polygon_geojson: dict,
+    classes_nomes: dict,
+    classes_cores: dict,
+    nome_documento: str = "InfoGEO - Exportação",
+    include_zero_class: bool = False,
+    simplificacao_px: float = 0.0,
+) -> Iterator[str]:
+    """Vetoriza o raster recortado pelo polígono e devolve o KML em blocos.
 
-    coords = list(polygon.exterior.coords)
+    A vetorização é feita antes do retorno (erros aparecem aqui, não no meio
+    da resposta); apenas a serialização é preguiçosa.
 
-    if transformer:
-        coords = [transformer.transform(pt[0], pt[1]) for pt in coords]
+    Args:
+        raster_path:      Caminho absoluto para o arquivo raster (TIFF/COG).
+        polygon_geojson:  GeoJSON do polígono de recorte (FeatureCollection).
+        classes_nomes:    Dict {int_classe: "Nome da classe"}.
+        classes_cores:    Dict {int_classe: "#RRGGBB"}.
+        nome_documento:   Nome do documento raiz no KML.
+        include_zero_class: Se True, inclui a classe 0 (NoData).
+        simplificacao_px: Tolerância de simplificação em pixels (0 = exato).
 
-    # simplekml espera (lon, lat) — que é (x, y) em WGS84, ignorando Z se existir
-    kml_coords = [(pt[0], pt[1]) for pt in coords]
-    
-    # Processar buracos (interiors) se existirem
-    inner_boundaries = []
-    for interior in polygon.interiors:
-        int_coords = list(interior.coords)
-        if transformer:
-            int_coords = [transformer.transform(pt[0], pt[1]) for pt in int_coords]
-        inner_boundaries.append([(pt[0], pt[1]) for pt in int_coords])
-
-    poly_kml = multi_geom.newpolygon(outerboundaryis=kml_coords)
-    if inner_boundaries:
-        poly_kml.innerboundaryis = inner_boundaries
+    Returns:
+        Iterador de strings que, concatenadas, formam o KML completo.
+    """
+    logger.info(f"[KML Export] Iniciando exportação: {nome_documento}")
+    logger.info(f"[KML Export] Raster: {raster_path}")
+
+    vetores_por_classe = _coletar_vetores(
+        raster_path, polygon_geojson, include_zero_class, simplificacao_px
+    )
+    return _iter_kml(vetores_por_classe, classes_nomes, classes_cores, nome_documento)
+
+
+def gerar_kml(*args, **kwargs) -> str:
+    """Igual a `gerar_kml_stream`, mas devolve o KML completo como string."""
+    return "".join(gerar_kml_stream(*args, **kwargs))
+
+
+def gerar_kmz(*args, **kwargs):
+    """Igual a `gerar_kml_stream`, gravando o KML compactado (KMZ).
+
+    Retorna um arquivo temporário posicionado no início; quem recebe é
+    responsável por fechá-lo (ex.: `send_file`).
+    """
+    blocos = gerar_kml_stream(*args, **kwargs)
+    out = SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES, mode="w+b")
+    try:
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as kmz:
+            with kmz.open("doc.kml", "w") as doc:
+                for bloco in blocos:
+                    doc.write(bloco.encode("utf-8"))
+    except Exception:
+        out.close()
+        raise
+    out.seek(0)
+    return out
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Tabela climática municipal (Köppen)
+=============================================
+Dados climáticos por município (temperatura, precipitação, altitude e
+classe Köppen dominante) indexados pelo código IBGE:
+
+  - o Excel `Koppen_Brasil.xls` é lido uma única vez e convertido num
+    pacote mapeado (server/camadas_mapeadas.py, nome "koppen_clima"):
+    códigos, textos e as séries mensais em arrays NumPy, abertos em
+    milissegundos e sem xlrd;
+  - a consulta é pelo código IBGE do município (localizador municipal de
+    server/geocoding.py) — acesso direto por dicionário, sem comparar nomes;
+  - sem código (ponto geocodificado pelo Nominatim), o nome é comparado já
+    normalizado (sem acentos, pontuação e caixa) num dicionário
+    nome/UF → linha, também sem varrer a tabela.
+
+O pacote guarda a versão (tamanho + mtime) do Excel e é refeito se ele
+mudar; se só o pacote estiver presente, é usado como está. Geração de
+todas as camadas: `python -m server.camadas_mapeadas`.
+"""
+
+import logging
+import re
+import unicodedata
+
+import numpy as np
+
+from . import camadas_mapeadas
+
+logger = logging.getLogger("lulc-analyzer")
+
+_NOME = "koppen_clima"
+
+_MESES_EN = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+_MESES_PT = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+
+# Colunas do Excel (aba "Data") → arrays da tabela
+_COLUNAS_TEXTO = {
+    "municipio": "Municipality",
+    "uf": "State",
+    "regiao": "Region",
+    "koppen": "Köppen",
+}
+
+# Séries mensais → colunas do pacote (uma por mês)
+_SERIES = {"temperaturas": "t", "precipitacoes": "r"}
+
+
+def normalizar_nome(texto) -> str:
+    """Nome comparável: sem acentos, pontuação e espaços repetidos, em maiúsculas."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^0-9A-Za-z]+", " ", texto).upper().split())
+
+
+# ------------------------------------------------------------------------------
+# Geração
+# ------------------------------------------------------------------------------
+def _ler_excel(excel_path) -> dict:
+    """Arrays da tabela a partir do Excel Köppen (aba "Data")."""
+    import pandas as pd
+
+    df = pd.read_excel(str(excel_path), sheet_name="Data")
+    arrays = {
+        nome: df[coluna].fillna("").astype(str).str.strip().to_numpy(dtype=str)
+        for nome, coluna in _COLUNAS_TEXTO.items()
+    }
+    arrays["codigo"] = (
+        pd.to_numeric(df["IBGE-Code"], errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+    )
+    arrays["altitude"] = pd.to_numeric(df["Altitude"], errors="coerce").to_numpy(dtype=np.float64)
+    arrays["temperaturas"] = df[[f"T_{m}" for m in _MESES_EN]].to_numpy(dtype=np.float64)
+    arrays["precipitacoes"] = df[[f"R_{m}" for m in _MESES_EN]].to_numpy(dtype=np.float64)
+    return arrays
+
+
+def _ler_tabela(excel_path):
+    """DataFrame do pacote: os arrays do Excel, com as séries mensais em colunas."""
+    import pandas as pd
+
+    arrays = _ler_excel(excel_path)
+    colunas = {nome: arrays[nome] for nome in (*_COLUNAS_TEXTO, "codigo", "altitude")}
+    for serie, prefixo in _SERIES.items():
+        for i in range(12):
+            colunas[f"{prefixo}{i:02d}"] = arrays[serie][:, i]
+    return pd.DataFrame(colunas)
+
+
+def _arrays(tabela) -> dict:
+    """Arrays da TabelaClima a partir do pacote mapeado."""
+    arrays = {nome: tabela.valores(nome) for nome in (*_COLUNAS_TEXTO, "codigo", "altitude")}
+    for nome in _COLUNAS_TEXTO:
+        arrays[nome] = np.array(["" if v is None else v for v in arrays[nome]], dtype=str)
+    for serie, prefixo in _SERIES.items():
+        arrays[serie] = np.column_stack([tabela.valores(f"{prefixo}{i:02d}") for i in range(12)])
+    return arrays
+
+
+# ------------------------------------------------------------------------------
+# Consulta
+# ------------------------------------------------------------------------------
+class TabelaClima:
+    """Tabela climática municipal com índices por código IBGE e por nome/UF."""
+
+    def __init__(self, arrays):
+        self._arrays = {nome: arrays[nome] for nome in arrays if nome != "origem"}
+        codigos = self._arrays["codigo"]
+        # Primeira ocorrência prevalece; códigos de 7 dígitos também entram
+        # sem o dígito verificador (bases que usam 6)
+        self._por_codigo = {}
+        for i, codigo in enumerate(codigos.tolist()):
+            if codigo >= 0:
+                self._por_codigo.setdefault(codigo, i)
+        for i, codigo in enumerate(codigos.tolist()):
+            if codigo >= 1_000_000:
+                self._por_codigo.setdefault(codigo // 10, i)
+
+        self._por_nome_uf = {}
+        por_nome = {}
+        for i, (municipio, uf) in enumerate(zip(self._arrays["municipio"], self._arrays["uf"])):
+            nome = normalizar_nome(municipio)
+            self._por_nome_uf.setdefault((nome, normalizar_nome(uf)), i)
+            por_nome.setdefault(nome, []).append(i)
+        # Só o nome (UF divergente): apenas quando não há homônimos
+        self._por_nome = {nome: linhas[0] for nome, linhas in por_nome.items() if len(linhas) == 1}
+
+    def __len__(self):
+        return len(self._arrays["codigo"])
+
+    def linha_por_codigo(self, codigo):
+        """Linha do município pelo código IBGE (7 dígitos ou 6, sem o verificador)."""
+        try:
+            codigo = int(codigo)
+        except (TypeError, ValueError):
+            return None
+        linha = self._por_codigo.get(codigo)
+        if linha is None and codigo >= 1_000_000:
+            linha = self._por_codigo.get(codigo // 10)
+        return linha
+
+    def linha_por_nome(self, municipio, uf=None):
+        """Linha do município pelo nome normalizado (e UF, se houver)."""
+        nome = normalizar_nome(municipio)
+        if not nome:
+            return None
+        linha = self._por_nome_uf.get((nome, normalizar_nome(uf)))
+        return linha if linha is not None else self._por_nome.get(nome)
+
+    def registro(self, linha) -> dict:
+        """Dados climáticos da linha no formato da resposta da análise Köppen."""
+        a = self._arrays
+        temps = [float(t) for t in a["temperaturas"][linha]]
+        precs = [float(p) for p in a["precipitacoes"][linha]]
+        codigo = int(a["codigo"][linha])
+        altitude = float(a["altitude"][linha])
+        return {
+            "municipio": str(a["municipio"][linha]),
+            "codigo_ibge": codigo if codigo >= 0 else None,
+            "uf": str(a["uf"][linha]),
+            "regiao": str(a["regiao"][linha]),
+            "koppen_dominante": str(a["koppen"][linha]),
+            "altitude_m": round(altitude, 1) if np.isfinite(altitude) else None,
+            "temperatura_media_anual": round(sum(temps) / 12, 1),
+            "precipitacao_total_anual": round(sum(precs), 1),
+            "temperaturas_mensais": {_MESES_PT[i]: round(t, 1) for i, t in enumerate(temps)},
+            "precipitacoes_mensais": {_MESES_PT[i]: round(p, 1) for i, p in enumerate(precs)},
+        }
+
+    def buscar(self, codigo_ibge=None, municipio=None, uf=None):
+        """Registro pelo código IBGE ou, sem ele, pelo nome; None se não houver."""
+        linha = self.linha_por_codigo(codigo_ibge) if codigo_ibge is not None else None
+        if linha is None and municipio:
+            linha = self.linha_por_nome(municipio, uf)
+        return self.registro(linha) if linha is not None else None
+
+
+_aberta = (None, None)  # (pacote mapeado, TabelaClima construída sobre ele)
+
+
+def carregar(excel_path=None):
+    """Tabela climática atual (em memória, por processo) ou None.
+
+    O pacote mapeado é gerado a partir do Excel na primeira chamada após
+    uma mudança dele; sem o Excel, usa o pacote mais recente que houver.
+    """
+    if excel_path is None:
+        from config import KOPPEN_EXCEL_PATH as excel_path
+
+    try:
+        tabela = camadas_mapeadas.carregar(_NOME, excel_path, lambda: _ler_tabela(excel_path))
+    except Exception as e:
+        logger.error(f"Erro ao carregar Excel Köppen: {e}")
+        return None
+    if tabela is None:
+        return None
+
+    global _aberta
+    pacote, clima = _aberta
+    if pacote is not tabela:
+        clima = TabelaClima(_arrays(tabela))
+        _aberta = (tabela, clima)
+    return clima
+
+
+def limpar_cache():
+    """Descarta a tabela em memória (recarga após troca dos dados)."""
+    global _aberta
+    camadas_mapeadas.limpar_cache(_NOME)
+    _aberta = (None, None)
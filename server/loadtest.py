@@ -0,0 +1,519 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Teste de carga com corpus reproduzível
+================================================
+Gera um corpus de requisições sintéticas (JSONL, semente fixa) e o
+reexecuta contra um servidor já em execução:
+
+    python -m server.loadtest gerar corpus.jsonl --requisicoes 2000 --limites=-50,-17,-47,-14
+    python -m server.loadtest rodar corpus.jsonl --url http://127.0.0.1:5000 \\
+        --concorrencia 8 --duracao 120 --pid <pid do gunicorn/hypercorn>
+
+O corpus mistura, com pesos configuráveis (`--mix rota=peso,...`):
+`/analisar`, os endpoints de cada módulo, `/buscar-car`,
+`/buscar-car-por-coordenada`, `/exportar-kml` e `/analisar-lote-completo`.
+Os polígonos (1 a 5 000 ha, log-uniforme) caem dentro de `--limites`, que
+deve coincidir com a área coberta pelos rasters do servidor; `--reuso` é a
+fração de requisições que repete um polígono anterior (acertos do cache de
+resultados, como na prática).
+
+O relatório traz, por rota: requisições, vazão, p50/p95/p99/máx da latência,
+taxa de erro e códigos HTTP. Com `--pid` (Linux), a memória de cada processo
+da árvore do servidor (mestre, workers, pool de análises) é amostrada em
+/proc: RSS no início, no fim e pico (VmHWM) — RSS que só cresce entre
+rodadas aponta vazamento nos caches. Com /metrics ligado, o tamanho dos
+caches antes/depois também é exibido (de um worker qualquer).
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+MIX_PADRAO = {
+    "/analisar": 20,
+    "/analisar-declividade": 5,
+    "/analisar-aptidao": 5,
+    "/analisar-solo-textural": 4,
+    "/analisar-koppen": 4,
+    "/analisar-prodes": 6,
+    "/analisar-embargo": 4,
+    "/analisar-icmbio": 3,
+    "/analisar-solos": 3,
+    "/buscar-car": 20,
+    "/buscar-car-por-coordenada": 18,
+    "/exportar-kml": 5,
+    "/analisar-lote-completo": 3,
+}
+
+# Campos extras do formulário de cada rota de upload (campo do arquivo: "kml")
+FORMULARIOS = {
+    "/analisar": {"raster_type": "com_mosaico", "enable_valoracao": "true", "formato_imagem": "url"},
+    "/analisar-declividade": {"formato_imagem": "url"},
+    "/analisar-aptidao": {"formato_imagem": "url"},
+    "/analisar-solo-textural": {"formato_imagem": "url"},
+    "/analisar-koppen": {"formato_imagem": "url"},
+    "/analisar-prodes": {"formato_imagem": "url"},
+    "/analisar-embargo": {},
+    "/analisar-icmbio": {},
+    "/analisar-solos": {},
+}
+
+ANALISES_KML = ("uso_solo", "declividade", "aptidao")
+ANALISES_LOTE = ("uso_solo", "declividade", "aptidao", "prodes", "embargo")
+
+UFS = ("AC", "AM", "BA", "GO", "MA", "MG", "MS", "MT", "PA", "PR", "RO", "RS", "SP", "TO")
+
+LIMITES_PADRAO = (-50.0, -17.0, -47.0, -14.0)
+AREA_MIN_HA, AREA_MAX_HA = 1, 5_000
+
+
+# ------------------------------------------------------------------------------
+# Corpus
+# ------------------------------------------------------------------------------
+def _feature_collection(geoms) -> dict:
+    from shapely.geometry import mapping
+
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": {"id": i}, "geometry": mapping(g)}
+            for i, g in enumerate(geoms, 1)
+        ],
+    }
+
+
+def gerar_corpus(n: int, mix: dict, limites, semente: int = 0, reuso: float = 0.2,
+                 car_consultas=None):
+    """Lista de n requisições (dicts serializáveis) sorteadas segundo `mix`."""
+    from .benchmark import _poligono
+
+    rng = np.random.default_rng(semente)
+    oeste, sul, leste, norte = limites
+    rotas = list(mix)
+    pesos = np.asarray([mix[r] for r in rotas], dtype=float)
+    pesos /= pesos.sum()
+    anteriores = []
+
+    def area_ha():
+        return float(math.exp(rng.uniform(math.log(AREA_MIN_HA), math.log(AREA_MAX_HA))))
+
+    def ponto():
+        return float(rng.uniform(oeste, leste)), float(rng.uniform(sul, norte))
+
+    def poligono():
+        if anteriores and rng.random() < reuso:
+            return anteriores[int(rng.integers(len(anteriores)))]
+        geom = _poligono(*ponto(), area_ha(), rng, 32)
+        anteriores.append(geom)
+        return geom
+
+    def consulta_car():
+        if car_consultas:
+            return car_consultas[int(rng.integers(len(car_consultas)))]
+        codigo = f"{UFS[int(rng.integers(len(UFS)))]}-{int(rng.integers(1_100_000, 5_300_000))}"
+        return codigo[: int(rng.integers(3, len(codigo) + 1))]
+
+    corpus = []
+    for rota in rng.choice(rotas, size=n, p=pesos):
+        rota = str(rota)
+        if rota in FORMULARIOS:
+            requisicao = {
+                "form": FORMULARIOS[rota],
+                "arquivo": {
+                    "campo": "kml",
+                    "nome": "area.geojson",
+                    "conteudo": json.dumps(_feature_collection([poligono()])),
+                },
+            }
+        elif rota == "/analisar-lote-completo":
+            n_feicoes = int(rng.integers(5, 51))
+            geoms = [_poligono(*ponto(), float(rng.uniform(1, 50)), rng, 24) for _ in range(n_feicoes)]
+            requisicao = {
+                "form": {"analises": json.dumps(list(ANALISES_LOTE)), "output_format": "csv"},
+                "arquivo": {
+                    "campo": "file",
+                    "nome": "lote.geojson",
+                    "conteudo": json.dumps(_feature_collection(geoms)),
+                },
+            }
+        elif rota == "/exportar-kml":
+            requisicao = {"json": {
+                "analysis_type": ANALISES_KML[int(rng.integers(len(ANALISES_KML)))],
+                "polygon_geojson": _feature_collection([poligono()]),
+                "formato": "kml",
+            }}
+        elif rota == "/buscar-car":
+            requisicao = {"query": {"q": consulta_car()}}
+        elif rota == "/buscar-car-por-coordenada":
+            lon, lat = ponto()
+            requisicao = {"query": {"lat": round(lat, 6), "lon": round(lon, 6)}}
+        else:
+            raise ValueError(f"Rota sem gerador no corpus: {rota}")
+        requisicao["rota"] = rota
+        requisicao["metodo"] = "GET" if "query" in requisicao else "POST"
+        corpus.append(requisicao)
+    return corpus
+
+
+def _preparar(requisicao: dict):
+    """(rota, método, caminho com query, corpo, cabeçalhos) pronto para envio."""
+    rota = requisicao["rota"]
+    caminho = rota + ("?" + urlencode(requisicao["query"]) if requisicao.get("query") else "")
+    cabecalhos = {}
+    corpo = None
+    if "json" in requisicao:
+        corpo = json.dumps(requisicao["json"]).encode("utf-8")
+        cabecalhos["Content-Type"] = "application/json"
+    elif "arquivo" in requisicao:
+        limite = uuid.uuid4().hex
+        partes = [
+            f'--{limite}\r\nContent-Disposition: form-data; name="{campo}"\r\n\r\n{valor}\r\n'.encode("utf-8")
+            for campo, valor in requisicao.get("form", {}).items()
+        ]
+        arquivo = requisicao["arquivo"]
+        partes.append(
+            f'--{limite}\r\nContent-Disposition: form-data; name="{arquivo["campo"]}"; '
+            f'filename="{arquivo["nome"]}"\r\nContent-Type: application/geo+json\r\n\r\n'.encode("utf-8")
+            + arquivo["conteudo"].encode("utf-8")
+            + b"\r\n"
+        )
+        partes.append(f"--{limite}--\r\n".encode("utf-8"))
+        corpo = b"".join(partes)
+        cabecalhos["Content-Type"] = f"multipart/form-data; boundary={limite}"
+    return rota, requisicao["metodo"], caminho, corpo, cabecalhos
+
+
+# ------------------------------------------------------------------------------
+# Memória dos processos do servidor (/proc, Linux)
+# ------------------------------------------------------------------------------
+def _arvore(pid: int) -> list:
+    """pid e todos os descendentes."""
+    pids, pendentes = [], [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        pids.append(atual)
+        try:
+            for tarefa in os.listdir(f"/proc/{atual}/task"):
+                with open(f"/proc/{atual}/task/{tarefa}/children") as f:
+                    pendentes.extend(int(p) for p in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def _status_kb(pid: int) -> dict:
+    valores = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linha in f:
+                chave, _, resto = linha.partition(":")
+                if chave in ("VmRSS", "VmHWM"):
+                    valores[chave] = int(resto.split()[0])
+    except OSError:
+        pass
+    return valores
+
+
+def _comando(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            partes = f.read().split(b"\0")
+        return " ".join(p.decode(errors="replace") for p in partes if p)[:70]
+    except OSError:
+        return "?"
+
+
+class MonitorMemoria(threading.Thread):
+    """Amostra o RSS da árvore de processos do servidor a cada `intervalo` s."""
+
+    def __init__(self, pid: int, intervalo: float = 0.5):
+        super().__init__(name="monitor-memoria", daemon=True)
+        self.pid = pid
+        self.intervalo = intervalo
+        self.processos = {}  # pid → {comando, inicio_kb, fim_kb, pico_kb}
+        self._parar = threading.Event()
+
+    def amostrar(self):
+        for pid in _arvore(self.pid):
+            status = _status_kb(pid)
+            if "VmRSS" not in status:
+                continue
+            info = self.processos.get(pid)
+            if info is None:
+                info = self.processos[pid] = {
+                    "comando": _comando(pid),
+                    "inicio_kb": status["VmRSS"],
+                    "pico_kb": 0,
+                }
+            info["fim_kb"] = status["VmRSS"]
+            info["pico_kb"] = max(info["pico_kb"], status["VmRSS"], status.get("VmHWM", 0))
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            self.amostrar()
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        self.amostrar()
+
+
+# ------------------------------------------------------------------------------
+# Execução
+# ------------------------------------------------------------------------------
+def _percentil(ordenados, p: float) -> float:
+    """Percentil por posição mais próxima."""
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, max(0, math.ceil(p / 100 * len(ordenados)) - 1))]
+
+
+def _caches(url) -> dict:
+    """{cache: bytes} lidos de /metrics (vazio se as métricas estiverem desligadas)."""
+    try:
+        status, corpo = _requisicao_avulsa(url, "/metrics")
+    except OSError:
+        return {}
+    if status != 200:
+        return {}
+    caches = {}
+    for linha in corpo.decode("utf-8", "replace").splitlines():
+        if linha.startswith("infogeo_cache_") and "_bytes " in linha:
+            nome, valor = linha.split()
+            caches[nome[len("infogeo_cache_"):-len("_bytes")]] = int(float(valor))
+    return caches
+
+
+def _requisicao_avulsa(url, caminho):
+    conexao = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    try:
+        conexao.request("GET", caminho)
+        resposta = conexao.getresponse()
+        return resposta.status, resposta.read()
+    finally:
+        conexao.close()
+
+
+def executar(url, preparadas, concorrencia: int, duracao: float, timeout: float):
+    """Reexecuta as requisições; devolve ([(rota, status, segundos)], segundos totais).
+
+    Com `duracao` > 0 o corpus é repetido até o tempo acabar; senão cada
+    requisição é enviada uma vez. status 0 = falha de conexão/timeout.
+    """
+    lock = threading.Lock()
+    proxima = [0]
+    observacoes = []
+    fim = time.perf_counter() + duracao if duracao > 0 else None
+
+    def trabalhador():
+        conexao = None
+        while True:
+            with lock:
+                i = proxima[0]
+                proxima[0] += 1
+            if fim is None and i >= len(preparadas):
+                break
+            if fim is not None and time.perf_counter() >= fim:
+                break
+            rota, metodo, caminho, corpo, cabecalhos = preparadas[i % len(preparadas)]
+
+            inicio = time.perf_counter()
+            try:
+                if conexao is None:
+                    conexao = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+                conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+                resposta = conexao.getresponse()
+                resposta.read()
+                status = resposta.status
+                if resposta.will_close:
+                    conexao.close()
+                    conexao = None
+            except (OSError, http.client.HTTPException):
+                status = 0
+                if conexao is not None:
+                    conexao.close()
+                conexao = None
+            decorrido = time.perf_counter() - inicio
+            with lock:
+                observacoes.append((rota, status, decorrido))
+        if conexao is not None:
+            conexao.close()
+
+    inicio = time.perf_counter()
+    threads = [
+        threading.Thread(target=trabalhador, name=f"carga-{i}", daemon=True)
+        for i in range(max(1, concorrencia))
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return observacoes, time.perf_counter() - inicio
+
+
+def resumir(observacoes, segundos: float) -> dict:
+    """Estatísticas por rota e total."""
+    por_rota = {}
+    for rota, status, decorrido in observacoes:
+        por_rota.setdefault(rota, []).append((status, decorrido))
+    por_rota["TOTAL"] = [(s, d) for _, s, d in observacoes]
+
+    resumo = {}
+    for rota, itens in por_rota.items():
+        tempos = sorted(d for _, d in itens)
+        erros = sum(1 for s, _ in itens if s == 0 or s >= 400)
+        codigos = {}
+        for s, _ in itens:
+            codigos[str(s)] = codigos.get(str(s), 0) + 1
+        resumo[rota] = {
+            "requisicoes": len(itens),
+            "vazao_rps": round(len(itens) / segundos, 2) if segundos > 0 else 0.0,
+            "p50_ms": round(_percentil(tempos, 50) * 1000, 1),
+            "p95_ms": round(_percentil(tempos, 95) * 1000, 1),
+            "p99_ms": round(_percentil(tempos, 99) * 1000, 1),
+            "max_ms": round(tempos[-1] * 1000, 1) if tempos else 0.0,
+            "erros": erros,
+            "taxa_erro": round(erros / len(itens), 4) if itens else 0.0,
+            "codigos": dict(sorted(codigos.items())),
+        }
+    return resumo
+
+
+def _imprimir(resumo: dict, memoria: dict, caches_antes: dict, caches_depois: dict):
+    print(f"{'rota':32} {'req':>6} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8} {'erro%':>6}  códigos")
+    for rota, r in sorted(resumo.items(), key=lambda item: (item[0] == "TOTAL", item[0])):
+        codigos = " ".join(f"{c}:{n}" for c, n in r["codigos"].items())
+        print(
+            f"{rota:32} {r['requisicoes']:6d} {r['vazao_rps']:7.2f} {r['p50_ms']:8.1f} "
+            f"{r['p95_ms']:8.1f} {r['p99_ms']:8.1f} {r['max_ms']:8.1f} "
+            f"{r['taxa_erro'] * 100:6.2f}  {codigos}"
+        )
+    if memoria:
+        print(f"\n{'pid':>8} {'RSS início':>11} {'RSS fim':>9} {'pico':>9}  processo (MB)")
+        for pid, m in sorted(memoria.items()):
+            print(
+                f"{pid:8d} {m['inicio_kb'] / 1024:11.1f} {m['fim_kb'] / 1024:9.1f} "
+                f"{m['pico_kb'] / 1024:9.1f}  {m['comando']}"
+            )
+    if caches_depois:
+        print("\ncaches (MB, /metrics):", ", ".join(
+            f"{nome} {caches_antes.get(nome, 0) / 2**20:.1f} → {valor / 2**20:.1f}"
+            for nome, valor in sorted(caches_depois.items())
+        ))
+
+
+def _ler_mix(texto: str) -> dict:
+    mix = {}
+    for item in texto.split(","):
+        rota, _, peso = item.partition("=")
+        rota = rota.strip()
+        if rota not in MIX_PADRAO:
+            raise argparse.ArgumentTypeError(f"rota desconhecida no mix: {rota}")
+        mix[rota] = float(peso)
+    return {rota: peso for rota, peso in mix.items() if peso > 0}
+
+
+def _ler_limites(texto: str):
+    valores = tuple(float(v) for v in texto.split(","))
+    if len(valores) != 4:
+        raise argparse.ArgumentTypeError("use oeste,sul,leste,norte")
+    return valores
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do InfoGEO")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    gerar = sub.add_parser("gerar", help="gera o corpus de requisições (JSONL)")
+    gerar.add_argument("corpus", type=Path)
+    gerar.add_argument("--requisicoes", type=int, default=1000)
+    gerar.add_argument("--mix", type=_ler_mix, default=dict(MIX_PADRAO),
+                       help="rota=peso,... (rotas omitidas ficam de fora)")
+    gerar.add_argument("--limites", type=_ler_limites, default=LIMITES_PADRAO,
+                       help="oeste,sul,leste,norte (EPSG:4674) cobertos pelos rasters")
+    gerar.add_argument("--reuso", type=float, default=0.2, help="fração de polígonos repetidos")
+    gerar.add_argument("--car-consultas", type=Path, default=None,
+                       help="arquivo com um código/prefixo CAR por linha")
+    gerar.add_argument("--semente", type=int, default=0)
+
+    rodar = sub.add_parser("rodar", help="reexecuta o corpus contra o servidor")
+    rodar.add_argument("corpus", type=Path)
+    rodar.add_argument("--url", default="http://127.0.0.1:5000")
+    rodar.add_argument("--concorrencia", type=int, default=4)
+    rodar.add_argument("--duracao", type=float, default=0,
+                       help="s; repete o corpus até o fim (0 = uma passada)")
+    rodar.add_argument("--timeout", type=float, default=300)
+    rodar.add_argument("--pid", type=int, default=None,
+                       help="pid do servidor (mestre) para medir a memória dos processos")
+    rodar.add_argument("--saida", type=Path, default=None, help="relatório em JSON")
+    args = parser.parse_args(argv)
+
+    if args.comando == "gerar":
+        consultas = None
+        if args.car_consultas:
+            consultas = [
+                linha.strip()
+                for linha in args.car_consultas.read_text(encoding="utf-8").splitlines()
+                if linha.strip()
+            ]
+        corpus = gerar_corpus(args.requisicoes, args.mix, args.limites, args.semente,
+                              args.reuso, consultas)
+        with open(args.corpus, "w", encoding="utf-8") as f:
+            for requisicao in corpus:
+                f.write(json.dumps(requisicao, ensure_ascii=False) + "\n")
+        print(f"{len(corpus)} requisições gravadas em {args.corpus}")
+        return 0
+
+    url = urlsplit(args.url)
+    with open(args.corpus, encoding="utf-8") as f:
+        preparadas = [_preparar(json.loads(linha)) for linha in f if linha.strip()]
+    if not preparadas:
+        print("Corpus vazio")
+        return 1
+
+    monitor = None
+    if args.pid:
+        if not os.path.exists(f"/proc/{args.pid}"):
+            print(f"Processo {args.pid} não encontrado em /proc; memória não será medida")
+        else:
+            monitor = MonitorMemoria(args.pid)
+            monitor.amostrar()
+            monitor.start()
+
+    caches_antes = _caches(url)
+    print(f"{len(preparadas)} requisições, concorrência {args.concorrencia}, "
+          f"{'duração ' + str(args.duracao) + ' s' if args.duracao > 0 else 'uma passada'}")
+    observacoes, segundos = executar(url, preparadas, args.concorrencia, args.duracao, args.timeout)
+    if monitor is not None:
+        monitor.parar()
+    caches_depois = _caches(url)
+
+    resumo = resumir(observacoes, segundos)
+    memoria = monitor.processos if monitor is not None else {}
+    _imprimir(resumo, memoria, caches_antes, caches_depois)
+    print(f"\n{len(observacoes)} requisições em {segundos:.1f} s")
+
+    if args.saida:
+        args.saida.write_text(json.dumps({
+            "url": args.url,
+            "concorrencia": args.concorrencia,
+            "segundos": round(segundos, 3),
+            "rotas": resumo,
+            "memoria": {str(pid): m for pid, m in memoria.items()},
+            "caches_bytes": {"antes": caches_antes, "depois": caches_depois},
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
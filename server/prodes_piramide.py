@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Pirâmide de desmatamento do PRODES (triagem EUDR)
+===========================================================
+Resumo grosseiro do raster PRODES para responder rápido "há desmatamento
+a partir de 2020 neste polígono?" (conformidade EUDR):
+
+  - nível grosso: uma célula por bloco de `celula` × `celula` pixels
+    (padrão 256, o bloco do COG) com o ano de desmatamento mais recente
+    da célula, gravado como GeoTIFF ao lado do raster
+    (`prodes_brasil_cog.eudr.tif`);
+  - nível fino: o próprio raster PRODES, lido apenas nas células do
+    polígono marcadas com desmatamento no ano de corte ou depois.
+
+A maioria dos imóveis não tem nenhuma célula marcada e é respondida só
+pelo nível grosso, sem ler o raster; nos demais a leitura se limita aos
+blocos com risco. O resultado é exato: a área de risco vem sempre dos
+pixels de resolução total.
+
+A pirâmide guarda a versão (tamanho + mtime) do raster de origem e é
+ignorada se ele mudar. Geração:
+
+    python -m server.prodes_piramide
+    python -m server.prodes_piramide --celula 128 --forcar
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger("lulc-analyzer")
+
+_BASE_DIR = Path(__file__).parent.parent
+
+CELULA_PADRAO = 256
+
+# Codificação das células: ano mais recente − _ANO_BASE (0 = sem desmatamento)
+_ANO_BASE = 1999
+
+# Linhas de células processadas por leitura na geração
+_FAIXA_CELULAS = 4
+
+_cache_lock = threading.Lock()
+_cache = {}  # caminho do raster → (versão, PiramideEudr | None)
+
+
+def _versao(caminho) -> str:
+    st = os.stat(caminho)
+    return f"{st.st_size}|{int(st.st_mtime)}"
+
+
+def caminho_piramide(raster_path) -> Path:
+    """Arquivo da pirâmide de um raster PRODES (ao lado dele)."""
+    return Path(raster_path).with_suffix(".eudr.tif")
+
+
+def _tabela_anos() -> np.ndarray:
+    """DN → ano codificado (0 para classes que não são desmatamento)."""
+    from config import PRODES_YEAR_MAP
+
+    tabela = np.zeros(256, dtype=np.uint8)
+    for dn, ano in PRODES_YEAR_MAP.items():
+        tabela[int(dn)] = ano - _ANO_BASE
+    return tabela
+
+
+def classes_risco() -> frozenset:
+    """DNs que tornam o polígono não conforme (marco 2020 e pós-2020)."""
+    from config import PRODES_EUDR_RISK
+
+    return frozenset(
+        dn for dn, risco in PRODES_EUDR_RISK.items() if risco in ("EUDR_MARKER", "HIGH_RISK")
+    )
+
+
+def ano_corte() -> int:
+    """Primeiro ano de desmatamento que conta como risco EUDR."""
+    from config import PRODES_YEAR_MAP
+
+    return min(PRODES_YEAR_MAP[dn] for dn in classes_risco() if dn in PRODES_YEAR_MAP)
+
+
+# ------------------------------------------------------------------------------
+# Geração
+# ------------------------------------------------------------------------------
+def construir(raster_path=None, celula: int = CELULA_PADRAO, forcar: bool = False) -> Path:
+    """Gera (ou mantém, se atual) a pirâmide do raster PRODES."""
+    import rasterio
+    from rasterio.windows import Window
+
+    if raster_path is None:
+        from config import RASTER_PRODES_PATH
+
+        raster_path = RASTER_PRODES_PATH
+    destino = caminho_piramide(raster_path)
+    versao = _versao(raster_path)
+
+    if not forcar and destino.exists():
+        with rasterio.open(destino) as atual:
+            tags = atual.tags()
+        if tags.get("INFOGEO_ORIGEM") == versao and int(tags.get("INFOGEO_CELULA", 0)) == celula:
+            logger.info(f"[PRODES] Pirâmide já atualizada: {destino}")
+            return destino
+
+    tabela = _tabela_anos()
+    with rasterio.open(raster_path) as src:
+        linhas = -(-src.height // celula)
+        colunas = -(-src.width // celula)
+        anos = np.zeros((linhas, colunas), dtype=np.uint8)
+        largura_pad = colunas * celula
+
+        for linha0 in range(0, linhas, _FAIXA_CELULAS):
+            n = min(_FAIXA_CELULAS, linhas - linha0)
+            janela = Window(0, linha0 * celula, src.width, min(n * celula, src.height - linha0 * celula))
+            dados = tabela[src.read(1, window=janela)]
+            faixa = np.zeros((n * celula, largura_pad), dtype=np.uint8)
+            faixa[: dados.shape[0], : dados.shape[1]] = dados
+            anos[linha0 : linha0 + n] = faixa.reshape(n, celula, colunas, celula).max(axis=(1, 3))
+
+        perfil = {
+            "driver": "GTiff",
+            "dtype": "uint8",
+            "count": 1,
+            "width": colunas,
+            "height": linhas,
+            "crs": src.crs,
+            "transform": src.transform * src.transform.scale(celula, celula),
+            "compress": "deflate",
+        }
+
+    temporario = destino.with_name(destino.name + ".tmp")
+    with rasterio.open(temporario, "w", **perfil) as dst:
+        dst.write(anos, 1)
+        dst.update_tags(
+            INFOGEO_ORIGEM=versao,
+            INFOGEO_CELULA=str(celula),
+            INFOGEO_CODIFICACAO=f"ano mais recente de desmatamento - {_ANO_BASE}; 0 = sem desmatamento",
+        )
+    os.replace(temporario, destino)
+
+    com_risco = int((anos >= ano_corte() - _ANO_BASE).sum())
+    logger.info(
+        f"[PRODES] Pirâmide gerada: {destino} ({colunas}x{linhas} células de {celula}px, "
+        f"{com_risco} com desmatamento desde {ano_corte()})"
+    )
+    return destino
+
+
+# ------------------------------------------------------------------------------
+# Consulta
+# ------------------------------------------------------------------------------
+def _areas_risco(src, geom, janelas, area_pixel_ha: float) -> dict:
+    """{DN: área (ha)} das classes de risco nos pixels tocados por `geom`.
+
+    Lê `src` só nas `janelas` (alinhadas à grade do raster); pixels tocados
+    pelo polígono contam inteiros, como em `_fractional_stats`.
+    """
+    from rasterio.features import rasterize
+    from rasterio.windows import transform as window_transform
+
+    risco = classes_risco()
+    areas = {}
+    for janela in janelas:
+        dados = src.read(1, window=janela)
+        tocados = rasterize(
+            [(geom, 1)],
+            out_shape=dados.shape,
+            transform=window_transform(janela, src.transform),
+            fill=0,
+            all_touched=True,
+        ).astype(bool)
+        for dn, n in zip(*np.unique(dados[tocados], return_counts=True)):
+            if int(dn) in risco:
+                areas[int(dn)] = areas.get(int(dn), 0.0) + float(n) * area_pixel_ha
+    return areas
+
+
+def areas_risco_resolucao_total(src, geom, area_pixel_ha: float) -> dict:
+    """Como `PiramideEudr.triagem`, sem pirâmide: lê o envelope inteiro de `geom`."""
+    from rasterio.windows import Window, from_bounds
+
+    janela = from_bounds(*geom.bounds, transform=src.transform)
+    coluna0, linha0 = int(np.floor(janela.col_off)), int(np.floor(janela.row_off))
+    janela = Window(
+        coluna0,
+        linha0,
+        int(np.ceil(janela.col_off + janela.width)) - coluna0 + 1,
+        int(np.ceil(janela.row_off + janela.height)) - linha0 + 1,
+    ).intersection(Window(0, 0, src.width, src.height))
+    return _areas_risco(src, geom, [janela], area_pixel_ha)
+
+
+class PiramideEudr:
+    """Nível grosso em memória + leitura seletiva do raster de resolução total."""
+
+    def __init__(self, anos: np.ndarray, transform, celula: int):
+        self.anos = anos
+        self.transform = transform
+        self.celula = celula
+        self._limiar = ano_corte() - _ANO_BASE
+        self._area_pixel_ha = None
+        # Tabela de somas acumuladas das células marcadas (contagem por retângulo em O(1))
+        marcadas = (anos >= self._limiar).astype(np.int32)
+        self._acumulado = np.zeros((anos.shape[0] + 1, anos.shape[1] + 1), dtype=np.int32)
+        self._acumulado[1:, 1:] = marcadas.cumsum(axis=0).cumsum(axis=1)
+
+    def sem_risco(self, limites: np.ndarray) -> np.ndarray:
+        """Máscara dos polígonos cujo retângulo envolvente não toca célula marcada.
+
+        `limites` é um array N×4 (minx, miny, maxx, maxy) no CRS do raster,
+        como `GeoSeries.bounds`; a consulta é vetorizada para todos de uma vez.
+        Polígonos fora da pirâmide também saem como sem risco.
+        """
+        limites = np.asarray(limites, dtype=float).reshape(-1, 4)
+        inversa = ~self.transform
+        coluna0, linha0 = inversa * (limites[:, 0], limites[:, 3])
+        coluna1, linha1 = inversa * (limites[:, 2], limites[:, 1])
+
+        altura, largura = self.anos.shape
+        # Margem para bordas exatamente sobre a divisa entre células (all_touched)
+        linha0 = np.clip(np.floor(linha0 - 1e-9), 0, altura).astype(int)
+        coluna0 = np.clip(np.floor(coluna0 - 1e-9), 0, largura).astype(int)
+        linha1 = np.clip(np.floor(linha1) + 1, 0, altura).astype(int)
+        coluna1 = np.clip(np.floor(coluna1) + 1, 0, largura).astype(int)
+
+        a = self._acumulado
+        soma = a[linha1, coluna1] - a[linha0, coluna1] - a[linha1, coluna0] + a[linha0, coluna0]
+        return soma == 0
+
+    def _celulas_poligono(self, geom):
+        """(linhas, colunas) das células tocadas pelo polígono (CRS do raster)."""
+        from rasterio.features import rasterize
+        from rasterio.windows import from_bounds
+
+        if geom.geom_type == "Point":
+            coluna, linha = ~self.transform * (geom.x, geom.y)
+            linha, coluna = int(np.floor(linha)), int(np.floor(coluna))
+            if 0 <= linha < self.anos.shape[0] and 0 <= coluna < self.anos.shape[1]:
+                return np.array([linha]), np.array([coluna])
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+        janela = from_bounds(*geom.bounds, transform=self.transform)
+        linha0 = max(0, int(np.floor(janela.row_off)))
+        coluna0 = max(0, int(np.floor(janela.col_off)))
+        linha1 = min(self.anos.shape[0], int(np.ceil(janela.row_off + janela.height)) + 1)
+        coluna1 = min(self.anos.shape[1], int(np.ceil(janela.col_off + janela.width)) + 1)
+        if linha1 <= linha0 or coluna1 <= coluna0:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+        mascara = rasterize(
+            [(geom, 1)],
+            out_shape=(linha1 - linha0, coluna1 - coluna0),
+            transform=self.transform * self.transform.translation(coluna0, linha0),
+            fill=0,
+            all_touched=True,
+        ).astype(bool)
+        linhas, colunas = np.nonzero(mascara)
+        return linhas + linha0, colunas + coluna0
+
+    def triagem(self, src, geom) -> dict:
+        """Áreas (ha) por classe de risco EUDR do polígono `geom` (CRS do raster).
+
+        Lê o raster `src` só nas células marcadas (ver `_areas_risco`).
+        """
+        from rasterio.windows import Window
+
+        linhas, colunas = self._celulas_poligono(geom)
+        marcadas = self.anos[linhas, colunas] >= self._limiar
+        if marcadas.any() and self._area_pixel_ha is None:
+            from server.geo_utils import _pixel_area_ha
+
+            self._area_pixel_ha = _pixel_area_ha(src)
+
+        janelas = [
+            Window(
+                int(coluna) * self.celula, int(linha) * self.celula, self.celula, self.celula
+            ).intersection(Window(0, 0, src.width, src.height))
+            for linha, coluna in zip(linhas[marcadas], colunas[marcadas])
+        ]
+        areas = _areas_risco(src, geom, janelas, self._area_pixel_ha) if janelas else {}
+
+        return {
+            "areas_risco_ha": areas,
+            "celulas_poligono": int(linhas.size),
+            "celulas_lidas": int(marcadas.sum()),
+        }
+
+
+def carregar(raster_path):
+    """Pirâmide atual do raster (em memória, por processo) ou None."""
+    import rasterio
+
+    try:
+        versao = _versao(raster_path)
+    except OSError:
+        return None
+    with _cache_lock:
+        item = _cache.get(str(raster_path))
+        if item is not None and item[0] == versao:
+            return item[1]
+
+    piramide = None
+    arquivo = caminho_piramide(raster_path)
+    if arquivo.exists():
+        try:
+            with rasterio.open(arquivo) as src:
+                tags = src.tags()
+                if tags.get("INFOGEO_ORIGEM") == versao:
+                    piramide = PiramideEudr(
+                        src.read(1), src.transform, int(tags["INFOGEO_CELULA"])
+                    )
+                else:
+                    logger.warning(
+                        f"[PRODES] Pirâmide desatualizada ({arquivo}); "
+                        "gere de novo com: python -m server.prodes_piramide"
+                    )
+        except Exception as e:
+            logger.warning(f"[PRODES] Falha ao carregar pirâmide {arquivo}: {e}")
+
+    with _cache_lock:
+        _cache[str(raster_path)] = (versao, piramide)
+    return piramide
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(_BASE_DIR))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Pirâmide de desmatamento do PRODES (triagem EUDR)")
+    parser.add_argument("raster", nargs="?", default=None, help="padrão: RASTER_PRODES_PATH")
+    parser.add_argument("--celula", type=int, default=CELULA_PADRAO, help="pixels por célula")
+    parser.add_argument("--forcar", action="store_true", help="gera mesmo se já estiver atualizada")
+    args = parser.parse_args()
+
+    print(construir(args.raster, celula=args.celula, forcar=args.forcar))
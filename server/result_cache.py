@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Cache de resultados das análises
+==========================================
+Memoização das respostas de /analisar, /analisar-prodes e demais análises
+por polígono. A chave combina:
+
+  - o hash canônico da geometria (`_geometry_hash`: WKB normalizado e
+    arredondado a ~1 cm, independente do formato do arquivo enviado);
+  - o tipo de análise e seus parâmetros (`raster_type`, `enable_valoracao`…);
+  - a versão (caminho + tamanho + mtime) de cada arquivo de dados usado.
+
+Camadas:
+  - Memória: LRU limitado em bytes (JSON comprimido, por processo).
+  - SQLite (opcional, `RESULT_CACHE_PATH`): compartilhado entre workers,
+    com descarte dos itens menos acessados acima de `RESULT_CACHE_DISK_MAX_MB`.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from cachetools import LRUCache
+
+from .image_cache import raster_fingerprint
+
+logger = logging.getLogger("lulc-analyzer")
+
+# A cada quantas gravações o tamanho do arquivo SQLite é conferido
+_PRUNE_EVERY = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resultados (
+    chave TEXT PRIMARY KEY,
+    criado REAL NOT NULL,
+    acessado REAL NOT NULL,
+    tamanho INTEGER NOT NULL,
+    dados BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_resultados_acessado ON resultados (acessado);
+"""
+
+
+def chave_resultado(tipo: str, geom_hash: str, params=None, arquivos_dados=()) -> str:
+    """Chave estável de (análise, geometria, parâmetros, versões dos dados)."""
+    material = json.dumps(
+        [
+            tipo,
+            geom_hash,
+            params or {},
+            [raster_fingerprint(str(p)) for p in arquivos_dados],
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:40]
+
+
+class ResultCache:
+    """Cache LRU de respostas (dict JSON) em memória, com espelho SQLite opcional."""
+
+    def __init__(self, max_bytes: int, db_path=None, disk_max_bytes: int = 0, name="resultados"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._mem = LRUCache(maxsize=max(1, int(max_bytes)), getsizeof=len)
+        self._db_path = Path(db_path) if db_path else None
+        self._disk_max_bytes = int(disk_max_bytes)
+        self._local = threading.local()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        if self._db_path is not None:
+            try:
+                self._db_path.parent.mkdir(parents=True, exist_ok=True)
+                self._conn().executescript(_SCHEMA)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Cache de {name} em disco desativado ({self._db_path}): {e}")
+                self._db_path = None
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(str(self._db_path), timeout=5, check_same_thread=False)
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("PRAGMA synchronous = NORMAL")
+            self._local.con = con
+        return con
+
+    @staticmethod
+    def _decode(blob) -> dict:
+        return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+    def get(self, chave: str):
+        """Retorna uma cópia nova do resultado (dict) ou None."""
+        with self._lock:
+            blob = self._mem.get(chave)
+            if blob is not None:
+                self.hits += 1
+        if blob is not None:
+            return self._decode(blob)
+
+        if self._db_path is not None:
+            try:
+                con = self._conn()
+                row = con.execute(
+                    "SELECT dados FROM resultados WHERE chave = ?", (chave,)
+                ).fetchone()
+                if row is not None:
+                    with con:
+                        con.execute(
+                            "UPDATE resultados SET acessado = ? WHERE chave = ?",
+                            (time.time(), chave),
+                        )
+                    blob = bytes(row[0])
+                    with self._lock:
+                        self._mem[chave] = blob
+                        self.hits += 1
+                    return self._decode(blob)
+            except Exception as e:
+                logger.warning(f"Falha ao ler do cache de {self.name}: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, chave: str, resultado: dict):
+        blob = zlib.compress(
+            json.dumps(resultado, ensure_ascii=False, default=str).encode("utf-8")
+        )
+        try:
+            with self._lock:
+                self._mem[chave] = blob
+        except ValueError:
+            # Item maior que o próprio cache: fica apenas no SQLite (se houver)
+            pass
+
+        if self._db_path is not None:
+            agora = time.time()
+            try:
+                con = self._conn()
+                with con:
+                    con.execute(
+                        "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?)",
+                        (chave, agora, agora, len(blob), blob),
+                    )
+                self._puts += 1
+                if self._disk_max_bytes and self._puts % _PRUNE_EVERY == 0:
+                    self._prune(con)
+            except Exception as e:
+                logger.warning(f"Falha ao gravar no cache de {self.name}: {e}")
+
+    def _prune(self, con: sqlite3.Connection):
+        """Mantém no SQLite só os itens mais recentes até o limite em bytes."""
+        with con:
+            cur = con.execute(
+                "DELETE FROM resultados WHERE chave IN ("
+                " SELECT chave FROM ("
+                "  SELECT chave, SUM(tamanho) OVER (ORDER BY acessado DESC) AS acumulado"
+                "  FROM resultados)"
+                " WHERE acumulado > ?)",
+                (self._disk_max_bytes,),
+            )
+        if cur.rowcount:
+            logger.info(f"Cache de {self.name}: {cur.rowcount} resultado(s) descartado(s)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "itens": len(self._mem),
+                "bytes": int(self._mem.currsize),
+                "max_bytes": int(self._mem.maxsize),
+                "hits": self.hits,
+                "misses": self.misses,
+                "disco": str(self._db_path) if self._db_path is not None else None,
+            }
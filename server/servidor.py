@@ -20,18 +20,31 @@ Módulos:
 import io
 import os
 import json
+import base64
+import hashlib
+import re
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from functools import lru_cache
-import pandas as pd
-import rasterio
-from rasterio.crs import CRS
 
 from shapely.geometry import Point
 from shapely.ops import unary_union
 
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import (
+    Flask,
+    Response,
+    g,
+    request,
+    jsonify,
+    send_from_directory,
+    send_file,
+    has_request_context,
+    copy_current_request_context,
+    stream_with_context,
+)
 from flask_cors import CORS
 from werkzeug.exceptions import RequestEntityTooLarge
 
@@ -49,23 +62,52 @@ from server.utils import (
     _format_percent,
     decimal_to_gms,
 )
-from server.geocoding import _get_location_from_coords, _get_rta_from_coords
+from server.geocoding import (
+    _get_codigo_ibge_from_coords,
+    _get_location_from_coords,
+    _get_rta_from_coords,
+)
 from server.geo_utils import (
     _convert_gdf_to_raster_crs,
     _polygon_area_ha,
     _intersect_area_ha,
     _optimize_cog_reading,
     _fractional_stats,
-    _create_visual_image,
+    _create_visual_png,
     _sanitize_gdf_for_json,
     _pixel_area_ha,
+    _geometry_hash,
+    _areas_utm_ha,
+    _buffer_metros,
+)
+from server.file_parsers import _allowed_file, parse_upload_file, parse_pontos_csv
+from server.kml_export import gerar_kml_stream, gerar_kmz
+from server.batch_export import BatchResultWriter, BATCH_OUTPUT_FORMATS
+from server.batch_progress import ProgressoLote
+from server.image_cache import (
+    PngCache,
+    recorte_cache_key,
+    is_valid_key,
+    raster_fingerprint,
+)
+from server.tile_server import render_tile, is_valid_tile
+from server.result_cache import ResultCache, chave_resultado
+from server import (
+    analysis_pool,
+    camadas_mapeadas,
+    car_index,
+    car_precompute,
+    koppen_clima,
+    prodes_piramide,
+    tracing,
 )
-from server.file_parsers import _allowed_file, parse_upload_file
-from server.kml_export import gerar_kml
 
 from server.valoracao import (
     _get_quadrante_info_from_centroid,
     calculate_valoracao,
+    CENTROIDES_PATH as VALORACAO_CENTROIDES_PATH,
+    MICRO_CLASSES_EXCEL_PATH as VALORACAO_NOTAS_PATH,
+    MACRO_RTA_PATH as VALORACAO_MACRO_RTA_PATH,
 )
 
 # Importações de configuração — fonte única de verdade para constantes
@@ -99,6 +141,33 @@ from config import (
     SOLOS_LAYER_NAME,
     SOLOS_CORES,
     SOLOS_ORDEM_CORES,
+    IMAGE_CACHE_MAX_MB,
+    IMAGE_CACHE_DIR,
+    IMAGE_CACHE_MAX_AGE,
+    TILE_CACHE_MAX_MB,
+    TILE_CACHE_DIR,
+    TILE_CACHE_MAX_AGE,
+    TILE_MIN_ZOOM,
+    TILE_MAX_ZOOM,
+    KML_SIMPLIFICACAO_NIVEIS,
+    KML_SIMPLIFICACAO_PADRAO,
+    RESULT_CACHE_MAX_MB,
+    RESULT_CACHE_PATH,
+    RESULT_CACHE_DISK_MAX_MB,
+    BATCH_PROGRESS_PATH,
+    BATCH_PROGRESS_TTL,
+    BATCH_PROGRESS_MAX_EVENTOS,
+    EUDR_TRIAGEM_MAX_PLOTS,
+    EUDR_TRIAGEM_RAIO_MAX_M,
+    EUDR_TRIAGEM_THREADS,
+    AMOSTRAGEM_MAX_PONTOS,
+    AMOSTRAGEM_RAIO_MAX_M,
+    AMOSTRAGEM_THREADS,
+    WARMUP_CAMADAS,
+    WARMUP_RASTERS,
+    WARMUP_THREADS,
+    METRICS_ENABLED,
+    METRICS_TOKEN,
 )
 
 # ------------------------------------------------------------------------------
@@ -120,8 +189,282 @@ logging.basicConfig(
 )
 logger = logging.getLogger("lulc-analyzer")
 
-# Para rastreamento de progresso de tarefas longas
-progress_tasks = {}
+# Progresso das análises de lote (stream SSE e consulta pontual por task_id)
+BATCH_PROGRESS = ProgressoLote(
+    BATCH_PROGRESS_PATH or None, BATCH_PROGRESS_TTL, BATCH_PROGRESS_MAX_EVENTOS
+)
+
+# PNGs dos recortes, servidos por /imagem-recorte/<camada>/<chave>.png
+RECORTE_IMAGE_CACHE = PngCache(
+    IMAGE_CACHE_MAX_MB * 1024 * 1024, IMAGE_CACHE_DIR or None, name="recortes"
+)
+
+# Tiles XYZ, servidos por /tiles/<camada>/<z>/<x>/<y>.png
+TILE_CACHE = PngCache(TILE_CACHE_MAX_MB * 1024 * 1024, TILE_CACHE_DIR or None, name="tiles")
+
+# Respostas das análises por polígono (memoização por geometria + versão dos dados)
+RESULT_CACHE = ResultCache(
+    RESULT_CACHE_MAX_MB * 1024 * 1024,
+    RESULT_CACHE_PATH or None,
+    RESULT_CACHE_DISK_MAX_MB * 1024 * 1024,
+)
+
+# Histogramas por etapa/rota para /metrics
+tracing.configurar(METRICS_ENABLED)
+
+
+# ==============================================================================
+# Imagem do recorte (PNG paletado em cache, servido por URL)
+# ==============================================================================
+def _want_base64_image():
+    """`formato_imagem=url` dispensa o base64 no JSON (padrão: base64, legado)."""
+    if not has_request_context():
+        return True
+    return request.values.get("formato_imagem", "base64").strip().lower() != "url"
+
+
+@tracing.medido("imagem")
+def _build_imagem_recortada(
+    layer,
+    img_data,
+    geom_union,
+    raster_path,
+    classes_nomes,
+    classes_cores,
+    include_zero_class=False,
+):
+    """Monta o bloco `imagem_recortada` da resposta.
+
+    A imagem é indexada por hash de (camada, raster, polígono): se o mesmo
+    polígono já foi analisado nesta camada, nada é renderizado. O PNG fica
+    disponível em `url`; o base64 só é embutido quando solicitado.
+    """
+    key = None
+    cached = None
+    try:
+        key = recorte_cache_key(layer, geom_union, raster_path)
+        cached = RECORTE_IMAGE_CACHE.get(layer, key)
+    except Exception as e:
+        logger.warning(f"Falha ao consultar cache de imagem ({layer}): {e}")
+
+    if cached is not None:
+        img_bytes, meta = cached
+        legenda = meta.get("legenda", [])
+        img_diag = meta.get("diagnostics", {})
+        logger.info(f"🖼️ Imagem de {layer} reaproveitada do cache ({key})")
+    else:
+        img_bytes, legenda, img_diag = _create_visual_png(
+            img_data, classes_nomes, classes_cores, include_zero_class
+        )
+        if img_bytes is None:
+            return None
+        if key is not None:
+            RECORTE_IMAGE_CACHE.put(
+                layer, key, img_bytes, {"legenda": legenda, "diagnostics": img_diag}
+            )
+
+    imagem = {"legenda": legenda, "diagnostics": img_diag}
+    if key is not None:
+        imagem["url"] = f"/imagem-recorte/{layer}/{key}.png"
+    if key is None or _want_base64_image():
+        imagem["base64"] = base64.b64encode(img_bytes).decode("utf-8")
+    return imagem
+
+
+# ==============================================================================
+# Memoização das análises por polígono
+# ==============================================================================
+_URL_RECORTE_PREFIXO = "/imagem-recorte/"
+
+
+def _blocos_imagem(obj):
+    """Percorre a resposta e devolve os blocos com URL de imagem de recorte."""
+    if isinstance(obj, dict):
+        if str(obj.get("url", "")).startswith(_URL_RECORTE_PREFIXO):
+            yield obj
+        for v in obj.values():
+            yield from _blocos_imagem(v)
+    elif isinstance(obj, list):
+        for v in obj:
+            yield from _blocos_imagem(v)
+
+
+def _restaurar_imagens(resultado):
+    """Reanexa o base64 (se pedido) às imagens de um resultado em cache.
+
+    Retorna False se algum PNG referenciado já saiu do cache de imagens —
+    nesse caso o resultado é recalculado para não devolver URL quebrada.
+    """
+    querer_base64 = _want_base64_image()
+    for bloco in _blocos_imagem(resultado):
+        layer, _, arquivo = bloco["url"][len(_URL_RECORTE_PREFIXO):].partition("/")
+        cached = RECORTE_IMAGE_CACHE.get(layer, arquivo[: -len(".png")])
+        if cached is None:
+            return False
+        if querer_base64:
+            bloco["base64"] = base64.b64encode(cached[0]).decode("utf-8")
+    return True
+
+
+def _adotar_imagens(resultado):
+    """Traz para o cache local os PNGs renderizados num processo do pool.
+
+    O processo filho devolve a imagem em base64; aqui ela é registrada no
+    cache de recortes (para a URL funcionar neste processo) e o base64 é
+    removido se o cliente pediu `formato_imagem=url`.
+    """
+    querer_base64 = _want_base64_image()
+    for bloco in _blocos_imagem(resultado):
+        b64 = bloco.get("base64")
+        if not b64:
+            continue
+        layer, _, arquivo = bloco["url"][len(_URL_RECORTE_PREFIXO):].partition("/")
+        RECORTE_IMAGE_CACHE.put(
+            layer,
+            arquivo[: -len(".png")],
+            base64.b64decode(b64),
+            {"legenda": bloco.get("legenda", []), "diagnostics": bloco.get("diagnostics", {})},
+        )
+        if not querer_base64:
+            bloco.pop("base64", None)
+
+
+def _ler_entrada(entrada):
+    """GeoDataFrame da análise a partir do upload (ou de um já lido).
+
+    /analisar-todos lê o arquivo uma única vez e repassa o GeoDataFrame a
+    cada análise; aqui ele é copiado para que as threads não o compartilhem.
+    """
+    if hasattr(entrada, "geometry"):
+        return entrada.copy()
+    return parse_upload_file(entrada)
+
+
+def _hash_geometria(gdf):
+    """Hash canônico (EPSG:4674) da união das geometrias, chave da memoização."""
+    if gdf.crs is not None:
+        gdf = gdf.to_crs("EPSG:4674")
+    return _geometry_hash(unary_union(gdf.geometry))
+
+
+def _executar_analise(tipo, funcao, input_file, *args):
+    """Roda um `_process_*_sync` com limite por tipo (e no pool, se ativo)."""
+    result = analysis_pool.executar(tipo, funcao, input_file, *args)
+    if analysis_pool.ativo() and isinstance(result, dict):
+        _adotar_imagens(result)
+    return result
+
+
+# Campos de `metadados` com a data da requisição (não dependem da geometria)
+_CAMPOS_DATA = ("data_imagem", "data_analise")
+
+
+def _para_memorizar(resultado, manter_imagens=False):
+    """Cópia da resposta só com a parte que depende da geometria e dos dados.
+
+    Sem o base64 das imagens (servidas pelo cache de recortes; mantido com
+    `manter_imagens`, para o pré-cálculo do CAR), sem o GeoJSON do polígono
+    enviado (traz as propriedades do arquivo) e sem a data da análise;
+    `_personalizar_resposta` os refaz a cada uso (campos em `_campos_data`).
+    """
+    guardado = _sanitize_response(resultado)
+    if not manter_imagens:
+        for bloco in _blocos_imagem(guardado):
+            bloco.pop("base64", None)
+    if "polygon_geojson" in guardado:
+        guardado["polygon_geojson"] = None
+    metadados = guardado.get("metadados")
+    guardado["_campos_data"] = []
+    if isinstance(metadados, dict):
+        guardado["_campos_data"] = [c for c in _CAMPOS_DATA if c in metadados]
+        guardado["metadados"] = {k: v for k, v in metadados.items() if k not in _CAMPOS_DATA}
+    return guardado
+
+
+def _personalizar_resposta(resultado, gdf, campos_data):
+    """Refaz numa resposta memorizada as partes próprias desta requisição."""
+    metadados = resultado.get("metadados")
+    if isinstance(metadados, dict):
+        hoje = datetime.now().strftime("%d/%m/%Y")
+        for campo in campos_data:
+            metadados[campo] = hoje
+    if "polygon_geojson" in resultado:
+        try:
+            gdf_wgs84 = gdf.to_crs("EPSG:4326") if gdf.crs is not None else gdf
+            resultado["polygon_geojson"] = json.loads(_sanitize_gdf_for_json(gdf_wgs84).to_json())
+        except Exception as e:
+            logger.warning(f"Erro ao gerar GeoJSON do polígono: {e}")
+    return resultado
+
+
+def _resposta_pre_calculada(chave):
+    """Resposta de polígono único gravada pelo pré-cálculo do CAR, se houver.
+
+    A chave é a mesma da memoização (geometria, parâmetros e versões dos
+    dados), então só um polígono idêntico ao do imóvel, com os mesmos
+    parâmetros e dados, é atendido. Os PNGs vêm junto e entram no cache de
+    recortes, para a URL da imagem funcionar.
+    """
+    try:
+        store = car_precompute.obter_store()
+        guardado = store.consultar_resposta(chave) if store is not None else None
+    except Exception as e:
+        logger.warning(f"Falha ao consultar pré-cálculo do CAR: {e}")
+        return None
+    if guardado is not None:
+        _adotar_imagens(guardado)
+    return guardado
+
+
+def _analise_memorizada(tipo, entrada, params, arquivos_dados, calcular, geom_hash=None):
+    """Executa `calcular(entrada)` com memoização pelo polígono enviado.
+
+    `entrada`: o upload ou o GeoDataFrame já lido. A chave usa o hash
+    canônico da geometria (em EPSG:4674), o tipo de análise, `params` e a
+    versão de cada arquivo em `arquivos_dados`. Apenas respostas com status
+    "sucesso" são guardadas (ver `_para_memorizar`). Sem resposta memorizada,
+    a chave ainda é procurada no pré-cálculo do CAR. O upload é lido uma
+    única vez: o GeoDataFrame segue para o cálculo.
+    """
+    chave = None
+    gdf = entrada if hasattr(entrada, "geometry") else None
+    try:
+        if gdf is None:
+            lido = parse_upload_file(entrada)
+            if not isinstance(lido, tuple) and not lido.empty:
+                gdf = entrada = lido
+        if geom_hash is None and gdf is not None:
+            geom_hash = _hash_geometria(gdf)
+        if geom_hash is not None:
+            chave = chave_resultado(tipo, geom_hash, params, arquivos_dados)
+    except Exception as e:
+        logger.warning(f"Memoização de {tipo} indisponível para esta requisição: {e}")
+        if gdf is None and hasattr(entrada, "seek"):
+            entrada.seek(0)
+
+    if chave is not None and gdf is not None:
+        with tracing.span("cache"):
+            cached = RESULT_CACHE.get(chave)
+            reaproveitado = cached is not None and _restaurar_imagens(cached)
+        if reaproveitado:
+            logger.info(f"♻️ Resultado de {tipo} reaproveitado do cache ({chave[:12]})")
+            return _personalizar_resposta(cached, gdf, cached.pop("_campos_data", []))
+
+        # Polígono idêntico ao de um imóvel do CAR já pré-calculado
+        with tracing.span("car_pre_calculo"):
+            pre_calculado = _resposta_pre_calculada(chave)
+        if pre_calculado is not None:
+            logger.info(f"♻️ Resultado de {tipo} atendido pelo pré-cálculo do CAR ({chave[:12]})")
+            return _personalizar_resposta(pre_calculado, gdf, pre_calculado.pop("_campos_data", []))
+
+    result = calcular(entrada)
+
+    if chave is not None and isinstance(result, dict) and result.get("status") == "sucesso":
+        try:
+            RESULT_CACHE.put(chave, _para_memorizar(result))
+        except Exception as e:
+            logger.warning(f"Falha ao memorizar resultado de {tipo}: {e}")
+    return result
 
 
 # ==============================================================================
@@ -150,6 +493,88 @@ def handle_500(e):
     return jsonify({"status": "erro", "mensagem": "Erro interno do servidor"}), 500
 
 
+# ==============================================================================
+# Tempos por etapa (bloco "timings", Server-Timing) e /metrics
+# ==============================================================================
+def _pediu_timings():
+    valor = request.args.get("timings") or request.headers.get("X-InfoGEO-Timings")
+    if valor is None and request.mimetype in ("multipart/form-data", "application/x-www-form-urlencoded"):
+        valor = request.form.get("timings")
+    return str(valor or "").strip().lower() in ("1", "true", "sim")
+
+
+@app.before_request
+def _iniciar_rastreio():
+    g.inicio_requisicao = time.perf_counter()
+    if _pediu_timings():
+        tracing.iniciar()
+
+
+@app.after_request
+def _anexar_timings(response):
+    inicio = g.get("inicio_requisicao")
+    if inicio is None:
+        return response
+    duracao = time.perf_counter() - inicio
+    if tracing.metricas_ativas():
+        rota = request.url_rule.rule if request.url_rule is not None else "(sem rota)"
+        tracing.REQUISICOES.observar(rota, duracao)
+
+    if tracing.ativo():
+        resumo = tracing.resumo_ms(tracing.finalizar())
+        resumo["total"] = round(duracao * 1000, 2)
+        response.headers["Server-Timing"] = tracing.server_timing(resumo)
+        if response.is_json and not response.is_streamed:
+            corpo = response.get_json(silent=True)
+            if isinstance(corpo, dict):
+                corpo["timings"] = resumo
+                response.set_data(app.json.dumps(corpo))
+    return response
+
+
+@app.teardown_request
+def _encerrar_rastreio(exc=None):
+    # A thread volta ao pool do servidor: não herda o rastreio desta requisição
+    tracing.finalizar()
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Histogramas por etapa/rota e contadores de cache (formato Prometheus).
+
+    Restrita: com `METRICS_TOKEN`, exige o token no cabeçalho Authorization;
+    sem ele, apenas requisições de localhost.
+    """
+    import hmac
+
+    if not tracing.metricas_ativas():
+        return jsonify({"status": "erro", "mensagem": "Métricas desativadas (INFOGEO_METRICS)."}), 404
+    if METRICS_TOKEN:
+        autorizado = hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"
+        )
+    else:
+        autorizado = request.remote_addr in ("127.0.0.1", "::1")
+    if not autorizado:
+        return jsonify({"status": "erro", "mensagem": "Acesso às métricas não autorizado."}), 403
+    linhas = [tracing.exposicao_prometheus()]
+    for nome, cache in (
+        ("resultados", RESULT_CACHE),
+        ("recortes", RECORTE_IMAGE_CACHE),
+        ("tiles", TILE_CACHE),
+    ):
+        stats = cache.stats()
+        linhas.append(
+            f"# TYPE infogeo_cache_{nome}_hits_total counter\n"
+            f"infogeo_cache_{nome}_hits_total {stats['hits']}\n"
+            f"# TYPE infogeo_cache_{nome}_misses_total counter\n"
+            f"infogeo_cache_{nome}_misses_total {stats['misses']}\n"
+            f"# TYPE infogeo_cache_{nome}_bytes gauge\n"
+            f"infogeo_cache_{nome}_bytes {stats['bytes']}\n"
+        )
+    return Response("".join(linhas), mimetype="text/plain; version=0.0.4")
+
+
 # ==============================================================================
 # Rotas estáticas
 # ==============================================================================
@@ -177,18 +602,390 @@ def serve_static(filename):
 
 
 # ==============================================================================
-# Processamento síncrono: Análise de Uso do Solo
+# Registro de análises raster
 # ==============================================================================
-def _process_analysis_sync(kml_file, raster_path, enable_valoracao=True):
-    """Processamento síncrono para análise de uso do solo."""
+# Cada análise por classes de pixel é uma entrada declarativa executada pelo
+# mesmo motor (parse → CRS → área → _fractional_stats → filtro de classes →
+# ajuste de área → relatório → imagem), na rota individual e no lote.
+# Para adicionar uma camada, basta incluir uma entrada em ANALISES_RASTER
+# (e a rota que chama `_rota_analise_raster`). Campos:
+#   "raster":             caminho do raster
+#   "lote":               chave da análise nas rotas de lote
+#   "titulo":             coluna "Tipo Análise" do lote e logs
+#   "rotulo":             complemento das mensagens ("raster de declividade")
+#   "nomes" / "cores":    legendas por DN
+#   "classes_validas":    DNs aceitos; os demais são descartados (None = todos)
+#   "incluir_classe_zero": DN 0 é classe real do raster (não NoData)
+#   "exibir_classe_zero": lista a classe 0 no relatório e no lote
+#   "ajustar_area":       completa/escala as classes até a área do polígono
+#   "imagem":             gera o recorte PNG
+#   "casas_resolucao":    casas decimais de `resolucao_espacial`
+#   "arquivos_extra":     outros arquivos que versionam o resultado (memoização)
+#   "extras_classe":      fn(dn) → campos extras de cada classe do relatório
+#   "pos_processar":      fn(resposta, contexto, **opcoes) → resposta
+#   "pos_lote":           fn(registros, areas_por_classe_ha, area_poligono_ha)
+#   "parametros_rota":    fn(form) → {"raster_type", "params", "arquivos_extra",
+#                         "opcoes"} lidos do formulário da requisição
+# ==============================================================================
+_PADRAO_ANALISE_RASTER = {
+    "classes_validas": None,
+    "incluir_classe_zero": False,
+    "exibir_classe_zero": False,
+    "ajustar_area": True,
+    "imagem": True,
+    "casas_resolucao": 2,
+    "arquivos_extra": (),
+    "extras_classe": None,
+    "pos_processar": None,
+    "pos_lote": None,
+    "parametros_rota": None,
+}
+
+# Diferença (ha) entre polígono e soma das classes tolerada sem ajuste
+_TOLERANCIA_AREA_HA = 1e-4
+
+
+def _extras_classe_aptidao(dn):
+    return {"descricao_completa": APTIDAO_CLASSES_DESCRICOES.get(dn, "")}
+
+
+def _extras_classe_prodes(dn):
+    return {"risco_eudr": PRODES_EUDR_RISK.get(dn, "CONSOLIDATED")}
+
+
+def _pos_valoracao(resposta, contexto, enable_valoracao=True):
+    """Uso do solo: valoração agronômica pelo quadrante do centroide."""
+    relatorio = resposta["relatorio"]
+    quadrante_code, valor_quadrante, quad_attrs = None, None, {}
+
+    if enable_valoracao:
+        try:
+            centroid = contexto["centroide"]
+            centroid_point = (
+                Point(centroid.x, centroid.y) if centroid is not None else None
+            )
+            valor_quadrante_result = (
+                _get_quadrante_info_from_centroid(centroid_point)
+                if centroid_point is not None
+                else (None, None, {}, "Centroide sem valor")
+            )
+            quadrante_code, valor_quadrante, quad_attrs, quad_msg = (
+                valor_quadrante_result
+            )
+
+            if (
+                quad_msg == "Centroide sem valor"
+                or quadrante_code is None
+                or valor_quadrante is None
+            ):
+                relatorio["valor_total_calculado"] = None
+                resposta["mensagem_centroide"] = "Centroide sem valor"
+                quadrante_code, valor_quadrante, quad_attrs = None, None, {}
+            else:
+                # Cálculo de valoração delegado ao módulo
+                relatorio, quadrante_code, valor_quadrante, quad_attrs, quad_msg = (
+                    calculate_valoracao(relatorio, centroid_point, valor_quadrante_result)
+                )
+                resposta["relatorio"] = relatorio
+
+        except Exception as e:
+            logger.warning(f"Erro no cálculo de valoração agronômica: {e}")
+            relatorio.setdefault("valor_total_calculado", 0.0)
+    else:
+        logger.info("Módulo de valoração desabilitado - pulando cálculos")
+        relatorio["valor_total_calculado"] = None
+        relatorio["valor_total_calculado_formatado"] = None
+
+    resposta["metadados"]["quadrante"] = {
+        "codigo": quadrante_code,
+        "valor_quadrante": valor_quadrante,
+        "valor_quadrante_formatado": (
+            quad_attrs.get("VL_CEND_AVLC_IMVL_formatted")
+            if isinstance(quad_attrs, dict)
+            else None
+        ),
+        "atributos": quad_attrs,
+    }
+    return resposta
+
+
+def _parametros_uso_solo(form):
+    """Mosaico e valoração escolhidos no formulário (rotas /analisar e /analisar-todos)."""
+    raster_type = form.get("raster_type", "com_mosaico")
+    enable_valoracao = form.get("enable_valoracao", "true").lower() == "true"
+    logger.info(
+        f"Módulo de valoração: {'habilitado' if enable_valoracao else 'desabilitado'}"
+    )
+    return {
+        "raster_type": raster_type,
+        "params": {"raster_type": raster_type, "enable_valoracao": enable_valoracao},
+        "arquivos_extra": (
+            (VALORACAO_CENTROIDES_PATH, VALORACAO_NOTAS_PATH, VALORACAO_MACRO_RTA_PATH)
+            if enable_valoracao
+            else ()
+        ),
+        "opcoes": {"enable_valoracao": enable_valoracao},
+    }
+
+
+def _pos_koppen(resposta, contexto):
+    """Köppen: classe predominante e dados climáticos do município.
+
+    O recorte do raster fica ruim pela baixa resolução; em vez dele, o
+    polígono é pintado com a cor da classe predominante.
+    """
+    cor_predominante = None
+    classe_predominante = None
+    max_area = 0
+    for cls, area_ha in contexto["areas_por_classe_ha"].items():
+        if cls > 0 and area_ha > max_area:
+            max_area = area_ha
+            classe_predominante = cls
+            cor_predominante = KOPPEN_CLASSES_CORES.get(cls, "#CCCCCC")
+
+    logger.info(f"Classe Köppen predominante: {classe_predominante} ({cor_predominante}) com {max_area:.4f} ha")
+
+    # Dados climáticos do município (temperatura, precipitação, altitude),
+    # pelo código IBGE do centroide
+    dados_climaticos = None
+    municipio = resposta["metadados"]["municipio"]
+    if municipio and municipio != "Não identificado":
+        try:
+            centroide = contexto["centroide"]
+            codigo_ibge = (
+                _get_codigo_ibge_from_coords(centroide.y, centroide.x)
+                if centroide is not None else None
+            )
+            dados_climaticos = _get_koppen_clima(codigo_ibge, municipio, resposta["metadados"]["uf"])
+        except Exception as e:
+            logger.warning(f"Erro ao buscar dados climáticos do município: {e}")
+
+    resposta["dados_climaticos"] = dados_climaticos
+    resposta["cor_predominante"] = cor_predominante
+    resposta["classe_predominante"] = classe_predominante
+    return resposta
+
+
+def _pos_prodes(resposta, contexto):
+    """PRODES: classificação EUDR do polígono."""
+    resposta["eudr"] = _compute_eudr_classification(
+        contexto["areas_por_classe_ha"], contexto["area_poligono_ha"]
+    )
+    return resposta
+
+
+def _pos_lote_prodes(registros, areas_por_classe_ha, area_poligono_ha):
+    eudr = _compute_eudr_classification(areas_por_classe_ha, area_poligono_ha)
+    for record in registros:
+        record["EUDR_Conforme"] = eudr["eudr_compliant"]
+        record["EUDR_Risco"] = eudr["overall_risk"]
+
+
+ANALISES_RASTER = {
+    tipo: {**_PADRAO_ANALISE_RASTER, **analise}
+    for tipo, analise in {
+        "uso_solo": {
+            "raster": TIFF_PATH,
+            "lote": "uso_solo",
+            "titulo": "Uso do Solo",
+            "rotulo": "de uso do solo",
+            "nomes": CLASSES_NOMES,
+            "cores": CLASSES_CORES,
+            # Classe 0 = área sem classe (NoData/fora do raster)
+            "exibir_classe_zero": True,
+            "pos_processar": _pos_valoracao,
+            "parametros_rota": _parametros_uso_solo,
+        },
+        "declividade": {
+            "raster": str(BASE_DIR / "data" / "ALOS_Declividade_Class_BR_majority_r2.tif"),
+            "lote": "declividade",
+            "titulo": "Declividade",
+            "rotulo": "de declividade",
+            "nomes": DECLIVIDADE_CLASSES_NOMES,
+            "cores": DECLIVIDADE_CLASSES_CORES,
+            "classes_validas": frozenset(range(1, 9)),
+        },
+        "aptidao": {
+            "raster": RASTER_APTIDAO_PATH,
+            "lote": "aptidao",
+            "titulo": "Aptidão",
+            "rotulo": "de aptidão",
+            "nomes": APTIDAO_CLASSES_NOMES,
+            "cores": APTIDAO_CLASSES_CORES,
+            "classes_validas": frozenset(range(1, 6)),
+            "extras_classe": _extras_classe_aptidao,
+        },
+        "solo_textural": {
+            "raster": RASTER_SOLO_TEXTURAL_PATH,
+            "lote": "soloTextural",
+            "titulo": "Solo Textural",
+            "rotulo": "de textura do solo",
+            "nomes": SOLO_TEXTURAL_CLASSES_NOMES,
+            "cores": SOLO_TEXTURAL_CLASSES_CORES,
+            "classes_validas": frozenset(range(1, 14)),
+        },
+        "koppen": {
+            "raster": RASTER_KOPPEN_PATH,
+            "lote": "koppen",
+            "titulo": "Köppen-Geiger",
+            "rotulo": "Köppen",
+            "nomes": KOPPEN_CLASSES_NOMES,
+            "cores": KOPPEN_CLASSES_CORES,
+            "classes_validas": frozenset(range(1, 13)),
+            "imagem": False,
+            "arquivos_extra": (KOPPEN_EXCEL_PATH,),
+            "pos_processar": _pos_koppen,
+        },
+        "prodes": {
+            "raster": RASTER_PRODES_PATH,
+            "lote": "prodes",
+            "titulo": "PRODES/EUDR",
+            "rotulo": "PRODES",
+            "nomes": PRODES_CLASSES_NOMES,
+            "cores": PRODES_CLASSES_CORES,
+            # DN 0 é classe PRODES (vegetação em 2000); áreas sem ajuste
+            "incluir_classe_zero": True,
+            "exibir_classe_zero": True,
+            "ajustar_area": False,
+            "casas_resolucao": 8,
+            "extras_classe": _extras_classe_prodes,
+            "pos_processar": _pos_prodes,
+            "pos_lote": _pos_lote_prodes,
+        },
+    }.items()
+}
+
+
+def _resolve_registry_raster(analysis_type, raster_type=None):
+    """Caminho do raster de uma entrada do ANALISES_RASTER.
+
+    Para uso_solo, `raster_type` escolhe entre os mosaicos disponíveis.
+    """
+    raster_path = ANALISES_RASTER[analysis_type]["raster"]
+    if analysis_type == "uso_solo":
+        if raster_type == "sem_mosaico":
+            raster_path = str(BASE_DIR / "data" / "LULC_Alpha_Biomas_radius_10.tif")
+        else:
+            raster_path = str(BASE_DIR / "data" / "LULC_VALORACAO_10m_com_mosaico.tif")
+        if not os.path.exists(raster_path):
+            raster_path = TIFF_PATH # fallback
+    return raster_path
+
+
+def _plano_analise_raster(tipo, form):
+    """Função, argumentos e chave de memoização da análise raster `tipo`.
+
+    Retorna {"erro": (mensagem, código HTTP)} se o raster não existir.
+    """
+    analise = ANALISES_RASTER[tipo]
+    parametros = analise["parametros_rota"](form) if analise["parametros_rota"] else {}
+    raster_path = _resolve_registry_raster(tipo, parametros.get("raster_type"))
+
+    if not os.path.exists(raster_path):
+        logger.error(f"Raster {analise['rotulo']} não encontrado: {raster_path}")
+        return {"erro": (f"Raster {analise['rotulo']} não disponível no servidor", 500)}
+
+    logger.info(f"Usando raster {analise['rotulo']}: {raster_path}")
+    return {
+        "funcao": _processar_analise_raster,
+        "args": (tipo, raster_path, parametros.get("opcoes")),
+        "params": parametros.get("params", {}),
+        "arquivos": [raster_path, *analise["arquivos_extra"], *parametros.get("arquivos_extra", ())],
+    }
+
+
+# ------------------------------------------------------------------------------
+# Motor das análises raster
+# ------------------------------------------------------------------------------
+def _areas_analise_raster(analise, src, gdf_tiff, area_poligono_ha, avisar=True):
+    """Áreas (ha) por classe do polígono no raster, filtradas e ajustadas.
+
+    Retorna (areas_por_classe_ha, area_classes_total_ha, img_data_visual, meta_aux);
+    `area_classes_total_ha` é a soma das classes válidas antes do ajuste.
+    """
+    cog_optimizations = _optimize_cog_reading(src, gdf_tiff.total_bounds)
+
+    area_classes_total_ha, areas_por_classe_ha, img_data_visual, meta_aux = (
+        _fractional_stats(
+            src, gdf_tiff, cog_optimizations,
+            include_zero_class=analise["incluir_classe_zero"],
+        )
+    )
+
+    # Filtrar classes válidas
+    classes_validas = analise["classes_validas"]
+    if classes_validas is not None:
+        areas_filtradas = {}
+        area_invalida = 0.0
+        for cls, area_ha in areas_por_classe_ha.items():
+            if cls in classes_validas:
+                areas_filtradas[cls] = area_ha
+                continue
+            area_invalida += area_ha
+            if avisar:
+                logger.warning(
+                    f"⚠️ Classe inválida {cls} encontrada no raster {analise['rotulo']} com {area_ha:.4f} ha - será ignorada"
+                )
+        areas_por_classe_ha = areas_filtradas
+        area_classes_total_ha = sum(areas_por_classe_ha.values())
+
+        if avisar and area_invalida > 0 and area_poligono_ha > 0:
+            logger.info(
+                f"📊 Área com classes inválidas: {area_invalida:.4f} ha ({(area_invalida / area_poligono_ha * 100):.2f}%)"
+            )
+    else:
+        areas_por_classe_ha = dict(areas_por_classe_ha)
+
+    # Ajustar diferenças de área: sobra vai para a classe 0, excesso é escalado
+    if analise["ajustar_area"]:
+        dif_ha = area_poligono_ha - area_classes_total_ha
+        if dif_ha > _TOLERANCIA_AREA_HA:
+            areas_por_classe_ha[0] = areas_por_classe_ha.get(0, 0.0) + dif_ha
+        elif dif_ha < -_TOLERANCIA_AREA_HA:
+            fator = area_poligono_ha / (
+                area_classes_total_ha if area_classes_total_ha > 0 else 1.0
+            )
+            for k in list(areas_por_classe_ha.keys()):
+                areas_por_classe_ha[k] *= fator
+
+    return areas_por_classe_ha, area_classes_total_ha, img_data_visual, meta_aux
+
+
+def _classes_exibidas(analise, areas_por_classe_ha):
+    """[(dn, área_ha)] das classes que entram no relatório e no lote."""
+    return [
+        (cls, area_ha)
+        for cls, area_ha in areas_por_classe_ha.items()
+        if area_ha > 0 and (cls != 0 or analise["exibir_classe_zero"])
+    ]
+
+
+def _processar_analise_raster(kml_file, tipo, raster_path, opcoes=None):
+    """Processamento síncrono da análise `tipo` do ANALISES_RASTER.
+
+    `opcoes` (dict) é repassado ao pós-processamento da análise
+    (ex.: {"enable_valoracao": False} no uso do solo).
+    """
+    import rasterio
+    from rasterio.crs import CRS
+    analise = ANALISES_RASTER[tipo]
+    rotulo = analise["rotulo"]
     try:
-        gdf = parse_upload_file(kml_file)
+        gdf = _ler_entrada(kml_file)
         if isinstance(gdf, tuple):
             return gdf
 
         with rasterio.open(raster_path) as src:
             tiff_crs = src.crs if src.crs else CRS.from_epsg(4674)
 
+            casas = analise["casas_resolucao"]
+            resolucao = f"{src.res[0]:.{casas}f} x {src.res[1]:.{casas}f}"
+            logger.info(f"📊 Raster {analise['titulo']} - Resolução: {resolucao}")
+            pixel_area = _pixel_area_ha(src)
+            logger.info(
+                f"📐 Área por pixel: {pixel_area:.6f} ha ({pixel_area * 10000:.2f} m²)"
+            )
+
             gdf_tiff, crs_info = _convert_gdf_to_raster_crs(gdf, tiff_crs)
             geom_union = unary_union(gdf_tiff.geometry)
 
@@ -204,76 +1001,71 @@ def _process_analysis_sync(kml_file, raster_path, enable_valoracao=True):
             if area_intersec_raster_ha == 0:
                 return {
                     "status": "erro",
-                    "mensagem": "Polígono não possui interseção com a área do raster.",
+                    "mensagem": f"Polígono não possui interseção com a área do raster {rotulo}.",
                 }
 
-            cog_optimizations = _optimize_cog_reading(src, gdf_tiff.total_bounds)
-
-            area_classes_total_ha, areas_por_classe_ha, img_data_visual, meta_aux = (
-                _fractional_stats(src, gdf_tiff, cog_optimizations)
+            areas_por_classe_ha, area_classes_total_ha, img_data_visual, meta_aux = (
+                _areas_analise_raster(analise, src, gdf_tiff, area_poligono_ha)
             )
-
-            # Ajustar diferenças de área
-            dif_ha = area_poligono_ha - area_classes_total_ha
-            tol = 1e-4
-            if dif_ha > tol:
-                areas_por_classe_ha[0] = areas_por_classe_ha.get(0, 0.0) + dif_ha
-            elif dif_ha < -tol:
-                fator = area_poligono_ha / (
-                    area_classes_total_ha if area_classes_total_ha > 0 else 1.0
-                )
-                for k in list(areas_por_classe_ha.keys()):
-                    areas_por_classe_ha[k] *= fator
+            exibidas = _classes_exibidas(analise, areas_por_classe_ha)
 
             # Preparar relatório
+            area_analisada_ha = (
+                area_poligono_ha if analise["ajustar_area"] else area_classes_total_ha
+            )
             total_ref = area_poligono_ha if area_poligono_ha > 0 else 1.0
             relatorio = {
                 "area_total_poligono_ha": round(area_poligono_ha, 4),
-                "area_total_poligono_ha_formatado": _format_area_ha(
-                    area_poligono_ha, 4
-                ),
-                "area_analisada_ha": round(area_poligono_ha, 4),
-                "area_analisada_ha_formatado": _format_area_ha(area_poligono_ha, 4),
+                "area_total_poligono_ha_formatado": _format_area_ha(area_poligono_ha, 4),
+                "area_analisada_ha": round(area_analisada_ha, 4),
+                "area_analisada_ha_formatado": _format_area_ha(area_analisada_ha, 4),
                 "numero_classes_encontradas": len(
-                    [c for c in areas_por_classe_ha if c != 0]
+                    [c for c, _ in exibidas if c != 0 or analise["incluir_classe_zero"]]
                 ),
                 "classes": {},
                 "metodo_utilizado": "pixel_parcial_otimizado",
             }
 
-            for cls, area_ha in sorted(
-                areas_por_classe_ha.items(), key=lambda k: -k[1]
-            ):
+            extras_classe = analise["extras_classe"]
+            for cls, area_ha in sorted(exibidas, key=lambda k: -k[1]):
                 percent = round((area_ha / total_ref) * 100, 4)
-                relatorio["classes"][f"Classe {int(cls)}"] = {
-                    "descricao": CLASSES_NOMES.get(int(cls), f"Classe {int(cls)}"),
+                classe = {
+                    "descricao": analise["nomes"].get(int(cls), f"Classe {int(cls)}"),
                     "area_ha": round(area_ha, 4),
                     "area_ha_formatado": _format_area_ha(round(area_ha, 4), 4),
                     "percentual": percent,
                     "percentual_formatado": _format_percent(percent, 2),
                 }
-
-            # Gerar imagem
-            img_base64, legenda, img_diag = _create_visual_image(
-                img_data_visual, CLASSES_NOMES, CLASSES_CORES
-            )
+                if extras_classe is not None:
+                    classe.update(extras_classe(int(cls)))
+                relatorio["classes"][f"Classe {int(cls)}"] = classe
+
+            # Gerar imagem com as cores da camada
+            imagem_recortada = None
+            if analise["imagem"]:
+                imagem_recortada = _build_imagem_recortada(
+                    tipo, img_data_visual, geom_union, raster_path,
+                    analise["nomes"], analise["cores"],
+                    include_zero_class=analise["incluir_classe_zero"],
+                )
 
             # GeoJSON do polígono processado para visualização
+            gdf_wgs84 = None
             polygon_geojson = None
             try:
                 gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
                 gdf_sanitized = _sanitize_gdf_for_json(gdf_wgs84)
                 polygon_geojson = json.loads(gdf_sanitized.to_json())
                 logger.info(
-                    f"GeoJSON do polígono gerado com sucesso: {len(polygon_geojson.get('features', []))} features"
+                    f"GeoJSON do polígono gerado: {len(polygon_geojson.get('features', []))} features"
                 )
             except Exception as e:
                 logger.error(f"Erro ao gerar GeoJSON do polígono: {e}")
 
-            # Calcular centroide
+            # Centroide
             centroid = None
             try:
-                if "gdf_wgs84" not in locals():
+                if gdf_wgs84 is None:
                     gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
                 centroid = gdf_wgs84.union_all().centroid
                 centroid_coords = [centroid.y, centroid.x]
@@ -289,96 +1081,13 @@ def _process_analysis_sync(kml_file, raster_path, enable_valoracao=True):
                 municipio, uf = "Não identificado", "Não identificado"
                 cd_rta, nm_rta = None, "Não identificado"
 
-            # ---------------------
-            # Valoração agronômica
-            # ---------------------
-            if enable_valoracao:
-                try:
-                    centroid_point = (
-                        Point(centroid.x, centroid.y) if centroid is not None else None
-                    )
-                    valor_quadrante_result = (
-                        _get_quadrante_info_from_centroid(centroid_point)
-                        if centroid_point is not None
-                        else (None, None, {}, "Centroide sem valor")
-                    )
-
-                    quadrante_code, valor_quadrante, quad_attrs, quad_msg = (
-                        valor_quadrante_result
-                    )
-
-                    if (
-                        quad_msg == "Centroide sem valor"
-                        or quadrante_code is None
-                        or valor_quadrante is None
-                    ):
-                        relatorio["valor_total_calculado"] = None
-                        return {
-                            "status": "sucesso",
-                            "mensagem_centroide": "Centroide sem valor",
-                            "relatorio": relatorio,
-                            "polygon_geojson": polygon_geojson,
-                            "metadados": {
-                                "crs": str(tiff_crs),
-                                "resolucao_espacial": f"{src.res[0]:.2f} x {src.res[1]:.2f}",
-                                "dimensoes_recorte": meta_aux.get(
-                                    "dimensoes_recorte", "N/D"
-                                ),
-                                "area_por_pixel_ha": meta_aux.get(
-                                    "area_por_pixel_ha", None
-                                ),
-                                "area_por_pixel_ha_formatado": meta_aux.get(
-                                    "area_por_pixel_ha_formatado", None
-                                ),
-                                "area_poligono_intersect_raster_ha": round(
-                                    area_intersec_raster_ha, 4
-                                ),
-                                "data_imagem": datetime.now().strftime("%d/%m/%Y"),
-                                "centroide": centroid_coords,
-                                "centroide_display": centroid_display,
-                                "municipio": municipio,
-                                "uf": uf,
-                                "cd_rta": cd_rta,
-                                "nm_rta": nm_rta,
-                                "quadrante": {
-                                    "codigo": None,
-                                    "valor_quadrante": None,
-                                    "valor_quadrante_formatado": None,
-                                    "atributos": {},
-                                },
-                            },
-                            "imagem_recortada": {
-                                "base64": img_base64,
-                                "legenda": legenda,
-                                "diagnostics": img_diag,
-                            }
-                            if img_base64
-                            else None,
-                            "crs_info": crs_info,
-                        }
-
-                    # Cálculo de valoração delegado ao módulo
-                    relatorio, quadrante_code, valor_quadrante, quad_attrs, quad_msg = (
-                        calculate_valoracao(
-                            relatorio, centroid_point, valor_quadrante_result
-                        )
-                    )
-
-                except Exception as e:
-                    logger.warning(f"Erro no cálculo de valoração agronômica: {e}")
-                    relatorio.setdefault("valor_total_calculado", 0.0)
-            else:
-                logger.info("Módulo de valoração desabilitado - pulando cálculos")
-                relatorio["valor_total_calculado"] = None
-                relatorio["valor_total_calculado_formatado"] = None
-
-            return {
+            resposta = {
                 "status": "sucesso",
                 "relatorio": relatorio,
                 "polygon_geojson": polygon_geojson,
                 "metadados": {
                     "crs": str(tiff_crs),
-                    "resolucao_espacial": f"{src.res[0]:.2f} x {src.res[1]:.2f}",
+                    "resolucao_espacial": resolucao,
                     "dimensoes_recorte": meta_aux.get("dimensoes_recorte", "N/D"),
                     "area_por_pixel_ha": meta_aux.get("area_por_pixel_ha", None),
                     "area_por_pixel_ha_formatado": meta_aux.get(
@@ -394,687 +1103,189 @@ def _process_analysis_sync(kml_file, raster_path, enable_valoracao=True):
                     "uf": uf,
                     "cd_rta": cd_rta,
                     "nm_rta": nm_rta,
-                    "quadrante": {
-                        "codigo": (
-                            quadrante_code if "quadrante_code" in locals() else None
-                        ),
-                        "valor_quadrante": (
-                            valor_quadrante if "valor_quadrante" in locals() else None
-                        ),
-                        "valor_quadrante_formatado": (
-                            quad_attrs.get("VL_CEND_AVLC_IMVL_formatted")
-                            if "quad_attrs" in locals()
-                            and isinstance(quad_attrs, dict)
-                            and "VL_CEND_AVLC_IMVL_formatted" in quad_attrs
-                            else None
-                        ),
-                        "atributos": (quad_attrs if "quad_attrs" in locals() else {}),
-                    },
                 },
-                "imagem_recortada": {
-                    "base64": img_base64,
-                    "legenda": legenda,
-                    "diagnostics": img_diag,
-                }
-                if img_base64
-                else None,
+                "imagem_recortada": imagem_recortada,
                 "crs_info": crs_info,
             }
 
-    except Exception as e:
-        logger.error(f"Erro no processamento síncrono: {e}")
-        return {"status": "erro", "mensagem": f"Erro no processamento: {str(e)}"}
+            if analise["pos_processar"] is not None:
+                contexto = {
+                    "areas_por_classe_ha": areas_por_classe_ha,
+                    "area_poligono_ha": area_poligono_ha,
+                    "centroide": centroid,
+                }
+                resposta = analise["pos_processar"](resposta, contexto, **(opcoes or {}))
+            return resposta
 
+    except Exception as e:
+        logger.exception(f"Erro na análise {tipo}: {e}")
+        return {
+            "status": "erro",
+            "mensagem": f"Erro ao processar análise {rotulo}: {str(e)}",
+        }
 
-# ==============================================================================
-# Processamento síncrono: Análise de Declividade
-# ==============================================================================
-def _process_declividade_sync(kml_file, raster_path):
-    """Processamento síncrono para análise de declividade."""
-    try:
-        gdf = parse_upload_file(kml_file)
-        if isinstance(gdf, tuple):
-            return gdf
 
-        with rasterio.open(raster_path) as src:
-            tiff_crs = src.crs if src.crs else CRS.from_epsg(4674)
+def _analisar_raster_lote(analise, src, single_gdf, area_poligono_ha):
+    """Registros de lote (um por classe) de uma análise raster já aberta."""
+    from rasterio.crs import CRS
+    raster_crs = src.crs if src.crs else CRS.from_epsg(4674)
+    if single_gdf.crs != raster_crs:
+        single_gdf, _ = _convert_gdf_to_raster_crs(single_gdf, raster_crs)
 
-            logger.info(
-                f"📊 Raster ALOS Declividade - Resolução: {src.res[0]}m x {src.res[1]}m"
-            )
-            pixel_area = _pixel_area_ha(src)
-            logger.info(
-                f"📐 Área por pixel: {pixel_area:.4f} ha ({pixel_area * 10000:.0f} m²)"
-            )
+    areas_por_classe_ha, _, _, _ = _areas_analise_raster(
+        analise, src, single_gdf, area_poligono_ha, avisar=False
+    )
+    registros = [
+        {
+            "Tipo Análise": analise["titulo"],
+            "DN": int(cls),
+            "Descrição": analise["nomes"].get(int(cls), f"Classe {int(cls)}"),
+            "área_classe_ha": round(area_ha, 4),
+        }
+        for cls, area_ha in _classes_exibidas(analise, areas_por_classe_ha)
+    ]
+    if registros and analise["pos_lote"] is not None:
+        analise["pos_lote"](registros, areas_por_classe_ha, area_poligono_ha)
+    return registros
 
-            gdf_tiff, crs_info = _convert_gdf_to_raster_crs(gdf, tiff_crs)
-            geom_union = unary_union(gdf_tiff.geometry)
 
-            if geom_union.is_empty:
-                return {
-                    "status": "erro",
-                    "mensagem": "Polígono inválido após processamento.",
-                }
+def _rota_analise_raster(tipo):
+    """Fluxo comum das rotas de análise raster.
 
-            area_poligono_ha = _polygon_area_ha(gdf_tiff, tiff_crs)
-            area_intersec_raster_ha = _intersect_area_ha(geom_union, tiff_crs, src)
+    Valida o upload, confere o raster, memoiza e executa a análise (com
+    limite por tipo e no pool de processos, se ativo).
+    """
+    rotulo = ANALISES_RASTER[tipo]["rotulo"]
+    logger.info(f"=== INICIANDO ANÁLISE {rotulo.upper()} ===")
 
-            if area_intersec_raster_ha == 0:
-                return {
-                    "status": "erro",
-                    "mensagem": "Polígono não possui interseção com a área do raster de declividade.",
-                }
+    if "kml" not in request.files:
+        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
 
-            cog_optimizations = _optimize_cog_reading(src, gdf_tiff.total_bounds)
+    input_file = request.files["kml"]
+    if input_file.filename == "":
+        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo selecionado"}), 400
 
-            area_classes_total_ha, areas_por_classe_ha, img_data_visual, meta_aux = (
-                _fractional_stats(src, gdf_tiff, cog_optimizations)
-            )
+    if not _allowed_file(input_file.filename):
+        return jsonify({
+            "status": "erro",
+            "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
+        }), 400
 
-            # Filtrar apenas classes válidas de declividade (1-8)
-            classes_validas_declividade = {1, 2, 3, 4, 5, 6, 7, 8}
-            areas_filtradas = {}
-            area_invalida = 0.0
+    plano = _plano_analise_raster(tipo, request.form)
+    if "erro" in plano:
+        mensagem, codigo = plano["erro"]
+        return jsonify({"status": "erro", "mensagem": mensagem}), codigo
 
-            for cls, area_ha in areas_por_classe_ha.items():
-                if cls in classes_validas_declividade:
-                    areas_filtradas[cls] = area_ha
-                else:
-                    logger.warning(
-                        f"⚠️ Classe inválida {cls} encontrada no raster de declividade com {area_ha:.4f} ha - será ignorada"
-                    )
-                    area_invalida += area_ha
-
-            areas_por_classe_ha = areas_filtradas
-            area_classes_total_ha = sum(areas_por_classe_ha.values())
-
-            if area_invalida > 0:
-                logger.info(
-                    f"📊 Área com classes inválidas: {area_invalida:.4f} ha ({(area_invalida / area_poligono_ha * 100):.2f}%)"
-                )
-
-            # Ajustar diferenças de área
-            dif_ha = area_poligono_ha - area_classes_total_ha
-            tol = 1e-4
-            if dif_ha > tol:
-                areas_por_classe_ha[0] = areas_por_classe_ha.get(0, 0.0) + dif_ha
-            elif dif_ha < -tol:
-                fator = area_poligono_ha / (
-                    area_classes_total_ha if area_classes_total_ha > 0 else 1.0
-                )
-                for k in list(areas_por_classe_ha.keys()):
-                    areas_por_classe_ha[k] *= fator
-
-            # Preparar relatório
-            total_ref = area_poligono_ha if area_poligono_ha > 0 else 1.0
-            relatorio = {
-                "area_total_poligono_ha": round(area_poligono_ha, 4),
-                "area_total_poligono_ha_formatado": _format_area_ha(
-                    area_poligono_ha, 4
-                ),
-                "area_analisada_ha": round(area_poligono_ha, 4),
-                "area_analisada_ha_formatado": _format_area_ha(area_poligono_ha, 4),
-                "numero_classes_encontradas": len(
-                    [
-                        c
-                        for c in areas_por_classe_ha
-                        if c != 0 and c in classes_validas_declividade
-                    ]
-                ),
-                "classes": {},
-                "metodo_utilizado": "pixel_parcial_otimizado",
-            }
-
-            for cls, area_ha in sorted(
-                areas_por_classe_ha.items(), key=lambda k: -k[1]
-            ):
-                if cls == 0 or cls not in classes_validas_declividade:
-                    continue
-                percent = round((area_ha / total_ref) * 100, 4)
-                relatorio["classes"][f"Classe {int(cls)}"] = {
-                    "descricao": DECLIVIDADE_CLASSES_NOMES.get(
-                        int(cls), f"Classe {int(cls)}"
-                    ),
-                    "area_ha": round(area_ha, 4),
-                    "area_ha_formatado": _format_area_ha(round(area_ha, 4), 4),
-                    "percentual": percent,
-                    "percentual_formatado": _format_percent(percent, 2),
-                }
-
-            # Gerar imagem com cores de declividade
-            img_base64, legenda, img_diag = _create_visual_image(
-                img_data_visual, DECLIVIDADE_CLASSES_NOMES, DECLIVIDADE_CLASSES_CORES
-            )
-
-            # GeoJSON do polígono
-            polygon_geojson = None
-            try:
-                gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
-                gdf_sanitized = _sanitize_gdf_for_json(gdf_wgs84)
-                polygon_geojson = json.loads(gdf_sanitized.to_json())
-                logger.info(
-                    f"GeoJSON do polígono gerado: {len(polygon_geojson.get('features', []))} features"
-                )
-            except Exception as e:
-                logger.error(f"Erro ao gerar GeoJSON do polígono: {e}")
-
-            # Centroide
-            try:
-                if "gdf_wgs84" not in locals():
-                    gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
-                centroid = gdf_wgs84.union_all().centroid
-                centroid_coords = [centroid.y, centroid.x]
-                lat_gms = decimal_to_gms(centroid.y, True)
-                lon_gms = decimal_to_gms(centroid.x, False)
-                centroid_display = f"{lat_gms}, {lon_gms}"
-                municipio, uf = _get_location_from_coords(centroid.y, centroid.x)
-                cd_rta, nm_rta = _get_rta_from_coords(centroid.y, centroid.x)
-            except Exception as e:
-                logger.warning(f"Erro ao calcular centroide: {e}")
-                centroid_coords = None
-                centroid_display = "Não disponível"
-                municipio, uf = "Não identificado", "Não identificado"
-                cd_rta, nm_rta = None, "Não identificado"
-            return {
-                "status": "sucesso",
-                "relatorio": relatorio,
-                "polygon_geojson": polygon_geojson,
-                "metadados": {
-                    "crs": str(tiff_crs),
-                    "resolucao_espacial": f"{src.res[0]:.2f} x {src.res[1]:.2f}",
-                    "dimensoes_recorte": meta_aux.get("dimensoes_recorte", "N/D"),
-                    "area_por_pixel_ha": meta_aux.get("area_por_pixel_ha", None),
-                    "area_por_pixel_ha_formatado": meta_aux.get(
-                        "area_por_pixel_ha_formatado", None
-                    ),
-                    "area_poligono_intersect_raster_ha": round(
-                        area_intersec_raster_ha, 4
-                    ),
-                    "data_imagem": datetime.now().strftime("%d/%m/%Y"),
-                    "centroide": centroid_coords,
-                    "centroide_display": centroid_display,
-                    "municipio": municipio,
-                    "uf": uf,
-                    "cd_rta": cd_rta,
-                    "nm_rta": nm_rta,
-                },
-                "imagem_recortada": {
-                    "base64": img_base64,
-                    "legenda": legenda,
-                    "diagnostics": img_diag,
-                }
-                if img_base64
-                else None,
-                "crs_info": crs_info,
-            }
-
-    except Exception as e:
-        logger.exception(f"Erro em _process_declividade_sync: {e}")
-        return {
-            "status": "erro",
-            "mensagem": f"Erro ao processar análise de declividade: {str(e)}",
-        }
-
-
-# ==============================================================================
-# Processamento síncrono: Análise de Classe Textural do Solo (MapBiomas)
-# ==============================================================================
-
-def _process_solo_textural_sync(kml_file, raster_path):
-    """Processamento síncrono para análise de classe textural do solo."""
     try:
-        gdf = parse_upload_file(kml_file)
-        if isinstance(gdf, tuple):
-            return gdf
-
-        with rasterio.open(raster_path) as src:
-            tiff_crs = src.crs if src.crs else CRS.from_epsg(4674)
-
-            logger.info(
-                f"📊 Raster Solo Textural - Resolução: {src.res[0]:.2f}m x {src.res[1]:.2f}m"
-            )
-            pixel_area = _pixel_area_ha(src)
-            logger.info(
-                f"📐 Área por pixel: {pixel_area:.4f} ha ({pixel_area * 10000:.0f} m²)"
-            )
-
-            gdf_tiff, crs_info = _convert_gdf_to_raster_crs(gdf, tiff_crs)
-            geom_union = unary_union(gdf_tiff.geometry)
-
-            if geom_union.is_empty:
-                return {
-                    "status": "erro",
-                    "mensagem": "Polígono inválido após processamento.",
-                }
-
-            area_poligono_ha = _polygon_area_ha(gdf_tiff, tiff_crs)
-            area_intersec_raster_ha = _intersect_area_ha(geom_union, tiff_crs, src)
-
-            if area_intersec_raster_ha == 0:
-                return {
-                    "status": "erro",
-                    "mensagem": "Polígono não possui interseção com a área do raster de textura do solo.",
-                }
-
-            cog_optimizations = _optimize_cog_reading(src, gdf_tiff.total_bounds)
-
-            area_classes_total_ha, areas_por_classe_ha, img_data_visual, meta_aux = (
-                _fractional_stats(src, gdf_tiff, cog_optimizations)
-            )
-
-            # Filtrar apenas classes válidas de textura do solo (1-13)
-            classes_validas_solo = set(range(1, 14))
-            areas_filtradas = {}
-            area_invalida = 0.0
-
-            for cls, area_ha in areas_por_classe_ha.items():
-                if cls in classes_validas_solo:
-                    areas_filtradas[cls] = area_ha
-                else:
-                    logger.warning(
-                        f"⚠️ Classe inválida {cls} encontrada no raster de solo textural com {area_ha:.4f} ha - será ignorada"
-                    )
-                    area_invalida += area_ha
-
-            areas_por_classe_ha = areas_filtradas
-            area_classes_total_ha = sum(areas_por_classe_ha.values())
-
-            if area_invalida > 0:
-                logger.info(
-                    f"📊 Área com classes inválidas: {area_invalida:.4f} ha ({(area_invalida / area_poligono_ha * 100):.2f}%)"
-                )
-
-            # Ajustar diferenças de área
-            dif_ha = area_poligono_ha - area_classes_total_ha
-            tol = 1e-4
-            if dif_ha > tol:
-                areas_por_classe_ha[0] = areas_por_classe_ha.get(0, 0.0) + dif_ha
-            elif dif_ha < -tol:
-                fator = area_poligono_ha / (
-                    area_classes_total_ha if area_classes_total_ha > 0 else 1.0
-                )
-                for k in list(areas_por_classe_ha.keys()):
-                    areas_por_classe_ha[k] *= fator
-
-            # Preparar relatório
-            total_ref = area_poligono_ha if area_poligono_ha > 0 else 1.0
-            relatorio = {
-                "area_total_poligono_ha": round(area_poligono_ha, 4),
-                "area_total_poligono_ha_formatado": _format_area_ha(area_poligono_ha, 4),
-                "area_analisada_ha": round(area_poligono_ha, 4),
-                "area_analisada_ha_formatado": _format_area_ha(area_poligono_ha, 4),
-                "numero_classes_encontradas": len(
-                    [c for c in areas_por_classe_ha if c != 0 and c in classes_validas_solo]
-                ),
-                "classes": {},
-                "metodo_utilizado": "pixel_parcial_otimizado",
-            }
-
-            for cls, area_ha in sorted(areas_por_classe_ha.items(), key=lambda k: -k[1]):
-                if cls == 0 or cls not in classes_validas_solo:
-                    continue
-                percent = round((area_ha / total_ref) * 100, 4)
-                relatorio["classes"][f"Classe {int(cls)}"] = {
-                    "descricao": SOLO_TEXTURAL_CLASSES_NOMES.get(int(cls), f"Classe {int(cls)}"),
-                    "area_ha": round(area_ha, 4),
-                    "area_ha_formatado": _format_area_ha(round(area_ha, 4), 4),
-                    "percentual": percent,
-                    "percentual_formatado": _format_percent(percent, 2),
-                }
-
-            # Gerar imagem com cores de solo textural
-            img_base64, legenda, img_diag = _create_visual_image(
-                img_data_visual, SOLO_TEXTURAL_CLASSES_NOMES, SOLO_TEXTURAL_CLASSES_CORES
-            )
-
-            # GeoJSON do polígono
-            polygon_geojson = None
-            try:
-                gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
-                gdf_sanitized = _sanitize_gdf_for_json(gdf_wgs84)
-                polygon_geojson = json.loads(gdf_sanitized.to_json())
-                logger.info(
-                    f"GeoJSON do polígono gerado: {len(polygon_geojson.get('features', []))} features"
-                )
-            except Exception as e:
-                logger.error(f"Erro ao gerar GeoJSON do polígono: {e}")
+        logger.info(
+            f"Arquivo recebido: filename={input_file.filename}, content_type={input_file.content_type}"
+        )
+        result = _analise_memorizada(
+            tipo,
+            input_file,
+            plano["params"],
+            plano["arquivos"],
+            lambda entrada: _executar_analise(tipo, plano["funcao"], entrada, *plano["args"]),
+        )
 
-            # Centroide
+        if isinstance(result, dict):
             try:
-                if "gdf_wgs84" not in locals():
-                    gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
-                centroid = gdf_wgs84.union_all().centroid
-                centroid_coords = [centroid.y, centroid.x]
-                lat_gms = decimal_to_gms(centroid.y, True)
-                lon_gms = decimal_to_gms(centroid.x, False)
-                centroid_display = f"{lat_gms}, {lon_gms}"
-                municipio, uf = _get_location_from_coords(centroid.y, centroid.x)
-                cd_rta, nm_rta = _get_rta_from_coords(centroid.y, centroid.x)
-            except Exception as e:
-                logger.warning(f"Erro ao calcular centroide: {e}")
-                centroid_coords = None
-                centroid_display = "Não disponível"
-                municipio, uf = "Não identificado", "Não identificado"
-                cd_rta, nm_rta = None, "Não identificado"
-
-            return {
-                "status": "sucesso",
-                "relatorio": relatorio,
-                "polygon_geojson": polygon_geojson,
-                "metadados": {
-                    "crs": str(tiff_crs),
-                    "resolucao_espacial": f"{src.res[0]:.2f} x {src.res[1]:.2f}",
-                    "dimensoes_recorte": meta_aux.get("dimensoes_recorte", "N/D"),
-                    "area_por_pixel_ha": meta_aux.get("area_por_pixel_ha", None),
-                    "area_por_pixel_ha_formatado": meta_aux.get("area_por_pixel_ha_formatado", None),
-                    "area_poligono_intersect_raster_ha": round(area_intersec_raster_ha, 4),
-                    "data_imagem": datetime.now().strftime("%d/%m/%Y"),
-                    "centroide": centroid_coords,
-                    "centroide_display": centroid_display,
-                    "municipio": municipio,
-                    "uf": uf,
-                    "cd_rta": cd_rta,
-                    "nm_rta": nm_rta,
-                },
-                "imagem_recortada": {
-                    "base64": img_base64,
-                    "legenda": legenda,
-                    "diagnostics": img_diag,
-                }
-                if img_base64
-                else None,
-                "crs_info": crs_info,
-            }
-
-    except Exception as e:
-        logger.exception(f"Erro em _process_solo_textural_sync: {e}")
-        return {
-            "status": "erro",
-            "mensagem": f"Erro ao processar análise de textura do solo: {str(e)}",
-        }
-
-
-# ==============================================================================
-# Processamento síncrono: Análise Climática Köppen-Geiger
-# ==============================================================================
-
-_MESES_EN = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
-_MESES_PT = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
-
+                safe = _sanitize_response(result)
+            except Exception:
+                safe = result
+            return jsonify(safe), analysis_pool.status_http(result)
+        else:
+            return jsonify(
+                {"status": "erro", "mensagem": "Resposta do processamento inválida"}
+            ), 500
 
-@lru_cache(maxsize=1)
-def _load_koppen_excel():
-    """Carrega dados climáticos municipais do Excel Köppen (cache permanente)."""
-    path = Path(KOPPEN_EXCEL_PATH)
-    if not path.exists():
-        logger.warning(f"Excel Köppen não encontrado: {path}")
-        return None
-    try:
-        df = pd.read_excel(str(path), sheet_name="Data")
-        df["Municipality_norm"] = df["Municipality"].str.strip().str.upper()
-        df["State_norm"] = df["State"].str.strip().str.upper()
-        logger.info(f"Excel Köppen carregado: {len(df)} municípios")
-        return df
     except Exception as e:
-        logger.error(f"Erro ao carregar Excel Köppen: {e}")
-        return None
-
-
-def _get_koppen_excel_data(municipio, uf):
-    """Busca dados climáticos do município no Excel Köppen."""
-    df = _load_koppen_excel()
-    if df is None:
-        return None
-
-    mun_norm = municipio.strip().upper()
-    uf_norm = uf.strip().upper()
-
-    match = df[(df["Municipality_norm"] == mun_norm) & (df["State_norm"] == uf_norm)]
-    if match.empty:
-        match = df[df["Municipality_norm"].str.contains(mun_norm, na=False)]
-
-    if match.empty:
-        logger.debug(f"Município '{municipio}/{uf}' não encontrado no Excel Köppen")
-        return None
-
-    row = match.iloc[0]
-    temps = [float(row[f"T_{m}"]) for m in _MESES_EN]
-    precs = [float(row[f"R_{m}"]) for m in _MESES_EN]
-
-    return {
-        "municipio": row["Municipality"],
-        "codigo_ibge": int(row["IBGE-Code"]),
-        "uf": row["State"],
-        "regiao": row["Region"],
-        "koppen_dominante": row["Köppen"],
-        "altitude_m": round(float(row["Altitude"]), 1),
-        "temperatura_media_anual": round(sum(temps) / 12, 1),
-        "precipitacao_total_anual": round(sum(precs), 1),
-        "temperaturas_mensais": {_MESES_PT[i]: round(t, 1) for i, t in enumerate(temps)},
-        "precipitacoes_mensais": {_MESES_PT[i]: round(p, 1) for i, p in enumerate(precs)},
-    }
-
-
-def _process_koppen_sync(kml_file, raster_path):
-    """Processamento síncrono para análise climática Köppen-Geiger."""
-    try:
-        gdf = parse_upload_file(kml_file)
-        if isinstance(gdf, tuple):
-            return gdf
-
-        with rasterio.open(raster_path) as src:
-            tiff_crs = src.crs if src.crs else CRS.from_epsg(4674)
-
-            logger.info(
-                f"📊 Raster Köppen-Geiger - Resolução: {src.res[0]:.2f}m x {src.res[1]:.2f}m"
-            )
-            pixel_area = _pixel_area_ha(src)
-            logger.info(
-                f"📐 Área por pixel: {pixel_area:.4f} ha ({pixel_area * 10000:.0f} m²)"
-            )
-
-            gdf_tiff, crs_info = _convert_gdf_to_raster_crs(gdf, tiff_crs)
-            geom_union = unary_union(gdf_tiff.geometry)
+        logger.exception(f"Exceção na rota de {tipo}: {e}")
+        return jsonify(
+            {"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}
+        ), 500
 
-            if geom_union.is_empty:
-                return {
-                    "status": "erro",
-                    "mensagem": "Polígono inválido após processamento.",
-                }
 
-            area_poligono_ha = _polygon_area_ha(gdf_tiff, tiff_crs)
-            area_intersec_raster_ha = _intersect_area_ha(geom_union, tiff_crs, src)
+# Funções por camada (usadas pelo benchmark e por chamadas diretas)
+def _process_analysis_sync(kml_file, raster_path, enable_valoracao=True):
+    """Processamento síncrono para análise de uso do solo."""
+    return _processar_analise_raster(
+        kml_file, "uso_solo", raster_path, {"enable_valoracao": enable_valoracao}
+    )
 
-            if area_intersec_raster_ha == 0:
-                return {
-                    "status": "erro",
-                    "mensagem": "Polígono não possui interseção com a área do raster Köppen.",
-                }
 
-            cog_optimizations = _optimize_cog_reading(src, gdf_tiff.total_bounds)
+def _process_declividade_sync(kml_file, raster_path):
+    """Processamento síncrono para análise de declividade."""
+    return _processar_analise_raster(kml_file, "declividade", raster_path)
 
-            area_classes_total_ha, areas_por_classe_ha, img_data_visual, meta_aux = (
-                _fractional_stats(src, gdf_tiff, cog_optimizations)
-            )
 
-            # Filtrar apenas classes válidas Köppen (1-12)
-            classes_validas_koppen = set(range(1, 13))
-            areas_filtradas = {}
-            area_invalida = 0.0
+def _process_aptidao_sync(kml_file, raster_path):
+    """Processamento síncrono para análise de aptidão agronômica."""
+    return _processar_analise_raster(kml_file, "aptidao", raster_path)
 
-            for cls, area_ha in areas_por_classe_ha.items():
-                if cls in classes_validas_koppen:
-                    areas_filtradas[cls] = area_ha
-                else:
-                    logger.warning(
-                        f"⚠️ Classe inválida {cls} encontrada no raster Köppen com {area_ha:.4f} ha - será ignorada"
-                    )
-                    area_invalida += area_ha
 
-            areas_por_classe_ha = areas_filtradas
-            area_classes_total_ha = sum(areas_por_classe_ha.values())
+def _process_solo_textural_sync(kml_file, raster_path):
+    """Processamento síncrono para análise de classe textural do solo."""
+    return _processar_analise_raster(kml_file, "solo_textural", raster_path)
 
-            if area_invalida > 0:
-                logger.info(
-                    f"📊 Área com classes inválidas: {area_invalida:.4f} ha ({(area_invalida / area_poligono_ha * 100):.2f}%)"
-                )
 
-            # Ajustar diferenças de área
-            dif_ha = area_poligono_ha - area_classes_total_ha
-            tol = 1e-4
-            if dif_ha > tol:
-                areas_por_classe_ha[0] = areas_por_classe_ha.get(0, 0.0) + dif_ha
-            elif dif_ha < -tol:
-                fator = area_poligono_ha / (
-                    area_classes_total_ha if area_classes_total_ha > 0 else 1.0
-                )
-                for k in list(areas_por_classe_ha.keys()):
-                    areas_por_classe_ha[k] *= fator
+def _process_koppen_sync(kml_file, raster_path):
+    """Processamento síncrono para análise climática Köppen-Geiger."""
+    return _processar_analise_raster(kml_file, "koppen", raster_path)
 
-            # Preparar relatório
-            total_ref = area_poligono_ha if area_poligono_ha > 0 else 1.0
-            relatorio = {
-                "area_total_poligono_ha": round(area_poligono_ha, 4),
-                "area_total_poligono_ha_formatado": _format_area_ha(area_poligono_ha, 4),
-                "area_analisada_ha": round(area_poligono_ha, 4),
-                "area_analisada_ha_formatado": _format_area_ha(area_poligono_ha, 4),
-                "numero_classes_encontradas": len(
-                    [c for c in areas_por_classe_ha if c != 0 and c in classes_validas_koppen]
-                ),
-                "classes": {},
-                "metodo_utilizado": "pixel_parcial_otimizado",
-            }
 
-            for cls, area_ha in sorted(areas_por_classe_ha.items(), key=lambda k: -k[1]):
-                if cls == 0 or cls not in classes_validas_koppen:
-                    continue
-                percent = round((area_ha / total_ref) * 100, 4)
-                relatorio["classes"][f"Classe {int(cls)}"] = {
-                    "descricao": KOPPEN_CLASSES_NOMES.get(int(cls), f"Classe {int(cls)}"),
-                    "area_ha": round(area_ha, 4),
-                    "area_ha_formatado": _format_area_ha(round(area_ha, 4), 4),
-                    "percentual": percent,
-                    "percentual_formatado": _format_percent(percent, 2),
-                }
+def _process_prodes_sync(kml_file, raster_path):
+    """Processamento síncrono para análise PRODES/EUDR."""
+    return _processar_analise_raster(kml_file, "prodes", raster_path)
 
-            # Gerar imagem com cores Köppen
-            img_base64, legenda, img_diag = _create_visual_image(
-                img_data_visual, KOPPEN_CLASSES_NOMES, KOPPEN_CLASSES_CORES
-            )
 
-            # Para Köppen, calcular a classe predominante e sua cor
-            # Ao invés de mostrar o recorte do raster (que fica ruim por baixa resolução),
-            # vamos pintar o polígono com a cor da classe predominante
-            cor_predominante = None
-            classe_predominante = None
-            max_area = 0
-            for cls, area_ha in areas_por_classe_ha.items():
-                if cls > 0 and cls in classes_validas_koppen and area_ha > max_area:
-                    max_area = area_ha
-                    classe_predominante = cls
-                    cor_predominante = KOPPEN_CLASSES_CORES.get(cls, "#CCCCCC")
-            
-            logger.info(f"Classe Köppen predominante: {classe_predominante} ({cor_predominante}) com {max_area:.4f} ha")
-
-            # GeoJSON do polígono
-            polygon_geojson = None
-            try:
-                gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
-                gdf_sanitized = _sanitize_gdf_for_json(gdf_wgs84)
-                polygon_geojson = json.loads(gdf_sanitized.to_json())
-                logger.info(
-                    f"GeoJSON do polígono gerado: {len(polygon_geojson.get('features', []))} features"
-                )
-            except Exception as e:
-                logger.error(f"Erro ao gerar GeoJSON do polígono: {e}")
+# ==============================================================================
+# Processamento síncrono: Análise Climática Köppen-Geiger
+# ==============================================================================
 
-            # Centroide
-            try:
-                if "gdf_wgs84" not in locals():
-                    gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
-                centroid = gdf_wgs84.union_all().centroid
-                centroid_coords = [centroid.y, centroid.x]
-                lat_gms = decimal_to_gms(centroid.y, True)
-                lon_gms = decimal_to_gms(centroid.x, False)
-                centroid_display = f"{lat_gms}, {lon_gms}"
-                municipio, uf = _get_location_from_coords(centroid.y, centroid.x)
-                cd_rta, nm_rta = _get_rta_from_coords(centroid.y, centroid.x)
-            except Exception as e:
-                logger.warning(f"Erro ao calcular centroide: {e}")
-                centroid_coords = None
-                centroid_display = "Não disponível"
-                municipio, uf = "Não identificado", "Não identificado"
-                cd_rta, nm_rta = None, "Não identificado"
+def _load_koppen_clima():
+    """Tabela climática municipal Köppen (mapeada, indexada por código IBGE)."""
+    return koppen_clima.carregar(KOPPEN_EXCEL_PATH)
 
-            # Dados climáticos do Excel Köppen (temperatura, precipitação, altitude)
-            dados_climaticos = None
-            if municipio and municipio != "Não identificado":
-                try:
-                    dados_climaticos = _get_koppen_excel_data(municipio, uf)
-                except Exception as e:
-                    logger.warning(f"Erro ao buscar dados climáticos do Excel: {e}")
 
-            return {
-                "status": "sucesso",
-                "relatorio": relatorio,
-                "polygon_geojson": polygon_geojson,
-                "metadados": {
-                    "crs": str(tiff_crs),
-                    "resolucao_espacial": f"{src.res[0]:.2f} x {src.res[1]:.2f}",
-                    "dimensoes_recorte": meta_aux.get("dimensoes_recorte", "N/D"),
-                    "area_por_pixel_ha": meta_aux.get("area_por_pixel_ha", None),
-                    "area_por_pixel_ha_formatado": meta_aux.get("area_por_pixel_ha_formatado", None),
-                    "area_poligono_intersect_raster_ha": round(area_intersec_raster_ha, 4),
-                    "data_imagem": datetime.now().strftime("%d/%m/%Y"),
-                    "centroide": centroid_coords,
-                    "centroide_display": centroid_display,
-                    "municipio": municipio,
-                    "uf": uf,
-                    "cd_rta": cd_rta,
-                    "nm_rta": nm_rta,
-                },
-                "dados_climaticos": dados_climaticos,
-                "cor_predominante": cor_predominante,
-                "classe_predominante": classe_predominante,
-                "imagem_recortada": None,
-                "crs_info": crs_info,
-            }
+@tracing.medido("clima")
+def _get_koppen_clima(codigo_ibge, municipio, uf):
+    """Dados climáticos do município: pelo código IBGE ou, sem ele, pelo nome."""
+    tabela = _load_koppen_clima()
+    if tabela is None:
+        return None
 
-    except Exception as e:
-        logger.exception(f"Erro em _process_koppen_sync: {e}")
-        return {
-            "status": "erro",
-            "mensagem": f"Erro ao processar análise Köppen-Geiger: {str(e)}",
-        }
+    dados = tabela.buscar(codigo_ibge, municipio, uf)
+    if dados is None:
+        logger.debug(
+            f"Município '{municipio}/{uf}' (IBGE {codigo_ibge}) não encontrado na tabela Köppen"
+        )
+    return dados
 
 
 # ==============================================================================
-# Processamento síncrono: Análise de Embargo IBAMA
-# ==============================================================================
-# ==============================================================================
-# Cache global: Solos Embrapa
+# Camada mapeada: Solos Embrapa
 # ==============================================================================
-_solos_gdf = None
-
-
-def _get_solos_gdf():
-    """Carrega e armazena em cache o vetor de solos Embrapa SiBCS."""
+def _ler_solos():
+    """Lê o vetor de solos Embrapa SiBCS em EPSG:4326."""
     import geopandas as gpd
-    global _solos_gdf
-    if _solos_gdf is None:
-        logger.info(f"Carregando vetor de solos: {SOLOS_VECTOR_PATH}")
-        try:
-            layer = SOLOS_LAYER_NAME if SOLOS_VECTOR_PATH.endswith(".gpkg") else None
-            _solos_gdf = gpd.read_file(SOLOS_VECTOR_PATH, layer=layer)
-            if _solos_gdf.crs is None:
-                _solos_gdf = _solos_gdf.set_crs("EPSG:4326")
-            elif str(_solos_gdf.crs) != "EPSG:4326":
-                _solos_gdf = _solos_gdf.to_crs("EPSG:4326")
-            logger.info(f"Solos carregado: {len(_solos_gdf)} registros, CRS={_solos_gdf.crs}")
-        except Exception as e:
-            logger.error(f"Erro ao carregar base de solos: {e}")
-            raise
-    return _solos_gdf
+    logger.info(f"Carregando vetor de solos: {SOLOS_VECTOR_PATH}")
+    layer = SOLOS_LAYER_NAME if SOLOS_VECTOR_PATH.endswith(".gpkg") else None
+    gdf = gpd.read_file(SOLOS_VECTOR_PATH, layer=layer)
+    if gdf.crs is None:
+        gdf = gdf.set_crs("EPSG:4326")
+    elif str(gdf.crs) != "EPSG:4326":
+        gdf = gdf.to_crs("EPSG:4326")
+    return gdf
+
+
+def _get_solos_camada():
+    """Camada mapeada do vetor de solos Embrapa SiBCS (compartilhada entre processos)."""
+    try:
+        return camadas_mapeadas.carregar("solos", SOLOS_VECTOR_PATH, _ler_solos)
+    except Exception as e:
+        logger.error(f"Erro ao carregar base de solos: {e}")
+        raise
 
 
 # ==============================================================================
@@ -1098,9 +1309,9 @@ def _analyze_solos_from_gdf(gdf_input):
 
     logger.info(f"[Solos] Geometria entrada: {len(gdf_input)} feicoes, bounds={gdf_wgs84.total_bounds}, CRS={gdf_wgs84.crs}")
 
-    solos_all = _get_solos_gdf()
+    solos_camada = _get_solos_camada()
     bounds = geom_union.bounds
-    solos_bbox = solos_all.cx[bounds[0]:bounds[2], bounds[1]:bounds[3]].copy()
+    solos_bbox = solos_camada.recorte(*bounds)
 
     _empty_return = {
         "status": "sucesso",
@@ -1242,7 +1453,7 @@ def _analyze_solos_from_gdf(gdf_input):
 def _process_solos_sync(kml_file):
     """Thin wrapper: parse do arquivo + delega para _analyze_solos_from_gdf."""
     try:
-        gdf = parse_upload_file(kml_file)
+        gdf = _ler_entrada(kml_file)
         if isinstance(gdf, tuple):
             gdf, _ = gdf
         if gdf is None or gdf.empty:
@@ -1253,19 +1464,19 @@ def _process_solos_sync(kml_file):
         return {"status": "erro", "mensagem": f"Erro ao processar análise de solos: {str(e)}"}
 
 
-
-_embargo_gdf = None
+# ==============================================================================
+# Processamento síncrono: Análise de Embargo IBAMA
+# ==============================================================================
+def _ler_embargos():
+    """Lê o shapefile de embargos IBAMA."""
+    import geopandas as gpd
+    logger.info(f"Carregando shapefile de embargos: {EMBARGO_SHAPEFILE_PATH}")
+    return gpd.read_file(str(EMBARGO_SHAPEFILE_PATH))
 
 
-def _get_embargo_gdf():
-    """Carrega e armazena em cache o shapefile de embargos IBAMA."""
-    import geopandas as gpd
-    global _embargo_gdf
-    if _embargo_gdf is None:
-        logger.info(f"Carregando shapefile de embargos: {EMBARGO_SHAPEFILE_PATH}")
-        _embargo_gdf = gpd.read_file(str(EMBARGO_SHAPEFILE_PATH))
-        logger.info(f"Shapefile de embargos carregado: {len(_embargo_gdf)} registros, CRS={_embargo_gdf.crs}")
-    return _embargo_gdf
+def _get_embargo_camada():
+    """Camada mapeada dos embargos IBAMA (compartilhada entre processos)."""
+    return camadas_mapeadas.carregar("embargo", EMBARGO_SHAPEFILE_PATH, _ler_embargos)
 
 
 def _process_embargo_sync(kml_file):
@@ -1273,7 +1484,7 @@ def _process_embargo_sync(kml_file):
     import geopandas as gpd
     try:
         # 1. Parse do arquivo do usuário
-        gdf = parse_upload_file(kml_file)
+        gdf = _ler_entrada(kml_file)
         if isinstance(gdf, tuple):
             gdf, _ = gdf
         if gdf is None or gdf.empty:
@@ -1286,10 +1497,10 @@ def _process_embargo_sync(kml_file):
         # 3. Área total do polígono em hectares (via projeção UTM)
         area_poligono_ha = _polygon_area_ha(gdf_wgs84, gdf_wgs84.crs)
 
-        # 4. Carregar embargos (cache) e filtrar pela bbox do polígono
-        embargo_gdf_all = _get_embargo_gdf()
+        # 4. Consultar embargos (camada mapeada) pela bbox do polígono
+        embargo_camada = _get_embargo_camada()
         bounds = geom_union.bounds  # (minx, miny, maxx, maxy)
-        embargo_bbox = embargo_gdf_all.cx[bounds[0]:bounds[2], bounds[1]:bounds[3]]
+        embargo_bbox = embargo_camada.recorte(*bounds)
         if embargo_bbox.crs and str(embargo_bbox.crs) != "EPSG:4674":
             embargo_bbox = embargo_bbox.to_crs("EPSG:4674")
 
@@ -1425,44 +1636,41 @@ def _process_embargo_sync(kml_file):
 # ==============================================================================
 # Processamento síncrono: Análise de Embargo ICMBio
 # ==============================================================================
-_icmbio_gdf = None
-
-
-def _get_icmbio_gdf():
-    """Carrega e armazena em cache o shapefile de embargos ICMBio."""
+def _ler_icmbio():
+    """Lê o shapefile de embargos ICMBio (.dbf legado em latin-1)."""
     import geopandas as gpd
-    global _icmbio_gdf
-    if _icmbio_gdf is None:
-        logger.info(f"Carregando shapefile ICMBio: {ICMBIO_SHAPEFILE_PATH}")
-        try:
-            # Forçar engine fiona e encoding latin-1 para lidar com .dbf legados
-            _icmbio_gdf = gpd.read_file(str(ICMBIO_SHAPEFILE_PATH), engine='fiona', encoding='latin-1')
-            
-            # Corrigir potenciais problemas de codificação (mojibake) se necessário
-            def _fix_enc(val):
-                if not isinstance(val, str):
-                    return val
-                try:
-                    return val.encode('latin-1').decode('utf-8', errors='replace')
-                except (UnicodeDecodeError, UnicodeEncodeError):
-                    return val
-            
-            for col in ['desc_infra', 'tipo_infra', 'numero_emb', 'autuado', 'municipio']:
-                if col in _icmbio_gdf.columns:
-                    _icmbio_gdf[col] = _icmbio_gdf[col].apply(_fix_enc)
-            
-            logger.info(f"Shapefile ICMBio carregado: {len(_icmbio_gdf)} registros, CRS={_icmbio_gdf.crs}")
-        except Exception as e:
-            logger.error(f"Erro ao carregar base ICMBio: {e}")
-            # Tentar fallback sem engine fiona se falhar (geopandas tentará escolher o melhor)
+    logger.info(f"Carregando shapefile ICMBio: {ICMBIO_SHAPEFILE_PATH}")
+    try:
+        # Forçar engine fiona e encoding latin-1 para lidar com .dbf legados
+        gdf = gpd.read_file(str(ICMBIO_SHAPEFILE_PATH), engine='fiona', encoding='latin-1')
+
+        # Corrigir potenciais problemas de codificação (mojibake) se necessário
+        def _fix_enc(val):
+            if not isinstance(val, str):
+                return val
             try:
-                logger.info("Tentando carregar ICMBio sem engine especificada...")
-                _icmbio_gdf = gpd.read_file(str(ICMBIO_SHAPEFILE_PATH), encoding='latin-1')
-                logger.info(f"ICMBio carregado via fallback: {len(_icmbio_gdf)} registros")
-            except Exception as e2:
-                logger.error(f"Falha total ao carregar ICMBio: {e2}")
-                raise e
-    return _icmbio_gdf
+                return val.encode('latin-1').decode('utf-8', errors='replace')
+            except (UnicodeDecodeError, UnicodeEncodeError):
+                return val
+
+        for col in ['desc_infra', 'tipo_infra', 'numero_emb', 'autuado', 'municipio']:
+            if col in gdf.columns:
+                gdf[col] = gdf[col].apply(_fix_enc)
+        return gdf
+    except Exception as e:
+        logger.error(f"Erro ao carregar base ICMBio: {e}")
+        # Tentar fallback sem engine fiona se falhar (geopandas tentará escolher o melhor)
+        try:
+            logger.info("Tentando carregar ICMBio sem engine especificada...")
+            return gpd.read_file(str(ICMBIO_SHAPEFILE_PATH), encoding='latin-1')
+        except Exception as e2:
+            logger.error(f"Falha total ao carregar ICMBio: {e2}")
+            raise e
+
+
+def _get_icmbio_camada():
+    """Camada mapeada dos embargos ICMBio (compartilhada entre processos)."""
+    return camadas_mapeadas.carregar("icmbio", ICMBIO_SHAPEFILE_PATH, _ler_icmbio)
 
 
 def _process_icmbio_sync(kml_file):
@@ -1470,7 +1678,7 @@ def _process_icmbio_sync(kml_file):
     import geopandas as gpd
     try:
         # 1. Parse do arquivo do usuário
-        gdf = parse_upload_file(kml_file)
+        gdf = _ler_entrada(kml_file)
         if isinstance(gdf, tuple):
             gdf, _ = gdf
         if gdf is None or gdf.empty:
@@ -1483,10 +1691,10 @@ def _process_icmbio_sync(kml_file):
         # 3. Área total do polígono em hectares
         area_poligono_ha = _polygon_area_ha(gdf_wgs84, gdf_wgs84.crs)
 
-        # 4. Carregar ICMBio (cache) e filtrar pela bbox do polígono
-        icmbio_gdf_all = _get_icmbio_gdf()
+        # 4. Consultar ICMBio (camada mapeada) pela bbox do polígono
+        icmbio_camada = _get_icmbio_camada()
         bounds = geom_union.bounds
-        icmbio_bbox = icmbio_gdf_all.cx[bounds[0]:bounds[2], bounds[1]:bounds[3]]
+        icmbio_bbox = icmbio_camada.recorte(*bounds)
         if icmbio_bbox.crs and str(icmbio_bbox.crs) != "EPSG:4674":
             icmbio_bbox = icmbio_bbox.to_crs("EPSG:4674")
 
@@ -1618,169 +1826,11 @@ def _process_icmbio_sync(kml_file):
 
 # ==============================================================================
 # Rota: Análise de Embargo ICMBio
-# ==============================================================================
-@app.route("/analisar-icmbio", methods=["POST"])
-def analisar_icmbio():
-    """Endpoint para verificação de sobreposição com embargos ICMBio."""
-    logger.info("=== INICIANDO ANÁLISE DE EMBARGO ICMBio ===")
-
-    if "kml" not in request.files:
-        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
-
-    input_file = request.files["kml"]
-    if input_file.filename == "":
-        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo selecionado"}), 400
-
-    if not _allowed_file(input_file.filename):
-        return jsonify({
-            "status": "erro",
-            "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
-        }), 400
-
-    if not os.path.exists(str(ICMBIO_SHAPEFILE_PATH)):
-        logger.error(f"Shapefile ICMBio não encontrado: {ICMBIO_SHAPEFILE_PATH}")
-        return jsonify({"status": "erro", "mensagem": "Base de embargos ICMBio não disponível no servidor"}), 500
-
-    try:
-        logger.info(f"Arquivo recebido: filename={input_file.filename}")
-        result = _process_icmbio_sync(input_file)
-
-        if isinstance(result, dict):
-            status = result.get("status", "erro")
-            try:
-                safe = _sanitize_response(result)
-            except Exception:
-                safe = result
-            return jsonify(safe), (200 if status == "sucesso" else 400)
-        else:
-            return jsonify({"status": "erro", "mensagem": "Resposta do processamento inválida"}), 500
-
-    except Exception as e:
-        logger.exception(f"Exceção em analisar_icmbio: {e}")
-        return jsonify({"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}), 500
-
-
-# ==============================================================================
-# Rota: Análise de Classe Textural do Solo (MapBiomas)
-# ==============================================================================
-@app.route("/analisar-solo-textural", methods=["POST"])
-def analisar_solo_textural():
-    """Endpoint para análise de classe textural do solo (MapBiomas)."""
-    logger.info("=== INICIANDO ANÁLISE DE TEXTURA DO SOLO ===")
-
-    if "kml" not in request.files:
-        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
-
-    input_file = request.files["kml"]
-    if input_file.filename == "":
-        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo selecionado"}), 400
-
-    if not _allowed_file(input_file.filename):
-        return jsonify({
-            "status": "erro",
-            "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
-        }), 400
-
-    raster_path = RASTER_SOLO_TEXTURAL_PATH
-
-    if not os.path.exists(raster_path):
-        logger.error(f"Raster de textura do solo não encontrado: {raster_path}")
-        return jsonify({
-            "status": "erro",
-            "mensagem": "Raster de textura do solo não disponível no servidor",
-        }), 500
-
-    logger.info(f"Usando raster de textura do solo: {raster_path}")
-
-    try:
-        logger.info(
-            f"Arquivo recebido: filename={input_file.filename}, content_type={input_file.content_type}"
-        )
-        result = _process_solo_textural_sync(input_file, raster_path)
-
-        if isinstance(result, dict):
-            status = result.get("status", "erro")
-            try:
-                safe = _sanitize_response(result)
-            except Exception:
-                safe = result
-            return jsonify(safe), (200 if status == "sucesso" else 400)
-        else:
-            return jsonify(
-                {"status": "erro", "mensagem": "Resposta do processamento inválida"}
-            ), 500
-
-    except Exception as e:
-        logger.exception(f"Exceção em analisar_solo_textural: {e}")
-        return jsonify(
-            {"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}
-        ), 500
-
-
-# ==============================================================================
-# Rota: Análise Climática Köppen-Geiger
-# ==============================================================================
-@app.route("/analisar-koppen", methods=["POST"])
-def analisar_koppen():
-    """Endpoint para análise climática Köppen-Geiger."""
-    logger.info("=== INICIANDO ANÁLISE CLIMÁTICA KÖPPEN-GEIGER ===")
-
-    if "kml" not in request.files:
-        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
-
-    input_file = request.files["kml"]
-    if input_file.filename == "":
-        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo selecionado"}), 400
-
-    if not _allowed_file(input_file.filename):
-        return jsonify({
-            "status": "erro",
-            "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
-        }), 400
-
-    raster_path = RASTER_KOPPEN_PATH
-
-    if not os.path.exists(raster_path):
-        logger.error(f"Raster Köppen não encontrado: {raster_path}")
-        return jsonify({
-            "status": "erro",
-            "mensagem": "Raster Köppen não disponível no servidor",
-        }), 500
-
-    logger.info(f"Usando raster Köppen: {raster_path}")
-
-    try:
-        logger.info(
-            f"Arquivo recebido: filename={input_file.filename}, content_type={input_file.content_type}"
-        )
-        result = _process_koppen_sync(input_file, raster_path)
-
-        if isinstance(result, dict):
-            status = result.get("status", "erro")
-            try:
-                safe = _sanitize_response(result)
-            except Exception:
-                safe = result
-            return jsonify(safe), (200 if status == "sucesso" else 400)
-        else:
-            return jsonify(
-                {"status": "erro", "mensagem": "Resposta do processamento inválida"}
-            ), 500
-
-    except Exception as e:
-        logger.exception(f"Exceção em analisar_koppen: {e}")
-        return jsonify(
-            {"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}
-        ), 500
-
-
-# ==============================================================================
-# Rota: Análise PRODES / EUDR
-# ==============================================================================
-@app.route("/analisar-prodes", methods=["POST"])
-def analisar_prodes():
-    """Endpoint para análise PRODES/EUDR (desmatamento e conformidade)."""
-    logger.info("=== INICIANDO ANÁLISE PRODES/EUDR ===")
+# ==============================================================================
+@app.route("/analisar-icmbio", methods=["POST"])
+def analisar_icmbio():
+    """Endpoint para verificação de sobreposição com embargos ICMBio."""
+    logger.info("=== INICIANDO ANÁLISE DE EMBARGO ICMBio ===")
 
     if "kml" not in request.files:
         return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
@@ -1795,40 +1845,56 @@ def analisar_prodes():
             "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
         }), 400
 
-    raster_path = RASTER_PRODES_PATH
-
-    if not os.path.exists(raster_path):
-        logger.error(f"Raster PRODES não encontrado: {raster_path}")
-        return jsonify({
-            "status": "erro",
-            "mensagem": "Raster PRODES não disponível no servidor",
-        }), 500
-
-    logger.info(f"Usando raster PRODES: {raster_path}")
+    if not os.path.exists(str(ICMBIO_SHAPEFILE_PATH)):
+        logger.error(f"Shapefile ICMBio não encontrado: {ICMBIO_SHAPEFILE_PATH}")
+        return jsonify({"status": "erro", "mensagem": "Base de embargos ICMBio não disponível no servidor"}), 500
 
     try:
-        logger.info(
-            f"Arquivo recebido: filename={input_file.filename}, content_type={input_file.content_type}"
+        logger.info(f"Arquivo recebido: filename={input_file.filename}")
+        result = _analise_memorizada(
+            "icmbio", input_file, {}, [ICMBIO_SHAPEFILE_PATH],
+            lambda entrada: _executar_analise("icmbio", _process_icmbio_sync, entrada),
         )
-        result = _process_prodes_sync(input_file, raster_path)
 
         if isinstance(result, dict):
-            status = result.get("status", "erro")
             try:
                 safe = _sanitize_response(result)
             except Exception:
                 safe = result
-            return jsonify(safe), (200 if status == "sucesso" else 400)
+            return jsonify(safe), analysis_pool.status_http(result)
         else:
-            return jsonify(
-                {"status": "erro", "mensagem": "Resposta do processamento inválida"}
-            ), 500
+            return jsonify({"status": "erro", "mensagem": "Resposta do processamento inválida"}), 500
 
     except Exception as e:
-        logger.exception(f"Exceção em analisar_prodes: {e}")
-        return jsonify(
-            {"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}
-        ), 500
+        logger.exception(f"Exceção em analisar_icmbio: {e}")
+        return jsonify({"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}), 500
+
+
+# ==============================================================================
+# Rota: Análise de Classe Textural do Solo (MapBiomas)
+# ==============================================================================
+@app.route("/analisar-solo-textural", methods=["POST"])
+def analisar_solo_textural():
+    """Endpoint para análise de classe textural do solo (MapBiomas)."""
+    return _rota_analise_raster("solo_textural")
+
+
+# ==============================================================================
+# Rota: Análise Climática Köppen-Geiger
+# ==============================================================================
+@app.route("/analisar-koppen", methods=["POST"])
+def analisar_koppen():
+    """Endpoint para análise climática Köppen-Geiger."""
+    return _rota_analise_raster("koppen")
+
+
+# ==============================================================================
+# Rota: Análise PRODES / EUDR
+# ==============================================================================
+@app.route("/analisar-prodes", methods=["POST"])
+def analisar_prodes():
+    """Endpoint para análise PRODES/EUDR (desmatamento e conformidade)."""
+    return _rota_analise_raster("prodes")
 
 
 @app.route("/analisar-solos", methods=["POST"])
@@ -1858,15 +1924,17 @@ def analisar_solos():
 
     try:
         logger.info(f"Arquivo recebido: filename={input_file.filename}")
-        result = _process_solos_sync(input_file)
+        result = _analise_memorizada(
+            "solos", input_file, {}, [SOLOS_VECTOR_PATH],
+            lambda entrada: _executar_analise("solos", _process_solos_sync, entrada),
+        )
 
         if isinstance(result, dict):
-            status = result.get("status", "erro")
             try:
                 safe = _sanitize_response(result)
             except Exception:
                 safe = result
-            return jsonify(safe), (200 if status == "sucesso" else 400)
+            return jsonify(safe), analysis_pool.status_http(result)
         else:
             return jsonify(
                 {"status": "erro", "mensagem": "Resposta do processamento inválida"}
@@ -1880,8 +1948,38 @@ def analisar_solos():
 
 
 # ==============================================================================
-# Processamento síncrono: Análise PRODES / EUDR
+# Classificação EUDR (PRODES)
 # ==============================================================================
+def _triagem_eudr(src, geom):
+    """Conformidade EUDR da geometria `geom` (já no CRS do raster PRODES `src`).
+
+    Com a pirâmide de desmatamento (server/prodes_piramide.py) o raster só
+    é lido nos blocos com desmatamento a partir de 2020; sem ela, lê o
+    envelope inteiro da geometria. Retorna {"conforme", "risco",
+    "areas_risco_ha", "metodo", ...}, com `risco` "HIGH_RISK", "EUDR_MARKER"
+    ou None.
+    """
+    piramide = prodes_piramide.carregar(src.name)
+    with tracing.span("triagem_eudr"):
+        if piramide is not None:
+            triagem = piramide.triagem(src, geom)
+            triagem["metodo"] = "piramide"
+        else:
+            triagem = {
+                "areas_risco_ha": prodes_piramide.areas_risco_resolucao_total(
+                    src, geom, _pixel_area_ha(src)
+                ),
+                "metodo": "resolucao_total",
+            }
+
+    niveis = {PRODES_EUDR_RISK[cls] for cls in triagem["areas_risco_ha"]}
+    triagem["conforme"] = not niveis
+    triagem["risco"] = (
+        "HIGH_RISK" if "HIGH_RISK" in niveis else ("EUDR_MARKER" if niveis else None)
+    )
+    return triagem
+
+
 def _compute_eudr_classification(areas_por_classe, area_total_ha):
     """Computa classificação EUDR baseada nos pixels PRODES encontrados."""
     risk_areas = {
@@ -1947,153 +2045,6 @@ def _compute_eudr_classification(areas_por_classe, area_total_ha):
     }
 
 
-def _process_prodes_sync(kml_file, raster_path):
-    """Processamento síncrono para análise PRODES/EUDR."""
-    try:
-        gdf = parse_upload_file(kml_file)
-        if isinstance(gdf, tuple):
-            return gdf
-
-        with rasterio.open(raster_path) as src:
-            tiff_crs = src.crs if src.crs else CRS.from_epsg(4674)
-
-            logger.info(f"📊 Raster PRODES - Resolução: {src.res[0]:.8f} x {src.res[1]:.8f}")
-            pixel_area = _pixel_area_ha(src)
-            logger.info(
-                f"📐 Área por pixel: {pixel_area:.6f} ha ({pixel_area * 10000:.2f} m²)"
-            )
-
-            gdf_tiff, crs_info = _convert_gdf_to_raster_crs(gdf, tiff_crs)
-            geom_union = unary_union(gdf_tiff.geometry)
-
-            if geom_union.is_empty:
-                return {
-                    "status": "erro",
-                    "mensagem": "Polígono inválido após processamento.",
-                }
-
-            area_poligono_ha = _polygon_area_ha(gdf_tiff, tiff_crs)
-            area_intersec_raster_ha = _intersect_area_ha(geom_union, tiff_crs, src)
-
-            if area_intersec_raster_ha == 0:
-                return {
-                    "status": "erro",
-                    "mensagem": "Polígono não possui interseção com a área do raster PRODES.",
-                }
-
-            cog_optimizations = _optimize_cog_reading(src, gdf_tiff.total_bounds)
-
-            area_classes_total_ha, areas_por_classe_ha, img_data_visual, meta_aux = (
-                _fractional_stats(src, gdf_tiff, cog_optimizations, include_zero_class=True)
-            )
-
-            # Classificação EUDR
-            eudr_result = _compute_eudr_classification(areas_por_classe_ha, area_poligono_ha)
-
-            # Relatório padrão por classe PRODES
-            total_ref = area_poligono_ha if area_poligono_ha > 0 else 1.0
-            relatorio = {
-                "area_total_poligono_ha": round(area_poligono_ha, 4),
-                "area_total_poligono_ha_formatado": _format_area_ha(area_poligono_ha, 4),
-                "area_analisada_ha": round(area_classes_total_ha, 4),
-                "area_analisada_ha_formatado": _format_area_ha(area_classes_total_ha, 4),
-                "numero_classes_encontradas": len(
-                    [c for c in areas_por_classe_ha if areas_por_classe_ha[c] > 0]
-                ),
-                "classes": {},
-                "metodo_utilizado": "pixel_parcial_otimizado",
-            }
-
-            for cls, area_ha in sorted(
-                areas_por_classe_ha.items(), key=lambda k: -k[1]
-            ):
-                if area_ha <= 0:
-                    continue
-                percent = round((area_ha / total_ref) * 100, 4)
-                relatorio["classes"][f"Classe {int(cls)}"] = {
-                    "descricao": PRODES_CLASSES_NOMES.get(int(cls), f"Classe {int(cls)}"),
-                    "area_ha": round(area_ha, 4),
-                    "area_ha_formatado": _format_area_ha(round(area_ha, 4), 4),
-                    "percentual": percent,
-                    "percentual_formatado": _format_percent(percent, 2),
-                    "risco_eudr": PRODES_EUDR_RISK.get(int(cls), "CONSOLIDATED"),
-                }
-
-            # Gerar imagem com cores PRODES
-            img_base64, legenda, img_diag = _create_visual_image(
-                img_data_visual, PRODES_CLASSES_NOMES, PRODES_CLASSES_CORES,
-                include_zero_class=True
-            )
-
-            # GeoJSON do polígono
-            polygon_geojson = None
-            try:
-                gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
-                gdf_sanitized = _sanitize_gdf_for_json(gdf_wgs84)
-                polygon_geojson = json.loads(gdf_sanitized.to_json())
-            except Exception as e:
-                logger.error(f"Erro ao gerar GeoJSON do polígono: {e}")
-
-            # Centroide
-            try:
-                if "gdf_wgs84" not in locals():
-                    gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
-                centroid = gdf_wgs84.union_all().centroid
-                centroid_coords = [centroid.y, centroid.x]
-                lat_gms = decimal_to_gms(centroid.y, True)
-                lon_gms = decimal_to_gms(centroid.x, False)
-                centroid_display = f"{lat_gms}, {lon_gms}"
-                municipio, uf = _get_location_from_coords(centroid.y, centroid.x)
-                cd_rta, nm_rta = _get_rta_from_coords(centroid.y, centroid.x)
-            except Exception as e:
-                logger.warning(f"Erro ao calcular centroide: {e}")
-                centroid_coords = None
-                centroid_display = "Não disponível"
-                municipio, uf = "Não identificado", "Não identificado"
-                cd_rta, nm_rta = None, "Não identificado"
-
-            return {
-                "status": "sucesso",
-                "relatorio": relatorio,
-                "eudr": eudr_result,
-                "polygon_geojson": polygon_geojson,
-                "metadados": {
-                    "crs": str(tiff_crs),
-                    "resolucao_espacial": f"{src.res[0]:.8f} x {src.res[1]:.8f}",
-                    "dimensoes_recorte": meta_aux.get("dimensoes_recorte", "N/D"),
-                    "area_por_pixel_ha": meta_aux.get("area_por_pixel_ha", None),
-                    "area_por_pixel_ha_formatado": meta_aux.get(
-                        "area_por_pixel_ha_formatado", None
-                    ),
-                    "area_poligono_intersect_raster_ha": round(
-                        area_intersec_raster_ha, 4
-                    ),
-                    "data_imagem": datetime.now().strftime("%d/%m/%Y"),
-                    "centroide": centroid_coords,
-                    "centroide_display": centroid_display,
-                    "municipio": municipio,
-                    "uf": uf,
-                    "cd_rta": cd_rta,
-                    "nm_rta": nm_rta,
-                },
-                "imagem_recortada": {
-                    "base64": img_base64,
-                    "legenda": legenda,
-                    "diagnostics": img_diag,
-                }
-                if img_base64
-                else None,
-                "crs_info": crs_info,
-            }
-
-    except Exception as e:
-        logger.exception(f"Erro em _process_prodes_sync: {e}")
-        return {
-            "status": "erro",
-            "mensagem": f"Erro ao processar análise PRODES/EUDR: {str(e)}",
-        }
-
-
 # ==============================================================================
 # Rota: Análise de Embargo IBAMA
 # ==============================================================================
@@ -2106,219 +2057,38 @@ def analisar_embargo():
         return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
 
     input_file = request.files["kml"]
-    if input_file.filename == "":
-        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo selecionado"}), 400
-
-    if not _allowed_file(input_file.filename):
-        return jsonify({
-            "status": "erro",
-            "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
-        }), 400
-
-    if not os.path.exists(str(EMBARGO_SHAPEFILE_PATH)):
-        logger.error(f"Shapefile de embargos não encontrado: {EMBARGO_SHAPEFILE_PATH}")
-        return jsonify({"status": "erro", "mensagem": "Base de embargos não disponível no servidor"}), 500
-
-    try:
-        logger.info(f"Arquivo recebido: filename={input_file.filename}")
-        result = _process_embargo_sync(input_file)
-
-        if isinstance(result, dict):
-            status = result.get("status", "erro")
-            try:
-                safe = _sanitize_response(result)
-            except Exception:
-                safe = result
-            return jsonify(safe), (200 if status == "sucesso" else 400)
-        else:
-            return jsonify({"status": "erro", "mensagem": "Resposta do processamento inválida"}), 500
-
-    except Exception as e:
-        logger.exception(f"Exceção em analisar_embargo: {e}")
-        return jsonify({"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}), 500
-
-
-# ==============================================================================
-# Processamento síncrono: Análise de Aptidão Agronômica
-# ==============================================================================
-def _process_aptidao_sync(kml_file, raster_path):
-    """Processamento síncrono para análise de aptidão agronômica."""
-    try:
-        gdf = parse_upload_file(kml_file)
-        if isinstance(gdf, tuple):
-            return gdf
-
-        with rasterio.open(raster_path) as src:
-            tiff_crs = src.crs if src.crs else CRS.from_epsg(4674)
-
-            logger.info(f"📊 Raster Aptidão - Resolução: {src.res[0]}m x {src.res[1]}m")
-            pixel_area = _pixel_area_ha(src)
-            logger.info(
-                f"📐 Área por pixel: {pixel_area:.4f} ha ({pixel_area * 10000:.0f} m²)"
-            )
-
-            gdf_tiff, crs_info = _convert_gdf_to_raster_crs(gdf, tiff_crs)
-            geom_union = unary_union(gdf_tiff.geometry)
-
-            if geom_union.is_empty:
-                return {
-                    "status": "erro",
-                    "mensagem": "Polígono inválido após processamento.",
-                }
-
-            area_poligono_ha = _polygon_area_ha(gdf_tiff, tiff_crs)
-            area_intersec_raster_ha = _intersect_area_ha(geom_union, tiff_crs, src)
-
-            if area_intersec_raster_ha == 0:
-                return {
-                    "status": "erro",
-                    "mensagem": "Polígono não possui interseção com a área do raster de aptidão.",
-                }
-
-            cog_optimizations = _optimize_cog_reading(src, gdf_tiff.total_bounds)
-
-            area_classes_total_ha, areas_por_classe_ha, img_data_visual, meta_aux = (
-                _fractional_stats(src, gdf_tiff, cog_optimizations)
-            )
-
-            # Filtrar apenas classes válidas (1-5)
-            classes_validas = {1, 2, 3, 4, 5}
-            areas_filtradas = {}
-            area_invalida = 0.0
-
-            for cls, area_ha in areas_por_classe_ha.items():
-                if cls in classes_validas:
-                    areas_filtradas[cls] = area_ha
-                else:
-                    logger.warning(
-                        f"⚠️ Classe inválida {cls} encontrada no raster com {area_ha:.4f} ha - será ignorada"
-                    )
-                    area_invalida += area_ha
-
-            areas_por_classe_ha = areas_filtradas
-            area_classes_total_ha = sum(areas_por_classe_ha.values())
-
-            if area_invalida > 0:
-                logger.info(
-                    f"📊 Área com classes inválidas: {area_invalida:.4f} ha ({(area_invalida / area_poligono_ha * 100):.2f}%)"
-                )
-
-            # Ajustar diferenças de área
-            dif_ha = area_poligono_ha - area_classes_total_ha
-            tol = 1e-4
-            if dif_ha > tol:
-                areas_por_classe_ha[0] = areas_por_classe_ha.get(0, 0.0) + dif_ha
-            elif dif_ha < -tol:
-                fator = area_poligono_ha / (
-                    area_classes_total_ha if area_classes_total_ha > 0 else 1.0
-                )
-                for k in list(areas_por_classe_ha.keys()):
-                    areas_por_classe_ha[k] *= fator
-
-            # Preparar relatório
-            total_ref = area_poligono_ha if area_poligono_ha > 0 else 1.0
-            relatorio = {
-                "area_total_poligono_ha": round(area_poligono_ha, 4),
-                "area_total_poligono_ha_formatado": _format_area_ha(
-                    area_poligono_ha, 4
-                ),
-                "area_analisada_ha": round(area_poligono_ha, 4),
-                "area_analisada_ha_formatado": _format_area_ha(area_poligono_ha, 4),
-                "numero_classes_encontradas": len(
-                    [c for c in areas_por_classe_ha if c != 0 and c in classes_validas]
-                ),
-                "classes": {},
-                "metodo_utilizado": "pixel_parcial_otimizado",
-            }
+    if input_file.filename == "":
+        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo selecionado"}), 400
 
-            for cls, area_ha in sorted(
-                areas_por_classe_ha.items(), key=lambda k: -k[1]
-            ):
-                if cls == 0 or cls not in classes_validas:
-                    continue
-                percent = round((area_ha / total_ref) * 100, 4)
-                relatorio["classes"][f"Classe {int(cls)}"] = {
-                    "descricao": APTIDAO_CLASSES_NOMES.get(
-                        int(cls), f"Classe {int(cls)}"
-                    ),
-                    "descricao_completa": APTIDAO_CLASSES_DESCRICOES.get(int(cls), ""),
-                    "area_ha": round(area_ha, 4),
-                    "area_ha_formatado": _format_area_ha(round(area_ha, 4), 4),
-                    "percentual": percent,
-                    "percentual_formatado": _format_percent(percent, 2),
-                }
+    if not _allowed_file(input_file.filename):
+        return jsonify({
+            "status": "erro",
+            "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
+        }), 400
 
-            # Gerar imagem com cores de aptidão
-            img_base64, legenda, img_diag = _create_visual_image(
-                img_data_visual, APTIDAO_CLASSES_NOMES, APTIDAO_CLASSES_CORES
-            )
+    if not os.path.exists(str(EMBARGO_SHAPEFILE_PATH)):
+        logger.error(f"Shapefile de embargos não encontrado: {EMBARGO_SHAPEFILE_PATH}")
+        return jsonify({"status": "erro", "mensagem": "Base de embargos não disponível no servidor"}), 500
 
-            # GeoJSON do polígono
-            polygon_geojson = None
-            try:
-                gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
-                gdf_sanitized = _sanitize_gdf_for_json(gdf_wgs84)
-                polygon_geojson = json.loads(gdf_sanitized.to_json())
-            except Exception as e:
-                logger.error(f"Erro ao gerar GeoJSON do polígono: {e}")
+    try:
+        logger.info(f"Arquivo recebido: filename={input_file.filename}")
+        result = _analise_memorizada(
+            "embargo", input_file, {}, [EMBARGO_SHAPEFILE_PATH],
+            lambda entrada: _executar_analise("embargo", _process_embargo_sync, entrada),
+        )
 
-            # Centroide
+        if isinstance(result, dict):
             try:
-                if "gdf_wgs84" not in locals():
-                    gdf_wgs84 = gdf_tiff.to_crs("EPSG:4326")
-                centroid = gdf_wgs84.union_all().centroid
-                centroid_coords = [centroid.y, centroid.x]
-                lat_gms = decimal_to_gms(centroid.y, True)
-                lon_gms = decimal_to_gms(centroid.x, False)
-                centroid_display = f"{lat_gms}, {lon_gms}"
-                municipio, uf = _get_location_from_coords(centroid.y, centroid.x)
-                cd_rta, nm_rta = _get_rta_from_coords(centroid.y, centroid.x)
-            except Exception as e:
-                logger.warning(f"Erro ao calcular centroide: {e}")
-                centroid_coords = None
-                centroid_display = "Não disponível"
-                municipio, uf = "Não identificado", "Não identificado"
-                cd_rta, nm_rta = None, "Não identificado"
-
-            return {
-                "status": "sucesso",
-                "relatorio": relatorio,
-                "polygon_geojson": polygon_geojson,
-                "metadados": {
-                    "crs": str(tiff_crs),
-                    "resolucao_espacial": f"{src.res[0]:.2f} x {src.res[1]:.2f}",
-                    "dimensoes_recorte": meta_aux.get("dimensoes_recorte", "N/D"),
-                    "area_por_pixel_ha": meta_aux.get("area_por_pixel_ha", None),
-                    "area_por_pixel_ha_formatado": meta_aux.get(
-                        "area_por_pixel_ha_formatado", None
-                    ),
-                    "area_poligono_intersect_raster_ha": round(
-                        area_intersec_raster_ha, 4
-                    ),
-                    "data_imagem": datetime.now().strftime("%d/%m/%Y"),
-                    "centroide": centroid_coords,
-                    "centroide_display": centroid_display,
-                    "municipio": municipio,
-                    "uf": uf,
-                    "cd_rta": cd_rta,
-                    "nm_rta": nm_rta,
-                },
-                "imagem_recortada": {
-                    "base64": img_base64,
-                    "legenda": legenda,
-                    "diagnostics": img_diag,
-                }
-                if img_base64
-                else None,
-                "crs_info": crs_info,
-            }
+                safe = _sanitize_response(result)
+            except Exception:
+                safe = result
+            return jsonify(safe), analysis_pool.status_http(result)
+        else:
+            return jsonify({"status": "erro", "mensagem": "Resposta do processamento inválida"}), 500
 
     except Exception as e:
-        logger.exception(f"Erro em _process_aptidao_sync: {e}")
-        return {
-            "status": "erro",
-            "mensagem": f"Erro ao processar análise de aptidão: {str(e)}",
-        }
+        logger.exception(f"Exceção em analisar_embargo: {e}")
+        return jsonify({"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}), 500
 
 
 # ==============================================================================
@@ -2373,207 +2143,684 @@ def convert_to_geojson():
 # ==============================================================================
 @app.route("/analisar", methods=["POST"])
 def analisar_imagem():
-    logger.info("=== INICIANDO ANÁLISE SÍNCRONA ===")
+    """Endpoint para análise de uso do solo (com valoração agronômica opcional)."""
+    return _rota_analise_raster("uso_solo")
+
+
+# ==============================================================================
+# Rota: Análise de Declividade
+# ==============================================================================
+@app.route("/analisar-declividade", methods=["POST"])
+def analisar_declividade():
+    """Endpoint para análise de declividade usando raster ALOS."""
+    return _rota_analise_raster("declividade")
+
+
+# ==============================================================================
+# Rota: Análise de Aptidão Agronômica
+# ==============================================================================
+@app.route("/analisar-aptidao", methods=["POST"])
+def analisar_aptidao():
+    """Endpoint para análise de aptidão usando o raster correspondente."""
+    return _rota_analise_raster("aptidao")
+
+
+# ==============================================================================
+# Rota: Todas as análises de um polígono
+# ==============================================================================
+# Análises vetoriais: tipo → (função, base de dados, mensagem e código HTTP
+# quando a base não está no servidor)
+_ANALISES_VETORIAIS = {
+    "embargo": (
+        _process_embargo_sync, EMBARGO_SHAPEFILE_PATH,
+        "Base de embargos não disponível no servidor", 500,
+    ),
+    "icmbio": (
+        _process_icmbio_sync, ICMBIO_SHAPEFILE_PATH,
+        "Base de embargos ICMBio não disponível no servidor", 500,
+    ),
+    "solos": (
+        _process_solos_sync, SOLOS_VECTOR_PATH,
+        "Base de solos Embrapa não disponível no servidor", 503,
+    ),
+}
+
+
+def _plano_analise(tipo, form):
+    """Plano de execução de qualquer análise por polígono (raster ou vetorial)."""
+    if tipo in ANALISES_RASTER:
+        return _plano_analise_raster(tipo, form)
+
+    funcao, caminho, mensagem, codigo = _ANALISES_VETORIAIS[tipo]
+    if not os.path.exists(str(caminho)):
+        logger.error(f"Base de {tipo} não encontrada: {caminho}")
+        return {"erro": (mensagem, codigo)}
+    return {"funcao": funcao, "args": (), "params": {}, "arquivos": [caminho]}
+
+
+def _analises_solicitadas(valor):
+    """(tipos, desconhecidos) do campo `analises` de /analisar-todos.
+
+    Aceita lista JSON ou nomes separados por vírgula, com os nomes do
+    registro (`solo_textural`) ou do lote (`soloTextural`). Vazio = todas.
+    """
+    disponiveis = [*ANALISES_RASTER, *_ANALISES_VETORIAIS]
+    valor = (valor or "").strip()
+    if not valor:
+        return disponiveis, []
+
+    apelidos = {analise["lote"]: tipo for tipo, analise in ANALISES_RASTER.items()}
+    try:
+        nomes = json.loads(valor) if valor.startswith("[") else valor.split(",")
+    except ValueError:
+        return [], [valor]
+
+    tipos, desconhecidos = [], []
+    for nome in nomes:
+        nome = str(nome).strip()
+        if not nome:
+            continue
+        tipo = apelidos.get(nome, nome)
+        if tipo not in disponiveis:
+            desconhecidos.append(nome)
+        elif tipo not in tipos:
+            tipos.append(tipo)
+    return tipos, desconhecidos
+
+
+def _aquecer_geocodificacao(gdf):
+    """Geocodifica o centroide uma vez, antes de as análises começarem.
+
+    As análises consultam o mesmo ponto (cache por coordenada); sem isso,
+    as que terminam juntas repetiriam a consulta ao Nominatim.
+    """
+    try:
+        gdf_wgs84 = gdf.to_crs("EPSG:4326") if gdf.crs is not None else gdf
+        centroide = gdf_wgs84.union_all().centroid
+        with tracing.span("geocodificacao"):
+            _get_location_from_coords(centroide.y, centroide.x)
+            _get_rta_from_coords(centroide.y, centroide.x)
+    except Exception as e:
+        logger.warning(f"[Todas] Falha ao geocodificar o centroide: {e}")
+
+
+def _executar_analise_todos(tipo, plano, entrada, geom_hash, rastrear):
+    """Executa uma análise de /analisar-todos; devolve (linha, tempos por etapa)."""
+    inicio = time.perf_counter()
+    if rastrear:
+        tracing.iniciar()
+    try:
+        with tracing.span(f"analise_{tipo}"):
+            result = _analise_memorizada(
+                tipo,
+                entrada,
+                plano["params"],
+                plano["arquivos"],
+                lambda entrada: _executar_analise(tipo, plano["funcao"], entrada, *plano["args"]),
+                geom_hash=geom_hash,
+            )
+    except Exception as e:
+        logger.exception(f"[Todas] Exceção na análise {tipo}: {e}")
+        result = {"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}
+    finally:
+        observacoes = tracing.finalizar() if rastrear else []
+
+    if isinstance(result, dict):
+        codigo = analysis_pool.status_http(result)
+        try:
+            result = _sanitize_response(result)
+        except Exception:
+            pass
+    else:
+        codigo = 500
+        result = {"status": "erro", "mensagem": "Resposta do processamento inválida"}
+
+    linha = {
+        "analise": tipo,
+        "status_http": codigo,
+        "tempo_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        "resultado": result,
+    }
+    return linha, observacoes
+
+
+def _resumo_todos(linhas, inicio):
+    """Status geral e tempos de /analisar-todos a partir das linhas por análise."""
+    sucesso = any(linha["status_http"] == 200 for linha in linhas)
+    resumo = {
+        "status": "sucesso" if sucesso else "erro",
+        "status_http": {linha["analise"]: linha["status_http"] for linha in linhas},
+        "tempos_ms": {linha["analise"]: linha["tempo_ms"] for linha in linhas},
+        "tempo_total_ms": round((time.perf_counter() - inicio) * 1000, 1),
+    }
+    if not sucesso:
+        resumo["mensagem"] = "Nenhuma análise foi concluída com sucesso."
+    return resumo
+
+
+@app.route("/analisar-todos", methods=["POST"])
+def analisar_todos():
+    """Executa várias análises do mesmo polígono numa única requisição.
+
+    O arquivo é lido uma vez e o polígono (com o pool de processos ativo,
+    cada processo recebe o GeoDataFrame já lido) e o hash da memoização são
+    compartilhados; o centroide é geocodificado antes de as análises
+    começarem. As análises rodam em paralelo (cada uma com o limite do seu
+    tipo), de modo que a resposta leva o tempo da mais lenta.
+
+    A interface web usa esta rota (NDJSON) quando mais de uma análise é
+    selecionada; as rotas de cada análise continuam para chamadas avulsas.
+
+    Campos do formulário:
+      kml       arquivo do polígono
+      analises  lista JSON ou separada por vírgulas (padrão: todas)
+      formato   "json" (padrão) ou "ndjson" — uma linha por análise, enviada
+                assim que ela termina, e uma linha final de resumo
+      raster_type / enable_valoracao: como em /analisar
+    """
+    inicio = time.perf_counter()
+    logger.info("=== INICIANDO TODAS AS ANÁLISES ===")
 
     if "kml" not in request.files:
         return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
 
     input_file = request.files["kml"]
     if input_file.filename == "":
-        return jsonify(
-            {"status": "erro", "mensagem": "Nenhum arquivo selecionado"}
-        ), 400
+        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo selecionado"}), 400
 
     if not _allowed_file(input_file.filename):
-        return jsonify(
-            {
-                "status": "erro",
-                "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
-            }
-        ), 400
+        return jsonify({
+            "status": "erro",
+            "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
+        }), 400
 
-    raster_type = request.form.get("raster_type", "com_mosaico")
-    enable_valoracao = request.form.get("enable_valoracao", "true").lower() == "true"
-    logger.info(
-        f"Módulo de valoração: {'habilitado' if enable_valoracao else 'desabilitado'}"
-    )
+    tipos, desconhecidos = _analises_solicitadas(request.form.get("analises"))
+    if desconhecidos:
+        return jsonify({
+            "status": "erro",
+            "mensagem": (
+                f"Análises desconhecidas: {', '.join(desconhecidos)}. "
+                f"Disponíveis: {', '.join([*ANALISES_RASTER, *_ANALISES_VETORIAIS])}"
+            ),
+        }), 400
+    if not tipos:
+        return jsonify({"status": "erro", "mensagem": "Nenhuma análise solicitada"}), 400
 
-    if raster_type == "sem_mosaico":
-        raster_path = str(BASE_DIR / "data" / "LULC_Alpha_Biomas_radius_10.tif")
-    else:
-        raster_path = str(BASE_DIR / "data" / "LULC_VALORACAO_10m_com_mosaico.tif")
+    formato = request.form.get("formato", "").strip().lower()
+    streaming = formato == "ndjson" or (
+        not formato and "application/x-ndjson" in request.headers.get("Accept", "")
+    )
 
-    if not os.path.exists(raster_path):
-        logger.warning(f"Arquivo raster {raster_path} não encontrado, usando padrão")
-        raster_path = TIFF_PATH
+    try:
+        gdf = parse_upload_file(input_file)
+        if isinstance(gdf, tuple):
+            gdf, _ = gdf
+        if gdf is None or gdf.empty:
+            return jsonify({"status": "erro", "mensagem": "Arquivo não contém geometrias válidas"}), 400
+        geom_hash = _hash_geometria(gdf)
+    except Exception as e:
+        logger.warning(f"[Todas] Arquivo inválido: {e}")
+        return jsonify({"status": "erro", "mensagem": f"Erro ao ler o arquivo: {str(e)}"}), 400
+
+    linhas = []
+    planos = {}
+    for tipo in tipos:
+        plano = _plano_analise(tipo, request.form)
+        if "erro" in plano:
+            mensagem, codigo = plano["erro"]
+            linhas.append({
+                "analise": tipo,
+                "status_http": codigo,
+                "tempo_ms": 0.0,
+                "resultado": {"status": "erro", "mensagem": mensagem},
+            })
+        else:
+            planos[tipo] = plano
 
-    logger.info(f"Usando raster: {raster_path}")
+    # No mesmo processo, as análises encontram o centroide já no cache
+    # (processos do pool têm cache próprio)
+    if planos and not analysis_pool.ativo():
+        _aquecer_geocodificacao(gdf)
 
-    try:
-        logger.info(
-            f"Arquivo recebido para análise: filename={input_file.filename}, content_type={input_file.content_type}"
+    rastrear = tracing.ativo()
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, len(planos)), thread_name_prefix="analisar-todos"
+    )
+    futuros = [
+        executor.submit(
+            copy_current_request_context(_executar_analise_todos),
+            tipo, plano, gdf, geom_hash, rastrear,
         )
-        result = _process_analysis_sync(input_file, raster_path, enable_valoracao)
+        for tipo, plano in planos.items()
+    ]
 
-        if isinstance(result, dict):
-            status = result.get("status", "erro")
+    def concluidas():
+        from concurrent.futures import as_completed
+
+        for futuro in as_completed(futuros):
+            linha, observacoes = futuro.result()
+            tracing.anexar(observacoes)
+            logger.info(
+                f"[Todas] {linha['analise']} concluída em {linha['tempo_ms']:.0f} ms "
+                f"(HTTP {linha['status_http']})"
+            )
+            yield linha
+
+    if streaming:
+        def gerar():
             try:
-                safe = _sanitize_response(result)
-            except Exception:
-                safe = result
-            return jsonify(safe), (200 if status == "sucesso" else 400)
-        else:
-            return jsonify(
-                {"status": "erro", "mensagem": "Resposta do processamento inválida"}
-            ), 500
+                for linha in linhas:
+                    yield app.json.dumps(linha) + "\n"
+                for linha in concluidas():
+                    linhas.append(linha)
+                    yield app.json.dumps(linha) + "\n"
+                yield app.json.dumps(_resumo_todos(linhas, inicio)) + "\n"
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
 
-    except Exception as e:
-        logger.exception(f"Exceção em analisar_imagem: {e}")
-        return jsonify(
-            {"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}
-        ), 500
+        response = app.response_class(
+            response=stream_with_context(gerar()),
+            status=200,
+            mimetype="application/x-ndjson",
+        )
+        # Proxies (nginx) não devem acumular as linhas até o fim
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    try:
+        linhas.extend(concluidas())
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    resposta = _resumo_todos(linhas, inicio)
+    resposta["analises"] = {linha["analise"]: linha["resultado"] for linha in linhas}
+    if resposta["status"] == "sucesso":
+        return jsonify(resposta), 200
+    return jsonify(resposta), resposta["status_http"][tipos[0]]
 
 
 # ==============================================================================
-# Rota: Análise de Declividade
+# Rota: Acompanhamento de Progresso
 # ==============================================================================
-@app.route("/analisar-declividade", methods=["POST"])
-def analisar_declividade():
-    """Endpoint para análise de declividade usando raster ALOS."""
-    logger.info("=== INICIANDO ANÁLISE DE DECLIVIDADE ===")
+@app.route("/analisar-lote-progresso/<task_id>", methods=["GET"])
+def analisar_lote_progresso(task_id):
+    """Último estado do lote (consulta pontual; prefira /analisar-lote-eventos)."""
+    return jsonify(BATCH_PROGRESS.estado(task_id))
 
-    if "kml" not in request.files:
-        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
 
-    input_file = request.files["kml"]
-    if input_file.filename == "":
-        return jsonify(
-            {"status": "erro", "mensagem": "Nenhum arquivo selecionado"}
-        ), 400
+# Intervalo (s) sem eventos após o qual o stream envia um comentário de
+# keep-alive (evita timeout de proxies e detecta cliente desconectado)
+_SSE_KEEPALIVE_S = 15
 
-    if not _allowed_file(input_file.filename):
-        return jsonify(
-            {
-                "status": "erro",
-                "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
-            }
-        ), 400
+# Espera máxima (s) pelo início de um lote desconhecido (o stream pode ser
+# aberto antes do POST, durante o envio do arquivo)
+_SSE_ESPERA_LOTE_S = 300
 
-    raster_path = str(BASE_DIR / "data" / "ALOS_Declividade_Class_BR_majority_r2.tif")
 
-    if not os.path.exists(raster_path):
-        logger.error(f"Raster de declividade não encontrado: {raster_path}")
-        return jsonify(
-            {
-                "status": "erro",
-                "mensagem": "Raster de declividade não disponível no servidor",
-            }
-        ), 500
+@app.route("/analisar-lote-eventos/<task_id>", methods=["GET"])
+def analisar_lote_eventos(task_id):
+    """Progresso do lote em Server-Sent Events.
 
-    logger.info(f"Usando raster de declividade: {raster_path}")
+    Eventos "inicio", "poligono" (um por polígono concluído, com registros
+    parciais, polígonos/s e ETA) e "fim", que encerra o stream. O stream
+    pode ser aberto antes do POST do lote (o `task_id` é do cliente) e
+    retoma do `Last-Event-ID` (reconexão do EventSource) ou de `?desde=`.
 
+    Lote desconhecido — expirado (`BATCH_PROGRESS_TTL`), não iniciado em
+    `_SSE_ESPERA_LOTE_S` ou executado por outro worker sem
+    `BATCH_PROGRESS_PATH` — encerra o stream com um "fim" de status "erro".
+    """
     try:
-        logger.info(
-            f"Arquivo recebido: filename={input_file.filename}, content_type={input_file.content_type}"
+        desde = int(request.headers.get("Last-Event-ID") or request.args.get("desde") or 0)
+    except ValueError:
+        desde = 0
+
+    def gerar():
+        ultimo = desde
+        inicio = time.monotonic()
+        yield "retry: 3000\n\n"
+        while True:
+            eventos = BATCH_PROGRESS.eventos(task_id, ultimo, timeout=_SSE_KEEPALIVE_S)
+            if not eventos:
+                # Reconexão (já houve eventos) ou prazo de início vencido
+                if not BATCH_PROGRESS.existe(task_id) and (
+                    ultimo > 0 or time.monotonic() - inicio > _SSE_ESPERA_LOTE_S
+                ):
+                    dados = {"status": "erro", "mensagem": "Lote não encontrado ou expirado."}
+                    yield f"event: fim\ndata: {app.json.dumps(dados)}\n\n"
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for seq, tipo, dados in eventos:
+                ultimo = seq
+                yield f"id: {seq}\nevent: {tipo}\ndata: {app.json.dumps(_sanitize_response(dados))}\n\n"
+                if tipo == "fim":
+                    return
+
+    response = app.response_class(gerar(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Proxies (nginx) não devem acumular os eventos
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+# ==============================================================================
+# Rota: Análise de Lote Completo (Uso do Solo, Declividade, Aptidão)
+# ==============================================================================
+# Ordem das análises de lote (blocos de registros por polígono)
+_ANALISES_LOTE = (
+    "uso_solo",
+    "declividade",
+    "aptidao",
+    "soloTextural",
+    "koppen",
+    "embargo",
+    "icmbio",
+    "prodes",
+    "eudr",
+    "solos",
+)
+
+
+def _caminhos_fontes_lote(raster_type="com_mosaico"):
+    """Arquivo de dados usado por cada análise de lote."""
+    caminhos = {
+        analise["lote"]: str(_resolve_registry_raster(tipo, raster_type))
+        for tipo, analise in ANALISES_RASTER.items()
+    }
+    caminhos.update({
+        "embargo": str(EMBARGO_SHAPEFILE_PATH),
+        "icmbio": str(ICMBIO_SHAPEFILE_PATH),
+        "eudr": str(RASTER_PRODES_PATH),
+        "solos": str(SOLOS_VECTOR_PATH),
+    })
+    return caminhos
+
+
+def _abrir_fontes_lote(analises, raster_type="com_mosaico"):
+    """Abre os rasters e carrega as camadas vetoriais das análises pedidas.
+
+    Análises cujo arquivo não existe ficam com fonte None (são ignoradas).
+    """
+    import rasterio
+    caminhos = _caminhos_fontes_lote(raster_type)
+    fontes = {}
+
+    for analise in ANALISES_RASTER.values():
+        chave = analise["lote"]
+        fontes[chave] = (
+            rasterio.open(caminhos[chave])
+            if chave in analises and os.path.exists(caminhos[chave])
+            else None
         )
-        result = _process_declividade_sync(input_file, raster_path)
+    fontes["eudr"] = (
+        rasterio.open(caminhos["eudr"])
+        if "eudr" in analises and os.path.exists(caminhos["eudr"])
+        else None
+    )
 
-        if isinstance(result, dict):
-            status = result.get("status", "erro")
-            try:
-                safe = _sanitize_response(result)
-            except Exception:
-                safe = result
-            return jsonify(safe), (200 if status == "sucesso" else 400)
-        else:
-            return jsonify(
-                {"status": "erro", "mensagem": "Resposta do processamento inválida"}
-            ), 500
+    # Camadas de embargos (abertas uma vez por processo)
+    fontes["embargo"] = (
+        _get_embargo_camada()
+        if "embargo" in analises and os.path.exists(caminhos["embargo"])
+        else None
+    )
+    fontes["icmbio"] = (
+        _get_icmbio_camada()
+        if "icmbio" in analises and os.path.exists(caminhos["icmbio"])
+        else None
+    )
+    return fontes
 
-    except Exception as e:
-        logger.exception(f"Exceção em analisar_declividade: {e}")
-        return jsonify(
-            {"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}
-        ), 500
+
+def _fechar_fontes_lote(fontes):
+    for chave in [analise["lote"] for analise in ANALISES_RASTER.values()] + ["eudr"]:
+        src = fontes.get(chave)
+        if src is not None:
+            src.close()
 
 
-# ==============================================================================
-# Rota: Análise de Aptidão Agronômica
-# ==============================================================================
-@app.route("/analisar-aptidao", methods=["POST"])
-def analisar_aptidao():
-    """Endpoint para análise de aptidão usando o raster correspondente."""
-    logger.info("=== INICIANDO ANÁLISE DE APTIDAO ===")
+def _analisar_poligono_lote(single_gdf, area_poligono_ha, analises, fontes, rotulo=""):
+    """Executa as análises de lote de um polígono.
 
-    if "kml" not in request.files:
-        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
+    Retorna ({análise: [registros]}, {análises com resultado}); os registros
+    trazem apenas as colunas da análise (sem os atributos do polígono).
+    """
+    embargo_lote = fontes.get("embargo")
+    icmbio_lote = fontes.get("icmbio")
 
-    input_file = request.files["kml"]
-    if input_file.filename == "":
-        return jsonify(
-            {"status": "erro", "mensagem": "Nenhum arquivo selecionado"}
-        ), 400
+    resultado = {}
+    tem_resultado = set()
 
-    if not _allowed_file(input_file.filename):
-        return jsonify(
-            {
-                "status": "erro",
-                "mensagem": "Extensão inválida. Envie um arquivo .kml, .kmz, .geojson, .shp ou .gpkg",
-            }
-        ), 400
+    # --- ANÁLISES RASTER (ANALISES_RASTER) ---
+    for analise in ANALISES_RASTER.values():
+        chave = analise["lote"]
+        src = fontes.get(chave)
+        if chave not in analises or src is None:
+            continue
+        registros = resultado[chave] = []
+        try:
+            registros.extend(
+                _analisar_raster_lote(analise, src, single_gdf, area_poligono_ha)
+            )
+            if registros:
+                tem_resultado.add(chave)
+            logger.info(f"  - {analise['titulo']} concluído para polígono {rotulo}.")
+        except Exception as e:
+            logger.warning(f"Erro em {analise['titulo']} {rotulo}: {e}")
 
-    raster_path = RASTER_APTIDAO_PATH
+    # --- TRIAGEM EUDR (PRODES, só blocos com desmatamento recente) ---
+    src_eudr = fontes.get("eudr")
+    if "eudr" in analises and src_eudr is not None:
+        registros = resultado["eudr"] = []
+        try:
+            from rasterio.crs import CRS
+            raster_crs = src_eudr.crs if src_eudr.crs else CRS.from_epsg(4674)
+            gdf_eudr = single_gdf
+            if gdf_eudr.crs != raster_crs:
+                gdf_eudr, _ = _convert_gdf_to_raster_crs(gdf_eudr, raster_crs)
+            triagem = _triagem_eudr(src_eudr, unary_union(gdf_eudr.geometry))
+
+            if triagem["conforme"]:
+                registros.append({
+                    "Tipo Análise": "Triagem EUDR",
+                    "DN": "",
+                    "Descrição": "Sem desmatamento a partir de 2020",
+                    "área_classe_ha": 0.0,
+                    "EUDR_Conforme": True,
+                    "EUDR_Risco": "",
+                })
+            else:
+                for cls, area_ha in sorted(triagem["areas_risco_ha"].items()):
+                    registros.append({
+                        "Tipo Análise": "Triagem EUDR",
+                        "DN": int(cls),
+                        "Descrição": PRODES_CLASSES_NOMES.get(int(cls), f"Classe {int(cls)}"),
+                        "área_classe_ha": round(area_ha, 4),
+                        "EUDR_Conforme": False,
+                        "EUDR_Risco": triagem["risco"],
+                    })
+            tem_resultado.add("eudr")
+            logger.info(f"  - Triagem EUDR ({triagem['metodo']}) concluída para polígono {rotulo}.")
+        except Exception as e:
+            logger.warning(f"Erro na triagem EUDR {rotulo}: {e}")
 
-    if not os.path.exists(raster_path):
-        logger.error(f"Raster de aptidão não encontrado: {raster_path}")
-        return jsonify(
-            {
-                "status": "erro",
-                "mensagem": "Raster de aptidão não disponível no servidor",
-            }
-        ), 500
+    # --- ANÁLISE DE EMBARGO IBAMA ---
+    if "embargo" in analises and embargo_lote is not None:
+        registros = resultado["embargo"] = []
+        try:
+            import geopandas as gpd
+            single_wgs84 = single_gdf.to_crs("EPSG:4674") if str(single_gdf.crs) != "EPSG:4674" else single_gdf
+            geom_u = single_wgs84.union_all()
+            bnds = geom_u.bounds
+            emb_bbox = embargo_lote.recorte(*bnds)
+            emb_bbox = emb_bbox.to_crs("EPSG:4674") if emb_bbox.crs and str(emb_bbox.crs) != "EPSG:4674" else emb_bbox
+            emb_inter = emb_bbox[emb_bbox.geometry.intersects(geom_u)]
+
+            if emb_inter.empty:
+                record = {}
+                record["Tipo Análise"] = "Embargo IBAMA"
+                record["DN"] = 0
+                record["Descrição"] = "Sem embargo"
+                record["área_classe_ha"] = 0.0
+                record["num_tad"] = ""
+                record["dat_embarg"] = ""
+                record["des_infrac"] = ""
+                registros.append(record)
+            else:
+                for emb_dn, (_, emb_row) in enumerate(emb_inter.iterrows(), start=1):
+                    inter_g = emb_row.geometry.intersection(geom_u)
+                    if inter_g.is_empty:
+                        continue
+                    inter_tmp = gpd.GeoDataFrame(geometry=[inter_g], crs="EPSG:4674")
+                    area_sob = _polygon_area_ha(inter_tmp, inter_tmp.crs)
+                    if area_sob <= 0:
+                        continue
+                    dat_r = emb_row.get("dat_embarg", None)
+                    dat_s = dat_r.strftime("%d/%m/%Y") if dat_r is not None and hasattr(dat_r, "strftime") else (str(dat_r)[:10] if dat_r else "")
+                    record = {}
+                    record["Tipo Análise"] = "Embargo IBAMA"
+                    record["DN"] = emb_dn
+                    record["Descrição"] = str(emb_row.get("des_infrac", "") or "—")
+                    record["área_classe_ha"] = round(area_sob, 4)
+                    record["num_tad"] = str(emb_row.get("num_tad", "") or "")
+                    record["dat_embarg"] = dat_s
+                    record["des_infrac"] = str(emb_row.get("des_infrac", "") or "")
+                    registros.append(record)
+                    tem_resultado.add("embargo")
+            logger.info(f"  - Embargo concluído para polígono {rotulo}.")
+        except Exception as e:
+            logger.warning(f"Erro em embargo {rotulo}: {e}")
 
-    logger.info(f"Usando raster de aptidão: {raster_path}")
+    # --- ANÁLISE DE EMBARGO ICMBio ---
+    if "icmbio" in analises and icmbio_lote is not None:
+        registros = resultado["icmbio"] = []
+        try:
+            import geopandas as gpd
+            single_wgs84 = single_gdf.to_crs("EPSG:4674") if str(single_gdf.crs) != "EPSG:4674" else single_gdf
+            geom_u = single_wgs84.union_all()
+            bnds = geom_u.bounds
+            icm_bbox = icmbio_lote.recorte(*bnds)
+            icm_bbox = icm_bbox.to_crs("EPSG:4674") if icm_bbox.crs and str(icm_bbox.crs) != "EPSG:4674" else icm_bbox
+            icm_inter = icm_bbox[icm_bbox.geometry.intersects(geom_u)]
+
+            if icm_inter.empty:
+                record = {}
+                record["Tipo Análise"] = "Embargo ICMBio"
+                record["DN"] = 0
+                record["Descrição"] = "Sem embargo"
+                record["área_classe_ha"] = 0.0
+                record["numero_emb"] = ""
+                record["data_embargo"] = ""
+                record["desc_infra"] = ""
+                record["tipo_infra"] = ""
+                registros.append(record)
+            else:
+                for icm_dn, (_, icm_row) in enumerate(icm_inter.iterrows(), start=1):
+                    inter_g = icm_row.geometry.intersection(geom_u)
+                    if inter_g.is_empty:
+                        continue
+                    inter_tmp = gpd.GeoDataFrame(geometry=[inter_g], crs="EPSG:4674")
+                    area_sob = _polygon_area_ha(inter_tmp, inter_tmp.crs)
+                    if area_sob <= 0:
+                        continue
+                    dat_r = icm_row.get("data", None)
+                    dat_s = dat_r.strftime("%d/%m/%Y") if dat_r is not None and hasattr(dat_r, "strftime") else (str(dat_r)[:10] if dat_r else "")
+                    record = {}
+                    record["Tipo Análise"] = "Embargo ICMBio"
+                    record["DN"] = icm_dn
+                    record["Descrição"] = str(icm_row.get("desc_infra", "") or "—")
+                    record["área_classe_ha"] = round(area_sob, 4)
+                    record["numero_emb"] = str(icm_row.get("numero_emb", "") or "")
+                    record["data_embargo"] = dat_s
+                    record["desc_infra"] = str(icm_row.get("desc_infra", "") or "")
+                    record["tipo_infra"] = str(icm_row.get("tipo_infra", "") or "")
+                    registros.append(record)
+                    tem_resultado.add("icmbio")
+            logger.info(f"  - ICMBio concluído para polígono {rotulo}.")
+        except Exception as e:
+            logger.warning(f"Erro em icmbio {rotulo}: {e}")
 
-    try:
-        logger.info(
-            f"Arquivo recebido: filename={input_file.filename}, content_type={input_file.content_type}"
-        )
-        result = _process_aptidao_sync(input_file, raster_path)
+    if "solos" in analises and os.path.exists(SOLOS_VECTOR_PATH):
+        registros = resultado["solos"] = []
+        try:
+            solos_r = _analyze_solos_from_gdf(single_gdf)
+            if solos_r and solos_r.get("status") == "sucesso":
+                rel_solos = solos_r.get("relatorio", {})
+                for cls in rel_solos.get("classes", []):
+                    if cls.get("area_ha", 0) > 0:
+                        record = {}
+                        record["Tipo Análise"] = "Solos Embrapa"
+                        record["DN"] = cls.get("simbolo", "")
+                        record["Descrição"] = cls.get("leg_desc", "-")
+                        record["área_classe_ha"] = cls.get("area_ha", 0)
+                        record["Solo_Ordem"] = cls.get("ordem", "-")
+                        record["Solo_Subordem"] = cls.get("subordem", "-")
+                        record["Solo_Grande_Grupo"] = cls.get("grande_grupo", "-")
+                        record["Solo_Percentual"] = cls.get("percentual", 0)
+                        registros.append(record)
+                        tem_resultado.add("solos")
+                logger.info(f"  - Solos concluído para polígono {rotulo}.")
+        except Exception as e:
+            logger.warning(f"Erro em Solos {rotulo}: {e}")
 
-        if isinstance(result, dict):
-            status = result.get("status", "erro")
-            try:
-                safe = _sanitize_response(result)
-            except Exception:
-                safe = result
-            return jsonify(safe), (200 if status == "sucesso" else 400)
-        else:
-            return jsonify(
-                {"status": "erro", "mensagem": "Resposta do processamento inválida"}
-            ), 500
+    return resultado, tem_resultado
 
-    except Exception as e:
-        logger.exception(f"Exceção em analisar_aptidao: {e}")
-        return jsonify(
-            {"status": "erro", "mensagem": f"Erro ao processar o arquivo: {str(e)}"}
-        ), 500
 
+def _parametros_lote(form):
+    """Lê as opções comuns das rotas de lote completo.
 
-# ==============================================================================
-# Rota: Acompanhamento de Progresso
-# ==============================================================================
-@app.route("/analisar-lote-progresso/<task_id>", methods=["GET"])
-def analisar_lote_progresso(task_id):
-    prog = progress_tasks.get(
-        task_id, {"current": 0, "total": 0, "label": "Aguardando..."}
-    )
-    return jsonify(prog)
+    `analises`: lista (corpo JSON), lista JSON ou nomes separados por
+    vírgula (padrão: uso_solo); nomes fora de `_ANALISES_LOTE` → erro.
+    Retorna (parametros, None) ou (None, resposta_de_erro).
+    """
+    analises = form.get("analises") or ["uso_solo"]
+    if isinstance(analises, str):
+        valor = analises.strip()
+        try:
+            analises = json.loads(valor) if valor.startswith(("[", '"')) else valor.split(",")
+        except ValueError:
+            return None, (jsonify({
+                "status": "erro",
+                "mensagem": f"Campo 'analises' inválido: {valor}",
+            }), 400)
+    if isinstance(analises, str):
+        analises = [analises]
+    if not isinstance(analises, (list, tuple)):
+        return None, (jsonify({
+            "status": "erro",
+            "mensagem": "Campo 'analises' deve ser uma lista de análises",
+        }), 400)
+
+    analises = list(dict.fromkeys(str(a).strip() for a in analises if str(a).strip()))
+    desconhecidas = [a for a in analises if a not in _ANALISES_LOTE]
+    if desconhecidas or not analises:
+        return None, (jsonify({
+            "status": "erro",
+            "mensagem": (
+                f"Análises desconhecidas: {', '.join(desconhecidas) or '(nenhuma informada)'}. "
+                f"Disponíveis: {', '.join(_ANALISES_LOTE)}"
+            ),
+        }), 400)
+
+    output_format = str(form.get("output_format", "csv")).strip().lower()
+    if output_format not in BATCH_OUTPUT_FORMATS:
+        disponiveis = ", ".join(sorted(BATCH_OUTPUT_FORMATS))
+        return None, (jsonify({
+            "status": "erro",
+            "mensagem": f"Formato de saída '{output_format}' inválido. Disponíveis: {disponiveis}",
+        }), 400)
+
+    return {
+        "analises": analises,
+        "task_id": form.get("task_id", None),
+        "include_centroid": str(form.get("include_centroid", "false")).lower() == "true",
+        "include_wkt": str(form.get("include_wkt", "false")).lower() == "true",
+        "raster_type": form.get("raster_type", "com_mosaico"),
+        "output_format": output_format,
+    }, None
 
 
-# ==============================================================================
-# Rota: Análise de Lote Completo (Uso do Solo, Declividade, Aptidão)
-# ==============================================================================
 @app.route("/analisar-lote-completo", methods=["POST"])
 def analisar_lote_completo():
     logger.info("=== INICIANDO ANÁLISE DE LOTE COMPLETO ===")
@@ -2590,86 +2837,71 @@ def analisar_lote_completo():
     if not _allowed_file(input_file.filename):
         return jsonify({"status": "erro", "mensagem": "Extensão inválida."}), 400
 
-    analises_str = request.form.get("analises", '["uso_solo"]')
+    params, erro = _parametros_lote(request.form)
+    if erro is not None:
+        return erro
+
     try:
-        analises = json.loads(analises_str)
-    except (json.JSONDecodeError, TypeError):
-        analises = ["uso_solo"]
+        gdf = parse_upload_file(input_file)
+    except ValueError as ve:
+        logger.warning(f"Erro de validação em analisar_lote_completo: {ve}")
+        return jsonify({"status": "erro", "mensagem": str(ve)}), 400
+    except Exception as e:
+        logger.exception("Erro em analisar_lote_completo")
+        return jsonify(
+            {"status": "erro", "mensagem": f"Erro fatal ao processar lote: {str(e)}"}
+        ), 500
 
-    task_id = request.form.get("task_id", None)
-    include_centroid = request.form.get("include_centroid", "false").lower() == "true"
-    include_wkt = request.form.get("include_wkt", "false").lower() == "true"
+    if isinstance(gdf, tuple):
+        return jsonify(
+            {"status": "erro", "mensagem": "Erro no parse do arquivo"}
+        ), 400
 
-    raster_type = request.form.get("raster_type", "com_mosaico")
+    return _executar_lote_completo(gdf, **params)
 
-    # Paths
-    raster_usosolo_path = (
-        str(BASE_DIR / "data" / "LULC_VALORACAO_10m_com_mosaico.tif")
-        if raster_type == "com_mosaico"
-        else str(BASE_DIR / "data" / "LULC_Alpha_Biomas_radius_10.tif")
-    )
-    if not os.path.exists(raster_usosolo_path):
-        raster_usosolo_path = TIFF_PATH
 
-    raster_declividade_path = str(
-        BASE_DIR / "data" / "ALOS_Declividade_Class_BR_majority_r2.tif"
-    )
-    raster_aptidao_path = RASTER_APTIDAO_PATH
-    raster_solo_textural_path = RASTER_SOLO_TEXTURAL_PATH
+def _executar_lote_completo(
+    gdf,
+    analises,
+    task_id=None,
+    include_centroid=False,
+    include_wkt=False,
+    raster_type="com_mosaico",
+    output_format="csv",
+    registros_extras=None,
+):
+    """Executa as análises de lote sobre `gdf` e devolve o arquivo de saída.
 
+    `registros_extras` são gravados ao final, sem análise (ex.: códigos CAR
+    não encontrados na base).
+    """
+    from rasterio.crs import CRS
+    writer = None
+    progresso = None
     try:
         import geopandas as gpd
 
-        gdf = parse_upload_file(input_file)
-        if isinstance(gdf, tuple):
-            return jsonify(
-                {"status": "erro", "mensagem": "Erro no parse do arquivo"}
-            ), 400
-
-        resultados = []
-        total_polygons = len(gdf)
-
-        if task_id:
-            progress_tasks[task_id] = {
-                "current": 0,
-                "total": total_polygons,
-                "label": f"Preparando {total_polygons} polígonos...",
-            }
-
-        # Abrir rasters necessários (dependendo do que foi selecionado)
-        src_uso = rasterio.open(raster_usosolo_path) if "uso_solo" in analises else None
-        src_dec = (
-            rasterio.open(raster_declividade_path)
-            if "declividade" in analises
-            else None
-        )
-        src_apt = rasterio.open(raster_aptidao_path) if "aptidao" in analises else None
-        src_stx = (
-            rasterio.open(raster_solo_textural_path)
-            if "soloTextural" in analises and os.path.exists(raster_solo_textural_path)
-            else None
+        writer = BatchResultWriter(
+            output_format,
+            gdf,
+            analises,
+            include_centroid=include_centroid,
+            include_wkt=include_wkt,
         )
+        total_polygons = len(gdf)
+        progresso = BATCH_PROGRESS.acompanhar(task_id, total_polygons)
 
-        src_kop = (
-            rasterio.open(RASTER_KOPPEN_PATH)
-            if "koppen" in analises and os.path.exists(RASTER_KOPPEN_PATH)
-            else None
-        )
+        fontes = _abrir_fontes_lote(analises, raster_type)
+        src_uso = fontes.get("uso_solo")
 
-        src_prodes = (
-            rasterio.open(RASTER_PRODES_PATH)
-            if "prodes" in analises and os.path.exists(RASTER_PRODES_PATH)
-            else None
+        # Imóveis do CAR já pré-calculados saem direto da tabela
+        store_car = car_precompute.obter_store()
+        versoes_car = (
+            car_precompute.versoes_analises(_caminhos_fontes_lote(raster_type), analises)
+            if store_car is not None
+            else {}
         )
-
-        # Pré-carregar embargos em cache se necessário
-        embargo_gdf_lote = None
-        if "embargo" in analises and os.path.exists(str(EMBARGO_SHAPEFILE_PATH)):
-            embargo_gdf_lote = _get_embargo_gdf()
-
-        icmbio_gdf_lote = None
-        if "icmbio" in analises and os.path.exists(str(ICMBIO_SHAPEFILE_PATH)):
-            icmbio_gdf_lote = _get_icmbio_gdf()
+        servidos_car = 0
 
         # Vamos usar um CRS de referência. O uso do solo é epsg:4674.
         ref_crs = src_uso.crs if src_uso and src_uso.crs else CRS.from_epsg(4674)
@@ -2677,15 +2909,10 @@ def analisar_lote_completo():
 
         for _i, (idx, row) in enumerate(gdf_proj.iterrows()):
             logger.info(f"Processando polígono {_i + 1} de {total_polygons}...")
-            if task_id:
-                progress_tasks[task_id] = {
-                    "current": _i + 1,
-                    "total": total_polygons,
-                    "label": f"Analisando polígono {_i + 1} de {total_polygons}...",
-                }
 
             geom = row.geometry
             if geom.is_empty:
+                progresso.poligono(_i + 1, str(idx), {})
                 continue
 
             base_dict = {
@@ -2694,20 +2921,41 @@ def analisar_lote_completo():
                 if k != "geometry" and not str(k).startswith("_")
             }
             single_gdf = gpd.GeoDataFrame([row], crs=gdf_proj.crs)
-            area_poligono_ha = _polygon_area_ha(single_gdf, ref_crs)
+
+            area_car, resultado, tem_resultado = None, {}, set()
+            if store_car is not None and base_dict.get("cod_imovel"):
+                try:
+                    area_car, resultado, tem_resultado = store_car.consultar(
+                        base_dict["cod_imovel"],
+                        car_precompute.hash_imovel(geom, gdf_proj.crs),
+                        versoes_car,
+                    )
+                except Exception as e:
+                    logger.warning(f"Falha ao consultar pré-cálculo do CAR: {e}")
+            pendentes = [a for a in analises if a not in resultado]
+            if not pendentes:
+                servidos_car += 1
+
+            area_poligono_ha = (
+                area_car if area_car is not None else _polygon_area_ha(single_gdf, ref_crs)
+            )
             base_record = base_dict.copy()
             base_record["área_imovel_ha"] = round(area_poligono_ha, 4)
 
-            # Calcular centroide se solicitado
-            if include_centroid or include_wkt:
+            # Calcular centroide / geometria de saída se solicitado
+            # (formatos tipados gravam a geometria em WKB, não em WKT textual)
+            include_wkt_text = include_wkt and not writer.typed
+            geom_saida = None
+            if include_centroid or include_wkt_text or writer.with_geometry:
                 try:
-                    single_wgs84 = single_gdf.to_crs("EPSG:4326")
+                    geom_wgs84 = single_gdf.to_crs("EPSG:4326").union_all()
+                    geom_saida = geom_wgs84
                     if include_centroid:
-                        centroid = single_wgs84.union_all().centroid
+                        centroid = geom_wgs84.centroid
                         base_record["Centroide_Lat"] = round(centroid.y, 6)
                         base_record["Centroide_Lon"] = round(centroid.x, 6)
-                    if include_wkt:
-                        base_record["Geometria_WKT"] = single_wgs84.union_all().wkt
+                    if include_wkt_text:
+                        base_record["Geometria_WKT"] = geom_wgs84.wkt
                 except Exception as e:
                     logger.warning(
                         f"Erro ao calcular centroide/WKT do polígono {idx}: {e}"
@@ -2715,403 +2963,716 @@ def analisar_lote_completo():
                     if include_centroid:
                         base_record["Centroide_Lat"] = ""
                         base_record["Centroide_Lon"] = ""
-                    if include_wkt:
+                    if include_wkt_text:
                         base_record["Geometria_WKT"] = ""
 
-            has_results = False
+            if pendentes:
+                calculado, tem_calculado = _analisar_poligono_lote(
+                    single_gdf, area_poligono_ha, pendentes, fontes, rotulo=_i + 1
+                )
+                resultado.update(calculado)
+                tem_resultado |= tem_calculado
+
+            registros = [
+                {**base_record, **parcial}
+                for analise in _ANALISES_LOTE
+                for parcial in resultado.get(analise, [])
+            ]
+            has_results = bool(tem_resultado)
 
-            # --- USO DO SOLO ---
-            if "uso_solo" in analises and src_uso:
-                try:
-                    cog_uso = _optimize_cog_reading(src_uso, single_gdf.total_bounds)
-                    area_tot_uso, areas_uso, _, _ = _fractional_stats(
-                        src_uso, single_gdf, cog_uso
-                    )
-                    # Ajuste do total
-                    dif_ha = area_poligono_ha - area_tot_uso
-                    if dif_ha > 1e-4:
-                        areas_uso[0] = areas_uso.get(0, 0.0) + dif_ha
-                    elif dif_ha < -1e-4:
-                        fator = area_poligono_ha / (
-                            area_tot_uso if area_tot_uso > 0 else 1.0
-                        )
-                        for k in list(areas_uso.keys()):
-                            areas_uso[k] *= fator
+            if not has_results:
+                record = base_record.copy()
+                record["Tipo Análise"] = "Sem Análise"
+                record["DN"] = ""
+                record["Descrição"] = "-"
+                record["área_classe_ha"] = 0.0
+                registros.append(record)
+
+            for record in registros:
+                writer.write(record, geom_saida)
+            progresso.poligono(
+                _i + 1,
+                str(base_dict.get("cod_imovel") or idx),
+                resultado,
+                linhas=len(registros),
+                area_ha=base_record["área_imovel_ha"],
+            )
 
-                    for cls_id, area_ha in areas_uso.items():
-                        if area_ha > 0:
-                            record = base_record.copy()
-                            record["Tipo Análise"] = "Uso do Solo"
-                            record["DN"] = int(cls_id)
-                            record["Descrição"] = CLASSES_NOMES.get(
-                                int(cls_id), f"Classe {int(cls_id)}"
-                            )
-                            record["área_classe_ha"] = round(area_ha, 4)
-                            resultados.append(record)
-                            has_results = True
-                    logger.info(f"  - Uso do Solo concluído para polígono {_i + 1}.")
-                except Exception as e:
-                    logger.warning(f"Erro em uso do solo {idx}: {e}")
+        for record in registros_extras or []:
+            writer.write(record, None)
 
-            # --- DECLIVIDADE ---
-            if "declividade" in analises and src_dec:
-                try:
-                    crs_dec = src_dec.crs if src_dec.crs else CRS.from_epsg(4674)
-                    gdf_dec, _ = _convert_gdf_to_raster_crs(single_gdf, crs_dec)
-                    cog_dec = _optimize_cog_reading(src_dec, gdf_dec.total_bounds)
-                    area_tot_dec, areas_dec, _, _ = _fractional_stats(
-                        src_dec, gdf_dec, cog_dec
-                    )
+        # Fechar rasters
+        _fechar_fontes_lote(fontes)
+        if servidos_car:
+            logger.info(f"[Lote] {servidos_car} imóvel(is) atendido(s) pelo pré-cálculo do CAR")
+
+        if writer.total_rows == 0:
+            writer.abort()
+            progresso.concluir("erro", "Nenhum resultado processado")
+            return jsonify(
+                {"status": "erro", "mensagem": "Nenhum resultado processado"}
+            ), 400
+
+        out_file, mimetype, download_name = writer.close()
+        progresso.concluir()
+
+        return send_file(
+            out_file,
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=download_name,
+        )
+
+    except ValueError as ve:
+        logger.warning(f"Erro de validação na análise de lote completo: {ve}")
+        if writer is not None:
+            writer.abort()
+        if progresso is not None:
+            progresso.concluir("erro", str(ve))
+        return jsonify({"status": "erro", "mensagem": str(ve)}), 400
+
+    except Exception as e:
+        logger.exception("Erro na análise de lote completo")
+        if writer is not None:
+            writer.abort()
+        if progresso is not None:
+            progresso.concluir("erro", f"Erro fatal ao processar lote: {str(e)}")
+        return jsonify(
+            {"status": "erro", "mensagem": f"Erro fatal ao processar lote: {str(e)}"}
+        ), 500
+
+
+# ==============================================================================
+# Rota: Análise de Lote por códigos CAR (sem upload de geometrias)
+# ==============================================================================
+_CAR_CODIGOS_SEP = re.compile(r"[\s,;]+")
+
+# Limite de códigos por requisição
+_CAR_LOTE_MAX_CODIGOS = 20000
+
+
+def _ler_codigos_car():
+    """Extrai a lista de cod_imovel da requisição.
+
+    Aceita JSON (`{"codigos": [...]}`), campo de formulário `codigos`
+    (separados por quebra de linha, vírgula ou ponto e vírgula) ou um CSV
+    enviado em `file` (coluna `cod_imovel`, ou a primeira coluna).
+    """
+    import pandas as pd
+    if request.is_json:
+        dados = request.get_json(silent=True) or {}
+        codigos = dados.get("codigos", [])
+        if isinstance(codigos, str):
+            codigos = _CAR_CODIGOS_SEP.split(codigos)
+        return [str(c).strip() for c in codigos if str(c).strip()], dados
+
+    if "file" in request.files and request.files["file"].filename:
+        conteudo = request.files["file"].read().decode("utf-8-sig", errors="replace")
+        df = pd.read_csv(io.StringIO(conteudo), sep=None, engine="python", dtype=str)
+        colunas = {str(c).strip().lower(): c for c in df.columns}
+        if "cod_imovel" in colunas:
+            serie = df[colunas["cod_imovel"]]
+        elif len(df.columns) == 1 and car_index.normalizar_codigo(df.columns[0]):
+            # CSV sem cabeçalho: o "cabeçalho" já é o primeiro código
+            serie = pd.concat([pd.Series([df.columns[0]]), df.iloc[:, 0]])
+        else:
+            serie = df.iloc[:, 0]
+        return [c.strip() for c in serie.dropna().astype(str) if c.strip()], request.form
+
+    codigos = _CAR_CODIGOS_SEP.split(request.form.get("codigos", ""))
+    return [c for c in codigos if c], request.form
+
+
+@app.route("/analisar-lote-car", methods=["POST"])
+def analisar_lote_car():
+    """Análise de lote completo a partir de uma lista de códigos CAR.
+
+    As geometrias são lidas em lote diretamente do GPKG do CAR (índice por
+    código + leitura por fid) e seguem o mesmo fluxo de
+    /analisar-lote-completo, com as mesmas opções e formatos de saída.
+    """
+    logger.info("=== INICIANDO ANÁLISE DE LOTE POR CÓDIGOS CAR ===")
+
+    if not os.path.exists(str(CAR_GPKG_PATH)):
+        return jsonify({"status": "erro", "mensagem": "Base de dados CAR não disponível"}), 500
+
+    try:
+        codigos, form = _ler_codigos_car()
+    except Exception as e:
+        logger.warning(f"Erro ao ler lista de códigos CAR: {e}")
+        return jsonify({"status": "erro", "mensagem": f"Lista de códigos inválida: {str(e)}"}), 400
+
+    codigos = list(dict.fromkeys(codigos))
+    if not codigos:
+        return jsonify({"status": "erro", "mensagem": "Nenhum código CAR informado"}), 400
+    if len(codigos) > _CAR_LOTE_MAX_CODIGOS:
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"Máximo de {_CAR_LOTE_MAX_CODIGOS} códigos por requisição",
+        }), 400
+
+    params, erro = _parametros_lote(form)
+    if erro is not None:
+        return erro
+
+    try:
+        import geopandas as gpd
+
+        encontrados = car_index.fids_por_codigos(codigos)
+        fids = [fid for fid, _ in encontrados.values()]
+        atributos, geoms = car_index.carregar_feicoes(fids)
+
+        gdf = gpd.GeoDataFrame(atributos, geometry=geoms, crs="EPSG:4326")
+        if "cod_imovel" in gdf.columns:
+            gdf = gdf[["cod_imovel"] + [c for c in gdf.columns if c != "cod_imovel"]]
+        gdf = gdf[~(gdf.geometry.isna() | gdf.geometry.is_empty)].reset_index(drop=True)
+    except Exception as e:
+        logger.exception("Erro ao carregar geometrias do CAR")
+        return jsonify({"status": "erro", "mensagem": f"Erro ao carregar CAR: {str(e)}"}), 500
+
+    resolvidos = set(gdf["cod_imovel"].map(car_index.normalizar_codigo)) if len(gdf) else set()
+    faltantes = [c for c in codigos if car_index.normalizar_codigo(c) not in resolvidos]
+    logger.info(
+        f"[CAR Lote] {len(codigos)} códigos: {len(gdf)} encontrados, {len(faltantes)} ausentes"
+    )
+    if gdf.empty:
+        return jsonify({"status": "erro", "mensagem": "Nenhum código CAR encontrado na base"}), 404
+
+    extras = [
+        {
+            "cod_imovel": cod,
+            "Tipo Análise": "CAR não encontrado",
+            "DN": "",
+            "Descrição": "-",
+            "área_classe_ha": 0.0,
+        }
+        for cod in faltantes
+    ]
+    resposta = _executar_lote_completo(gdf, registros_extras=extras, **params)
+    if not isinstance(resposta, tuple):
+        resposta.headers["X-CAR-Nao-Encontrados"] = str(len(faltantes))
+    return resposta
+
+
+# ==============================================================================
+# Rota: Triagem EUDR em lote (carteiras de fornecedores)
+# ==============================================================================
+# Colunas da linha de veredito, na ordem de saída
+_TRIAGEM_EUDR_COLUNAS = (
+    "id",
+    "area_ha",
+    "conforme",
+    "risco",
+    "area_pos_2020_ha",
+    "embargo_ibama",
+    "embargo_icmbio",
+    "embargos",
+    "metodo",
+    "erro",
+)
+
+# Colunas do arquivo usadas como identificador do plot (a primeira presente)
+_TRIAGEM_EUDR_COLUNAS_ID = ("id", "plot_id", "cod_imovel", "codigo", "nome", "name")
+
+# Plots por tarefa das threads de triagem (e por bloco enviado na resposta)
+_TRIAGEM_EUDR_BLOCO = 500
+
+
+def _ids_linhas(gdf, coluna_id=None):
+    """Identificador de cada plot: coluna pedida, uma das usuais ou a linha (1…N)."""
+    colunas = {str(c).strip().lower(): c for c in gdf.columns if c != gdf.geometry.name}
+    coluna = colunas.get(str(coluna_id).strip().lower()) if coluna_id else None
+    if coluna is None:
+        coluna = next((colunas[n] for n in _TRIAGEM_EUDR_COLUNAS_ID if n in colunas), None)
+    if coluna is None:
+        return [str(i) for i in range(1, len(gdf) + 1)]
+    return ["" if v is None or v != v else str(v) for v in gdf[coluna]]
+
+
+def _embargos_por_plot(geoms, camada, coluna):
+    """[ids] dos embargos da `camada` (mapeada) que tocam cada geometria.
+
+    Uma única consulta à R-tree da camada para todos os plots.
+    """
+    import numpy as np
+
+    hits = [[] for _ in range(len(geoms))]
+    if camada is None or camada.empty:
+        return hits
+    if camada.crs is not None and geoms.crs != camada.crs:
+        geoms = geoms.to_crs(camada.crs)
+    validas = np.flatnonzero((geoms.notna() & ~geoms.is_empty).to_numpy())
+    plots, embargos = camada.consultar(geoms.iloc[validas].to_numpy(), "intersects")
+    valores = camada.valores(coluna, embargos) if coluna in camada.columns else embargos + 1
+    for plot, embargo, valor in zip(validas[plots], embargos, valores):
+        texto = "" if valor is None or valor != valor else str(valor).strip()
+        hits[plot].append(texto or f"#{embargo + 1}")
+    return hits
+
+
+def _triagem_eudr_bloco(raster_path, itens):
+    """[(posição, triagem)] dos plots [(posição, geometria no CRS do raster)].
+
+    Cada tarefa abre o próprio dataset (rasterio não é thread-safe).
+    """
+    import rasterio
+
+    resultado = []
+    with rasterio.open(raster_path) as src:
+        for posicao, geom in itens:
+            try:
+                resultado.append((posicao, _triagem_eudr(src, geom)))
+            except Exception as e:
+                logger.warning(f"[Triagem EUDR] Falha no plot {posicao + 1}: {e}")
+                resultado.append((posicao, {"erro": f"Falha na triagem: {str(e)}"}))
+    return resultado
+
+
+def _preparar_triagem_eudr(gdf, raster_path):
+    """Etapas vetorizadas da triagem (todas as linhas de uma vez).
+
+    Reprojeção, área, cobertura do PRODES, sobreposição com embargos e
+    descarte dos plots cujo envelope não toca célula com desmatamento
+    recente na pirâmide. Só o que sobra passa pela triagem por plot.
+    """
+    import numpy as np
+    import rasterio
+    from rasterio.crs import CRS
+    from shapely.geometry import box
+
+    with rasterio.open(raster_path) as src:
+        raster_crs = src.crs if src.crs else CRS.from_epsg(4674)
+        cobertura = box(*src.bounds)
+
+    geoms = gdf.geometry.to_crs(raster_crs)
+    validas = (geoms.notna() & ~geoms.is_empty).to_numpy()
+    dentro = validas & geoms.intersects(cobertura).to_numpy()
+
+    with tracing.span("embargos"):
+        ibama = _embargos_por_plot(
+            geoms,
+            _get_embargo_camada() if os.path.exists(str(EMBARGO_SHAPEFILE_PATH)) else None,
+            "num_tad",
+        )
+        icmbio = _embargos_por_plot(
+            geoms,
+            _get_icmbio_camada() if os.path.exists(str(ICMBIO_SHAPEFILE_PATH)) else None,
+            "numero_emb",
+        )
+
+    limpos = np.zeros(len(geoms), dtype=bool)
+    piramide = prodes_piramide.carregar(raster_path)
+    if piramide is not None:
+        limites = np.nan_to_num(geoms.bounds.to_numpy())
+        limpos = dentro & piramide.sem_risco(limites)
+
+    return {
+        "geoms": geoms,
+        "areas_ha": _areas_utm_ha(geoms) if raster_crs.is_geographic else geoms.area.to_numpy() / 10000.0,
+        "validas": validas,
+        "dentro": dentro,
+        "limpos": limpos,
+        "ibama": ibama,
+        "icmbio": icmbio,
+    }
+
+
+def _linha_triagem_eudr(identificador, posicao, contexto, triagem):
+    """Linha de veredito de um plot (`triagem` None = descartado pela pirâmide)."""
+    linha = {
+        "id": identificador,
+        "area_ha": round(float(contexto["areas_ha"][posicao]), 4),
+        "conforme": None,
+        "risco": "",
+        "area_pos_2020_ha": None,
+        "embargo_ibama": bool(contexto["ibama"][posicao]),
+        "embargo_icmbio": bool(contexto["icmbio"][posicao]),
+        "embargos": ",".join(contexto["ibama"][posicao] + contexto["icmbio"][posicao]),
+        "metodo": "",
+        "erro": "",
+    }
+    if not contexto["validas"][posicao]:
+        linha["erro"] = "Geometria inválida ou coordenadas ausentes"
+    elif not contexto["dentro"][posicao]:
+        linha["erro"] = "Fora da cobertura do PRODES"
+    elif triagem is None:
+        linha.update(conforme=True, area_pos_2020_ha=0.0, metodo="piramide")
+    elif "erro" in triagem:
+        linha["erro"] = triagem["erro"]
+    else:
+        linha.update(
+            conforme=triagem["conforme"],
+            risco=triagem["risco"] or "",
+            area_pos_2020_ha=round(sum(triagem["areas_risco_ha"].values()), 4),
+            metodo=triagem["metodo"],
+        )
+    return linha
+
+
+def _linhas_triagem_eudr(ids, contexto, raster_path, executor):
+    """Linhas de veredito na ordem do arquivo, um bloco de cada vez.
+
+    Os blocos são triados em paralelo; cada um é enviado assim que ele e
+    os anteriores terminam.
+    """
+    geoms = contexto["geoms"]
+    pendentes = contexto["dentro"] & ~contexto["limpos"]
+    blocos = [
+        range(inicio, min(inicio + _TRIAGEM_EUDR_BLOCO, len(ids)))
+        for inicio in range(0, len(ids), _TRIAGEM_EUDR_BLOCO)
+    ]
+
+    def tarefa(bloco):
+        itens = [(posicao, geoms.iloc[posicao]) for posicao in bloco if pendentes[posicao]]
+        return dict(_triagem_eudr_bloco(raster_path, itens)) if itens else {}
+
+    for bloco, triagens in zip(blocos, executor.map(tarefa, blocos)):
+        yield [
+            _linha_triagem_eudr(ids[posicao], posicao, contexto, triagens.get(posicao))
+            for posicao in bloco
+        ]
+
+
+def _csv_triagem_eudr(linhas, cabecalho=False):
+    """Bloco CSV no formato legado do lote (`;`, vírgula decimal)."""
+    import csv
+
+    def valor(v):
+        if v is None:
+            return ""
+        if isinstance(v, float):
+            return str(v).replace(".", ",")
+        return v
+
+    saida = io.StringIO()
+    escritor = csv.writer(saida, delimiter=";", lineterminator="\n")
+    if cabecalho:
+        escritor.writerow(_TRIAGEM_EUDR_COLUNAS)
+    for linha in linhas:
+        escritor.writerow([valor(linha[c]) for c in _TRIAGEM_EUDR_COLUNAS])
+    return saida.getvalue()
+
+
+@app.route("/triagem-eudr", methods=["POST"])
+def triagem_eudr():
+    """Triagem EUDR de carteiras de plots: uma linha de veredito por plot.
+
+    Bem mais leve que /analisar-lote-completo com PRODES: só classifica o
+    desmatamento a partir de 2020 (pirâmide + leitura seletiva do PRODES)
+    e cruza com os embargos IBAMA/ICMBio. A resposta é enviada em blocos,
+    na ordem do arquivo, enquanto os seguintes são processados.
+
+    Campos do formulário:
+      file       polígonos (GeoJSON, KML, KMZ, SHP, GPKG) ou CSV de pontos
+                 com colunas lat/lon e, opcionalmente, raio_m
+      raio_m     raio (m) dos pontos sem raio próprio (padrão 0: o pixel
+                 do ponto)
+      coluna_id  coluna do identificador (padrão: id, plot_id, cod_imovel...)
+      formato    "csv" (padrão; `;` e vírgula decimal) ou "ndjson"
+    """
+    import numpy as np
+
+    inicio = time.perf_counter()
+    logger.info("=== INICIANDO TRIAGEM EUDR EM LOTE ===")
+
+    if "file" not in request.files:
+        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
+
+    input_file = request.files["file"]
+    if input_file.filename == "":
+        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo selecionado"}), 400
+
+    eh_csv = input_file.filename.lower().endswith((".csv", ".txt"))
+    if not eh_csv and not _allowed_file(input_file.filename):
+        return jsonify({
+            "status": "erro",
+            "mensagem": "Extensão inválida. Envie .csv (lat/lon), .kml, .kmz, .geojson, .shp ou .gpkg",
+        }), 400
+
+    formato = request.form.get("formato", "csv").strip().lower()
+    if formato not in ("csv", "ndjson"):
+        return jsonify({"status": "erro", "mensagem": "Formato inválido. Use 'csv' ou 'ndjson'"}), 400
+
+    try:
+        raio_m = float(str(request.form.get("raio_m", "0") or "0").replace(",", "."))
+    except ValueError:
+        return jsonify({"status": "erro", "mensagem": "raio_m inválido"}), 400
+
+    if not os.path.exists(RASTER_PRODES_PATH):
+        logger.error(f"Raster PRODES não encontrado: {RASTER_PRODES_PATH}")
+        return jsonify({"status": "erro", "mensagem": "Raster PRODES não disponível no servidor"}), 500
+
+    try:
+        with tracing.span("parse"):
+            gdf = parse_pontos_csv(input_file, raio_m) if eh_csv else parse_upload_file(input_file)
+        if isinstance(gdf, tuple):
+            gdf, _ = gdf
+        if gdf is None or gdf.empty:
+            return jsonify({"status": "erro", "mensagem": "Arquivo não contém geometrias válidas"}), 400
+    except ValueError as ve:
+        logger.warning(f"[Triagem EUDR] Arquivo inválido: {ve}")
+        return jsonify({"status": "erro", "mensagem": str(ve)}), 400
+    except Exception as e:
+        logger.exception("[Triagem EUDR] Erro ao ler o arquivo")
+        return jsonify({"status": "erro", "mensagem": f"Erro ao ler o arquivo: {str(e)}"}), 400
 
-                    # Filtra classes validas declividade (1-8)
-                    areas_validas = {
-                        k: v
-                        for k, v in areas_dec.items()
-                        if k in {1, 2, 3, 4, 5, 6, 7, 8}
-                    }
-                    area_tot_valida = sum(areas_validas.values())
+    if len(gdf) > EUDR_TRIAGEM_MAX_PLOTS:
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"Máximo de {EUDR_TRIAGEM_MAX_PLOTS} plots por requisição",
+        }), 400
 
-                    dif_ha = area_poligono_ha - area_tot_valida
-                    if dif_ha > 1e-4:
-                        areas_validas[0] = areas_validas.get(0, 0.0) + dif_ha
-                    elif dif_ha < -1e-4:
-                        fator = area_poligono_ha / (
-                            area_tot_valida if area_tot_valida > 0 else 1.0
-                        )
-                        for k in list(areas_validas.keys()):
-                            areas_validas[k] *= fator
-
-                    for cls_id, area_ha in areas_validas.items():
-                        if area_ha > 0 and cls_id != 0:
-                            record = base_record.copy()
-                            record["Tipo Análise"] = "Declividade"
-                            record["DN"] = int(cls_id)
-                            record["Descrição"] = DECLIVIDADE_CLASSES_NOMES.get(
-                                int(cls_id), f"Classe {int(cls_id)}"
-                            )
-                            record["área_classe_ha"] = round(area_ha, 4)
-                            resultados.append(record)
-                            has_results = True
-                    logger.info(f"  - Declividade concluída para polígono {_i + 1}.")
-                except Exception as e:
-                    logger.warning(f"Erro em declividade {idx}: {e}")
+    raios = (
+        gdf["raio_m"].to_numpy(dtype=float)
+        if "raio_m" in gdf.columns
+        else np.full(len(gdf), raio_m)
+    )
+    if np.nanmax(np.append(raios, 0.0)) > EUDR_TRIAGEM_RAIO_MAX_M or np.nanmin(np.append(raios, 0.0)) < 0:
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"raio_m deve estar entre 0 e {EUDR_TRIAGEM_RAIO_MAX_M:g} m",
+        }), 400
 
-            # --- APTIDAO ---
-            if "aptidao" in analises and src_apt:
-                try:
-                    crs_apt = src_apt.crs if src_apt.crs else CRS.from_epsg(4674)
-                    gdf_apt, _ = _convert_gdf_to_raster_crs(single_gdf, crs_apt)
-                    cog_apt = _optimize_cog_reading(src_apt, gdf_apt.total_bounds)
-                    area_tot_apt, areas_apt, _, _ = _fractional_stats(
-                        src_apt, gdf_apt, cog_apt
-                    )
+    try:
+        if gdf.crs is None:
+            gdf = gdf.set_crs("EPSG:4326")
+        pontos = (gdf.geometry.geom_type == "Point").to_numpy()
+        if (pontos & (np.nan_to_num(raios) > 0)).any():
+            with tracing.span("buffer"):
+                geograficas = gdf.geometry.to_crs("EPSG:4326")
+                gdf = gdf.set_geometry(
+                    _buffer_metros(geograficas, np.where(pontos, raios, 0.0)).to_crs(gdf.crs)
+                )
+        ids = _ids_linhas(gdf, request.form.get("coluna_id"))
+        contexto = _preparar_triagem_eudr(gdf, RASTER_PRODES_PATH)
+    except Exception as e:
+        logger.exception("[Triagem EUDR] Erro ao preparar a triagem")
+        return jsonify({"status": "erro", "mensagem": f"Erro na triagem EUDR: {str(e)}"}), 500
 
-                    # Filtra turmas validas aptidao (1-5)
-                    areas_validas = {
-                        k: v for k, v in areas_apt.items() if k in {1, 2, 3, 4, 5}
-                    }
-                    area_tot_valida = sum(areas_validas.values())
+    total = len(ids)
+    logger.info(
+        f"[Triagem EUDR] {total} plots: {int(contexto['limpos'].sum())} resolvidos pela pirâmide, "
+        f"{int((contexto['dentro'] & ~contexto['limpos']).sum())} com leitura do PRODES, "
+        f"{int((~contexto['dentro']).sum())} inválidos ou fora da cobertura"
+    )
 
-                    dif_ha = area_poligono_ha - area_tot_valida
-                    if dif_ha > 1e-4:
-                        areas_validas[0] = areas_validas.get(0, 0.0) + dif_ha
-                    elif dif_ha < -1e-4:
-                        fator = area_poligono_ha / (
-                            area_tot_valida if area_tot_valida > 0 else 1.0
-                        )
-                        for k in list(areas_validas.keys()):
-                            areas_validas[k] *= fator
-
-                    for cls_id, area_ha in areas_validas.items():
-                        if area_ha > 0 and cls_id != 0:
-                            record = base_record.copy()
-                            record["Tipo Análise"] = "Aptidão"
-                            record["DN"] = int(cls_id)
-                            record["Descrição"] = APTIDAO_CLASSES_NOMES.get(
-                                int(cls_id), f"Classe {int(cls_id)}"
-                            )
-                            record["área_classe_ha"] = round(area_ha, 4)
-                            resultados.append(record)
-                            has_results = True
-                    logger.info(f"  - Aptidão concluída para polígono {_i + 1}.")
-                except Exception as e:
-                    logger.warning(f"Erro em aptidao {idx}: {e}")
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, EUDR_TRIAGEM_THREADS), thread_name_prefix="triagem-eudr"
+    )
 
-            # --- SOLO TEXTURAL ---
-            if "soloTextural" in analises and src_stx:
-                try:
-                    crs_stx = src_stx.crs if src_stx.crs else CRS.from_epsg(4674)
-                    gdf_stx, _ = _convert_gdf_to_raster_crs(single_gdf, crs_stx)
-                    cog_stx = _optimize_cog_reading(src_stx, gdf_stx.total_bounds)
-                    area_tot_stx, areas_stx, _, _ = _fractional_stats(
-                        src_stx, gdf_stx, cog_stx
-                    )
+    def gerar():
+        try:
+            primeiro = True
+            for linhas in _linhas_triagem_eudr(ids, contexto, RASTER_PRODES_PATH, executor):
+                if formato == "ndjson":
+                    yield "".join(app.json.dumps(linha) + "\n" for linha in linhas)
+                else:
+                    yield ("\ufeff" if primeiro else "") + _csv_triagem_eudr(linhas, cabecalho=primeiro)
+                primeiro = False
+            decorrido = time.perf_counter() - inicio
+            logger.info(
+                f"[Triagem EUDR] Concluída: {total} plots em {decorrido:.1f}s "
+                f"({total / decorrido if decorrido > 0 else 0:.0f} plots/s)"
+            )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
-                    areas_validas = {
-                        k: v for k, v in areas_stx.items() if k in set(range(1, 14))
-                    }
-                    area_tot_valida = sum(areas_validas.values())
+    response = app.response_class(
+        response=stream_with_context(gerar()),
+        status=200,
+        mimetype="application/x-ndjson" if formato == "ndjson" else "text/csv",
+    )
+    if formato == "csv":
+        response.headers["Content-Disposition"] = "attachment; filename=triagem_eudr.csv"
+    response.headers["X-Triagem-Plots"] = str(total)
+    # Proxies (nginx) não devem acumular os blocos até o fim
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
-                    dif_ha = area_poligono_ha - area_tot_valida
-                    if dif_ha > 1e-4:
-                        areas_validas[0] = areas_validas.get(0, 0.0) + dif_ha
-                    elif dif_ha < -1e-4:
-                        fator = area_poligono_ha / (
-                            area_tot_valida if area_tot_valida > 0 else 1.0
-                        )
-                        for k in list(areas_validas.keys()):
-                            areas_validas[k] *= fator
-
-                    for cls_id, area_ha in areas_validas.items():
-                        if area_ha > 0 and cls_id != 0:
-                            record = base_record.copy()
-                            record["Tipo Análise"] = "Solo Textural"
-                            record["DN"] = int(cls_id)
-                            record["Descrição"] = SOLO_TEXTURAL_CLASSES_NOMES.get(
-                                int(cls_id), f"Classe {int(cls_id)}"
-                            )
-                            record["área_classe_ha"] = round(area_ha, 4)
-                            resultados.append(record)
-                            has_results = True
-                    logger.info(f"  - Solo Textural concluído para polígono {_i + 1}.")
-                except Exception as e:
-                    logger.warning(f"Erro em solo textural {idx}: {e}")
 
-            # --- KÖPPEN-GEIGER ---
-            if "koppen" in analises and src_kop:
-                try:
-                    crs_kop = src_kop.crs if src_kop.crs else CRS.from_epsg(4674)
-                    gdf_kop, _ = _convert_gdf_to_raster_crs(single_gdf, crs_kop)
-                    cog_kop = _optimize_cog_reading(src_kop, gdf_kop.total_bounds)
-                    area_tot_kop, areas_kop, _, _ = _fractional_stats(
-                        src_kop, gdf_kop, cog_kop
-                    )
+# ==============================================================================
+# Rota: Amostragem dos rasters por ponto
+# ==============================================================================
+# Linhas por bloco enviado na resposta
+_AMOSTRAGEM_BLOCO = 5000
+
+
+def _dns_amostrados(analise, valores):
+    """Máscara das amostras com classe válida para a análise (como nas áreas)."""
+    import numpy as np
+
+    validos = valores >= 0
+    if not analise["incluir_classe_zero"]:
+        validos &= valores != 0
+    if analise["classes_validas"] is not None:
+        validos &= np.isin(valores, sorted(analise["classes_validas"]))
+    return validos
+
+
+@app.route("/amostrar-pontos", methods=["POST"])
+def amostrar_pontos():
+    """Classe de cada ponto nas camadas raster, sem rasterizar polígonos.
+
+    Os pontos são lidos agrupados pelo bloco do raster (server/amostragem.py);
+    com raio, vale a classe predominante no círculo e sua fração.
+
+    Campos do formulário:
+      file         CSV de pontos (lat, lon e, opcionalmente, raio_m) ou
+                   GeoJSON/KML/... de pontos (outras geometrias usam um
+                   ponto interno)
+      camadas      lista JSON ou separada por vírgulas (padrão: todas as
+                   análises raster)
+      raio_m       raio (m) dos pontos sem raio próprio (padrão 0: pixel do ponto)
+      coluna_id    coluna do identificador (padrão: id, plot_id, cod_imovel...)
+      raster_type  como em /analisar
+      formato      "csv" (padrão; `;` e vírgula decimal) ou "ndjson"
+    """
+    import numpy as np
+    import pandas as pd
+    from server.amostragem import amostrar
 
-                    areas_validas = {
-                        k: v for k, v in areas_kop.items() if k in set(range(1, 13))
-                    }
-                    area_tot_valida = sum(areas_validas.values())
+    inicio = time.perf_counter()
+    logger.info("=== INICIANDO AMOSTRAGEM POR PONTO ===")
 
-                    dif_ha = area_poligono_ha - area_tot_valida
-                    if dif_ha > 1e-4:
-                        areas_validas[0] = areas_validas.get(0, 0.0) + dif_ha
-                    elif dif_ha < -1e-4:
-                        fator = area_poligono_ha / (
-                            area_tot_valida if area_tot_valida > 0 else 1.0
-                        )
-                        for k in list(areas_validas.keys()):
-                            areas_validas[k] *= fator
-
-                    for cls_id, area_ha in areas_validas.items():
-                        if area_ha > 0 and cls_id != 0:
-                            record = base_record.copy()
-                            record["Tipo Análise"] = "Köppen-Geiger"
-                            record["DN"] = int(cls_id)
-                            record["Descrição"] = KOPPEN_CLASSES_NOMES.get(
-                                int(cls_id), f"Classe {int(cls_id)}"
-                            )
-                            record["área_classe_ha"] = round(area_ha, 4)
-                            resultados.append(record)
-                            has_results = True
-                    logger.info(f"  - Köppen concluído para polígono {_i + 1}.")
-                except Exception as e:
-                    logger.warning(f"Erro em Köppen {idx}: {e}")
+    if "file" not in request.files:
+        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo enviado"}), 400
 
-            # --- ANÁLISE DE EMBARGO IBAMA ---
-            if "embargo" in analises and embargo_gdf_lote is not None:
-                try:
-                    import geopandas as gpd
-                    single_wgs84 = single_gdf.to_crs("EPSG:4674") if str(single_gdf.crs) != "EPSG:4674" else single_gdf
-                    geom_u = single_wgs84.union_all()
-                    bnds = geom_u.bounds
-                    emb_bbox = embargo_gdf_lote.cx[bnds[0]:bnds[2], bnds[1]:bnds[3]]
-                    emb_bbox = emb_bbox.to_crs("EPSG:4674") if emb_bbox.crs and str(emb_bbox.crs) != "EPSG:4674" else emb_bbox
-                    emb_inter = emb_bbox[emb_bbox.geometry.intersects(geom_u)]
-
-                    if emb_inter.empty:
-                        record = base_record.copy()
-                        record["Tipo Análise"] = "Embargo IBAMA"
-                        record["DN"] = 0
-                        record["Descrição"] = "Sem embargo"
-                        record["área_classe_ha"] = 0.0
-                        record["num_tad"] = ""
-                        record["dat_embarg"] = ""
-                        record["des_infrac"] = ""
-                        resultados.append(record)
-                    else:
-                        for emb_dn, (_, emb_row) in enumerate(emb_inter.iterrows(), start=1):
-                            inter_g = emb_row.geometry.intersection(geom_u)
-                            if inter_g.is_empty:
-                                continue
-                            inter_tmp = gpd.GeoDataFrame(geometry=[inter_g], crs="EPSG:4674")
-                            area_sob = _polygon_area_ha(inter_tmp, inter_tmp.crs)
-                            if area_sob <= 0:
-                                continue
-                            dat_r = emb_row.get("dat_embarg", None)
-                            dat_s = dat_r.strftime("%d/%m/%Y") if dat_r is not None and hasattr(dat_r, "strftime") else (str(dat_r)[:10] if dat_r else "")
-                            record = base_record.copy()
-                            record["Tipo Análise"] = "Embargo IBAMA"
-                            record["DN"] = emb_dn
-                            record["Descrição"] = str(emb_row.get("des_infrac", "") or "—")
-                            record["área_classe_ha"] = round(area_sob, 4)
-                            record["num_tad"] = str(emb_row.get("num_tad", "") or "")
-                            record["dat_embarg"] = dat_s
-                            record["des_infrac"] = str(emb_row.get("des_infrac", "") or "")
-                            resultados.append(record)
-                            has_results = True
-                    logger.info(f"  - Embargo concluído para polígono {_i + 1}.")
-                except Exception as e:
-                    logger.warning(f"Erro em embargo {idx}: {e}")
+    input_file = request.files["file"]
+    if input_file.filename == "":
+        return jsonify({"status": "erro", "mensagem": "Nenhum arquivo selecionado"}), 400
 
-            # --- ANÁLISE DE EMBARGO ICMBio ---
-            if "icmbio" in analises and icmbio_gdf_lote is not None:
-                try:
-                    import geopandas as gpd
-                    single_wgs84 = single_gdf.to_crs("EPSG:4674") if str(single_gdf.crs) != "EPSG:4674" else single_gdf
-                    geom_u = single_wgs84.union_all()
-                    bnds = geom_u.bounds
-                    icm_bbox = icmbio_gdf_lote.cx[bnds[0]:bnds[2], bnds[1]:bnds[3]]
-                    icm_bbox = icm_bbox.to_crs("EPSG:4674") if icm_bbox.crs and str(icm_bbox.crs) != "EPSG:4674" else icm_bbox
-                    icm_inter = icm_bbox[icm_bbox.geometry.intersects(geom_u)]
-
-                    if icm_inter.empty:
-                        record = base_record.copy()
-                        record["Tipo Análise"] = "Embargo ICMBio"
-                        record["DN"] = 0
-                        record["Descrição"] = "Sem embargo"
-                        record["área_classe_ha"] = 0.0
-                        record["numero_emb"] = ""
-                        record["data_embargo"] = ""
-                        record["desc_infra"] = ""
-                        record["tipo_infra"] = ""
-                        resultados.append(record)
-                    else:
-                        for icm_dn, (_, icm_row) in enumerate(icm_inter.iterrows(), start=1):
-                            inter_g = icm_row.geometry.intersection(geom_u)
-                            if inter_g.is_empty:
-                                continue
-                            inter_tmp = gpd.GeoDataFrame(geometry=[inter_g], crs="EPSG:4674")
-                            area_sob = _polygon_area_ha(inter_tmp, inter_tmp.crs)
-                            if area_sob <= 0:
-                                continue
-                            dat_r = icm_row.get("data", None)
-                            dat_s = dat_r.strftime("%d/%m/%Y") if dat_r is not None and hasattr(dat_r, "strftime") else (str(dat_r)[:10] if dat_r else "")
-                            record = base_record.copy()
-                            record["Tipo Análise"] = "Embargo ICMBio"
-                            record["DN"] = icm_dn
-                            record["Descrição"] = str(icm_row.get("desc_infra", "") or "—")
-                            record["área_classe_ha"] = round(area_sob, 4)
-                            record["numero_emb"] = str(icm_row.get("numero_emb", "") or "")
-                            record["data_embargo"] = dat_s
-                            record["desc_infra"] = str(icm_row.get("desc_infra", "") or "")
-                            record["tipo_infra"] = str(icm_row.get("tipo_infra", "") or "")
-                            resultados.append(record)
-                            has_results = True
-                    logger.info(f"  - ICMBio concluído para polígono {_i + 1}.")
-                except Exception as e:
-                    logger.warning(f"Erro em icmbio {idx}: {e}")
+    eh_csv = input_file.filename.lower().endswith((".csv", ".txt"))
+    if not eh_csv and not _allowed_file(input_file.filename):
+        return jsonify({
+            "status": "erro",
+            "mensagem": "Extensão inválida. Envie .csv (lat/lon), .kml, .kmz, .geojson, .shp ou .gpkg",
+        }), 400
 
-            # --- ANÁLISE PRODES / EUDR ---
-            if "prodes" in analises and src_prodes:
-                try:
-                    crs_prodes = src_prodes.crs if src_prodes.crs else CRS.from_epsg(4674)
-                    gdf_prodes, _ = _convert_gdf_to_raster_crs(single_gdf, crs_prodes)
-                    cog_prodes = _optimize_cog_reading(src_prodes, gdf_prodes.total_bounds)
-                    area_tot_prodes, areas_prodes, _, _ = _fractional_stats(
-                        src_prodes, gdf_prodes, cog_prodes, include_zero_class=True
-                    )
+    tipos, desconhecidos = _analises_solicitadas(request.form.get("camadas") or ",".join(ANALISES_RASTER))
+    desconhecidos += [tipo for tipo in tipos if tipo not in ANALISES_RASTER]
+    if desconhecidos:
+        return jsonify({
+            "status": "erro",
+            "mensagem": (
+                f"Camadas desconhecidas: {', '.join(desconhecidos)}. "
+                f"Disponíveis: {', '.join(ANALISES_RASTER)}"
+            ),
+        }), 400
+    tipos = [tipo for tipo in tipos if tipo in ANALISES_RASTER]
 
-                    eudr = _compute_eudr_classification(areas_prodes, area_poligono_ha)
+    formato = request.form.get("formato", "csv").strip().lower()
+    if formato not in ("csv", "ndjson"):
+        return jsonify({"status": "erro", "mensagem": "Formato inválido. Use 'csv' ou 'ndjson'"}), 400
 
-                    for cls_id, area_ha in areas_prodes.items():
-                        if area_ha > 0:
-                            record = base_record.copy()
-                            record["Tipo Análise"] = "PRODES/EUDR"
-                            record["DN"] = int(cls_id)
-                            record["Descrição"] = PRODES_CLASSES_NOMES.get(
-                                int(cls_id), f"Classe {int(cls_id)}"
-                            )
-                            record["área_classe_ha"] = round(area_ha, 4)
-                            record["EUDR_Conforme"] = eudr["eudr_compliant"]
-                            record["EUDR_Risco"] = eudr["overall_risk"]
-                            resultados.append(record)
-                            has_results = True
-                    logger.info(f"  - PRODES/EUDR concluído para polígono {_i + 1}.")
-                except Exception as e:
-                    logger.warning(f"Erro em PRODES {idx}: {e}")
+    try:
+        raio_m = float(str(request.form.get("raio_m", "0") or "0").replace(",", "."))
+    except ValueError:
+        return jsonify({"status": "erro", "mensagem": "raio_m inválido"}), 400
 
-            if "solos" in analises and os.path.exists(SOLOS_VECTOR_PATH):
-                try:
-                    solos_r = _analyze_solos_from_gdf(single_gdf)
-                    if solos_r and solos_r.get("status") == "sucesso":
-                        rel_solos = solos_r.get("relatorio", {})
-                        for cls in rel_solos.get("classes", []):
-                            if cls.get("area_ha", 0) > 0:
-                                record = base_record.copy()
-                                record["Tipo Análise"] = "Solos Embrapa"
-                                record["DN"] = cls.get("simbolo", "")
-                                record["Descrição"] = cls.get("leg_desc", "-")
-                                record["área_classe_ha"] = cls.get("area_ha", 0)
-                                record["Solo_Ordem"] = cls.get("ordem", "-")
-                                record["Solo_Subordem"] = cls.get("subordem", "-")
-                                record["Solo_Grande_Grupo"] = cls.get("grande_grupo", "-")
-                                record["Solo_Percentual"] = cls.get("percentual", 0)
-                                resultados.append(record)
-                                has_results = True
-                        logger.info(f"  - Solos concluído para polígono {_i + 1}.")
-                except Exception as e:
-                    logger.warning(f"Erro em Solos {idx}: {e}")
+    try:
+        with tracing.span("parse"):
+            gdf = parse_pontos_csv(input_file, raio_m) if eh_csv else parse_upload_file(input_file)
+        if isinstance(gdf, tuple):
+            gdf, _ = gdf
+        if gdf is None or gdf.empty:
+            return jsonify({"status": "erro", "mensagem": "Arquivo não contém geometrias válidas"}), 400
+    except ValueError as ve:
+        logger.warning(f"[Amostragem] Arquivo inválido: {ve}")
+        return jsonify({"status": "erro", "mensagem": str(ve)}), 400
+    except Exception as e:
+        logger.exception("[Amostragem] Erro ao ler o arquivo")
+        return jsonify({"status": "erro", "mensagem": f"Erro ao ler o arquivo: {str(e)}"}), 400
 
-            if not has_results:
-                record = base_record.copy()
-                record["Tipo Análise"] = "Sem Análise"
-                record["DN"] = ""
-                record["Descrição"] = "-"
-                record["área_classe_ha"] = 0.0
-                resultados.append(record)
+    if len(gdf) > AMOSTRAGEM_MAX_PONTOS:
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"Máximo de {AMOSTRAGEM_MAX_PONTOS} pontos por requisição",
+        }), 400
 
-        # Fechar rasters
-        if src_uso:
-            src_uso.close()
-        if src_dec:
-            src_dec.close()
-        if src_apt:
-            src_apt.close()
-        if src_stx:
-            src_stx.close()
-        if src_kop:
-            src_kop.close()
-        if src_prodes:
-            src_prodes.close()
-
-        if task_id and task_id in progress_tasks:
-            del progress_tasks[task_id]
+    raios = (
+        gdf["raio_m"].to_numpy(dtype=float)
+        if "raio_m" in gdf.columns
+        else np.full(len(gdf), raio_m)
+    )
+    raios = np.nan_to_num(raios)
+    if raios.max() > AMOSTRAGEM_RAIO_MAX_M or raios.min() < 0:
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"raio_m deve estar entre 0 e {AMOSTRAGEM_RAIO_MAX_M:g} m",
+        }), 400
 
-        if not resultados:
-            return jsonify(
-                {"status": "erro", "mensagem": "Nenhum resultado processado"}
-            ), 400
+    if gdf.crs is None:
+        gdf = gdf.set_crs("EPSG:4326")
+    geometrias = gdf.geometry.to_crs("EPSG:4326")
+    pontos = (geometrias.geom_type == "Point").to_numpy()
+    if not pontos.all():
+        geometrias = geometrias.where(pontos, geometrias.representative_point())
+    lon = np.where(geometrias.notna(), geometrias.x, np.nan)
+    lat = np.where(geometrias.notna(), geometrias.y, np.nan)
+
+    tabela = pd.DataFrame({
+        "id": _ids_linhas(gdf, request.form.get("coluna_id")),
+        "lat": np.round(lat, 6),
+        "lon": np.round(lon, 6),
+    })
+    com_raio = bool((raios > 0).any())
+    raster_type = request.form.get("raster_type", "com_mosaico")
 
-        df_resultados = pd.DataFrame(resultados).fillna(0)
+    for tipo in tipos:
+        analise = ANALISES_RASTER[tipo]
+        raster_path = _resolve_registry_raster(tipo, raster_type)
+        if not os.path.exists(raster_path):
+            logger.warning(f"[Amostragem] Raster {analise['rotulo']} não encontrado: {raster_path}")
+            continue
+        try:
+            with tracing.span(f"amostragem_{tipo}"):
+                valores, fracoes = amostrar(
+                    raster_path, lon, lat, raios, threads=AMOSTRAGEM_THREADS
+                )
+        except Exception as e:
+            logger.exception(f"[Amostragem] Falha em {analise['rotulo']}")
+            return jsonify({
+                "status": "erro",
+                "mensagem": f"Erro ao amostrar {analise['titulo']}: {str(e)}",
+            }), 500
 
-        csv_buffer = io.StringIO()
-        df_resultados.to_csv(csv_buffer, index=False, sep=";", decimal=",")
-        csv_buffer.seek(0)
+        validos = _dns_amostrados(analise, valores)
+        dns = pd.array(np.where(validos, valores, 0), dtype="Int64")
+        dns[~validos] = pd.NA
+        tabela[f"{tipo}_dn"] = dns
+        tabela[f"{tipo}_classe"] = [
+            analise["nomes"].get(int(dn), f"Classe {int(dn)}") if ok else None
+            for dn, ok in zip(valores, validos)
+        ]
+        if com_raio:
+            tabela[f"{tipo}_fracao"] = np.where(validos, np.round(fracoes, 4), np.nan)
+
+    total = len(tabela)
+    decorrido = time.perf_counter() - inicio
+    logger.info(
+        f"[Amostragem] {total} pontos x {len(tipos)} camadas em {decorrido:.2f}s"
+    )
 
-        return send_file(
-            io.BytesIO(csv_buffer.getvalue().encode("utf-8-sig")),
-            mimetype="text/csv",
-            as_attachment=True,
-            download_name="analise_lote_completa.csv",
-        )
+    def gerar():
+        for inicio_bloco in range(0, total, _AMOSTRAGEM_BLOCO):
+            bloco = tabela.iloc[inicio_bloco : inicio_bloco + _AMOSTRAGEM_BLOCO]
+            if formato == "ndjson":
+                yield bloco.to_json(orient="records", lines=True, force_ascii=False) + "\n"
+            else:
+                primeiro = inicio_bloco == 0
+                yield ("\ufeff" if primeiro else "") + bloco.to_csv(
+                    sep=";", decimal=",", index=False, header=primeiro, lineterminator="\n"
+                )
 
-    except Exception as e:
-        logger.exception("Erro em analisar_lote_completo")
-        if task_id and task_id in progress_tasks:
-            del progress_tasks[task_id]
-        return jsonify(
-            {"status": "erro", "mensagem": f"Erro fatal ao processar lote: {str(e)}"}
-        ), 500
+    response = app.response_class(
+        response=stream_with_context(gerar()),
+        status=200,
+        mimetype="application/x-ndjson" if formato == "ndjson" else "text/csv",
+    )
+    if formato == "csv":
+        response.headers["Content-Disposition"] = "attachment; filename=amostragem_pontos.csv"
+    response.headers["X-Amostragem-Pontos"] = str(total)
+    return response
 
 
 # ==============================================================================
@@ -3119,6 +3680,9 @@ def analisar_lote_completo():
 # ==============================================================================
 @app.route("/analisar-multiplos-csv", methods=["POST"])
 def analisar_multiplos_csv():
+    import pandas as pd
+    import rasterio
+    from rasterio.crs import CRS
     logger.info("=== INICIANDO ANÁLISE DE MÚLTIPLOS POLÍGONOS (CSV) ===")
 
     if "file" not in request.files:
@@ -3291,6 +3855,45 @@ def analisar_multiplos_csv():
         ), 500
 
 
+# ==============================================================================
+# CAR: serialização das feições
+# ==============================================================================
+def _car_resultados(atributos, geoms):
+    """Monta os itens de CAR (atributos, centroide e GeoJSON) em lote.
+
+    `geoms` já deve estar em WGS84; feições sem geometria são omitidas.
+    """
+    import shapely
+
+    validas = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+    centroides = shapely.centroid(geoms)
+    geojsons = shapely.to_geojson(geoms)
+
+    resultados = []
+    for i, attrs in enumerate(atributos):
+        if not validas[i]:
+            continue
+        attrs = {
+            k: (v if v is None or isinstance(v, (int, float, str, bool)) else str(v))
+            for k, v in attrs.items()
+        }
+        resultados.append({
+            "cod_imovel": str(attrs.get("cod_imovel") or ""),
+            "atributos": attrs,
+            "centroid": [shapely.get_y(centroides[i]), shapely.get_x(centroides[i])],
+            "geojson": {
+                "type": "FeatureCollection",
+                "features": [{
+                    "id": str(i),
+                    "type": "Feature",
+                    "properties": attrs,
+                    "geometry": json.loads(geojsons[i]),
+                }],
+            },
+        })
+    return resultados
+
+
 # ==============================================================================
 # Rota: Buscar CAR por cod_imovel
 # ==============================================================================
@@ -3307,54 +3910,14 @@ def buscar_car():
         return jsonify({"status": "erro", "mensagem": "Base de dados CAR não disponível"}), 500
 
     try:
-        import geopandas as gpd
-        import fiona
-
-        # Descobrir o nome da camada
-        layers = fiona.listlayers(car_path)
-        layer_name = layers[0] if layers else None
-
-        if not layer_name:
-            return jsonify({"status": "erro", "mensagem": "Nenhuma camada encontrada no GPKG"}), 500
-
-        # Busca via SQL para eficiência (evita carregar tudo em memória)
-        safe_query = query.replace("'", "''")
-        query_normalized = safe_query.replace('-', '')  # aceita input com ou sem hífens
-        sql = f"SELECT * FROM \"{layer_name}\" WHERE UPPER(REPLACE(cod_imovel, '-', '')) LIKE UPPER('%{query_normalized}%') LIMIT 10"
-
+        # Prefixo via B-tree e trecho via FTS5/trigram no índice auxiliar
         logger.info(f"[CAR] Buscando: {query}")
-        gdf = gpd.read_file(car_path, sql=sql)
-
-        if gdf.empty:
+        encontrados = car_index.buscar_codigos(query, limit=10)
+        if not encontrados:
             return jsonify({"status": "sucesso", "resultados": []}), 200
 
-        # Converter para WGS84 para exibir no mapa
-        if gdf.crs and gdf.crs.to_string() != "EPSG:4326":
-            gdf = gdf.to_crs("EPSG:4326")
-
-        resultados = []
-        for _, row in gdf.iterrows():
-            geom = row.geometry
-            if geom is None or geom.is_empty:
-                continue
-
-            centroid = geom.centroid
-            # Extrair campos relevantes
-            attrs = {}
-            for col in gdf.columns:
-                if col != 'geometry':
-                    val = row[col]
-                    if pd.isna(val):
-                        attrs[col] = None
-                    else:
-                        attrs[col] = str(val) if not isinstance(val, (int, float, str, bool)) else val
-
-            resultados.append({
-                "cod_imovel": str(row.get("cod_imovel", "")),
-                "atributos": attrs,
-                "centroid": [centroid.y, centroid.x],
-                "geojson": json.loads(gpd.GeoDataFrame([row], crs=gdf.crs).to_json())
-            })
+        atributos, geoms = car_index.carregar_feicoes([fid for fid, _ in encontrados])
+        resultados = _car_resultados(atributos, geoms)
 
         logger.info(f"[CAR] Encontrados {len(resultados)} resultados para '{query}'")
         return jsonify({"status": "sucesso", "resultados": resultados}), 200
@@ -3369,7 +3932,12 @@ def buscar_car():
 # ==============================================================================
 @app.route("/buscar-car-por-coordenada", methods=["GET"])
 def buscar_car_por_coordenada():
-    """Busca CARs que contêm um ponto geográfico específico."""
+    """Busca CARs que contêm um ponto geográfico específico.
+
+    Resposta leve (cod_imovel, centroide e bbox); a geometria completa é
+    obtida em /car-geometria ao selecionar o imóvel. Com `geometria=1` o
+    GeoJSON volta embutido em cada item, como antes.
+    """
     try:
         lat = float(request.args.get('lat', ''))
         lon = float(request.args.get('lon', ''))
@@ -3381,91 +3949,173 @@ def buscar_car_por_coordenada():
         logger.warning(f"Arquivo CAR GPKG não encontrado: {car_path}")
         return jsonify({"results": []}), 500
 
+    incluir_geometria = request.args.get("geometria", "0").lower() in ("1", "true", "sim")
+
     try:
-        import geopandas as gpd
-        import fiona
-        from shapely.geometry import Point
+        # Envelope na R-tree do GPKG + teste exato ponto-no-polígono
+        resultados = car_index.buscar_por_ponto(lon, lat)
 
-        # Descobrir o nome da camada
-        layers = fiona.listlayers(car_path)
-        layer_name = layers[0] if layers else None
+        if incluir_geometria and resultados:
+            atributos, geoms = car_index.carregar_feicoes([r["fid"] for r in resultados])
+            completos = {c["cod_imovel"]: c for c in _car_resultados(atributos, geoms)}
+            for r in resultados:
+                r["geojson"] = completos.get(r["cod_imovel"], {}).get("geojson")
 
-        if not layer_name:
-            return jsonify({"results": []}), 500
+        for r in resultados:
+            r.pop("fid", None)
 
-        # Usar mask para eficiência: gpd.read_file com mask usa o índice espacial do GPKG
-        point_geom = Point(lon, lat)  # lon, lat é a ordem do Shapely
-        gdf = gpd.read_file(car_path, mask=point_geom)
+        logger.info(f"[CAR] Encontrados {len(resultados)} imóvel(is) na coordenada ({lat}, {lon})")
+        return jsonify({"results": resultados}), 200
 
-        if gdf.empty:
-            return jsonify({"results": []}), 200
+    except Exception as e:
+        logger.exception(f"Erro ao buscar CAR por coordenada: {e}")
+        return jsonify({"results": []}), 500
 
-        # Converter para WGS84 se necessário
-        if gdf.crs and gdf.crs.to_string() != "EPSG:4326":
-            gdf = gdf.to_crs("EPSG:4326")
 
-        # Filtro exato: ponto deve estar dentro do polígono
-        gdf = gdf[gdf.geometry.contains(point_geom)]
+# ==============================================================================
+# Rota: Geometria de um CAR (carregamento sob demanda)
+# ==============================================================================
+@app.route("/car-geometria", methods=["GET"])
+def car_geometria():
+    """Retorna atributos e GeoJSON (WGS84) de um imóvel pelo cod_imovel exato."""
+    cod_imovel = request.args.get("cod_imovel", "").strip()
+    if not cod_imovel:
+        return jsonify({"status": "erro", "mensagem": "Informe o cod_imovel"}), 400
+
+    if not os.path.exists(str(CAR_GPKG_PATH)):
+        return jsonify({"status": "erro", "mensagem": "Base de dados CAR não disponível"}), 500
 
-        resultados = []
-        for _, row in gdf.iterrows():
-            geom = row.geometry
-            if geom is None or geom.is_empty:
-                continue
+    try:
+        encontrado = car_index.fids_por_codigos([cod_imovel])
+        if not encontrado:
+            return jsonify({"status": "erro", "mensagem": "CAR não encontrado"}), 404
 
-            centroid = geom.centroid
-            resultados.append({
-                "cod_imovel": str(row.get("cod_imovel", "")),
-                "centroid": [centroid.y, centroid.x],
-                "geojson": json.loads(gpd.GeoDataFrame([row], crs=gdf.crs).to_json())
-            })
+        fid, _cod = next(iter(encontrado.values()))
+        atributos, geoms = car_index.carregar_feicoes([fid])
+        resultados = _car_resultados(atributos, geoms)
+        if not resultados:
+            return jsonify({"status": "erro", "mensagem": "CAR sem geometria"}), 404
 
-        logger.info(f"[CAR] Encontrados {len(resultados)} imóvel(is) na coordenada ({lat}, {lon})")
-        return jsonify({"results": resultados}), 200
+        return jsonify({"status": "sucesso", **resultados[0]}), 200
 
     except Exception as e:
-        logger.exception(f"Erro ao buscar CAR por coordenada: {e}")
-        return jsonify({"results": []}), 500
+        logger.exception(f"Erro ao carregar geometria do CAR: {e}")
+        return jsonify({"status": "erro", "mensagem": f"Erro ao carregar CAR: {str(e)}"}), 500
 
 
 # ==============================================================================
-# Registro extensível de análises para exportação KML
-# Para adicionar uma nova análise, basta incluir uma entrada aqui:
-#   "chave_da_analise": {
-#       "raster": CAMINHO_DO_RASTER,
-#       "nomes":  DICT_CLASSES_NOMES,
-#       "cores":  DICT_CLASSES_CORES,
-#   }
+# Camadas disponíveis para exportação KML e tiles (derivado de ANALISES_RASTER)
 # ==============================================================================
 KML_EXPORT_REGISTRY = {
-    "uso_solo": {
-        "raster": TIFF_PATH,
-        "nomes": CLASSES_NOMES,
-        "cores": CLASSES_CORES,
-    },
-    "declividade": {
-        "raster": str(BASE_DIR / "data" / "ALOS_Declividade_Class_BR_majority_r2.tif"),
-        "nomes": DECLIVIDADE_CLASSES_NOMES,
-        "cores": DECLIVIDADE_CLASSES_CORES,
-    },
-    "aptidao": {
-        "raster": RASTER_APTIDAO_PATH,
-        "nomes": APTIDAO_CLASSES_NOMES,
-        "cores": APTIDAO_CLASSES_CORES,
-    },
-    "solo_textural": {
-        "raster": RASTER_SOLO_TEXTURAL_PATH,
-        "nomes": SOLO_TEXTURAL_CLASSES_NOMES,
-        "cores": SOLO_TEXTURAL_CLASSES_CORES,
-    },
-    "prodes": {
-        "raster": RASTER_PRODES_PATH,
-        "nomes": PRODES_CLASSES_NOMES,
-        "cores": PRODES_CLASSES_CORES,
-    },
+    tipo: {
+        "raster": analise["raster"],
+        "nomes": analise["nomes"],
+        "cores": analise["cores"],
+    }
+    for tipo, analise in ANALISES_RASTER.items()
 }
 
 
+# ==============================================================================
+# Rota: Imagem do recorte (cacheável)
+# ==============================================================================
+@app.route("/imagem-recorte/<layer>/<key>.png", methods=["GET"])
+def imagem_recorte(layer, key):
+    """Serve o PNG de um recorte já analisado.
+
+    A chave deriva do conteúdo (camada + raster + polígono), então a resposta
+    é imutável e pode ser guardada pelo navegador/proxy.
+    """
+    if not is_valid_key(layer, key):
+        return jsonify({"status": "erro", "mensagem": "Chave de imagem inválida"}), 400
+
+    cached = RECORTE_IMAGE_CACHE.get(layer, key)
+    if cached is None:
+        return jsonify({
+            "status": "erro",
+            "mensagem": "Imagem não encontrada no cache. Refaça a análise do polígono.",
+        }), 404
+
+    img_bytes, _meta = cached
+    response = send_file(
+        io.BytesIO(img_bytes),
+        mimetype="image/png",
+        etag=key,
+        max_age=IMAGE_CACHE_MAX_AGE,
+        conditional=True,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+# ==============================================================================
+# Rota: Tiles XYZ das camadas de classificação
+# ==============================================================================
+@app.route("/tiles/<layer>/<int:z>/<int:x>/<int:y>.png", methods=["GET"])
+def tiles(layer, z, x, y):
+    """Tile Web Mercator (256 px) de qualquer raster do KML_EXPORT_REGISTRY.
+
+    Query string opcional: raster_type=com_mosaico|sem_mosaico (uso_solo).
+    Os tiles ficam em cache LRU em memória e, se configurado, em disco.
+    """
+    config = KML_EXPORT_REGISTRY.get(layer)
+    if not config:
+        tipos_disponiveis = ", ".join(sorted(KML_EXPORT_REGISTRY.keys()))
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"Camada '{layer}' não registrada. Disponíveis: {tipos_disponiveis}",
+        }), 404
+
+    if not (TILE_MIN_ZOOM <= z <= TILE_MAX_ZOOM) or not is_valid_tile(z, x, y):
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"Tile fora da faixa atendida (zoom {TILE_MIN_ZOOM}–{TILE_MAX_ZOOM})",
+        }), 404
+
+    raster_path = _resolve_registry_raster(layer, request.args.get("raster_type"))
+    if not os.path.exists(raster_path):
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"Raster para '{layer}' não disponível no servidor",
+        }), 404
+
+    # Namespace do cache (e o dataset aberto) muda junto com o arquivo do raster
+    fingerprint = raster_fingerprint(raster_path)
+    versao = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12]
+    namespace = f"{layer}_{versao}/{z}"
+    key = f"{x}_{y}"
+
+    cached = TILE_CACHE.get(namespace, key)
+    if cached is not None:
+        png = cached[0]
+    else:
+        try:
+            png = render_tile(
+                raster_path,
+                z,
+                x,
+                y,
+                config["cores"],
+                include_zero_class=(layer == "prodes"),
+                versao=fingerprint,
+            )
+        except Exception as e:
+            logger.exception(f"[Tiles] Erro ao renderizar {layer}/{z}/{x}/{y}: {e}")
+            return jsonify({"status": "erro", "mensagem": "Erro ao renderizar tile"}), 500
+        TILE_CACHE.put(namespace, key, png)
+
+    response = send_file(
+        io.BytesIO(png),
+        mimetype="image/png",
+        etag=f"{versao}-{z}_{key}",
+        max_age=TILE_CACHE_MAX_AGE,
+        conditional=True,
+    )
+    response.cache_control.public = True
+    return response
+
+
 # ==============================================================================
 # Rota: Exportar KML
 # ==============================================================================
@@ -3477,6 +4127,9 @@ def exportar_kml():
         - analysis_type (str): chave no KML_EXPORT_REGISTRY
         - polygon_geojson (dict): GeoJSON FeatureCollection do polígono
         - nome_arquivo (str, opcional): nome do arquivo de saída
+        - formato (str, opcional): "kml" (padrão, enviado em streaming) ou "kmz"
+        - simplificacao (str|float, opcional): nível em KML_SIMPLIFICACAO_NIVEIS
+          ou tolerância em pixels
     """
     try:
         data = request.get_json(force=True)
@@ -3486,6 +4139,25 @@ def exportar_kml():
         analysis_type = data.get("analysis_type", "")
         polygon_geojson = data.get("polygon_geojson")
         nome_arquivo = data.get("nome_arquivo", "InfoGEO_export")
+        formato = str(data.get("formato", "kml")).strip().lower()
+        simplificacao = data.get("simplificacao", KML_SIMPLIFICACAO_PADRAO)
+
+        if formato not in ("kml", "kmz"):
+            return jsonify({"status": "erro", "mensagem": "Formato inválido. Use 'kml' ou 'kmz'"}), 400
+
+        if isinstance(simplificacao, str) and simplificacao in KML_SIMPLIFICACAO_NIVEIS:
+            simplificacao_px = KML_SIMPLIFICACAO_NIVEIS[simplificacao]
+        else:
+            try:
+                simplificacao_px = float(simplificacao)
+            except (TypeError, ValueError):
+                niveis = ", ".join(KML_SIMPLIFICACAO_NIVEIS.keys())
+                return jsonify({
+                    "status": "erro",
+                    "mensagem": f"Simplificação inválida. Use um nível ({niveis}) ou tolerância em pixels",
+                }), 400
+            if not 0 <= simplificacao_px <= 10:
+                return jsonify({"status": "erro", "mensagem": "Tolerância de simplificação deve estar entre 0 e 10 pixels"}), 400
 
         if not analysis_type:
             return jsonify({"status": "erro", "mensagem": "Tipo de análise não informado"}), 400
@@ -3503,15 +4175,9 @@ def exportar_kml():
                             f"Disponíveis: {tipos_disponiveis}",
             }), 400
 
-        raster_path = config["raster"]
-        if analysis_type == "uso_solo":
-            raster_type = data.get("raster_type", "com_mosaico")
-            if raster_type == "sem_mosaico":
-                raster_path = str(BASE_DIR / "data" / "LULC_Alpha_Biomas_radius_10.tif")
-            else:
-                raster_path = str(BASE_DIR / "data" / "LULC_VALORACAO_10m_com_mosaico.tif")
-            if not os.path.exists(raster_path):
-                raster_path = TIFF_PATH # fallback
+        raster_path = _resolve_registry_raster(
+            analysis_type, data.get("raster_type", "com_mosaico")
+        )
 
         classes_nomes = config["nomes"]
         classes_cores = config["cores"]
@@ -3523,15 +4189,19 @@ def exportar_kml():
                 "mensagem": f"Raster para '{analysis_type}' não disponível no servidor",
             }), 500
 
-        # Gerar KML
-        logger.info(f"[KML Export] Gerando KML para '{analysis_type}', nome='{nome_arquivo}'")
-        kml_content = gerar_kml(
+        # Gerar KML/KMZ
+        logger.info(
+            f"[KML Export] Gerando {formato.upper()} para '{analysis_type}', "
+            f"nome='{nome_arquivo}', simplificação={simplificacao_px} px"
+        )
+        kml_args = dict(
             raster_path=raster_path,
             polygon_geojson=polygon_geojson,
             classes_nomes=classes_nomes,
             classes_cores=classes_cores,
             nome_documento=f"InfoGEO - {nome_arquivo}",
             include_zero_class=(analysis_type == "prodes"),
+            simplificacao_px=simplificacao_px,
         )
 
         # Retornar como arquivo para download
@@ -3541,8 +4211,17 @@ def exportar_kml():
         if not safe_name:
             safe_name = "InfoGEO_export"
 
+        if formato == "kmz":
+            return send_file(
+                gerar_kmz(**kml_args),
+                mimetype="application/vnd.google-earth.kmz",
+                as_attachment=True,
+                download_name=f"{safe_name}.kmz",
+            )
+
+        # KML: placemarks enviados à medida que são serializados
         response = app.response_class(
-            response=kml_content,
+            response=gerar_kml_stream(**kml_args),
             status=200,
             mimetype="application/vnd.google-earth.kml+xml",
         )
@@ -3562,15 +4241,194 @@ def exportar_kml():
         }), 500
 
 
+# ==============================================================================
+# Camadas de referência: pré-carga (warm-up), prontidão e recarga
+# ==============================================================================
+# nome → {"tipo", "status": pendente|carregando|ok|ausente|erro, "segundos", "erro"}
+_ESTADO_PRECARGA = {}
+_estado_precarga_lock = threading.Lock()
+_INICIO_PROCESSO = time.time()
+
+
+def _camadas_referencia():
+    """Camadas carregadas sob demanda: nome → (carregador, arquivo de origem).
+
+    Todas são camadas mapeadas (server/camadas_mapeadas.py): a pré-carga no
+    mestre do gunicorn gera/abre os pacotes e os workers compartilham as
+    páginas.
+    """
+    from server import geocoding, valoracao
+
+    return {
+        "municipios_ibge": (geocoding._load_municipios, geocoding._SHP_PATH),
+        "macro_rta_geocoding": (geocoding._load_rta, geocoding._RTA_SHP_PATH),
+        "macro_rta_valoracao": (valoracao._load_macro_rta, valoracao.MACRO_RTA_PATH),
+        "centroides": (valoracao._load_centroides, valoracao.CENTROIDES_PATH),
+        "notas_agronomicas": (valoracao._load_micro_classes, valoracao.MICRO_CLASSES_EXCEL_PATH),
+        "koppen_excel": (_load_koppen_clima, KOPPEN_EXCEL_PATH),
+        "embargo": (_get_embargo_camada, EMBARGO_SHAPEFILE_PATH),
+        "icmbio": (_get_icmbio_camada, ICMBIO_SHAPEFILE_PATH),
+        "solos": (_get_solos_camada, SOLOS_VECTOR_PATH),
+    }
+
+
+def _rasters_referencia():
+    """Rasters das análises: nome → caminho."""
+    return {
+        f"raster_{analise}": caminho
+        for analise, caminho in _caminhos_fontes_lote().items()
+        if caminho.lower().endswith((".tif", ".tiff"))
+    }
+
+
+def _aquecer_raster(caminho):
+    """Lê cabeçalho e a menor visão geral: metadados e páginas do arquivo ficam
+    no cache do SO (o handle é fechado; cada requisição abre o seu)."""
+    import rasterio
+    with rasterio.open(caminho) as src:
+        escala = max(1, max(src.width, src.height) // 256)
+        src.read(1, out_shape=(max(1, src.height // escala), max(1, src.width // escala)))
+
+
+def _registrar_precarga(nome, **dados):
+    with _estado_precarga_lock:
+        _ESTADO_PRECARGA.setdefault(nome, {}).update(dados)
+
+
+def _precarregar_item(nome, carregar, caminho):
+    if not Path(caminho).exists():
+        _registrar_precarga(nome, status="ausente", segundos=0.0)
+        logger.warning(f"[Pré-carga] {nome}: arquivo não encontrado ({caminho})")
+        return
+    _registrar_precarga(nome, status="carregando")
+    inicio = time.perf_counter()
+    try:
+        carregar()
+    except Exception as e:
+        segundos = round(time.perf_counter() - inicio, 3)
+        _registrar_precarga(nome, status="erro", segundos=segundos, erro=str(e))
+        logger.error(f"[Pré-carga] {nome}: falhou ({e})")
+        return
+    segundos = round(time.perf_counter() - inicio, 3)
+    _registrar_precarga(nome, status="ok", segundos=segundos)
+    logger.info(f"[Pré-carga] {nome}: {segundos:.1f}s")
+
+
+def _itens_precarga(nomes=None, rasters=None):
+    """Itens a pré-carregar: nome → (tipo, carregador, caminho)."""
+    if nomes is None:
+        nomes = WARMUP_CAMADAS
+    if isinstance(nomes, str):
+        nomes = nomes.strip().lower()
+        nomes = None if nomes in ("todas", "all", "*") else {n.strip() for n in nomes.split(",") if n.strip()}
+    itens = {
+        nome: ("camada", carregar, caminho)
+        for nome, (carregar, caminho) in _camadas_referencia().items()
+        if nomes is None or nome in nomes
+    }
+    desconhecidas = set(nomes or ()) - set(_camadas_referencia())
+    if desconhecidas:
+        logger.warning(f"[Pré-carga] Camadas desconhecidas ignoradas: {sorted(desconhecidas)}")
+    if WARMUP_RASTERS if rasters is None else rasters:
+        for nome, caminho in _rasters_referencia().items():
+            itens[nome] = ("raster", lambda c=caminho: _aquecer_raster(c), caminho)
+    return itens
+
+
+def precarregar_camadas(nomes=None, rasters=None):
+    """Carrega em paralelo as camadas de referência e aquece os rasters.
+
+    `nomes`: lista ou texto como `WARMUP_CAMADAS` (padrão da configuração).
+    Bloqueia até o fim; o andamento fica em `_ESTADO_PRECARGA` (/readyz).
+    Falhas são apenas registradas.
+    """
+    itens = _itens_precarga(nomes, rasters)
+    for nome, (tipo, _, _) in itens.items():
+        _registrar_precarga(nome, tipo=tipo, status="pendente", segundos=None, erro=None)
+    if not itens:
+        return
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(
+        max_workers=max(1, WARMUP_THREADS), thread_name_prefix="precarga"
+    ) as executor:
+        for nome, (_, carregar, caminho) in itens.items():
+            executor.submit(_precarregar_item, nome, carregar, caminho)
+    logger.info(f"[Pré-carga] {len(itens)} item(ns) em {time.perf_counter() - inicio:.1f}s")
+
+
+def iniciar_precarga():
+    """Pré-carga em segundo plano (servidor de desenvolvimento / ASGI)."""
+    itens = _itens_precarga()
+    for nome, (tipo, _, _) in itens.items():
+        _registrar_precarga(nome, tipo=tipo, status="pendente", segundos=None, erro=None)
+    threading.Thread(target=precarregar_camadas, name="precarga", daemon=True).start()
+
+
+def estado_precarga():
+    """(pronto, {nome: estado}) — pronto quando nenhum item está pendente/carregando."""
+    with _estado_precarga_lock:
+        itens = {nome: dict(estado) for nome, estado in _ESTADO_PRECARGA.items()}
+    pronto = all(e.get("status") not in ("pendente", "carregando") for e in itens.values())
+    return pronto, itens
+
+
+def versoes_camadas():
+    """Versão (caminho + tamanho + mtime) do arquivo de cada camada de
+    referência e de cada raster das análises."""
+    arquivos = {nome: caminho for nome, (_, caminho) in _camadas_referencia().items()}
+    arquivos.update(_rasters_referencia())
+    return {nome: raster_fingerprint(str(caminho)) for nome, caminho in arquivos.items()}
+
+
+def limpar_camadas():
+    """Descarta as camadas em memória; a próxima consulta relê os arquivos."""
+    from server import geocoding, valoracao
+
+    geocoding.limpar_cache()
+    valoracao.limpar_cache()
+    koppen_clima.limpar_cache()
+    camadas_mapeadas.limpar_cache()
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: o processo responde."""
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "uptime_s": round(time.time() - _INICIO_PROCESSO, 1),
+    })
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: 200 após a pré-carga; 503 enquanto houver camada carregando."""
+    pronto, camadas = estado_precarga()
+    degradado = sorted(n for n, e in camadas.items() if e.get("status") in ("ausente", "erro"))
+    return jsonify({
+        "status": "pronto" if pronto else "aquecendo",
+        "pid": os.getpid(),
+        "degradado": degradado,
+        "camadas": camadas,
+    }), (200 if pronto else 503)
+
+
 # ==============================================================================
 # Main
 # ==============================================================================
 if __name__ == "__main__":
+    # Servidor de desenvolvimento (Flask). Em produção:
+    #     gunicorn -c server/gunicorn_conf.py server.servidor:app
+    from config import DEBUG_MODE, SERVER_HOST, SERVER_PORT
+
     logger.info("=== INICIANDO SERVIDOR ===")
     logger.info(f"Diretório base: {BASE_DIR}")
     logger.info(f"Verificando TIFF: {TIFF_PATH}")
     logger.info(f"TIFF existe: {os.path.exists(TIFF_PATH)}")
     logger.info(f"Index.html existe: {os.path.exists(BASE_DIR / 'index.html')}")
-    logger.info("Abra http://localhost:5000 no navegador.")
-    debug_mode = True
-    app.run(debug=debug_mode, host="0.0.0.0", port=5000, use_reloader=False)
+    logger.info(f"Abra http://localhost:{SERVER_PORT} no navegador.")
+    # Índice de busca do CAR: constrói em segundo plano se ausente/desatualizado
+    car_index.ensure_car_index()
+    iniciar_precarga()
+    app.run(debug=DEBUG_MODE, host=SERVER_HOST, port=SERVER_PORT, use_reloader=False)
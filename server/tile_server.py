@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Tiles XYZ das camadas de classificação
+=================================================
+Renderiza tiles Web Mercator (EPSG:3857, 256 px) diretamente dos rasters
+de classes, usando as overviews do COG e as paletas do `config.py`.
+
+Cada tile:
+  1. converte (z, x, y) em limites no CRS do raster;
+  2. lê apenas a janela correspondente, já decimada para ~2× a resolução
+     do tile (o GDAL escolhe a overview adequada);
+  3. reprojeta para a grade do tile (vizinho mais próximo, sem misturar
+     classes);
+  4. colore com a mesma LUT paletada das imagens de recorte.
+"""
+
+import logging
+import math
+import threading
+
+import numpy as np
+
+from .geo_utils import _render_palette_png
+
+logger = logging.getLogger("lulc-analyzer")
+
+TILE_SIZE = 256
+
+# Semieixo da esfera Web Mercator
+_ORIGIN_SHIFT = 2 * math.pi * 6378137 / 2.0
+
+# Fator de leitura: quantos pixels de origem por pixel de tile (antes da reprojeção)
+_OVERSAMPLE = 2
+
+# Datasets abertos por thread (evita reabrir o COG a cada tile):
+# caminho → (versão do arquivo, dataset)
+_local = threading.local()
+
+
+def tile_bounds_3857(z: int, x: int, y: int):
+    """Limites (left, bottom, right, top) de um tile XYZ em EPSG:3857."""
+    n = 2 ** z
+    size = 2 * _ORIGIN_SHIFT / n
+    left = -_ORIGIN_SHIFT + x * size
+    top = _ORIGIN_SHIFT - y * size
+    return left, top - size, left + size, top
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    n = 2 ** z
+    return 0 <= x < n and 0 <= y < n
+
+
+def _open_dataset(raster_path, versao=None):
+    """Dataset do raster para a thread atual; reaberto se o arquivo mudou de versão."""
+    import rasterio
+    datasets = getattr(_local, "datasets", None)
+    if datasets is None:
+        datasets = _local.datasets = {}
+    aberto = datasets.get(raster_path)
+    if aberto is not None:
+        versao_aberta, src = aberto
+        if versao_aberta == versao and not src.closed:
+            return src
+        src.close()
+    src = rasterio.open(raster_path)
+    datasets[raster_path] = (versao, src)
+    return src
+
+
+def _read_tile_classes(src, z, x, y):
+    """Matriz (256×256, int32) de classes do tile; -1 onde não há dado."""
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.transform import from_bounds as transform_from_bounds
+    from rasterio.warp import reproject, transform_bounds
+    from rasterio.windows import from_bounds as window_from_bounds
+    from rasterio.windows import Window
+    tile = np.full((TILE_SIZE, TILE_SIZE), -1, dtype=np.int32)
+
+    bounds_3857 = tile_bounds_3857(z, x, y)
+    src_crs = src.crs if src.crs else "EPSG:4674"
+    left, bottom, right, top = transform_bounds(
+        "EPSG:3857", src_crs, *bounds_3857, densify_pts=21
+    )
+
+    full = Window(0, 0, src.width, src.height)
+    try:
+        window = window_from_bounds(left, bottom, right, top, src.transform)
+        # Expandir para pixels inteiros cobrindo todo o tile (+1 px de margem)
+        col0 = math.floor(window.col_off) - 1
+        row0 = math.floor(window.row_off) - 1
+        col1 = math.ceil(window.col_off + window.width) + 1
+        row1 = math.ceil(window.row_off + window.height) + 1
+        window = Window(col0, row0, col1 - col0, row1 - row0).intersection(full)
+    except Exception:
+        # Sem interseção com o raster
+        return tile
+
+    if window.width < 1 or window.height < 1:
+        return tile
+
+    # Ler já decimado: GDAL usa a overview mais próxima de out_shape
+    scale = max(window.width, window.height) / (TILE_SIZE * _OVERSAMPLE)
+    if scale > 1:
+        out_h = max(1, int(round(window.height / scale)))
+        out_w = max(1, int(round(window.width / scale)))
+    else:
+        out_h, out_w = int(window.height), int(window.width)
+
+    nodata = src.nodata
+    data = src.read(
+        1,
+        window=window,
+        out_shape=(out_h, out_w),
+        resampling=Resampling.nearest,
+        masked=True,
+    )
+    arr = data.astype(np.int32).filled(-1)
+    if nodata is not None:
+        arr[arr == nodata] = -1
+
+    src_transform = src.window_transform(window) * rasterio.Affine.scale(
+        window.width / out_w, window.height / out_h
+    )
+    reproject(
+        source=arr,
+        destination=tile,
+        src_transform=src_transform,
+        src_crs=src_crs,
+        src_nodata=-1,
+        dst_transform=transform_from_bounds(*bounds_3857, TILE_SIZE, TILE_SIZE),
+        dst_crs="EPSG:3857",
+        dst_nodata=-1,
+        resampling=Resampling.nearest,
+    )
+    return tile
+
+
+def render_tile(raster_path, z, x, y, classes_cores, include_zero_class=False, versao=None):
+    """Renderiza o tile (z, x, y) do raster como PNG paletado.
+
+    `versao`: impressão digital do arquivo (raster_fingerprint); quando muda,
+    o dataset da thread é reaberto. Tiles fora da extensão do raster
+    retornam um PNG totalmente transparente.
+    """
+    src = _open_dataset(raster_path, versao)
+    classes = _read_tile_classes(src, z, x, y)
+    png, _valores, _opacos = _render_palette_png(
+        classes, classes_cores, include_zero_class
+    )
+    return png
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+InfoGEO – Tempos por etapa das análises
+=======================================
+Spans leves em torno das etapas (parse, CRS, leitura do raster, rasterize,
+histograma, PNG, geocodificação, Nominatim, valoração…):
+
+    with span("leitura_raster"):
+        data = src.read(...)
+
+    @medido("parse")
+    def parse_upload_file(...): ...
+
+Cada span alimenta:
+  - o rastreio da requisição atual, quando ativo (`iniciar()`): o servidor
+    o devolve no bloco `timings` da resposta e no cabeçalho `Server-Timing`;
+  - histogramas por etapa (`configurar(True)`), expostos em /metrics no
+    formato texto do Prometheus.
+
+Os tempos são inclusivos (ex.: `geocodificacao` contém `nominatim`). Com
+métricas desligadas e sem rastreio ativo, `span()` devolve um contexto
+nulo compartilhado. As métricas são por processo (cada worker expõe as suas).
+"""
+
+import functools
+import threading
+import time
+from contextlib import nullcontext
+
+# Limites (s) dos buckets dos histogramas
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULO = nullcontext()
+
+_local = threading.local()
+_metricas_ativas = False
+
+
+class Histograma:
+    """Histograma cumulativo (estilo Prometheus) com um rótulo."""
+
+    def __init__(self, nome: str, ajuda: str, rotulo: str):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulo = rotulo
+        self._lock = threading.Lock()
+        self._series = {}  # valor do rótulo → [contagens por bucket..., soma, total]
+
+    def observar(self, valor_rotulo: str, segundos: float):
+        with self._lock:
+            serie = self._series.get(valor_rotulo)
+            if serie is None:
+                serie = self._series[valor_rotulo] = [0] * len(BUCKETS) + [0.0, 0]
+            for i, limite in enumerate(BUCKETS):
+                if segundos <= limite:
+                    serie[i] += 1
+            serie[-2] += segundos
+            serie[-1] += 1
+
+    def exposicao(self) -> list:
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        for valor, serie in sorted(series.items()):
+            rotulo = f'{self.rotulo}="{_escapar(valor)}"'
+            for limite, contagem in zip(BUCKETS, serie):
+                linhas.append(f'{self.nome}_bucket{{{rotulo},le="{limite:g}"}} {contagem}')
+            linhas.append(f'{self.nome}_bucket{{{rotulo},le="+Inf"}} {serie[-1]}')
+            linhas.append(f"{self.nome}_sum{{{rotulo}}} {serie[-2]:.6f}")
+            linhas.append(f"{self.nome}_count{{{rotulo}}} {serie[-1]}")
+        return linhas
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+ETAPAS = Histograma(
+    "infogeo_etapa_segundos", "Duração das etapas das análises (s)", "etapa"
+)
+REQUISICOES = Histograma(
+    "infogeo_requisicao_segundos", "Duração das requisições por rota (s)", "rota"
+)
+
+
+def configurar(metricas: bool):
+    """Liga/desliga a coleta dos histogramas por etapa (`METRICS_ENABLED`)."""
+    global _metricas_ativas
+    _metricas_ativas = bool(metricas)
+
+
+def metricas_ativas() -> bool:
+    return _metricas_ativas
+
+
+# ------------------------------------------------------------------------------
+# Spans
+# ------------------------------------------------------------------------------
+class _Span:
+    __slots__ = ("nome", "inicio")
+
+    def __init__(self, nome: str):
+        self.nome = nome
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registrar(self.nome, time.perf_counter() - self.inicio)
+        return False
+
+
+def span(nome: str):
+    """Contexto que mede a etapa `nome` (nulo se nada estiver coletando)."""
+    if not _metricas_ativas and getattr(_local, "observacoes", None) is None:
+        return _NULO
+    return _Span(nome)
+
+
+def medido(nome: str):
+    """Decorador: a função inteira conta como a etapa `nome`."""
+
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with span(nome):
+                return funcao(*args, **kwargs)
+
+        return envolvida
+
+    return decorador
+
+
+def registrar(nome: str, segundos: float):
+    """Registra uma observação da etapa (rastreio atual e histograma)."""
+    observacoes = getattr(_local, "observacoes", None)
+    if observacoes is not None:
+        observacoes.append((nome, segundos))
+    if _metricas_ativas:
+        ETAPAS.observar(nome, segundos)
+
+
+# ------------------------------------------------------------------------------
+# Rastreio por requisição
+# ------------------------------------------------------------------------------
+def iniciar():
+    """Passa a acumular as etapas da thread atual."""
+    _local.observacoes = []
+
+
+def ativo() -> bool:
+    return getattr(_local, "observacoes", None) is not None
+
+
+def finalizar() -> list:
+    """Encerra o rastreio da thread e devolve [(etapa, segundos)]."""
+    observacoes = getattr(_local, "observacoes", None) or []
+    _local.observacoes = None
+    return observacoes
+
+
+def incorporar(observacoes):
+    """Registra observações feitas em outro processo (pool de análises)."""
+    for nome, segundos in observacoes or ():
+        registrar(nome, segundos)
+
+
+def anexar(observacoes):
+    """Junta ao rastreio atual etapas medidas em outra thread da requisição.
+
+    Ao contrário de `incorporar`, não observa os histogramas de novo (a
+    outra thread já os alimentou ao medir).
+    """
+    atuais = getattr(_local, "observacoes", None)
+    if atuais is not None:
+        atuais.extend(observacoes or ())
+
+
+def resumo_ms(observacoes) -> dict:
+    """{etapa: ms somados} na ordem da primeira ocorrência."""
+    total = {}
+    for nome, segundos in observacoes:
+        total[nome] = total.get(nome, 0.0) + segundos
+    return {nome: round(s * 1000, 2) for nome, s in total.items()}
+
+
+def server_timing(resumo: dict) -> str:
+    """Valor do cabeçalho HTTP Server-Timing."""
+    return ", ".join(f"{nome};dur={ms}" for nome, ms in resumo.items())
+
+
+def exposicao_prometheus() -> str:
+    return "\n".join(ETAPAS.exposicao() + REQUISICOES.exposicao()) + "\n"
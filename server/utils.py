@@ -8,7 +8,6 @@ formatação numérica pt-BR, coordenadas GMS, etc.
 
 import re
 import numpy as np
-import pandas as pd
 
 
 # ------------------------------------------------------------------------------
@@ -16,6 +15,7 @@ import pandas as pd
 # ------------------------------------------------------------------------------
 def _make_json_friendly(obj):
     """Recursively convert numpy / pandas / other non-serializable types to native Python types."""
+    import pandas as pd
     try:
         if obj is None:
             return None
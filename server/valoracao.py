@@ -9,14 +9,12 @@ de valor por classe.
 import logging
 import traceback
 from pathlib import Path
-from functools import lru_cache
 
-import pandas as pd
-import geopandas as gpd
 from shapely.geometry import Point
 from shapely.ops import transform as shapely_transform
-from pyproj import Transformer
 
+from . import camadas_mapeadas
+from .tracing import medido
 from .utils import _format_number_ptbr, _parse_number_ptbr
 
 logger = logging.getLogger("lulc-analyzer")
@@ -29,99 +27,67 @@ CENTROIDES_PATH = BASE_DIR / "data" / "Centroides_BR.geojson"
 MICRO_CLASSES_EXCEL_PATH = BASE_DIR / "data" / "nota_agronomica_por_tipo_microrregiao.csv"
 MACRO_RTA_PATH = BASE_DIR / "data" / "MACRO_RTA" / "MACRO_RTA.shp"
 
-# Caches globais
-MACRO_RTA_GDF = None
-
-
 # ------------------------------------------------------------------------------
 # Carregamento de dados
 # ------------------------------------------------------------------------------
-@lru_cache(maxsize=1)
-def _load_centroides_gdf():
-    """Carrega o GeoJSON de centroides/quadrantes com caching.
-    Retorna GeoDataFrame ou None."""
-    if not CENTROIDES_PATH.exists():
-        logger.warning(f"GeoJSON Centroides não encontrado: {CENTROIDES_PATH}")
-        return None
+def _ler_centroides():
+    """Lê o GeoJSON de centroides/quadrantes em EPSG:4326."""
+    import geopandas as gpd
+    gdf = gpd.read_file(str(CENTROIDES_PATH))
+    if gdf.crs is None:
+        gdf = gdf.set_crs("EPSG:4326")
+    elif gdf.crs.to_string() != "EPSG:4326":
+        gdf = gdf.to_crs("EPSG:4326")
+    return gdf
+
+
+def _load_centroides():
+    """Camada mapeada de centroides/quadrantes ou None."""
     try:
-        gdf = gpd.read_file(str(CENTROIDES_PATH))
-        if gdf.crs is None:
-            gdf = gdf.set_crs("EPSG:4326")
-        logger.info(f"Centroides GeoJSON carregado. Registros: {len(gdf)}")
-        return gdf
+        return camadas_mapeadas.carregar("centroides", CENTROIDES_PATH, _ler_centroides)
     except Exception as e:
         logger.error(f"Falha ao carregar GeoJSON Centroides: {e}")
         return None
 
 
-@lru_cache(maxsize=1)
-def _load_micro_classes_df():
-    """Carrega o arquivo de notas agronômicas (CSV ou Excel) com caching.
-    Retorna DataFrame ou None."""
-    if not MICRO_CLASSES_EXCEL_PATH.exists():
-        logger.warning(
-            f"Arquivo de notas agronômicas não encontrado: {MICRO_CLASSES_EXCEL_PATH}"
-        )
-        return None
+def _ler_micro_classes():
+    """Lê o arquivo de notas agronômicas (CSV ou Excel)."""
+    import pandas as pd
+    suffix = MICRO_CLASSES_EXCEL_PATH.suffix.lower()
+    if suffix == '.csv':
+        return pd.read_csv(str(MICRO_CLASSES_EXCEL_PATH))
+    return pd.read_excel(str(MICRO_CLASSES_EXCEL_PATH))
+
+
+def _load_micro_classes():
+    """Tabela mapeada de notas agronômicas, indexada por CD_MICR_GEO, ou None."""
     try:
-        suffix = MICRO_CLASSES_EXCEL_PATH.suffix.lower()
-        if suffix == '.csv':
-            df = pd.read_csv(str(MICRO_CLASSES_EXCEL_PATH))
-        else:
-            df = pd.read_excel(str(MICRO_CLASSES_EXCEL_PATH))
-        logger.info(f"Notas agronômicas carregadas: {len(df)} registros de {MICRO_CLASSES_EXCEL_PATH.name}")
-        return df
+        return camadas_mapeadas.carregar(
+            "notas_agronomicas", MICRO_CLASSES_EXCEL_PATH, _ler_micro_classes,
+            indices=("CD_MICR_GEO",),
+        )
     except Exception as e:
         logger.error(f"Falha ao carregar notas agronômicas: {e}")
         return None
 
 
-@lru_cache(maxsize=1)
-def _load_macro_rta_gdf():
-    """Carrega o shapefile MACRO_RTA_2025 com as microregiões.
+def _load_macro_rta():
+    """Camada MACRO_RTA com as microregiões (a mesma da geocodificação).
 
     IMPORTANTE: CD_RTA (campo do shapefile) = CD_MICR_GEO (campo do Excel)
     São códigos idênticos para identificar as microrregiões geográficas.
     """
-    global MACRO_RTA_GDF
-    if MACRO_RTA_GDF is not None:
-        logger.info("📦 Usando MACRO_RTA em cache")
-        return MACRO_RTA_GDF
-
-    if not MACRO_RTA_PATH.exists():
-        logger.error(f"❌ Shapefile MACRO_RTA não encontrado: {MACRO_RTA_PATH}")
-        MACRO_RTA_GDF = None
-        return None
+    from .geocoding import _load_rta
 
-    try:
-        logger.info(f"📂 Carregando MACRO_RTA de: {MACRO_RTA_PATH}")
-        gdf = gpd.read_file(str(MACRO_RTA_PATH))
-        if gdf.crs is None:
-            gdf = gdf.set_crs("EPSG:4326")
-        elif gdf.crs.to_string() != "EPSG:4326":
-            gdf = gdf.to_crs("EPSG:4326")
-
-        MACRO_RTA_GDF = gdf
-        logger.info(
-            f"✅ MACRO_RTA shapefile carregado: {len(gdf)} regiões, CRS: {gdf.crs}"
-        )
-        logger.info(f"   Colunas: {gdf.columns.tolist()}")
+    camada = _load_rta()
+    if camada is not None and "CD_RTA" not in camada.columns:
+        logger.error(f"   ❌ Campo CD_RTA não encontrado! Colunas: {camada.columns}")
+    return camada
 
-        if "CD_RTA" in gdf.columns:
-            sample_cd = sorted(gdf["CD_RTA"].unique())[:10]
-            logger.info(f"   Amostra CD_RTA: {sample_cd}")
-            logger.info("   ℹ️ CD_RTA será usado como CD_MICR_GEO no Excel")
-        else:
-            logger.error(
-                f"   ❌ Campo CD_RTA não encontrado! Colunas: {gdf.columns.tolist()}"
-            )
 
-        return MACRO_RTA_GDF
-    except Exception as e:
-        logger.error(f"❌ Falha ao carregar shapefile MACRO_RTA: {e}")
-        logger.error(traceback.format_exc())
-        MACRO_RTA_GDF = None
-        return None
+def limpar_cache():
+    """Fecha as camadas abertas (recarga após troca dos arquivos de dados)."""
+    camadas_mapeadas.limpar_cache("centroides", "notas_agronomicas", "macro_rta")
 
 
 # ------------------------------------------------------------------------------
@@ -136,24 +102,25 @@ def _get_cd_rta_from_centroid(centroid_point_wgs84: Point):
     Returns:
         int: CD_RTA encontrado ou None se não encontrado
     """
+    from pyproj import Transformer
     try:
         logger.info(
             f"🌍 Centroide recebido: Lat={centroid_point_wgs84.y:.6f}, Lon={centroid_point_wgs84.x:.6f}"
         )
 
-        gdf_macro = _load_macro_rta_gdf()
-        if gdf_macro is None or gdf_macro.empty:
+        camada_macro = _load_macro_rta()
+        if camada_macro is None or camada_macro.empty:
             logger.error("❌ Shapefile MACRO_RTA não carregado ou vazio!")
             return None
 
         logger.info(
-            f"📍 MACRO_RTA carregado: {len(gdf_macro)} regiões, CRS: {gdf_macro.crs}"
+            f"📍 MACRO_RTA carregado: {len(camada_macro)} regiões, CRS: {camada_macro.crs}"
         )
 
-        if gdf_macro.crs.to_string() != "EPSG:4326":
-            logger.info(f"🔄 Transformando centroide de EPSG:4326 para {gdf_macro.crs}")
+        if camada_macro.crs != "EPSG:4326":
+            logger.info(f"🔄 Transformando centroide de EPSG:4326 para {camada_macro.crs}")
             transformer = Transformer.from_crs(
-                "EPSG:4326", gdf_macro.crs, always_xy=True
+                "EPSG:4326", camada_macro.crs, always_xy=True
             )
             centroid_transformed = shapely_transform(
                 transformer.transform, centroid_point_wgs84
@@ -163,21 +130,16 @@ def _get_cd_rta_from_centroid(centroid_point_wgs84: Point):
             centroid_transformed = centroid_point_wgs84
             logger.info("✅ CRS já é EPSG:4326, sem necessidade de transformação")
 
-        logger.info("🔍 Buscando região que contém o centroide...")
-        matches = gdf_macro[gdf_macro.geometry.contains(centroid_transformed)]
-
-        if matches.empty:
-            logger.warning(
-                "⚠️ Nenhuma região contém exatamente o ponto. Tentando intersects..."
-            )
-            matches = gdf_macro[gdf_macro.geometry.intersects(centroid_transformed)]
+        logger.info("🔍 Buscando região que contém o centroide (ou o toca, na borda)...")
+        indices = camada_macro.contendo(centroid_transformed.x, centroid_transformed.y)
+        matches = camada_macro.linhas(indices[:1])
 
         if matches.empty:
             logger.error(
                 f"❌ Centroide ({centroid_point_wgs84.x:.6f}, {centroid_point_wgs84.y:.6f}) não encontrado em nenhuma região MACRO_RTA"
             )
-            logger.error(f"   Total de regiões no shapefile: {len(gdf_macro)}")
-            logger.error(f"   Bounds do shapefile: {gdf_macro.total_bounds}")
+            logger.error(f"   Total de regiões no shapefile: {len(camada_macro)}")
+            logger.error(f"   Bounds do shapefile: {camada_macro.limites}")
             return None
 
         cd_rta = matches.iloc[0]["CD_RTA"]
@@ -216,8 +178,8 @@ def _get_nota_from_micro_classe(cd_micr_geo: int, cls_num: int):
         float: Nota agronômica ou None se não encontrado
     """
     try:
-        df = _load_micro_classes_df()
-        if df is None or df.empty:
+        tabela = _load_micro_classes()
+        if tabela is None or tabela.empty:
             logger.warning("⚠️ DataFrame de micro_classes vazio ou não carregado")
             return None
 
@@ -232,23 +194,22 @@ def _get_nota_from_micro_classe(cd_micr_geo: int, cls_num: int):
             logger.error(f"❌ Erro ao converter parâmetros para int: {e}")
             return None
 
-        matches = df[
-            (df["CD_MICR_GEO"] == cd_micr_geo_int) & (df["COD_DN"] == cls_num_int)
-        ]
+        linhas = tabela.linhas_com("CD_MICR_GEO", cd_micr_geo_int)
+        matches = linhas[tabela.valores("COD_DN", linhas) == cls_num_int]
 
-        if matches.empty:
+        if len(matches) == 0:
             logger.warning(
                 f"⚠️ Nenhuma linha encontrada para CD_MICR_GEO={cd_micr_geo_int}, COD_DN={cls_num_int}"
             )
             logger.info(
-                f"   Valores únicos de CD_MICR_GEO no Excel: {sorted(df['CD_MICR_GEO'].unique())[:20]}"
+                f"   Valores únicos de CD_MICR_GEO no Excel: {sorted(set(tabela.valores('CD_MICR_GEO').tolist()))[:20]}"
             )
             logger.info(
-                f"   Valores únicos de COD_DN no Excel: {sorted(df['COD_DN'].unique())}"
+                f"   Valores únicos de COD_DN no Excel: {sorted(set(tabela.valores('COD_DN').tolist()))}"
             )
             return None
 
-        nota_val = matches.iloc[0]["NOTA_AGRONOMICA"]
+        nota_val = tabela.valores("NOTA_AGRONOMICA", matches[:1])[0]
 
         if nota_val is None or (isinstance(nota_val, float) and nota_val != nota_val):
             logger.warning(
@@ -275,27 +236,19 @@ def _get_nota_from_micro_classe(cd_micr_geo: int, cls_num: int):
 # ------------------------------------------------------------------------------
 # Informações do quadrante
 # ------------------------------------------------------------------------------
+@medido("valoracao")
 def _get_quadrante_info_from_centroid(centroid_point_wgs84: Point):
     """Dado um Point em WGS84, retorna (codigo_quadrante, valor_quadrante, atributos, mensagem)
     ou (None, None, {}, 'Centroide sem valor')"""
-    gdf = _load_centroides_gdf()
-    if gdf is None or gdf.empty:
+    import pandas as pd
+    camada = _load_centroides()
+    if camada is None or camada.empty:
         return None, None, {}, "Centroide sem valor"
 
     try:
-        if gdf.crs is None:
-            gdf = gdf.set_crs("EPSG:4326")
-        if gdf.crs.to_string() != "EPSG:4326":
-            gdf_wgs = gdf.to_crs("EPSG:4326")
-        else:
-            gdf_wgs = gdf
-    except Exception:
-        gdf_wgs = gdf
-
-    try:
-        matches = gdf_wgs[gdf_wgs.geometry.contains(centroid_point_wgs84)]
-        if matches.empty:
-            matches = gdf_wgs[gdf_wgs.geometry.intersects(centroid_point_wgs84)]
+        # Camada já em EPSG:4326; contém o ponto ou, na borda, o toca
+        indices = camada.contendo(centroid_point_wgs84.x, centroid_point_wgs84.y)
+        matches = camada.linhas(indices[:1])
         if matches.empty:
             return None, None, {}, "Centroide sem valor"
 
@@ -458,6 +411,7 @@ def _get_quadrante_info_from_centroid(centroid_point_wgs84: Point):
 # ------------------------------------------------------------------------------
 # Cálculo de valoração por classe (extraído de _process_analysis_sync)
 # ------------------------------------------------------------------------------
+@medido("valoracao")
 def calculate_valoracao(relatorio, centroid_point, valor_quadrante_result):
     """Calcula a valoração agronômica para cada classe do relatório.
 